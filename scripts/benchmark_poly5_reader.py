@@ -0,0 +1,142 @@
+""" Benchmark of the Poly5Reader: block-by-block struct.unpack loop vs. reading all data blocks at once
+
+Usage (from the repository root):
+    python scripts/benchmark_poly5_reader.py
+    python scripts/benchmark_poly5_reader.py --channels 34 --sfreq 4096 --duration 600
+
+A synthetic Poly5 file is written to a temporary folder, read with the previous loop and with Poly5Reader,
+both sample matrices are compared and the reading times are printed.
+
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+
+reader_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "bssu", "extern", "tmsi_poly5reader.py")
+
+
+def load_poly5reader_module():
+    """ load tmsi_poly5reader.py directly, without importing the whole bssu package """
+
+    spec = importlib.util.spec_from_file_location("tmsi_poly5reader", reader_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def write_synthetic_poly5(filepath: str, n_channels: int, sfreq: int, duration: int, partial_samples: int = 0):
+    """
+    Input:
+        - filepath: str, path of the new .Poly5 file
+        - n_channels: int, e.g. 34
+        - sfreq: int, sampling frequency, e.g. 4096
+        - duration: int, seconds
+        - partial_samples: int, samples missing in the final data block, 0: all blocks are filled completely
+
+    return np.array (samples, channels) of the written float32 data
+    """
+
+    samples_per_block = sfreq // 8
+    n_samples = sfreq * duration - partial_samples
+    n_blocks = -(-n_samples // samples_per_block)
+
+    data = np.random.default_rng(0).standard_normal((n_samples, n_channels)).astype("<f4")
+
+    with open(filepath, "wb") as file:
+        file.write(struct.pack(
+            "=31sH81phhBHi4xHHHHHHHiHHH64x",
+            b"POLY SAMPLE FILEversion 2.03\r\n\x1a", 203, b"synthetic", sfreq, sfreq, 0, n_channels * 2, n_samples,
+            2024, 1, 1, 1, 10, 0, 0, n_blocks, samples_per_block, 0, 0
+            ))
+
+        # two descriptions per channel (low and high word), as written by TMSi
+        for c in range(n_channels):
+            description = struct.pack("=41p4x11pffffH62x", f"(Lo) LFP{c}".encode(), "µVolt".encode(), 0, 0, 0, 0, 0)
+            file.write(description)
+            file.write(description)
+
+        for b in range(n_blocks):
+            file.write(b"\0" * 86)
+            file.write(data[b * samples_per_block:(b + 1) * samples_per_block].tobytes())
+
+    return data
+
+
+def read_block_loop(poly5reader_module, filepath: str):
+    """ samples read with the previous Poly5Reader loop: one struct.unpack per data block """
+
+    # header and channel descriptions only
+    reader = poly5reader_module.Poly5Reader(filepath, readAll=False)
+    reader.file_obj.close()
+
+    file_obj = open(filepath, "rb")
+    file_obj.seek(reader._data_offset)
+
+    sample_buffer = np.zeros(reader.num_channels * reader.num_samples)
+
+    for i in range(reader.num_data_blocks):
+
+        # Check whether final data block is filled completely or not
+        if i == reader.num_data_blocks - 1 and reader.num_samples % reader.num_samples_per_block != 0:
+            final_samples = reader.num_samples % reader.num_samples_per_block
+            data_block = reader._readSignalBlock(file_obj, final_samples * reader.num_channels, "f" * final_samples * reader.num_channels)
+        else:
+            data_block = reader._readSignalBlock(file_obj, reader._buffer_size, reader._myfmt)
+
+        i1 = i * reader.num_samples_per_block * reader.num_channels
+        i2 = min((i + 1) * reader.num_samples_per_block * reader.num_channels, reader.num_samples * reader.num_channels)
+
+        sample_buffer[i1:i2] = data_block
+
+    file_obj.close()
+
+    return np.transpose(np.reshape(sample_buffer, [reader.num_samples, reader.num_channels]))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=34)
+    parser.add_argument("--sfreq", type=int, default=4096)
+    parser.add_argument("--duration", type=int, default=600, help="seconds")
+    args = parser.parse_args()
+
+    poly5reader_module = load_poly5reader_module()
+
+    with tempfile.TemporaryDirectory() as temp_path:
+
+        for partial_samples in [0, 100]:
+
+            filepath = os.path.join(temp_path, "synthetic.Poly5")
+            data = write_synthetic_poly5(filepath, args.channels, args.sfreq, args.duration, partial_samples=partial_samples)
+
+            # the reader prints its progress
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                loop_samples = read_block_loop(poly5reader_module, filepath)
+                loop_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                reader_samples = poly5reader_module.Poly5Reader(filepath).samples
+                reader_time = time.perf_counter() - start
+
+            identical = np.array_equal(loop_samples, reader_samples) and np.array_equal(reader_samples, data.T)
+
+            print(f"{args.channels} channels, {args.sfreq} Hz, {args.duration} s, final block missing {partial_samples} samples:")
+            print(f"    block loop: {loop_time:.2f} s")
+            print(f"    Poly5Reader: {reader_time:.3f} s ({loop_time / reader_time:.0f}x)")
+            print(f"    identical samples: {identical}")
+
+
+if __name__ == "__main__":
+    main()
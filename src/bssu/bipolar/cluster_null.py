@@ -0,0 +1,768 @@
+""" Cluster permutation test of power spectra between two sessions with a persistent permutation null """
+
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from scipy import ndimage
+from scipy.stats import f as fstat
+from scipy.stats import t as tstat
+
+import mne
+
+# Local Imports
+from .. utils import find_folders as find_folders
+
+
+def permutation_orders(n_observations: int, n_permutations: int, seed=None):
+    """
+    Input:
+        - n_observations: int, number of power spectra of both sessions together
+        - n_permutations: int, e.g. 1000, the first permutation is the original order (as in mne.stats.permutation_cluster_test)
+        - seed: None, int or np.random.RandomState
+
+    The orders are drawn in the same way as in mne.stats.permutation_cluster_test,
+    so with the same seed both tests use the same permutations.
+
+    return np.array (n_permutations - 1, n_observations) with the shuffled indices of each permutation
+    """
+
+    rng = mne.utils.check_random_state(seed)
+
+    orders = np.array([rng.permutation(n_observations) for _ in range(int(n_permutations) - 1)], dtype=np.int32)
+
+    return orders.reshape(int(n_permutations) - 1, n_observations)
+
+
+def f_statistics_two_sessions(x_full, n_session_1: int, orders=None, batch_size: int = 1000):
+    """
+    Input:
+        - x_full: np.array (n_observations, n_frequencies), power spectra of session 1 first, then session 2
+        - n_session_1: int, number of power spectra of session 1
+        - orders: None or np.array (n_permutations, n_observations) from permutation_orders()
+        - batch_size: int, number of permutations computed at once, limits the memory usage
+
+    One-way ANOVA F statistic for each frequency, same formula as mne.stats.f_oneway.
+    The sum of squares of all data and the total sum don't change by shuffling,
+    so for each permutation only the sum of the power spectra in session 1 is computed.
+
+    return
+        - orders None: np.array (n_frequencies,) observed F values
+        - otherwise: np.array (n_permutations, n_frequencies) F values of each permutation
+    """
+
+    x_full = np.asarray(x_full, dtype=np.float64)
+
+    n_samples = x_full.shape[0]
+    n_session_2 = n_samples - n_session_1
+
+    ss_alldata = np.sum(x_full ** 2, axis=0)
+    square_of_sums_alldata = np.sum(x_full, axis=0) ** 2
+    sstot = ss_alldata - square_of_sums_alldata / n_samples
+
+    def f_values(sums_session_1, sums_session_2):
+        ssbn = sums_session_1 ** 2 / n_session_1 + sums_session_2 ** 2 / n_session_2 - square_of_sums_alldata / n_samples
+        sswn = sstot - ssbn
+        # dfbn = 1 for two sessions
+        return ssbn / (sswn / (n_samples - 2))
+
+    if orders is None:
+        return f_values(np.sum(x_full[:n_session_1], axis=0), np.sum(x_full[n_session_1:], axis=0))
+
+    f_permutations = np.empty((len(orders), x_full.shape[1]))
+
+    for batch_start in range(0, len(orders), batch_size):
+
+        batch_orders = orders[batch_start:batch_start + batch_size]
+
+        sums_session_1 = np.sum(x_full[batch_orders[:, :n_session_1]], axis=1)
+        sums_session_2 = np.sum(x_full[batch_orders[:, n_session_1:]], axis=1)
+
+        f_permutations[batch_start:batch_start + len(batch_orders)] = f_values(sums_session_1, sums_session_2)
+
+    return f_permutations
+
+
+def default_threshold(n_session_1: int, n_session_2: int, p_threshold: float = 0.05):
+    """
+    F threshold for cluster forming, same as the default of mne.stats.permutation_cluster_test for two sessions
+
+    return float
+    """
+
+    return fstat.ppf(1.0 - p_threshold, 1, n_session_1 + n_session_2 - 2)
+
+
+def cluster_masks(values, threshold: float, tail: int):
+    """
+    Input:
+        - values: np.array (..., n_frequencies) of F or t values
+        - threshold: float, see find_clusters()
+        - tail: int, 1: values > threshold, -1: values < threshold, 0: both values > threshold and values < -threshold
+
+    return list of boolean masks, one per direction (positive clusters first, as in MNE)
+    """
+
+    if tail == 1:
+        return [values > threshold]
+
+    elif tail == -1:
+        return [values < threshold]
+
+    elif tail == 0:
+        return [values > abs(threshold), values < -abs(threshold)]
+
+    raise ValueError(f"tail must be -1, 0 or 1, got: {tail}")
+
+
+def find_clusters(f_values, threshold: float, tail: int = 1):
+    """
+    Input:
+        - f_values: np.array (n_frequencies,) of F or t values
+        - threshold: float, frequencies above threshold form clusters of adjacent frequencies 
+            (below threshold for tail -1, above abs(threshold) or below -abs(threshold) for tail 0)
+        - tail: int, see cluster_masks()
+
+    return
+        - clusters: list of clusters, each a tuple with the array of frequency indices (as out_type="indices" in MNE)
+        - cluster_stats: np.array, sum of F or t values of each cluster
+    """
+
+    clusters = []
+
+    for mask in cluster_masks(f_values, threshold, tail):
+
+        labels, n_clusters = ndimage.label(mask)
+        clusters += [(np.nonzero(labels == label)[0],) for label in range(1, n_clusters + 1)]
+
+    cluster_stats = np.array([np.sum(f_values[cluster]) for cluster in clusters])
+
+    return clusters, cluster_stats
+
+
+def max_cluster_stats(f_permutations, threshold: float, tail: int = 1):
+    """
+    Input:
+        - f_permutations: np.array (n_permutations, n_frequencies) of F or t values
+        - threshold: float, see find_clusters()
+        - tail: int, see cluster_masks()
+
+    Clusters of all permutations at once: runs of adjacent frequencies within a mask,
+    the sum of a run is the difference of the cumulative sums at its end and start.
+
+    return np.array (n_permutations,), the cluster sum with the largest absolute value of each permutation (with sign),
+    0 if there is no cluster
+    """
+
+    n_permutations = len(f_permutations)
+
+    # largest positive and most negative cluster sum of each permutation
+    max_sums = np.zeros(n_permutations)
+    min_sums = np.zeros(n_permutations)
+
+    for mask in cluster_masks(f_permutations, threshold, tail):
+
+        values_in_mask = np.where(mask, f_permutations, 0)
+
+        # cumulative sums with a 0 column in front, so run sum = cumulative[end + 1] - cumulative[start]
+        cumulative = np.concatenate([np.zeros((n_permutations, 1)), np.cumsum(values_in_mask, axis=1)], axis=1)
+
+        padded = np.pad(mask, ((0, 0), (1, 1)))
+        starts = padded[:, 1:-1] & ~padded[:, :-2]
+        ends = padded[:, 1:-1] & ~padded[:, 2:]
+
+        # starts and ends are in the same order within each permutation
+        start_rows, start_columns = np.nonzero(starts)
+        end_columns = np.nonzero(ends)[1]
+
+        cluster_sums = cumulative[start_rows, end_columns + 1] - cumulative[start_rows, start_columns]
+
+        np.maximum.at(max_sums, start_rows, cluster_sums)
+        np.minimum.at(min_sums, start_rows, cluster_sums)
+
+    # positive clusters first: ties are resolved to the positive cluster as in MNE
+    return np.where(max_sums >= -min_sums, max_sums, min_sums)
+
+
+def cluster_test_from_null(f_obs, f_permutations, threshold: float, tail: int = 1):
+    """
+    Input:
+        - f_obs: np.array (n_frequencies,) observed F or t values
+        - f_permutations: np.array (n_permutations - 1, n_frequencies) F or t values of the stored permutations
+        - threshold: float, see find_clusters()
+        - tail: int, see cluster_masks()
+
+    Cluster p-values from a stored permutation null, e.g. after changing the threshold or the frequency window.
+
+    Permutations with the same cluster sum as an observed cluster (relative tolerance 1e-9) are always counted as at least as extreme,
+    e.g. the original sign flip of an exact paired test or permutations that only shuffle spectra within a session.
+    MNE compares without tolerance, so whether it counts these ties depends on floating point rounding of its permutation statistics
+    (and on the MNE version). For all tails the p-values can therefore be larger by 1 / n_permutations per tie 
+    than in mne.stats.permutation_cluster_test or mne.stats.permutation_cluster_1samp_test,
+    e.g. exact paired test of 8 STNs, tail=1: p=0.0078 here, p=0.0039 with MNE 1.13.
+
+    return F_obs, clusters, cluster_pv, H0 in the same way as mne.stats.permutation_cluster_test
+        - H0: first value is the most extreme observed cluster sum (original order), then one value per permutation
+    """
+
+    clusters, cluster_stats = find_clusters(f_obs, threshold, tail)
+
+    if len(clusters) == 0:
+        print("No clusters found, returning empty H0, clusters, and cluster_pv")
+        return f_obs, np.array([]), np.array([]), np.array([])
+
+    H0_permutations = max_cluster_stats(f_permutations, threshold, tail)
+
+    # permutations with the same cluster sum as observed (e.g. the original sign flips of an exact test) count as at least as extreme, 
+    # with a tolerance for rounding errors
+    tolerance = 1e-9 * np.maximum(1, np.abs(cluster_stats))
+
+    if tail == 1:
+        H0 = np.concatenate([[cluster_stats.max()], H0_permutations])
+        cluster_pv = np.array([np.mean(H0 >= stat - tol) for stat, tol in zip(cluster_stats, tolerance)])
+
+    elif tail == -1:
+        H0 = np.concatenate([[cluster_stats.min()], H0_permutations])
+        cluster_pv = np.array([np.mean(H0 <= stat + tol) for stat, tol in zip(cluster_stats, tolerance)])
+
+    else:
+        H0 = np.concatenate([[np.abs(cluster_stats).max()], H0_permutations])
+        cluster_pv = np.array([np.mean(np.abs(H0) >= np.abs(stat) - tol) for stat, tol in zip(cluster_stats, tolerance)])
+
+    return f_obs, clusters, cluster_pv, H0
+
+
+class ClusterNullCache:
+    """
+    Persistent permutation nulls of cluster permutation tests, one .npz file per session comparison in cache_path.
+
+    Stored for each comparison: the permutation orders and the F values (or t values of the paired test) of each permutation for all frequencies.
+    The key is the sha256 hash of the power spectra of both sessions, the number of permutations, the seed and the design,
+    so a different frequency window or threshold reuses the same null.
+
+    Parameters:
+        - cache_path: str, folder of the cache files, default: "cluster_null_cache" in the GroupResults folder
+
+    Usage:
+        null_cache = ClusterNullCache()
+        cluster_test = cluster_permutation_test(x_session_1, x_session_2, null_cache=null_cache)
+        null_cache.print_statistics()
+    """
+
+    def __init__(self, cache_path: str = None):
+
+        if cache_path is None:
+            cache_path = os.path.join(find_folders.get_local_path(folder="GroupResults"), "cluster_null_cache")
+
+        self.cache_path = cache_path
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_path, exist_ok=True)
+
+
+    def cache_file(self, x_full, n_session_1: int, n_permutations: int, seed, design: str = "independent"):
+        """ 
+        path of the cache file of one session comparison 
+        
+        design: "independent" for the F-test of two sessions, e.g. "paired_tail0" for the paired sign-flip test
+        """
+
+        x_full = np.ascontiguousarray(x_full, dtype=np.float64)
+
+        key_settings = {"n_session_1": int(n_session_1), "n_permutations": int(n_permutations), "seed": seed}
+
+        # independent nulls keep the key without design
+        if design != "independent":
+            key_settings["design"] = design
+
+        key_hash = hashlib.sha256()
+        key_hash.update(str(x_full.shape).encode())
+        key_hash.update(x_full.tobytes())
+        key_hash.update(json.dumps(key_settings, sort_keys=True, default=str).encode())
+
+        return os.path.join(self.cache_path, f"{key_hash.hexdigest()}.npz")
+
+
+    def load(self, x_full, n_session_1: int, n_permutations: int, seed, design: str = "independent"):
+        """
+        return {"orders", "F_permutations"} ({"orders", "T_permutations"} for the paired design) of the stored null, 
+        None if it was not computed before
+        """
+
+        cache_file = self.cache_file(x_full, n_session_1, n_permutations, seed, design)
+
+        if not os.path.isfile(cache_file):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        with np.load(cache_file) as cached:
+            return dict(cached)
+
+
+    def save(self, x_full, n_session_1: int, n_permutations: int, seed, null: dict, design: str = "independent"):
+        """
+        store the permutation orders and F values (t values) of each permutation
+        """
+
+        cache_file = self.cache_file(x_full, n_session_1, n_permutations, seed, design)
+
+        stored = {name: null[name] for name in ["orders", "F_permutations", "T_permutations"] if name in null}
+
+        # write to a temporary file first, so an interrupted run never leaves a broken cache file
+        temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temporary_file, "wb") as file:
+            np.savez(file, **stored)
+
+        os.replace(temporary_file, cache_file)
+
+
+    def print_statistics(self):
+        """ print cache hits and misses of this run """
+
+        print(f"Cluster null cache: {self.hits} hits, {self.misses} misses (permuted),",
+              f"\ncache folder: {self.cache_path}")
+
+
+def f_statistics_task(task: tuple):
+    """
+    Input:
+        - task: tuple (x_full, n_session_1, orders), see f_statistics_two_sessions()
+
+    module level function, so it can be sent to worker processes
+
+    return (F values of each permutation, seconds)
+    """
+
+    start_time = time.perf_counter()
+    f_permutations = f_statistics_two_sessions(*task)
+
+    return f_permutations, time.perf_counter() - start_time
+
+
+def permutation_nulls(
+        sessions: dict,
+        n_permutations: int = 1000,
+        seed=None,
+        null_cache=None,
+        n_jobs: int = 1,
+        batch_size: int = 1000,
+):
+    """
+    Permutation nulls of several session comparisons.
+
+    Input:
+        - sessions: dict {key: (x_session_1, x_session_2)} with the full power spectra of both sessions, e.g. key = (comparison, channel_group)
+        - n_permutations: int, e.g. 1000 or 10000
+        - seed: None or int, see permutation_orders(). The same seed is used for each comparison, 
+            so each comparison has the same permutations as mne.stats.permutation_cluster_test(..., seed=seed)
+        - null_cache: None or ClusterNullCache, loads stored nulls and stores new nulls
+        - n_jobs: int, number of worker processes
+            1: one after the other
+            >1: the permutations of all comparisons are split into batches of batch_size permutations,
+                all batches are computed in parallel in a process pool
+            -1: one worker process per CPU core
+        - batch_size: int, number of permutations per batch
+
+    return {key: {
+        "orders": np.array (n_permutations - 1, n_observations),
+        "F_obs": np.array (n_frequencies,),
+        "F_permutations": np.array (n_permutations - 1, n_frequencies),
+        "from_cache": bool,
+        "seconds": float, computation time of the permutations (summed over all batches)
+    }}
+    """
+
+    nulls = {}
+    tasks = []
+    task_keys = []
+
+    for key, (x_session_1, x_session_2) in sessions.items():
+
+        x_full = np.concatenate([x_session_1, x_session_2], axis=0)
+        n_session_1 = len(x_session_1)
+
+        null = None
+
+        if null_cache is not None:
+            null = null_cache.load(x_full, n_session_1, n_permutations, seed)
+
+        if null is None:
+            orders = permutation_orders(len(x_full), n_permutations, seed)
+            null = {"orders": orders, "from_cache": False, "seconds": 0.0}
+
+            for batch_start in range(0, len(orders), batch_size):
+                tasks.append((x_full, n_session_1, orders[batch_start:batch_start + batch_size]))
+                task_keys.append(key)
+
+        else:
+            null.update({"from_cache": True, "seconds": 0.0})
+
+        null["F_obs"] = f_statistics_two_sessions(x_full, n_session_1)
+        nulls[key] = null
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    if n_jobs > 1 and len(tasks) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as executor:
+            # executor.map returns the results in the order of tasks
+            task_results = list(executor.map(f_statistics_task, tasks))
+
+    else:
+        task_results = [f_statistics_task(task) for task in tasks]
+
+    # merge the batches of each comparison in the order of the permutations
+    batches = {}
+    for key, (f_permutations, seconds) in zip(task_keys, task_results):
+        batches.setdefault(key, []).append(f_permutations)
+        nulls[key]["seconds"] += seconds
+
+    for key, key_batches in batches.items():
+        nulls[key]["F_permutations"] = np.concatenate(key_batches, axis=0)
+
+        if null_cache is not None:
+            x_session_1, x_session_2 = sessions[key]
+            null_cache.save(np.concatenate([x_session_1, x_session_2], axis=0), len(x_session_1), n_permutations, seed, nulls[key])
+
+    # n_permutations = 1: no permutations, only the original order
+    for key, null in nulls.items():
+        if "F_permutations" not in null:
+            null["F_permutations"] = np.empty((0, len(null["F_obs"])))
+
+    return nulls
+
+
+def cluster_permutation_tests(
+        test_inputs: dict,
+        n_permutations: int = 1000,
+        seed=None,
+        threshold: float = None,
+        tail: int = 1,
+        null_cache=None,
+        n_jobs: int = 1,
+):
+    """
+    Cluster permutation tests of power spectra between two sessions for several session comparisons,
+    each with the same permutations as mne.stats.permutation_cluster_test([x_session_1, x_session_2], n_permutations, seed=seed),
+    p-values can differ for permutations tied with an observed cluster sum, see cluster_test_from_null().
+    The permutation null is computed for all frequencies and can be stored and reused.
+
+    Input:
+        - test_inputs: dict {key: {"x_session_1", "x_session_2", "frequency_window"}}, e.g. key = (comparison, channel_group)
+            x_session_1, x_session_2: np.array (n_observations, n_frequencies), full power spectra of each session
+            frequency_window: None or slice of frequency indices e.g. slice(5, 36), clusters are only searched within the window
+        - n_permutations: int, e.g. 1000 or 10000
+        - seed: None or int, see permutation_nulls()
+        - threshold: float, F threshold for cluster forming, None: default_threshold()
+        - tail: int, the F-test is 1-tailed: as in MNE, other values are ignored with a warning
+        - null_cache: None or ClusterNullCache
+        - n_jobs: int, number of worker processes, see permutation_nulls()
+
+    A timing report is printed for each comparison: permutations computed or loaded from the cache, and the cluster search.
+
+    return {key: {
+        "F_obs", "clusters", "cluster_pv", "H0": as mne.stats.permutation_cluster_test within the frequency window,
+        "threshold": float,
+        "seconds": float, computation time of the permutations and the clusters
+    }}
+    """
+
+    if tail != 1:
+        print('Ignoring argument "tail", performing 1-tailed F-test')
+        tail = 1
+
+    nulls = permutation_nulls(
+        sessions={key: (test_input["x_session_1"], test_input["x_session_2"]) for key, test_input in test_inputs.items()},
+        n_permutations=n_permutations,
+        seed=seed,
+        null_cache=null_cache,
+        n_jobs=n_jobs
+    )
+
+    cluster_tests = {}
+
+    for key, test_input in test_inputs.items():
+
+        start_time = time.perf_counter()
+
+        key_threshold = threshold
+        if key_threshold is None:
+            key_threshold = default_threshold(len(test_input["x_session_1"]), len(test_input["x_session_2"]))
+
+        frequency_window = test_input.get("frequency_window")
+        if frequency_window is None:
+            frequency_window = slice(None)
+
+        # F values are computed for each frequency separately, so the window is a selection of columns
+        F_obs, clusters, cluster_pv, H0 = cluster_test_from_null(
+            f_obs=nulls[key]["F_obs"][frequency_window],
+            f_permutations=nulls[key]["F_permutations"][:, frequency_window],
+            threshold=key_threshold,
+            tail=tail
+        )
+
+        cluster_seconds = time.perf_counter() - start_time
+
+        null_info = "loaded from cache" if nulls[key]["from_cache"] else f"computed in {nulls[key]['seconds']:.2f} s"
+        print(f"{key}: {n_permutations} permutations {null_info}, clusters in {cluster_seconds:.2f} s")
+
+        cluster_tests[key] = {
+            "F_obs": F_obs,
+            "clusters": clusters,
+            "cluster_pv": cluster_pv,
+            "H0": H0,
+            "threshold": key_threshold,
+            "seconds": nulls[key]["seconds"] + cluster_seconds,
+        }
+
+    return cluster_tests
+
+
+def cluster_permutation_test(
+        x_session_1,
+        x_session_2,
+        n_permutations: int = 1000,
+        seed=None,
+        threshold: float = None,
+        frequency_window=None,
+        null_cache=None,
+):
+    """
+    Cluster permutation test of power spectra between two sessions,
+    same permutations as mne.stats.permutation_cluster_test([x_session_1, x_session_2], n_permutations, seed=seed)
+    (p-values can differ for tied permutations, see cluster_test_from_null()), but the permutation null is computed for all frequencies and can be stored and reused.
+
+    Input:
+        - x_session_1: np.array (n_observations_1, n_frequencies), full power spectra of session 1
+        - x_session_2: np.array (n_observations_2, n_frequencies), full power spectra of session 2
+        - n_permutations, seed, threshold, null_cache: see cluster_permutation_tests()
+        - frequency_window: None or slice of frequency indices e.g. slice(5, 36), clusters are only searched within the window
+
+    return {"F_obs", "clusters", "cluster_pv", "H0", "threshold", "seconds"}, see cluster_permutation_tests()
+    """
+
+    cluster_tests = cluster_permutation_tests(
+        test_inputs={"comparison": {"x_session_1": x_session_1, "x_session_2": x_session_2, "frequency_window": frequency_window}},
+        n_permutations=n_permutations,
+        seed=seed,
+        threshold=threshold,
+        null_cache=null_cache,
+    )
+
+    return cluster_tests["comparison"]
+
+
+def sign_flip_orders(n_samples: int, n_permutations: int, tail: int, seed=None):
+    """
+    Input:
+        - n_samples: int, number of paired power spectra (e.g. STNs)
+        - n_permutations: int, e.g. 1000, the first permutation is the original order
+        - tail: int, for tail 0 the first sample is never flipped, because flipping all signs gives the same absolute t values
+        - seed: None, int or np.random.RandomState
+
+    Sign flips are drawn in the same way as in mne.stats.permutation_cluster_1samp_test,
+    so with the same seed both tests use the same sign flips.
+    If there are less possible sign flips than n_permutations, all sign flips are used (exact test).
+
+    return np.array (n_sign_flips, n_samples) of 0 (flip) and 1 (keep)
+    """
+
+    rng = mne.utils.check_random_state(seed)
+
+    max_perms = 2 ** (n_samples - (tail == 0)) - 1
+    n_permutations = int(n_permutations)
+
+    # binary representation of all sign flips, first sample = most significant bit
+    def binary_orders(numbers):
+        return ((np.asarray(numbers)[:, np.newaxis] >> np.arange(n_samples - 1, -1, -1)) & 1).astype(int)
+
+    if max_perms < n_permutations:
+        return binary_orders(np.arange(1, max_perms + 1))
+
+    elif n_samples <= 20:
+        return binary_orders(rng.choice(max_perms, n_permutations - 1, replace=False) + 1)
+
+    # draw random sign flips, only unique ones
+    orders = np.zeros((n_permutations - 1, n_samples), int)
+    drawn = set()
+    use_samples = n_samples - (tail == 0)
+    order_index = 0
+
+    while order_index < n_permutations - 1:
+        signs = tuple((rng.uniform(size=use_samples) < 0.5).astype(int))
+
+        if signs not in drawn:
+            orders[order_index, :use_samples] = signs
+
+            # for tail 0: half of the time the last sample is flipped
+            if tail == 0 and rng.uniform() < 0.5:
+                orders[order_index] = 1 - orders[order_index]
+
+            drawn.add(signs)
+            order_index += 1
+
+    return orders
+
+
+def one_sample_t_statistics(differences, orders=None, batch_size: int = 10000):
+    """
+    Input:
+        - differences: np.array (n_samples, n_frequencies), e.g. power spectrum session 2 - session 1 of each STN
+        - orders: None or np.array (n_sign_flips, n_samples) from sign_flip_orders()
+        - batch_size: int, number of sign flips computed at once, limits the memory usage
+
+    One-sample t statistic for each frequency, same formula as mne.stats.ttest_1samp_no_p.
+    The sum of squares doesn't change by flipping signs, so the t values of all sign flips 
+    only need the matrix product of the signs (n_sign_flips x n_samples) with the differences.
+
+    return
+        - orders None: np.array (n_frequencies,) observed t values
+        - otherwise: np.array (n_sign_flips, n_frequencies) t values of each sign flip
+    """
+
+    differences = np.asarray(differences, dtype=np.float64)
+    n_samples = differences.shape[0]
+
+    sum_of_squares = np.sum(differences ** 2, axis=0)
+
+    def t_values(sums):
+        mean = sums / n_samples
+        variance = (sum_of_squares - n_samples * mean ** 2) / (n_samples - 1)
+        return mean / np.sqrt(variance / n_samples)
+
+    if orders is None:
+        return t_values(np.sum(differences, axis=0))
+
+    t_permutations = np.empty((len(orders), differences.shape[1]))
+
+    for batch_start in range(0, len(orders), batch_size):
+
+        signs = 2.0 * orders[batch_start:batch_start + batch_size] - 1.0
+        t_permutations[batch_start:batch_start + len(signs)] = t_values(signs @ differences)
+
+    return t_permutations
+
+
+def default_paired_threshold(n_samples: int, tail: int, p_threshold: float = 0.05):
+    """
+    t threshold for cluster forming, same as the default of mne.stats.permutation_cluster_1samp_test
+
+    return float, negative for tail -1
+    """
+
+    threshold = -tstat.ppf(p_threshold / (1 + (tail == 0)), n_samples - 1)
+
+    if tail < 0:
+        threshold = -threshold
+
+    return threshold
+
+
+def paired_cluster_permutation_tests(
+        test_inputs: dict,
+        n_permutations: int = 1000,
+        seed=None,
+        threshold: float = None,
+        tail: int = 0,
+        null_cache=None,
+):
+    """
+    Paired cluster permutation tests of power spectra between two sessions (same STNs at both sessions),
+    each with the same sign flips as mne.stats.permutation_cluster_1samp_test(x_session_2 - x_session_1, n_permutations, tail=tail, seed=seed).
+    P-values can differ from MNE for sign flips tied with an observed cluster sum, e.g. the original signs of an exact test, 
+    see cluster_test_from_null().
+
+    Input:
+        - test_inputs: dict {key: {"x_session_1", "x_session_2", "frequency_window"}}, e.g. key = (comparison, channel_group)
+            x_session_1, x_session_2: np.array (n_pairs, n_frequencies), full power spectra, row i of both sessions from the same STN (and channel)
+            frequency_window: None or slice of frequency indices e.g. slice(5, 36), clusters are only searched within the window
+        - n_permutations: int, e.g. 1000 or 10000
+        - seed: None or int, see sign_flip_orders(). The same seed is used for each comparison
+        - threshold: float, t threshold for cluster forming, None: default_paired_threshold()
+        - tail: int, 0: two-sided, 1: power session 2 > session 1, -1: power session 2 < session 1
+        - null_cache: None or ClusterNullCache
+
+    1) the differences session 2 - session 1 of each pair are computed once
+    2) sign flips of the differences: t values of all sign flips and all frequencies at once (sign flips x frequencies matrix)
+    3) clusters and cluster p-values, see cluster_test_from_null()
+
+    A timing report is printed for each comparison.
+
+    return {key: {
+        "T_obs", "clusters", "cluster_pv", "H0": as mne.stats.permutation_cluster_1samp_test within the frequency window,
+        "threshold": float,
+        "seconds": float, computation time of the sign flips and the clusters
+    }}
+    """
+
+    cluster_tests = {}
+
+    for key, test_input in test_inputs.items():
+
+        start_time = time.perf_counter()
+
+        x_session_1 = np.asarray(test_input["x_session_1"], dtype=np.float64)
+        x_session_2 = np.asarray(test_input["x_session_2"], dtype=np.float64)
+
+        if x_session_1.shape != x_session_2.shape:
+            raise ValueError(f"paired test needs the same shape of both sessions, got: {x_session_1.shape} and {x_session_2.shape}")
+
+        differences = x_session_2 - x_session_1
+        n_samples = len(differences)
+        design = f"paired_tail{tail}"
+
+        null = None
+
+        if null_cache is not None:
+            null = null_cache.load(differences, n_samples, n_permutations, seed, design)
+
+        from_cache = null is not None
+
+        if null is None:
+            orders = sign_flip_orders(n_samples, n_permutations, tail, seed)
+            null = {"orders": orders, "T_permutations": one_sample_t_statistics(differences, orders=orders)}
+
+            if null_cache is not None:
+                null_cache.save(differences, n_samples, n_permutations, seed, null, design)
+
+        permutation_seconds = time.perf_counter() - start_time
+
+        key_threshold = threshold
+        if key_threshold is None:
+            key_threshold = default_paired_threshold(n_samples, tail)
+
+        frequency_window = test_input.get("frequency_window")
+        if frequency_window is None:
+            frequency_window = slice(None)
+
+        # t values are computed for each frequency separately, so the window is a selection of columns
+        T_obs, clusters, cluster_pv, H0 = cluster_test_from_null(
+            f_obs=one_sample_t_statistics(differences)[frequency_window],
+            f_permutations=null["T_permutations"][:, frequency_window],
+            threshold=key_threshold,
+            tail=tail
+        )
+
+        seconds = time.perf_counter() - start_time
+
+        null_info = "loaded from cache" if from_cache else f"computed in {permutation_seconds:.2f} s"
+        print(f"{key}: {len(null['orders'])} sign flips {null_info}, clusters in {seconds - permutation_seconds:.2f} s")
+
+        cluster_tests[key] = {
+            "T_obs": T_obs,
+            "clusters": clusters,
+            "cluster_pv": cluster_pv,
+            "H0": H0,
+            "threshold": key_threshold,
+            "seconds": seconds,
+        }
+
+    return cluster_tests
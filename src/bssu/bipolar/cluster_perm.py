@@ -9,17 +9,61 @@ from cycler import cycler
 import scipy.stats as st
 
 import mne
-from mne.stats import permutation_cluster_test
 
 from .. utils import find_folders as find_folders
 from .. utils import loadResults as loadResults
+from . import cluster_null as cluster_null
+
+
+
+def paired_power_spectra(
+        session_1_df,
+        session_2_df,
+        power_column:str,
+        pair_columns:list
+):
+    """
+    Align the power spectra of two sessions for a paired test
+
+    Input:
+        - session_1_df, session_2_df: Dataframes of one session each
+        - power_column: str, column with the power spectrum of each row, e.g. "power_spectrum", "fooof_power_spectrum"
+        - pair_columns: list of columns identifying one pair, e.g. ["stn", "bipolar_channel"]
+
+    Only pairs recorded at both sessions are included, each pair must be unique within one session.
+
+    return x_session_1, x_session_2: np.array (n_pairs, n_frequencies), row i of both arrays is the same pair
+    """
+
+    for session_df in [session_1_df, session_2_df]:
+        if session_df.duplicated(subset=pair_columns).any():
+            raise ValueError(f"pairs must be unique within one session, duplicated values of {pair_columns}")
+
+    paired_df = pd.merge(
+        session_1_df[pair_columns + [power_column]],
+        session_2_df[pair_columns + [power_column]],
+        on=pair_columns,
+        suffixes=("_session_1", "_session_2")
+    ).sort_values(pair_columns)
+
+    x_session_1 = np.vstack(paired_df[f"{power_column}_session_1"].values)
+    x_session_2 = np.vstack(paired_df[f"{power_column}_session_2"].values)
+
+    return x_session_1, x_session_2
 
 
 
 def cluster_permutation_power_spectra_betw_sessions(
         incl_channels:str,
         signalFilter:str,
-        normalization:str
+        normalization:str,
+        n_permutations:int = 1000,
+        seed:int = None,
+        tail:int = None,
+        n_jobs:int = 1,
+        threshold:float = None,
+        use_cache:bool = True,
+        paired:bool = False
 ):
     
     """
@@ -30,6 +74,18 @@ def cluster_permutation_power_spectra_betw_sessions(
         - incl_channels: str, e.g. "SegmInter", "SegmIntra", "Ring"
         - signalFilter: str, e.g. "band-pass" or "unfiltered" 
         - normalization: str, e.g. "rawPsd", "normPsdToTotalSum", "normPsdToSum1_100Hz", "normPsdToSum40_90Hz"
+        - n_permutations: int, e.g. 1000 or 10000
+        - seed: int for reproducible permutations, the same seed gives the same permutations as mne.stats.permutation_cluster_test(..., seed=seed)
+        - tail: int, None: 1 for the F-test, 0 for the paired test
+            F-test: 1-tailed, other values are ignored with a warning (as in MNE)
+            paired test: 0: two-sided, 1: power session 2 > session 1, -1: power session 2 < session 1
+        - n_jobs: int, number of worker processes for the permutations of all comparisons, -1: one per CPU core (only F-test)
+        - threshold: float, F threshold (t threshold if paired) for cluster forming, None: default of mne.stats.permutation_cluster_test (permutation_cluster_1samp_test if paired)
+        - use_cache: bool, if True the permutation null of each comparison is stored and reused (see cluster_null.ClusterNullCache)
+        - paired: bool, if True the same STNs (and channels) are compared between both sessions with a paired sign-flip test:
+            differences session 2 - session 1 per STN, same sign flips as mne.stats.permutation_cluster_1samp_test(..., seed=seed),
+            p-values can differ from MNE for sign flips tied with the observed cluster sum (see cluster_null.cluster_test_from_null()),
+            the column "F_obs" of the results holds the t values of the differences
     
     1) Get the Dataframes of each session for each session comparison 
         - within each session comparison -> only STNs are included, that have recordings at both sessions (same sample size per comparison)
@@ -42,7 +98,14 @@ def cluster_permutation_power_spectra_betw_sessions(
     3) perform cluster permutation per session comparison:
         - comparisons: ["postop_fu3m", "postop_fu12m", "postop_fu18m", 
                         "fu3m_fu12m", "fu3m_fu18m", "fu12m_fu18m"]
-        - number of Permutations = 1000
+        - number of Permutations = n_permutations
+        - cluster_null.cluster_permutation_test(): same output as mne.stats.permutation_cluster_test,
+            the permutation null is computed for the full power spectra and stored, 
+            so a rerun with another threshold or frequency window reuses the stored null
+        - the permutations of all comparisons are computed together, in parallel if n_jobs > 1 (cluster_null.cluster_permutation_tests())
+        - paired: sign flips of the differences per STN instead (cluster_null.paired_cluster_permutation_tests()), 
+            the t values of all sign flips and frequencies are computed at once
+        - a timing report is printed for each comparison
         
     Output of mne.stats.permutation_cluster_test:
         - F_obs, shape (p[, q][, r]): 
@@ -75,7 +138,11 @@ def cluster_permutation_power_spectra_betw_sessions(
     # maximal frequency to perform cluster permutation
     max_freq = 90
 
-    permutation_results = {}
+    # stored permutation nulls
+    null_cache = cluster_null.ClusterNullCache() if use_cache else None
+
+    test_inputs = {}
+    sample_sizes = {}
     
     for comparison in compare_sessions:
 
@@ -89,21 +156,58 @@ def cluster_permutation_power_spectra_betw_sessions(
         session_1_df = comparison_df.loc[comparison_df.session==session_1]
         session_2_df = comparison_df.loc[comparison_df.session==session_2]
 
-        # from each session df only take the values from column with power spectra only until maximal frequency
-        x_session_1 = np.vstack(session_1_df['power_spectrum'].values)[:,:max_freq]
-        # e.g. for shape x_18mfu comparison to 12mfu = (10, 90), 10 STNs, 90 values per STN
-        x_session_2 = np.vstack(session_2_df['power_spectrum'].values)[:,:max_freq]
-
-        list_for_cluster_permutation = [x_session_1, x_session_2]
+        # from each session df take the full power spectra, cluster permutation only until maximal frequency
+        if paired:
+            x_session_1, x_session_2 = paired_power_spectra(session_1_df, session_2_df, power_column="power_spectrum", 
+                                                            pair_columns=["stn", "bipolar_channel"])
+        
+        else:
+            x_session_1 = np.vstack(session_1_df['power_spectrum'].values)
+            # e.g. for shape x_18mfu comparison to 12mfu = (10, 90), 10 STNs, 90 values per STN
+            x_session_2 = np.vstack(session_2_df['power_spectrum'].values)
 
-        # perform cluster permutation
-        F_obs, clusters, cluster_pv, H0 = permutation_cluster_test(list_for_cluster_permutation, n_permutations=1000)
+        test_inputs[comparison] = {
+            "x_session_1": x_session_1,
+            "x_session_2": x_session_2,
+            "frequency_window": slice(None, max_freq)
+        }
 
         # get the sample size
-        sample_size = len(session_1_df.power_spectrum.values)
+        sample_sizes[comparison] = len(x_session_1)
+
+    # perform cluster permutation
+    if paired:
+        cluster_tests = cluster_null.paired_cluster_permutation_tests(
+            test_inputs=test_inputs,
+            n_permutations=n_permutations,
+            seed=seed,
+            threshold=threshold,
+            tail=0 if tail is None else tail,
+            null_cache=null_cache
+        )
+
+        # same results layout: t values in the column F_obs
+        for cluster_test in cluster_tests.values():
+            cluster_test["F_obs"] = cluster_test["T_obs"]
+
+    else:
+        cluster_tests = cluster_null.cluster_permutation_tests(
+            test_inputs=test_inputs,
+            n_permutations=n_permutations,
+            seed=seed,
+            threshold=threshold,
+            tail=1 if tail is None else tail,
+            null_cache=null_cache,
+            n_jobs=n_jobs
+        )
+
+    permutation_results = {}
+
+    for comparison, cluster_test in cluster_tests.items():
 
         # save results
-        permutation_results[f"{comparison}"] = [comparison, F_obs, clusters, cluster_pv, H0, sample_size]
+        permutation_results[f"{comparison}"] = [comparison, cluster_test["F_obs"], cluster_test["clusters"], cluster_test["cluster_pv"], cluster_test["H0"], 
+                                                sample_sizes[comparison]]
 
     results_df = pd.DataFrame(permutation_results)
     results_df.rename(index={
@@ -116,30 +220,54 @@ def cluster_permutation_power_spectra_betw_sessions(
     }, inplace=True)
     results_df = results_df.transpose()
 
-    # save the results DF into results path
-    results_df_filepath = os.path.join(results_path, f"cluster_permutation_session_comparisons_{incl_channels}_{signalFilter}_{normalization}.pickle")
+    if use_cache:
+        null_cache.print_statistics()
+
+    # save the results DF into results path, paired results in a separate file
+    paired_label = "paired_" if paired else ""
+    results_df_filepath = os.path.join(results_path, f"cluster_permutation_{paired_label}session_comparisons_{incl_channels}_{signalFilter}_{normalization}.pickle")
     with open(results_df_filepath, "wb") as file:
         pickle.dump(results_df, file)
     
     print("file: ", 
-          f"cluster_permutation_session_comparisons_{incl_channels}_{signalFilter}_{normalization}.pickle",
+          f"cluster_permutation_{paired_label}session_comparisons_{incl_channels}_{signalFilter}_{normalization}.pickle",
           "\nwritten in: ", results_path
           )
 
     return {
         "results_df": results_df,
-        "x_session_1": x_session_1
+        "x_session_1": x_session_1[:,:max_freq]
 
     }
         
         
 
 def cluster_permutation_fooof_power_spectra(
-        
+        n_permutations:int = 1000,
+        seed:int = None,
+        tail:int = None,
+        n_jobs:int = 1,
+        threshold:float = None,
+        use_cache:bool = True,
+        paired:bool = False
 ):
     """
     Load the file "fooof_model_group_data.json"
     from the group result folder
+
+    Input:
+        - n_permutations: int, e.g. 1000 or 10000
+        - seed: int for reproducible permutations, the same seed gives the same permutations as mne.stats.permutation_cluster_test(..., seed=seed)
+        - tail: int, None: 1 for the F-test, 0 for the paired test
+            F-test: 1-tailed, other values are ignored with a warning (as in MNE)
+            paired test: 0: two-sided, 1: power session 2 > session 1, -1: power session 2 < session 1
+        - n_jobs: int, number of worker processes for the permutations of all comparisons, -1: one per CPU core (only F-test)
+        - threshold: float, F threshold (t threshold if paired) for cluster forming, None: default of mne.stats.permutation_cluster_test (permutation_cluster_1samp_test if paired)
+        - use_cache: bool, if True the permutation null of each comparison is stored and reused (see cluster_null.ClusterNullCache)
+        - paired: bool, if True the same STNs (and channels) are compared between both sessions with a paired sign-flip test:
+            differences session 2 - session 1 per STN, same sign flips as mne.stats.permutation_cluster_1samp_test(..., seed=seed),
+            p-values can differ from MNE for sign flips tied with the observed cluster sum (see cluster_null.cluster_test_from_null()),
+            the column "F_obs" of the results holds the t values of the differences
   
     1) Get the Dataframes for each session comparison and for channel groups seperately
         - within each session comparison -> only STNs are included, that have recordings at both sessions (same sample size per comparison)
@@ -152,7 +280,14 @@ def cluster_permutation_fooof_power_spectra(
     3) perform cluster permutation per session comparison:
         - comparisons: ["postop_fu3m", "postop_fu12m", "postop_fu18m", 
                         "fu3m_fu12m", "fu3m_fu18m", "fu12m_fu18m"]
-        - number of Permutations = 1000
+        - number of Permutations = n_permutations
+        - cluster_null.cluster_permutation_test(): same output as mne.stats.permutation_cluster_test,
+            the permutation null is computed for the full power spectra and stored, 
+            so a rerun with another threshold or frequency window reuses the stored null
+        - the permutations of all comparisons are computed together, in parallel if n_jobs > 1 (cluster_null.cluster_permutation_tests())
+        - paired: sign flips of the differences per STN instead (cluster_null.paired_cluster_permutation_tests()), 
+            the t values of all sign flips and frequencies are computed at once
+        - a timing report is printed for each comparison
         
     Output of mne.stats.permutation_cluster_test:
         - F_obs, shape (p[, q][, r]): 
@@ -219,7 +354,11 @@ def cluster_permutation_fooof_power_spectra(
     # maximal frequency to perform cluster permutation
     max_freq = 95
 
-    permutation_results = {}
+    # stored permutation nulls
+    null_cache = cluster_null.ClusterNullCache() if use_cache else None
+
+    test_inputs = {}
+    sample_sizes = {}
 
     # filter each comparison Dataframe for comparisons and channels in each channel group
     for comp in compare_sessions:
@@ -248,21 +387,58 @@ def cluster_permutation_fooof_power_spectra(
             session_1_df = group_comp_df.loc[group_comp_df.session==session_1]
             session_2_df = group_comp_df.loc[group_comp_df.session==session_2]
 
-            # from each session df only take the values from column with power spectra only until maximal frequency 95
-            x_session_1 = np.vstack(session_1_df['fooof_power_spectrum'].values)[:,:max_freq]
-            # e.g. for shape x_18mfu comparison to 12mfu = (10, 90), 10 STNs, 90 values per STN
-            x_session_2 = np.vstack(session_2_df['fooof_power_spectrum'].values)[:,:max_freq]
-
-            list_for_cluster_permutation = [x_session_1, x_session_2]
+            # from each session df take the full power spectra, cluster permutation only until maximal frequency 95
+            if paired:
+                x_session_1, x_session_2 = paired_power_spectra(session_1_df, session_2_df, power_column="fooof_power_spectrum", 
+                                                                pair_columns=["subject_hemisphere", "bipolar_channel"])
+            
+            else:
+                x_session_1 = np.vstack(session_1_df['fooof_power_spectrum'].values)
+                # e.g. for shape x_18mfu comparison to 12mfu = (10, 90), 10 STNs, 90 values per STN
+                x_session_2 = np.vstack(session_2_df['fooof_power_spectrum'].values)
 
-            # perform cluster permutation
-            F_obs, clusters, cluster_pv, H0 = permutation_cluster_test(list_for_cluster_permutation, n_permutations=1000)
+            test_inputs[(comp, group)] = {
+                "x_session_1": x_session_1,
+                "x_session_2": x_session_2,
+                "frequency_window": slice(None, max_freq)
+            }
 
             # get the sample size
-            sample_size = len(session_1_df.fooof_power_spectrum.values)
+            sample_sizes[(comp, group)] = len(x_session_1)
+
+    # perform cluster permutation
+    if paired:
+        cluster_tests = cluster_null.paired_cluster_permutation_tests(
+            test_inputs=test_inputs,
+            n_permutations=n_permutations,
+            seed=seed,
+            threshold=threshold,
+            tail=0 if tail is None else tail,
+            null_cache=null_cache
+        )
 
-            # save results
-            permutation_results[f"{comp}_{group}"] = [comp, group, F_obs, clusters, cluster_pv, H0, sample_size]
+        # same results layout: t values in the column F_obs
+        for cluster_test in cluster_tests.values():
+            cluster_test["F_obs"] = cluster_test["T_obs"]
+
+    else:
+        cluster_tests = cluster_null.cluster_permutation_tests(
+            test_inputs=test_inputs,
+            n_permutations=n_permutations,
+            seed=seed,
+            threshold=threshold,
+            tail=1 if tail is None else tail,
+            null_cache=null_cache,
+            n_jobs=n_jobs
+        )
+
+    permutation_results = {}
+
+    for (comp, group), cluster_test in cluster_tests.items():
+
+        # save results
+        permutation_results[f"{comp}_{group}"] = [comp, group, cluster_test["F_obs"], cluster_test["clusters"], cluster_test["cluster_pv"], cluster_test["H0"], 
+                                                    sample_sizes[(comp, group)]]
     
 
     results_df = pd.DataFrame(permutation_results)
@@ -277,13 +453,17 @@ def cluster_permutation_fooof_power_spectra(
     }, inplace=True)
     results_df = results_df.transpose()
 
-    # save the results DF into results path
-    results_df_filepath = os.path.join(results_path, f"cluster_permutation_fooof_spectra_session_comparisons.pickle")
+    if use_cache:
+        null_cache.print_statistics()
+
+    # save the results DF into results path, paired results in a separate file
+    paired_label = "paired_" if paired else ""
+    results_df_filepath = os.path.join(results_path, f"cluster_permutation_fooof_spectra_{paired_label}session_comparisons.pickle")
     with open(results_df_filepath, "wb") as file:
         pickle.dump(results_df, file)
     
     print("file: ", 
-          f"cluster_permutation_fooof_spectra_session_comparisons.pickle",
+          f"cluster_permutation_fooof_spectra_{paired_label}session_comparisons.pickle",
           "\nwritten in: ", results_path
           )
 
@@ -495,7 +675,14 @@ def cluster_permutation_fooof_power_spectra_highest_beta(
         fooof_spectrum:str,
         highest_beta_session:str,
         min_freq:int,
-        max_freq:int
+        max_freq:int,
+        n_permutations:int = 1000,
+        seed:int = None,
+        tail:int = None,
+        n_jobs:int = 1,
+        threshold:float = None,
+        use_cache:bool = True,
+        paired:bool = False
 ):
     """
     Load the modified FOOOF dataframe with this function: highest_beta_channels_fooof()
@@ -513,6 +700,20 @@ def cluster_permutation_fooof_power_spectra_highest_beta(
         cluster permutation only within a frequency band from min_freq to max_freq
         - min_freq: e.g. 5 Hz 
         - max_freq: e.g. 35 Hz 
+
+        - n_permutations: int, e.g. 1000 or 10000
+        - seed: int for reproducible permutations, the same seed gives the same permutations as mne.stats.permutation_cluster_test(..., seed=seed)
+        - tail: int, None: 1 for the F-test, 0 for the paired test
+            F-test: 1-tailed, other values are ignored with a warning (as in MNE)
+            paired test: 0: two-sided, 1: power session 2 > session 1, -1: power session 2 < session 1
+        - n_jobs: int, number of worker processes for the permutations of all comparisons, -1: one per CPU core (only F-test)
+        - threshold: float, F threshold (t threshold if paired) for cluster forming, None: default of mne.stats.permutation_cluster_test (permutation_cluster_1samp_test if paired)
+        - use_cache: bool, if True the permutation null of each comparison is stored and reused (see cluster_null.ClusterNullCache)
+        - paired: bool, if True the same STNs (and channels) are compared between both sessions with a paired sign-flip test:
+            differences session 2 - session 1 per STN, same sign flips as mne.stats.permutation_cluster_1samp_test(..., seed=seed),
+            p-values can differ from MNE for sign flips tied with the observed cluster sum (see cluster_null.cluster_test_from_null()),
+            the column "F_obs" of the results holds the t values of the differences
+            the null is computed for the full power spectra, so another min_freq or max_freq reuses the stored null
   
     1) Get the Dataframes for each session comparison and for channel groups seperately
         - within each session comparison -> only STNs are included, that have recordings at both sessions (same sample size per comparison)
@@ -525,7 +726,14 @@ def cluster_permutation_fooof_power_spectra_highest_beta(
     3) perform cluster permutation per session comparison:
         - comparisons: ["postop_fu3m", "postop_fu12m", "postop_fu18m", 
                         "fu3m_fu12m", "fu3m_fu18m", "fu12m_fu18m"]
-        - number of Permutations = 1000
+        - number of Permutations = n_permutations
+        - cluster_null.cluster_permutation_test(): same output as mne.stats.permutation_cluster_test,
+            the permutation null is computed for the full power spectra and stored, 
+            so a rerun with another threshold or frequency window reuses the stored null
+        - the permutations of all comparisons are computed together, in parallel if n_jobs > 1 (cluster_null.cluster_permutation_tests())
+        - paired: sign flips of the differences per STN instead (cluster_null.paired_cluster_permutation_tests()), 
+            the t values of all sign flips and frequencies are computed at once
+        - a timing report is printed for each comparison
         
     Output of mne.stats.permutation_cluster_test:
         - F_obs, shape (p[, q][, r]): 
@@ -594,7 +802,11 @@ def cluster_permutation_fooof_power_spectra_highest_beta(
 
     ################################ CLUSTER PERMUTATION FOR EACH SESSION COMPARISON; SEPERATELY IN CHANNEL GROUPS ###############################
     
-    permutation_results = {}
+    # stored permutation nulls
+    null_cache = cluster_null.ClusterNullCache() if use_cache else None
+
+    test_inputs = {}
+    sample_sizes = {}
 
     # filter each comparison Dataframe for comparisons and channels in each channel group
     for comp in compare_sessions:
@@ -632,21 +844,59 @@ def cluster_permutation_fooof_power_spectra_highest_beta(
             elif fooof_spectrum == "periodic_flat":
                 power_column = "fooof_periodic_flat"
 
-            # from each session df only take the values from column with power spectra only until maximal frequency 95
-            x_session_1 = np.vstack(session_1_df[power_column].values)[:, min_freq:max_freq+1]
-            # e.g. for shape x_18mfu comparison to 12mfu = (10, 90), 10 STNs, 90 values per STN
-            x_session_2 = np.vstack(session_2_df[power_column].values)[:,min_freq:max_freq+1]
-
-            list_for_cluster_permutation = [x_session_1, x_session_2]
+            # from each session df take the full power spectra, cluster permutation only from min_freq to max_freq
+            if paired:
+                # one highest beta channel per STN and channel group, the channel can differ between sessions
+                x_session_1, x_session_2 = paired_power_spectra(session_1_df, session_2_df, power_column=power_column, 
+                                                                pair_columns=["subject_hemisphere"])
+            
+            else:
+                x_session_1 = np.vstack(session_1_df[power_column].values)
+                # e.g. for shape x_18mfu comparison to 12mfu = (10, 90), 10 STNs, 90 values per STN
+                x_session_2 = np.vstack(session_2_df[power_column].values)
 
-            # perform cluster permutation
-            F_obs, clusters, cluster_pv, H0 = permutation_cluster_test(list_for_cluster_permutation, n_permutations=1000)
+            test_inputs[(comp, group)] = {
+                "x_session_1": x_session_1,
+                "x_session_2": x_session_2,
+                "frequency_window": slice(min_freq, max_freq+1)
+            }
 
             # get the sample size
-            sample_size = len(session_1_df.fooof_power_spectrum.values)
+            sample_sizes[(comp, group)] = len(x_session_1)
+
+    # perform cluster permutation
+    if paired:
+        cluster_tests = cluster_null.paired_cluster_permutation_tests(
+            test_inputs=test_inputs,
+            n_permutations=n_permutations,
+            seed=seed,
+            threshold=threshold,
+            tail=0 if tail is None else tail,
+            null_cache=null_cache
+        )
 
-            # save results
-            permutation_results[f"{comp}_{group}"] = [comp, group, F_obs, clusters, cluster_pv, H0, sample_size]
+        # same results layout: t values in the column F_obs
+        for cluster_test in cluster_tests.values():
+            cluster_test["F_obs"] = cluster_test["T_obs"]
+
+    else:
+        cluster_tests = cluster_null.cluster_permutation_tests(
+            test_inputs=test_inputs,
+            n_permutations=n_permutations,
+            seed=seed,
+            threshold=threshold,
+            tail=1 if tail is None else tail,
+            null_cache=null_cache,
+            n_jobs=n_jobs
+        )
+
+    permutation_results = {}
+
+    for (comp, group), cluster_test in cluster_tests.items():
+
+        # save results
+        permutation_results[f"{comp}_{group}"] = [comp, group, cluster_test["F_obs"], cluster_test["clusters"], cluster_test["cluster_pv"], cluster_test["H0"], 
+                                                    sample_sizes[(comp, group)]]
     
 
     results_df = pd.DataFrame(permutation_results)
@@ -661,13 +911,17 @@ def cluster_permutation_fooof_power_spectra_highest_beta(
     }, inplace=True)
     results_df = results_df.transpose()
 
-    # save the results DF into results path
-    results_df_filepath = os.path.join(results_path, f"cluster_permutation_fooof_{highest_beta_session}_beta_{min_freq}_{max_freq}Hz_spectra_session_comparisons.pickle")
+    if use_cache:
+        null_cache.print_statistics()
+
+    # save the results DF into results path, paired results in a separate file
+    paired_label = "paired_" if paired else ""
+    results_df_filepath = os.path.join(results_path, f"cluster_permutation_fooof_{highest_beta_session}_beta_{min_freq}_{max_freq}Hz_spectra_{paired_label}session_comparisons.pickle")
     with open(results_df_filepath, "wb") as file:
         pickle.dump(results_df, file)
     
     print("file: ", 
-          f"cluster_permutation_fooof_{highest_beta_session}_beta_{min_freq}_{max_freq}Hz_spectra_session_comparisons.pickle",
+          f"cluster_permutation_fooof_{highest_beta_session}_beta_{min_freq}_{max_freq}Hz_spectra_{paired_label}session_comparisons.pickle",
           "\nwritten in: ", results_path
           )
 
@@ -11,6 +11,7 @@ from .. utils import find_folders as find_folders
 from .. utils import loadResults as loadResults
 from .. classes import metadataAnalysis_class as metadata
 from .. classes import sessionAnalysis_class as session_class
+from .. classes import resultIndex_class as result_index
 
 
 
@@ -24,6 +25,7 @@ class MainClass:
         - filename for result of PowerSpectrum: "SPECTROGRAMPSD_{hemisphere}_{filter}.json"
         - filename for result of PSDaverageFrequencyBands: "SPECTROGRAMpsdAverageFrequencyBands_{hemisphere}_{filter}.json"
         - filename for result of PeakParameters: "SPECTROGRAM_highestPEAK_FrequencyBands_{hemisphere}_{filter}.json"
+        - if the binary .npz file with the same name exists and is not older than the json file, it is loaded instead (faster)
     
     2) depending on input of sub, hemispere, filter and result:
         - one json file is being loaded
@@ -46,6 +48,13 @@ class MainClass:
     7) feature_class:
         sets an attribute "data" to itself containing the value = output
 
+    lazy=True: 3)-6) are not run for every combination
+        - resultIndex_class builds one sorted MultiIndex (session, channel, normalization, frequency band) of all rows
+        - each session, channel, normalization and frequency band is only created when it is accessed as attribute
+        - the feature value is taken directly from the first row of the selection without copying
+        - Result_DF of a lazy node is the same selection of rows as in the eager mode, taken from the MultiIndex on first access
+        access is the same as in the eager mode: sub029.postop.BIP_03.rawPsd.data
+
         
     
     parameters:
@@ -75,6 +84,8 @@ class MainClass:
             "PeakParameters":
                 ["PEAK_frequency", "PEAK_amplitude", "PEAK_5HzAverage"]
 
+        - lazy: bool, default False, True: sessions, channels, normalizations, frequency bands and features are created on first access
+
     TODO: 
         - fix .json files for PSDaverageFrequencyBands and PeakParameters: should contain all normalization variants! 
         - then take out normalization in main_class and metadata_class
@@ -128,6 +139,7 @@ class MainClass:
                                                    "frequencyBand", "averagedPSD", 
                                                    "PEAK_frequency", "PEAK_amplitude", "PEAK_5HzAverage", 
                                                    ])
+    lazy: bool = False
     
    
 
@@ -174,6 +186,19 @@ class MainClass:
 
         )
 
+        if self.lazy:
+
+            for ses in self.incl_session:
+
+                assert ses in allowed_sessions, (
+                    f'inserted session ({ses}) should'
+                    f' be in {allowed_sessions}'
+                )
+
+            # sessions are created on first access in __getattr__
+            self.resultIndex = result_index.resultIndexClass(metaClass=self.metaClass)
+            return
+
 
 
         # loop through every session input in the incl_session list 
@@ -206,8 +231,16 @@ class MainClass:
                     metaClass=self.metaClass,
                     Result_DF=sel_Result_DF
                 ),
-            )  
+            )
+
 
+    def __getattr__(self, name):
 
+        # only called if the attribute does not exist yet: in lazy mode each session is created on first access
+        if name.startswith("_") or "resultIndex" not in self.__dict__:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
+        session = self.resultIndex.child(sub=self.sub, key=(), name=name)
+        setattr(self, name, session)
 
+        return session
@@ -0,0 +1,259 @@
+""" Result index class """
+
+import functools
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+from .. classes import featureAnalysis_class as feature_class
+
+
+@dataclass (init=True, repr=False)
+class resultIndexClass:
+    """
+    Result index Class for the lazy mode of MainClass:
+    one sorted MultiIndex of all rows of the original_Result_DF, built once
+
+    parameters:
+        - metaClass: all original attributes set in Main_Class
+
+    post-initialized parameters:
+        - levels: index levels, depending on the result
+            "PowerSpectrum": ["session", "channel"]
+            "PSDaverageFrequencyBands" or "PeakParameters": ["session", "channel", "normalization", "freqBand"]
+        - row_positions: Series of row positions in the original_Result_DF, with a lexsorted MultiIndex of the levels
+            rows of the same key are sorted by their original order, so the first row of a key is the first row of the eager selection
+        - session_row_positions: Series of row positions of each session, sorted by session and original order
+
+    Children of a node are found by binary search in the sorted MultiIndex (pd.MultiIndex.slice_locs),
+    instead of boolean filtering of the Dataframe for every session, channel, normalization and frequency band.
+
+    """
+
+    metaClass: any
+
+
+    def __post_init__(self,):
+
+        Result_DF = self.metaClass.original_Result_DF
+
+        # attributes allowed for each level, as in the eager classes only the selected sessions, channels, normalizations and bands
+        self.requested = {
+            "session": list(self.metaClass.incl_session),
+            "channel": list(self.metaClass.pickChannels),
+            "normalization": list(self.metaClass.normalization),
+            "freqBand": list(self.metaClass.freqBands),
+        }
+
+        if self.metaClass.result == "PowerSpectrum":
+            self.levels = ["session", "channel"]
+            level_columns = {"session": "session"}
+
+        else:
+            self.levels = ["session", "channel", "normalization", "freqBand"]
+            level_columns = {"session": "session", "normalization": "absoluteOrRelativePSD", "freqBand": "frequencyBand"}
+
+        # bipolarChannel.str.contains(chan) once per unique bipolar channel name, a row can belong to more than one picked channel
+        channel_map = pd.DataFrame(
+            [(bipolar_channel, chan) for bipolar_channel in Result_DF.bipolarChannel.unique()
+             for chan in self.metaClass.pickChannels if chan in str(bipolar_channel)],
+            columns=["bipolarChannel", "channel"]
+        )
+
+        rows = pd.DataFrame({level: Result_DF[column].values for level, column in level_columns.items()})
+        rows["bipolarChannel"] = Result_DF.bipolarChannel.values
+        rows["row"] = np.arange(len(Result_DF))
+
+        # rows without a label are never selected by the eager classes (Result_DF.session == ses)
+        rows = rows.dropna(subset=list(level_columns.keys()))
+
+        # all rows of a session, also of channels that were not picked, as in the eager sessionClass
+        self.session_row_positions = rows.sort_values(["session", "row"]).set_index("session")["row"]
+
+        rows = rows.merge(channel_map, on="bipolarChannel").sort_values(self.levels + ["row"])
+
+        self.row_positions = rows.set_index(self.levels)["row"]
+
+
+    def __repr__(self,):
+
+        return f"resultIndexClass(levels={self.levels}, rows={len(self.row_positions)})"
+
+
+    def locate(self, key:tuple):
+        """
+        Input:
+            - key: tuple of labels of the first levels, e.g. ("postop", "03")
+
+        return (start, stop) positions of the key in row_positions, start == stop if the key does not exist
+        """
+
+        if len(key) == 0:
+            return 0, len(self.row_positions)
+
+        try:
+            return self.row_positions.index.slice_locs(key, key)
+
+        except (KeyError, TypeError):
+            return 0, 0
+
+
+    def result_rows(self, key:tuple):
+        """
+        Input:
+            - key: tuple of labels of a node, e.g. ("postop", "03")
+
+        return the rows of the original_Result_DF selected by the key, 
+            same rows, order and index as the Result_DF of the eager session, channel, normalization or frequency band class
+        """
+
+        if len(key) == 1:
+            start, stop = self.session_row_positions.index.slice_locs(key[0], key[0])
+            return self.metaClass.original_Result_DF.iloc[self.session_row_positions.iloc[start:stop].values]
+
+        start, stop = self.locate(key)
+
+        # a row can belong to more than one picked channel of a session node, np.unique also restores the original order
+        rows = np.unique(self.row_positions.iloc[start:stop].values)
+
+        return self.metaClass.original_Result_DF.iloc[rows]
+
+
+    def label_from_attribute(self, level:str, name:str):
+        """ channels are set as attributes starting with BIP_, because attributes can not start with integers """
+
+        if level == "channel":
+            return name[len("BIP_"):] if name.startswith("BIP_") else None
+
+        return name
+
+
+    def attribute_from_label(self, level:str, label:str):
+
+        if level == "channel":
+            return f"BIP_{label}"
+
+        return label
+
+
+    def child(self, sub:str, key:tuple, name:str):
+        """
+        Input:
+            - sub: e.g. "029"
+            - key: tuple of labels of the parent node, e.g. () for MainClass, ("postop", "03") for a channel node
+            - name: attribute name, e.g. "postop", "BIP_03", "rawPsd", "beta", "averagedPSD"
+
+        return the child node:
+            - lazyResultClass for the next level
+            - featureClass after the last level, its data is the value of the first row of the key,
+                taken directly from the column without copying
+
+        raise AttributeError if the child was not selected or does not exist in the data
+        """
+
+        depth = len(key)
+
+        if depth < len(self.levels):
+
+            level = self.levels[depth]
+            label = self.label_from_attribute(level, name)
+
+            if label not in self.requested[level]:
+                raise AttributeError(f"{name} is not a selected {level} ({self.requested[level]})")
+
+            start, stop = self.locate(key + (label,))
+
+            if start == stop:
+                raise AttributeError(f"no rows for {level} {label} in {key}")
+
+            return lazyResultClass(
+                sub=sub,
+                level=level,
+                label=name,
+                key=key + (label,),
+                resultIndex=self
+            )
+
+        # feature level
+        if name not in self.metaClass.feature or name not in self.metaClass.original_Result_DF.columns:
+            raise AttributeError(f"{name} is not a selected feature ({self.metaClass.feature})")
+
+        start, stop = self.locate(key)
+        resultValue = self.metaClass.original_Result_DF[name].iloc[self.row_positions.iloc[start]]
+
+        # as in the eager channelClass: empty features of the PowerSpectrum are not set
+        if self.metaClass.result == "PowerSpectrum" and hasattr(resultValue, "__len__") and len(resultValue) == 0:
+            raise AttributeError(f"feature {name} is empty in {key}")
+
+        return feature_class.featureClass(
+            sub=sub,
+            feature=name,
+            metaClass=self.metaClass,
+            resultValue=resultValue
+        )
+
+
+    def children(self, key:tuple):
+        """ return list of attribute names of all existing children of a node """
+
+        depth = len(key)
+
+        if depth == len(self.levels):
+            return [feat for feat in self.metaClass.feature if feat in self.metaClass.original_Result_DF.columns]
+
+        level = self.levels[depth]
+        start, stop = self.locate(key)
+        labels = self.row_positions.index[start:stop].get_level_values(depth).unique()
+
+        return [self.attribute_from_label(level, label) for label in labels if label in self.requested[level]]
+
+
+
+@dataclass (init=True, repr=True)
+class lazyResultClass:
+    """
+    lazy node Class: session, channel, normalization or frequency band node of MainClass(lazy=True)
+
+    parameters:
+        - sub: e.g. "029"
+        - level: str "session", "channel", "normalization" or "freqBand"
+        - label: str attribute name of this node, e.g. "postop", "BIP_03"
+        - key: tuple of labels from the session to this node, e.g. ("postop", "03")
+        - resultIndex: resultIndexClass built in MainClass
+
+    Children are created on first attribute access and then stored as attributes,
+    e.g. sub029.postop.BIP_03.rawPsd.highBeta.averagedPSD.data
+
+    Result_DF: selected rows of the original_Result_DF as in the eager classes, 
+        taken from the sorted MultiIndex on first access
+
+    """
+
+    sub: str
+    level: str
+    label: str
+    key: tuple
+    resultIndex: any
+
+
+    def __getattr__(self, name):
+
+        # only called if the attribute does not exist yet
+        if name.startswith("_") or "resultIndex" not in self.__dict__:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        child = self.resultIndex.child(sub=self.sub, key=self.key, name=name)
+        setattr(self, name, child)
+
+        return child
+
+
+    @functools.cached_property
+    def Result_DF(self,):
+
+        return self.resultIndex.result_rows(self.key)
+
+
+    def __dir__(self,):
+
+        return list(super().__dir__()) + self.resultIndex.children(self.key)
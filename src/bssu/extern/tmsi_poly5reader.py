@@ -40,7 +40,7 @@ import tkinter as tk
 from tkinter import filedialog
 
 class Poly5Reader: 
-    def __init__(self, filename=None, readAll = True):
+    def __init__(self, filename=None, readAll = True, dtype = np.float32, lazy = False):
         if filename==None:
             root = tk.Tk()
 
@@ -49,18 +49,28 @@ class Poly5Reader:
             
         self.filename = filename
         self.readAll = readAll
+        self.dtype = dtype
+        self.lazy = lazy
         print('Reading file ', filename)
         self._readFile(filename)
         
-    def read_data_MNE(self,) -> mne.io.RawArray:
+    def read_data_MNE(self, tmin=None, tmax=None, picks=None) -> mne.io.RawArray:
         """Return MNE RawArray given internal channel names and types
 
+        Parameters
+        ----------
+        tmin, tmax : float | None
+            Time window in seconds, see get_data. If None, the whole recording is used.
+        picks : list of str | list of int | None
+            Channel names or indices to include. If None, all channels are used.
+
         Returns
         -------
         mne.io.RawArray
         """
 
-        streams = self.channels
+        pick_idx = self._pickIndices(picks)
+        streams = [self.channels[idx] for idx in pick_idx]
         fs = self.sample_rate
         labels = [s._Channel__name for s in streams]
         units = [s._Channel__unit_name for s in streams]
@@ -96,8 +106,111 @@ class Poly5Reader:
         # convert from microvolts to volts if necessary
         scale = np.array([1e-6 if u == "µVolt" else 1 for u in units])
 
-        raw = mne.io.RawArray(self.samples * np.expand_dims(scale, axis=1), info)
+        first_samp = 0 if tmin is None else int(round(tmin * fs))
+        data = self.get_data(tmin=tmin, tmax=tmax, picks=pick_idx)
+
+        raw = mne.io.RawArray(data * np.expand_dims(scale, axis=1), info, first_samp=first_samp)
         return raw
+    
+    def get_data(self, tmin=None, tmax=None, picks=None):
+        """Return the samples of a time window and a subset of channels
+
+        If the file was not read completely, only the data blocks covering the window are
+        decoded from the memory-mapped file, otherwise the window is sliced from self.samples.
+        Like mne.io.Raw.crop, the sample at tmax is included.
+
+        Parameters
+        ----------
+        tmin : float | None
+            Start of the window in seconds. If None, start at the first sample.
+        tmax : float | None
+            End of the window in seconds. If None, end at the last sample.
+        picks : list of str | list of int | None
+            Channel names or indices to include. If None, all channels are used.
+
+        Returns
+        -------
+        np.ndarray, shape (n_picks, n_samples), dtype self.dtype
+        """
+        start, stop = self._sampleWindow(tmin, tmax)
+        return self._getSamples(start, stop, self._pickIndices(picks))
+    
+    def iterSamples(self, chunk_size=None, picks=None, tmin=None, tmax=None):
+        """Iterate over the recording in consecutive chunks of samples
+
+        Only the data blocks covering the current chunk are decoded from the memory-mapped
+        file, so recordings that do not fit into memory can be processed with bounded memory.
+
+        Parameters
+        ----------
+        chunk_size : int | None
+            Number of samples per chunk. If None, one data block (num_samples_per_block).
+            The last chunk may be shorter.
+        picks : list of str | list of int | None
+            Channel names or indices to include. If None, all channels are used.
+        tmin, tmax : float | None
+            Time window in seconds to iterate over, see get_data.
+
+        Yields
+        ------
+        np.ndarray, shape (n_picks, n_chunk_samples), dtype self.dtype
+        """
+        if chunk_size is None:
+            chunk_size = self.num_samples_per_block
+        if chunk_size < 1:
+            raise ValueError(f'chunk_size must be a positive number of samples, got {chunk_size}')
+        start, stop = self._sampleWindow(tmin, tmax)
+        pick_idx = self._pickIndices(picks)
+
+        for chunk_start in range(start, stop, chunk_size):
+            yield self._getSamples(chunk_start, min(chunk_start + chunk_size, stop), pick_idx)
+    
+    def _sampleWindow(self, tmin, tmax):
+        "Convert a time window in seconds to start and stop sample indices, the sample at tmax is included"
+        start = 0 if tmin is None else int(round(tmin * self.sample_rate))
+        stop = self.num_samples if tmax is None else int(round(tmax * self.sample_rate)) + 1
+        stop = min(stop, self.num_samples)
+        if start < 0 or start >= stop:
+            raise ValueError(f'Invalid time window: tmin={tmin}, tmax={tmax} '
+                             f'for a recording of {self.num_samples / self.sample_rate} s')
+        return start, stop
+    
+    def _getSamples(self, start, stop, pick_idx):
+        "Return samples start:stop of the picked channels, from self.samples or the memory-mapped blocks"
+        if hasattr(self, 'samples'):
+            return self.samples[pick_idx, start:stop]
+
+        if not hasattr(self, '_blocks'):
+            self._mapBlocks()
+
+        spb = self.num_samples_per_block
+        n_block_samples = self._blocks.shape[0] * spb
+        data = []
+
+        # samples stored in completely filled blocks
+        if start < n_block_samples:
+            block_stop = min(stop, n_block_samples)
+            b1, b2 = start // spb, -(-block_stop // spb)
+            window = self._blocks[b1:b2][:, :, pick_idx].reshape(-1, len(pick_idx))
+            data.append(window[start - b1 * spb:block_stop - b1 * spb])
+
+        # samples stored in a partially filled final block
+        if stop > n_block_samples:
+            data.append(self._tail[max(start - n_block_samples, 0):stop - n_block_samples][:, pick_idx])
+
+        samples = data[0] if len(data) == 1 else np.concatenate(data)
+        return samples.T.astype(self.dtype, copy=False)
+    
+    def _mapBlocks(self):
+        "Memory-map the data section of the file, blocks are only decoded when samples are requested"
+        raw = np.memmap(self.filename, dtype=np.uint8, mode='r', offset=self._data_offset)
+        self._blocks, self._tail = self._splitBlocks(raw)
+    
+    def _pickIndices(self, picks):
+        "Convert channel names or indices to a list of channel indices"
+        if picks is None:
+            return list(range(self.num_channels))
+        return [self.ch_names.index(p) if isinstance(p, str) else int(p) for p in picks]
         
     def _readFile(self, filename):
         try:
@@ -108,40 +221,17 @@ class Poly5Reader:
                 self.channels = self._readSignalDescription(file_obj)
                 self._myfmt = 'f' * self.num_channels*self.num_samples_per_block
                 self._buffer_size = self.num_channels*self.num_samples_per_block
+                self.ch_names = [s._Channel__name for s in self.channels]
+                self.ch_unit_names = [s._Channel__unit_name for s in self.channels]
                 
-                if self.readAll:
-                    sample_buffer = np.zeros(self.num_channels * self.num_samples)
-     
-                    for i in range(self.num_data_blocks):
-                        print('\rProgress: % 0.1f %%' %(100*i/self.num_data_blocks), end="\r")
-                         
-                        # Check whether final data block is filled completely or not
-                        if i == self.num_data_blocks-1:
-                            _final_block_size = self.num_samples / self.num_data_blocks
-                            if _final_block_size % self.num_samples_per_block != 0:
-                                data_block = self._readSignalBlock(file_obj, 
-                                                                   buffer_size = (self.num_samples%self.num_samples_per_block) * self.num_channels, 
-                                                                   myfmt = 'f' * (self.num_samples%self.num_samples_per_block) * self.num_channels)
-                            else:
-                                data_block = self._readSignalBlock(file_obj, self._buffer_size, self._myfmt)
-                        else:
-                            data_block = self._readSignalBlock(file_obj, self._buffer_size, self._myfmt)
-                        
-                        # Get indices that need to be filled in the samples array
-                        i1 = i * self.num_samples_per_block * self.num_channels
-                        i2 = (i+1) * self.num_samples_per_block * self.num_channels
-                        
-                        # Correct for final data block if this is not fully filled
-                        if i2 >= self.num_samples * self.num_channels:
-                            i2 = self.num_samples * self.num_channels
-                        
-                        # Insert the read data_block into the sample_buffer array
-                        sample_buffer[i1:i2] = data_block
-                       
-                    samples=np.transpose(np.reshape(sample_buffer, [self.num_samples, self.num_channels]))
-                    
-                    self.ch_names = [s._Channel__name for s in self.channels]
-                    self.ch_unit_names = [s._Channel__unit_name for s in self.channels]
+                self._data_offset = file_obj.tell()
+                
+                if self.lazy:
+                    self._mapBlocks()
+                    self.file_obj.close()
+                
+                elif self.readAll:
+                    samples = self._readAllBlocks(file_obj)
                     
                     self.samples=samples
                     print('Done reading data.')
@@ -159,16 +249,10 @@ class Poly5Reader:
         if n_blocks==None:
             n_blocks = self.num_data_blocks
             
-        sample_buffer = np.zeros(self.num_channels*n_blocks*self.num_samples_per_block)
-     
-        for i in range(n_blocks):
-            data_block = self._readSignalBlock(self.file_obj, self._buffer_size, self._myfmt)
-            i1 = i * self.num_samples_per_block * self.num_channels
-            i2 = (i+1) * self.num_samples_per_block * self.num_channels
-            sample_buffer[i1:i2] = data_block
+        blocks = np.fromfile(self.file_obj, dtype=self._blockDtype(), count=n_blocks)["samples"]
         
-        samples = np.transpose(np.reshape(sample_buffer, [self.num_samples_per_block*(i+1), self.num_channels]))
-        return samples
+        samples = np.transpose(blocks.reshape(-1, self.num_channels))
+        return samples.astype(self.dtype, copy=False)
     
             
     def _readHeader(self, f):
@@ -207,6 +291,57 @@ class Poly5Reader:
         
             
     
+    def _blockDtype(self, num_samples_per_block=None):
+        """Structured dtype of one data block: 86-byte block header followed by the float32 samples,
+        stored sample-major (num_samples_per_block x num_channels)"""
+        if num_samples_per_block is None:
+            num_samples_per_block = self.num_samples_per_block
+        return np.dtype([
+            ("header", np.uint8, (86,)),
+            ("samples", "<f4", (num_samples_per_block, self.num_channels)),
+        ])
+    
+    def _splitBlocks(self, raw):
+        """View a uint8 buffer of the data section as data blocks
+
+        Returns
+        -------
+        blocks : np.ndarray, shape (n_full_blocks, num_samples_per_block, num_channels)
+            float32 view of all completely filled data blocks, no data is copied
+        tail : np.ndarray, shape (n_tail_samples, num_channels)
+            float32 view of the samples of a partially filled final block
+        """
+        block_dtype = self._blockDtype()
+        
+        n_full_blocks = min(self.num_data_blocks, raw.size // block_dtype.itemsize)
+        blocks = raw[:n_full_blocks * block_dtype.itemsize].view(block_dtype)["samples"]
+        
+        # Final data block may not be filled completely
+        n_missing = max(self.num_samples - n_full_blocks * self.num_samples_per_block, 0)
+        tail = raw[n_full_blocks * block_dtype.itemsize + 86:]
+        n_tail = min(n_missing, tail.size // (4 * self.num_channels))
+        tail = tail[:n_tail * 4 * self.num_channels].view("<f4").reshape(n_tail, self.num_channels)
+        return blocks, tail
+    
+    def _readAllBlocks(self, f):
+        """Decode all remaining data blocks of the file in one go
+
+        The data section is read with a single np.fromfile call and viewed as an array
+        of structured blocks, so no per-block struct.unpack is needed. A final block that
+        is only partially filled is handled separately.
+
+        Returns
+        -------
+        np.ndarray, shape (num_channels, num_samples), dtype self.dtype
+        """
+        blocks, tail = self._splitBlocks(np.fromfile(f, dtype=np.uint8))
+        sample_buffer = blocks.reshape(-1, self.num_channels)
+        if tail.shape[0] > 0:
+            sample_buffer = np.concatenate([sample_buffer, tail])
+        
+        samples = sample_buffer[:self.num_samples].T
+        return samples.astype(self.dtype, copy=False)
+    
     def _readSignalBlock(self, f, buffer_size, myfmt):
         f.read(86)
         sampleData = f.read(buffer_size*4)
@@ -15,6 +15,8 @@ import pickle
 # local Imports
 from .. utils import find_folders as findfolders
 from .. utils import loadResults as loadResults
+from . import spearman_batch as spearman_batch
+from .. utils import bootstrap_engine as bootstrap_engine
 
 
 
@@ -182,12 +184,16 @@ def monopol_psd_correlations_sessions(
         - mean_or_median: str, e.g. "mean", "median"
 
     1) After loading the data, only select the contacts 0, 1A, 1B, 1C, 2A, 2B, 2C and 3
-        - rank again from 1-8 -> column "Rank8contacts"
-        - calculate the relative PSD normalized to the highest PSD within an electrode -> column "relativePSD_to_beta_Rank1from8"
+        - rank again from 1-8 by the PSD of freqBand (column "averaged_monopolar_PSD_{freqBand}") -> column "Rank8contacts"
+        - calculate the relative PSD normalized to the highest PSD within an electrode -> column "relativePSD_to_{freqBand}_Rank1from8"
+        - before, the contacts of every frequency band were ranked by "averaged_monopolar_PSD_beta" 
+          and the relPsd correlation read "relativePSD_to_beta_Rank1from8" (KeyError for other frequency bands),
+          the results for freqBand="beta" are unchanged
     
-    2) Use scipy.stats.spearmanr to correlate each STN electrode at two sessions
+    2) Spearman correlation of each STN electrode at two sessions
         - choose between ranks or rel PSD normalized to the highest PSD per electrode
         - STN = one hemisphere of one subject
+        - all STNs and session pairs at once: spearman_batch.spearman_session_pairs() (same values as scipy.stats.spearmanr)
         - pairs of sessions: 
             [('postop', 'postop'),
             ('postop', 'fu3m'),
@@ -241,87 +247,50 @@ def monopol_psd_correlations_sessions(
     # first check, which STNs and sessions exist in data 
     sub_hem_keys = list(data_weightedByCoordinates.subject_hemisphere.unique())
 
-    weightedByCoordinate_Dataframe = pd.DataFrame() # concat all Dataframes from all sub, hem, sessions
     sample_size_dict = {}
 
     ################## CHOOSE ONLY 8 CONTACTS AND RANK AGAIN ##################
-    for STN in sub_hem_keys:
-
-        # select only one STN
-        STN_data = data_weightedByCoordinates[data_weightedByCoordinates.subject_hemisphere == STN]
-
-        for ses in sessions:
-
-            # first check, if session exists in STN data
-            if ses not in STN_data.session.values:
-                continue
-            
-            # get the dataframe per session
-            STN_session_data = STN_data[STN_data.session == ses]
+    # choose only directional contacts and Ring contacts 0, 3 and rank again only the chosen contacts, all STNs and sessions in one groupby pass
+    weightedByCoordinate_Dataframe = data_weightedByCoordinates.loc[(data_weightedByCoordinates["contact"].isin(contacts)) 
+                                                                    & (data_weightedByCoordinates.session.isin(sessions))]
+    
+    # order rows by STN and session
+    stn_codes = pd.Categorical(weightedByCoordinate_Dataframe.subject_hemisphere, categories=sub_hem_keys).codes
+    session_codes = pd.Categorical(weightedByCoordinate_Dataframe.session, categories=sessions).codes
+    weightedByCoordinate_Dataframe = weightedByCoordinate_Dataframe.iloc[np.lexsort((session_codes, stn_codes))].copy()
 
-            # choose only directional contacts and Ring contacts 0, 3 and rank again only the chosen contacts
-            STN_session_data = STN_session_data[STN_session_data["contact"].isin(contacts)]
-            STN_session_data["Rank8contacts"] = STN_session_data["averaged_monopolar_PSD_beta"].rank(ascending=False) # ranks 1-8
-            STN_session_data_copy = STN_session_data.copy()
-            STN_session_data_copy.drop(["rank"], axis=1, inplace=True)
+    stn_session_groups = weightedByCoordinate_Dataframe.groupby(["subject_hemisphere", "session"], sort=False)
+    weightedByCoordinate_Dataframe["Rank8contacts"] = stn_session_groups[f"averaged_monopolar_PSD_{freqBand}"].rank(ascending=False) # ranks 1-8
+    weightedByCoordinate_Dataframe.drop(["rank"], axis=1, inplace=True)
 
-            # calculate the relative PSD to the highest PSD of the 8 remaining contacts
-            beta_rank_1 = STN_session_data_copy[STN_session_data_copy["Rank8contacts"] == 1.0] # taking the row containing 1.0 in rank
-            beta_rank_1 = beta_rank_1[f"averaged_monopolar_PSD_{freqBand}"].values[0] # just taking psdAverage of rank 1.0
+    # calculate the relative PSD to the highest PSD of the 8 remaining contacts
+    beta_rank_1 = weightedByCoordinate_Dataframe[f"averaged_monopolar_PSD_{freqBand}"].where(weightedByCoordinate_Dataframe["Rank8contacts"] == 1.0)
+    beta_rank_1 = beta_rank_1.groupby([weightedByCoordinate_Dataframe.subject_hemisphere, weightedByCoordinate_Dataframe.session], sort=False).transform("first")
 
-            STN_session_data_copy[f"relativePSD_to_{freqBand}_Rank1from8"] = STN_session_data_copy.apply(lambda row: row[f"averaged_monopolar_PSD_{freqBand}"] / beta_rank_1, axis=1) # in each row add to new value psd/beta_rank1
-            STN_session_data_copy.drop([f"relativePSD_to_{freqBand}_Rank1"], axis=1, inplace=True)
-            # session_weightedByCoordinates_copy["subject_hemisphere_monoChannel"] = session_weightedByCoordinates_copy[["subject_hemisphere", "monopolarChannels"]].agg("_".join, axis=1)
-
-            weightedByCoordinate_Dataframe = pd.concat([weightedByCoordinate_Dataframe, STN_session_data_copy], ignore_index=True)
+    weightedByCoordinate_Dataframe[f"relativePSD_to_{freqBand}_Rank1from8"] = (weightedByCoordinate_Dataframe[f"averaged_monopolar_PSD_{freqBand}"] / beta_rank_1).astype(float)
+    weightedByCoordinate_Dataframe.drop([f"relativePSD_to_{freqBand}_Rank1"], axis=1, inplace=True)
+    weightedByCoordinate_Dataframe.reset_index(drop=True, inplace=True)
 
 
     ################## CORRELATE RANKS OR REL PSD TO HIGHEST PSD BETWEEN ALL SESSION COMBINATIONS ##################
-    sub_hem_keys = list(weightedByCoordinate_Dataframe.subject_hemisphere.unique()) # n=13 subjects
-
-    # from the list of all existing sub_hem STNs, get only the STNs with existing sessions 1 + 2 
-    session_pair_STNs = {}
-
-    # find session pairs to correlate: check for each pair if subject exists
-    for p, pair in enumerate(pairs): # pair e.g. ["postop", "fu3m"]
-
-        # define session 1 and session 2 to correlate
-        session_1 = pair[0] # e.g. "postop"
-        session_2 = pair[1] # e.g. "fu3m"
-
-        session_1_df = weightedByCoordinate_Dataframe.loc[(weightedByCoordinate_Dataframe.session == session_1)]
-        session_2_df = weightedByCoordinate_Dataframe.loc[(weightedByCoordinate_Dataframe.session == session_2)]
-
-        for STN in sub_hem_keys:
-
-            # only run, if sub_hem STN exists in both session Dataframes
-            if STN not in session_1_df.subject_hemisphere.values:
-                continue
-
-            elif STN not in session_2_df.subject_hemisphere.values:
-                continue
-            
-            # get the rows with the current STN of both sessions: 1 and 2
-            STN_session_1 = session_1_df.loc[(session_1_df.subject_hemisphere == STN)]
-            STN_session_2 = session_2_df.loc[(session_2_df.subject_hemisphere == STN)]
-
-            if ranks_or_relPsd == "ranks":
-
-                # correlate the ranks of session 1 and session 2 of each STN 
-                spearman_correlation = stats.spearmanr(STN_session_1.Rank8contacts.values, STN_session_2.Rank8contacts.values)
-            
-            elif ranks_or_relPsd == "relPsd":
-
-                # correlate the rel Psd values normalized to highest PSD per electrode of session 1 and session 2 of each STN 
-                spearman_correlation = stats.spearmanr(STN_session_1.relativePSD_to_beta_Rank1from8.values, STN_session_2.relativePSD_to_beta_Rank1from8.values)
-            
-            # dictionary to store the spearman r values and pval per STN and session combination
-            session_pair_STNs[f"{session_1}_{session_2}_{STN}"] = [session_1, session_2, f"{session_1}_{session_2}", STN, spearman_correlation.statistic, spearman_correlation.pvalue]
+    # all STNs, sessions and contacts in one array, correlations of all session pairs of all STNs at once
+    if ranks_or_relPsd == "ranks":
+        # correlate the ranks of session 1 and session 2 of each STN 
+        value_column = "Rank8contacts"
+    
+    elif ranks_or_relPsd == "relPsd":
+        # correlate the rel Psd values normalized to highest PSD per electrode of session 1 and session 2 of each STN 
+        value_column = f"relativePSD_to_{freqBand}_Rank1from8"
+
+    contact_tensor = spearman_batch.contact_value_tensor(
+        data=weightedByCoordinate_Dataframe,
+        value_column=value_column,
+        sessions=sessions,
+        contacts=contacts
+    )
 
-    # save the dictionary as a Dataframe
-    results_DF = pd.DataFrame(session_pair_STNs)
-    results_DF.rename(index={0: "session_1", 1: "session_2", 2: "session_comparison", 3: "subject_hemisphere", 4: f"spearman_r", 5: f"pval"}, inplace=True)
-    results_DF = results_DF.transpose()
+    # only STNs with existing sessions 1 + 2 are included for each pair
+    results_DF = spearman_batch.spearman_session_pairs(tensor=contact_tensor, session_pairs=pairs)
 
     # get sample size
     for s_comp in comparison:
@@ -461,9 +430,10 @@ def fooof_monopol_psd_spearman_betw_sessions(
     1) After loading the data, only select the contacts 0, 1A, 1B, 1C, 2A, 2B, 2C and 3
         - rank again from 1-8 -> column "Rank8contacts"
     
-    2) Use scipy.stats.spearmanr to correlate each STN electrode at two sessions
+    2) Spearman correlation of each STN electrode at two sessions
         - choose between ranks or rel PSD normalized to the highest PSD per electrode
         - STN = one hemisphere of one subject
+        - all STNs and session pairs at once: spearman_batch.spearman_session_pairs() (same values as scipy.stats.spearmanr)
         - pairs of sessions: 
             [('postop', 'postop'),
             ('postop', 'fu3m'),
@@ -511,77 +481,41 @@ def fooof_monopol_psd_spearman_betw_sessions(
     loaded_fooof_monopolar = loadResults.load_fooof_monoRef_all_contacts_weight_beta(similarity_calculation=similarity_calculation)
 
 
-    # from the list of all existing sub_hem STNs, get only the STNs with existing sessions 1 + 2 
-    session_pair_stn_list = {}
     sample_size_dict = {}
 
-    # for each session comparison select STNs that have recordings for both
-    for comparison in session_comparison:
-
-        both_sessions = list(comparison.split("_"))
-
-        # define session 1 and 2
-        session_1 = both_sessions[0] # e.g. "postop"
-        session_2 = both_sessions[1] # e.g. "fu3m"
-
-        session_1_df = loaded_fooof_monopolar.loc[loaded_fooof_monopolar.session == session_1]
-        session_2_df = loaded_fooof_monopolar.loc[loaded_fooof_monopolar.session == session_2]
-
-        #find STNs with both sessions
-        session_1_stns = list(session_1_df.subject_hemisphere.unique())
-        session_2_stns = list(session_2_df.subject_hemisphere.unique())
-
-        stn_comparison_list = list(set(session_1_stns) & set(session_2_stns))
-        stn_comparison_list.sort()
-
-        comparison_df_1 = session_1_df.loc[session_1_df["subject_hemisphere"].isin(stn_comparison_list)]
-        comparison_df_2 = session_2_df.loc[session_2_df["subject_hemisphere"].isin(stn_comparison_list)]
-
-        comparsion_df = pd.concat([comparison_df_1, comparison_df_2], axis=0)
-
-        if only_segmental == "yes":
-            comparsion_df = comparsion_df.loc[comparsion_df.contact.isin(segmental_contacts)] # only rows with segmental contacts are included
-            print("only segmental contacts included")
-        
-        else:
-            print("all contacts included")
-
-        # correlate each electrode seperately
-        for sub_hem in stn_comparison_list:
-
-            # only run, if sub_hem STN exists in both session Dataframes
-            if sub_hem not in comparsion_df.subject_hemisphere.values:
-                continue
-
-            # only take one electrode at both sessions and get spearman correlation
-            stn_comparison = comparsion_df.loc[comparsion_df["subject_hemisphere"] == sub_hem]
-
-            stn_session1 = stn_comparison.loc[stn_comparison.session == session_1]
-            stn_session2 = stn_comparison.loc[stn_comparison.session == session_2]
-
-            # choose which values to correlate
-            if values_to_correlate == "not_normalized":
-                # correlate the beta psd of both sessions to each other
-                spearman_psd_stn = stats.spearmanr(stn_session1.estimated_monopolar_beta_psd.values, stn_session2.estimated_monopolar_beta_psd.values)
-
-            elif values_to_correlate == "rel_to_rank_1":
-                # correlate the beta psd of both sessions to each other
-                spearman_psd_stn = stats.spearmanr(stn_session1.beta_psd_rel_to_rank1.values, stn_session2.beta_psd_rel_to_rank1.values)
-            
-            elif values_to_correlate == "rel_range_0_to_1":
-                # correlate the beta psd of both sessions to each other
-                spearman_psd_stn = stats.spearmanr(stn_session1.beta_psd_rel_range_0_to_1.values, stn_session2.beta_psd_rel_range_0_to_1.values)
-
+    if only_segmental == "yes":
+        loaded_fooof_monopolar = loaded_fooof_monopolar.loc[loaded_fooof_monopolar.contact.isin(segmental_contacts)] # only rows with segmental contacts are included
+        print("only segmental contacts included")
+    
+    else:
+        print("all contacts included")
 
-            # store values in a dictionary
-            session_pair_stn_list[f"{comparison}_{sub_hem}"] = [session_1, session_2, comparison, sub_hem, spearman_psd_stn.statistic, spearman_psd_stn.pvalue]
+    # choose which values to correlate
+    if values_to_correlate == "not_normalized":
+        # correlate the beta psd of both sessions to each other
+        value_column = "estimated_monopolar_beta_psd"
 
-            
+    elif values_to_correlate == "rel_to_rank_1":
+        value_column = "beta_psd_rel_to_rank1"
+    
+    elif values_to_correlate == "rel_range_0_to_1":
+        value_column = "beta_psd_rel_range_0_to_1"
+
+    # all STNs, sessions and contacts in one array, correlate each electrode seperately for all session comparisons at once
+    # only STNs with recordings at both sessions are included for each comparison
+    sessions = ["postop", "fu3m", "fu12m", "fu18or24m"]
+
+    contact_tensor = spearman_batch.contact_value_tensor(
+        data=loaded_fooof_monopolar.loc[loaded_fooof_monopolar.session.isin(sessions)],
+        value_column=value_column,
+        sessions=sessions,
+        stns=sorted(loaded_fooof_monopolar.subject_hemisphere.unique())
+    )
 
-    # save the dictionary as a Dataframe
-    results_DF = pd.DataFrame(session_pair_stn_list)
-    results_DF.rename(index={0: "session_1", 1: "session_2", 2: "session_comparison", 3: "subject_hemisphere", 4: f"spearman_r", 5: f"pval"}, inplace=True)
-    results_DF = results_DF.transpose()
+    results_DF = spearman_batch.spearman_session_pairs(
+        tensor=contact_tensor, 
+        session_pairs=[tuple(comparison.split("_")) for comparison in session_comparison]
+    )
 
     # save Dataframe to Excel
     results_DF_copy = results_DF.copy()
@@ -917,6 +851,66 @@ def mono_rank_differences(
 
 
 
+def session_comparison_bootstrap_cis(
+        observations_df,
+        statistic_columns:list,
+        comparisons:list,
+        n_resamples:int = 10000,
+        confidence:float = 0.95,
+        rng = None,
+        n_jobs:int = 1,
+):
+    """
+    Bootstrap confidence intervals of group means of each session comparison, with STNs as resampling unit
+
+    Input:
+        - observations_df: Dataframe with columns session_comparison, subject_hemisphere and statistic_columns
+            one row per observation, e.g. one rank of one STN
+        - statistic_columns: list of columns, e.g. ["rel_amount_difference_0", "mean"]
+            values 0 or 1 -> CI of the relative amount, other values -> CI of the mean
+        - comparisons: list of session comparisons, e.g. ["0_0", "0_3"]
+        - n_resamples: int, e.g. 10000
+        - confidence: float, e.g. 0.95
+        - rng: None or int seed
+        - n_jobs: int, number of worker processes, -1: one per CPU core
+
+    1) sum up the observations of each STN within each session comparison
+    2) resample the STNs: each resampled mean is the mean of all observations of the drawn STNs,
+        so STNs with more observations weigh more, as in the relative amounts of all observations
+
+    return Dataframe with index session_comparison and columns f"{column}_ci_low", f"{column}_ci_high"
+    """
+
+    bootstrap_inputs = {}
+
+    for comp in comparisons:
+
+        comp_dataframe = observations_df.loc[observations_df.session_comparison == comp]
+        stn_sums = bootstrap_engine.group_sums(comp_dataframe[statistic_columns].values, comp_dataframe.subject_hemisphere.values)
+
+        bootstrap_inputs[comp] = {
+            "stn_values": stn_sums["sums"],
+            "stn_counts": stn_sums["counts"],
+            "statistic": "mean"
+        }
+
+    bootstrap_results = bootstrap_engine.bootstrap_cis(
+        bootstrap_inputs=bootstrap_inputs,
+        n_resamples=n_resamples,
+        confidence=confidence,
+        rng=rng,
+        n_jobs=n_jobs
+    )
+
+    ci_columns = {}
+
+    for column_index, column in enumerate(statistic_columns):
+        ci_columns[f"{column}_ci_low"] = [bootstrap_results[comp]["ci_low"][column_index] for comp in comparisons]
+        ci_columns[f"{column}_ci_high"] = [bootstrap_results[comp]["ci_high"][column_index] for comp in comparisons]
+
+    return pd.DataFrame(ci_columns, index=comparisons)
+
+
 def mono_rank_difference_heatmap(
         freq_band:str,
         normalization:str,
@@ -925,6 +919,10 @@ def mono_rank_difference_heatmap(
         difference_to_plot:str,
         level_or_direction:str,
         only_segmental:str,
+        n_resamples:int = 10000,
+        confidence:float = 0.95,
+        rng = None,
+        n_jobs:int = 1,
 ):
     """
     Research question: how many levels do beta ranks change over time across electrodes?
@@ -939,6 +937,10 @@ def mono_rank_difference_heatmap(
             "1_or_less" will plot relative amount how often a difference <= 1 occured for each session comparison
         - level_or_direction: str, e.g. "level" or "direction"
         - only_segmental: str, "yes" -> then monopolar estimation method only includes segmental bipolar channels and calculates psd only for segmental contacts
+        - n_resamples: int, number of bootstrap resamples of the STNs, e.g. 10000
+        - confidence: float, e.g. 0.95
+        - rng: None or int seed of the bootstrap
+        - n_jobs: int, number of worker processes for the bootstrap, -1: one per CPU core
 
     1) load the dataframe written by the function mono_rank_level_differences()
         - containing columns: session_comparison, session_1, session_2, subject_hemisphere, rank, level_session_1, level_session_2, level_abs_difference
@@ -947,7 +949,9 @@ def mono_rank_difference_heatmap(
     2) for each session comparison
         - count how often the level difference 0, 1, 2, 3 occurs or the direction difference 0 or 1
         - calculate relative amount of how often a level or direction difference occurs
-    
+        - bootstrap confidence intervals of the relative amounts and the mean difference (resampling STNs):
+            columns f"{column}_ci_low", f"{column}_ci_high"
+
     3) plot heatmap
         - 
     
@@ -1069,7 +1073,35 @@ def mono_rank_difference_heatmap(
     description_results = pd.DataFrame(group_description)
     description_results.rename(index={0: "session_comparison", 1: "number_of_observations", 2: "number_of_stn", 3: "mean", 4: "standard_deviation"}, inplace=True)
     description_results = description_results.transpose()
-   
+
+    # bootstrap confidence intervals, one row per rank comparison
+    differences = difference_df_ranks_included[f"{level_or_direction}_difference"]
+    observations_df = pd.DataFrame({
+        "session_comparison": difference_df_ranks_included.session_comparison,
+        "subject_hemisphere": difference_df_ranks_included.subject_hemisphere,
+        "rel_amount_difference_0": differences == 0,
+        "rel_amount_difference_1": differences == 1,
+        "rel_amount_difference_2": differences == 2,
+        "rel_amount_difference_3": differences == 3,
+        "rel_amount_difference_1_or_less": differences <= 1,
+        "rel_amount_difference_more_than_1": differences > 1,
+        "rel_amount_difference_more_than_0": differences > 0,
+        "mean": differences,
+    })
+
+    ci_df = session_comparison_bootstrap_cis(
+        observations_df=observations_df,
+        statistic_columns=list(observations_df.columns[2:]),
+        comparisons=comparisons,
+        n_resamples=n_resamples,
+        confidence=confidence,
+        rng=rng,
+        n_jobs=n_jobs
+    )
+
+    session_comparison_difference_df = session_comparison_difference_df.join(ci_df.drop(columns=["mean_ci_low", "mean_ci_high"]))
+    description_results = description_results.join(ci_df[["mean_ci_low", "mean_ci_high"]])
+
 
     ########################## PLOT HEATMAP OF REL AMOUNT OF DIFFERENCES IN LEVELS FOR RANKS ##########################
 
@@ -1512,7 +1544,11 @@ def fooof_mono_rank_difference_heatmap(
         difference_to_plot:str,
         level_or_direction_or_rank:str,
         similarity_calculation:str,
-        label_percentage_or_division:str
+        label_percentage_or_division:str,
+        n_resamples:int = 10000,
+        confidence:float = 0.95,
+        rng = None,
+        n_jobs:int = 1,
 ):
     """
     Research question: how many levels do beta ranks change over time across electrodes?
@@ -1537,7 +1573,12 @@ def fooof_mono_rank_difference_heatmap(
         - similarity_calculation: str e.g. "inverse_distance" or "exp_neg_distance"
 
         - label_percentage_or_division: str "percentage" or "division"
-        
+
+        - n_resamples: int, number of bootstrap resamples of the STNs, e.g. 10000
+        - confidence: float, e.g. 0.95
+        - rng: None or int seed of the bootstrap
+        - n_jobs: int, number of worker processes for the bootstrap, -1: one per CPU core
+
     1) load the dataframe written by the function mono_rank_level_differences()
         - containing columns: session_comparison, session_1, session_2, subject_hemisphere, rank, level_session_1, level_session_2, level_abs_difference
         - filter by ranks_included: only keep rows of dataframe containing rank isin rank_included
@@ -1545,7 +1586,9 @@ def fooof_mono_rank_difference_heatmap(
     2) for each session comparison
         - count how often the level difference 0, 1, 2, 3 occurs or the direction difference 0 or 1
         - calculate relative amount of how often a level or direction difference occurs
-    
+        - bootstrap confidence intervals of the relative amounts and the mean (resampling STNs):
+            columns f"{column}_ci_low", f"{column}_ci_high"
+
     3) plot heatmap
         - 
     
@@ -1758,7 +1801,47 @@ def fooof_mono_rank_difference_heatmap(
         description_results = pd.DataFrame(group_description)
         description_results.rename(index={0: "session_comparison", 1: "number_of_observations", 2: "number_of_stn", 3: "mean", 4: "standard_deviation"}, inplace=True)
         description_results = description_results.transpose()
-    
+
+    # bootstrap confidence intervals, one row per compared rank or rank 1 contact
+    if level_or_direction_or_rank == "rank":
+        labels_session_2 = difference_df_ranks_included["label_contact_session_2"]
+        observations_df = pd.DataFrame({
+            "session_comparison": difference_df_ranks_included.session_comparison,
+            "subject_hemisphere": difference_df_ranks_included.subject_hemisphere,
+            "rel_amount_staying_rank1": labels_session_2 == 0,
+            "rel_amount_staying_rank1_or_2": labels_session_2 <= 1,
+            "rel_amount_changing_at_least_2_ranks": labels_session_2 == 2,
+            "mean": labels_session_2,
+        })
+
+    else:
+        differences = difference_df_ranks_included[f"{level_or_direction_or_rank}_difference"]
+        observations_df = pd.DataFrame({
+            "session_comparison": difference_df_ranks_included.session_comparison,
+            "subject_hemisphere": difference_df_ranks_included.subject_hemisphere,
+            "rel_amount_difference_0": differences == 0,
+            "rel_amount_difference_1": differences == 1,
+            "rel_amount_difference_2": differences == 2,
+            "rel_amount_difference_3": differences == 3,
+            "rel_amount_difference_1_or_less": differences <= 1,
+            "rel_amount_difference_more_than_1": differences > 1,
+            "rel_amount_difference_more_than_0": differences > 0,
+            "mean": differences,
+        })
+
+    ci_df = session_comparison_bootstrap_cis(
+        observations_df=observations_df,
+        statistic_columns=list(observations_df.columns[2:]),
+        comparisons=comparisons,
+        n_resamples=n_resamples,
+        confidence=confidence,
+        rng=rng,
+        n_jobs=n_jobs
+    )
+
+    session_comparison_difference_df = session_comparison_difference_df.join(ci_df.drop(columns=["mean_ci_low", "mean_ci_high"]))
+    description_results = description_results.join(ci_df[["mean_ci_low", "mean_ci_high"]])
+
 
     ########################## PLOT HEATMAP OF REL AMOUNT OF DIFFERENCES IN LEVELS FOR RANKS ##########################
 
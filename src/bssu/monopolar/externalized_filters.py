@@ -0,0 +1,119 @@
+""" Butterworth and notch filters of externalized LFPs, applied to all channels at once """
+
+
+import functools
+
+import numpy as np
+import scipy.signal
+
+
+@functools.lru_cache(maxsize=None)
+def sos_filter_coefficients_externalized(
+        fs: float,
+        btype: str,
+        frequency,
+        order: int = None,
+        Q: float = None
+):
+    """
+    Input:
+        - fs: sampling frequency of the signal
+        - btype: "bandpass", "highpass" or "notch"
+        - frequency: cutoff frequency, tuple (low, high) for "bandpass", notch frequency for "notch"
+        - order: Butterworth filter order
+        - Q: quality factor of the notch filter
+
+    Design the filter in second-order sections (SOS) form.
+    Coefficients are cached per (fs, btype, frequency, order, Q), so the same filter is only designed once
+    for all channels and subjects.
+    """
+
+    if btype == "notch":
+        b, a = scipy.signal.iirnotch(w0=frequency, Q=Q, fs=fs)
+        sos = scipy.signal.tf2sos(b, a)
+    
+    else:
+        sos = scipy.signal.butter(order, frequency, btype=btype, output='sos', fs=fs)
+
+    return sos
+
+
+# get index of each channel and get the corresponding LFP data
+# plot filtered channels 1-8 [0]-[7] Right and 9-16 [8]-[15] 
+# butterworth filter: band pass -> filter order = 5, high pass 5 Hz, low-pass 95 Hz
+def band_pass_filter_externalized(
+        fs: int,
+        signal: np.array
+):
+    """
+    Input:
+        - fs: sampling frequency of the signal
+        - signal: array of the signal, 1D or 2D (channels x samples)
+
+    Applying a band pass filter to the signal, all channels are filtered at once along the last axis
+        - 5 Hz high pass
+        - 95 Hz low pass
+        - filter order: 3
+
+    """
+    # parameters
+    filter_order = 3 # in MATLAB spm_eeg_filter default=5 Butterworth
+    frequency_cutoff_low = 5 # 5Hz high-pass filter 
+    frequency_cutoff_high = 95 # 95 Hz low-pass filter
+
+    # create and apply the filter
+    sos = sos_filter_coefficients_externalized(fs=fs, btype='bandpass', frequency=(frequency_cutoff_low, frequency_cutoff_high), order=filter_order)
+    band_pass_filtered = scipy.signal.sosfiltfilt(sos, signal, axis=-1) 
+
+    return band_pass_filtered
+
+def high_pass_filter_externalized(
+        fs: int,
+        signal: np.array
+):
+    """
+    Input:
+        - fs: sampling frequency of the signal
+        - signal: array of the signal, 1D or 2D (channels x samples)
+
+    Applying a high pass filter to the signal, all channels are filtered at once along the last axis
+        - 1 Hz high pass
+        - filter order: 5
+    """
+    # parameters
+    filter_order = 5 # in MATLAB spm_eeg_filter default=5 Butterworth
+    frequency_cutoff_low = 1 # 1Hz high-pass filter 
+
+    # create and apply the filter
+    sos = sos_filter_coefficients_externalized(fs=fs, btype='highpass', frequency=frequency_cutoff_low, order=filter_order)
+    band_pass_filtered = scipy.signal.sosfiltfilt(sos, signal, axis=-1) 
+
+    return band_pass_filtered
+
+
+
+
+# notch filter: 50 Hz
+def notch_filter_externalized(
+        fs: int,
+        signal: np.array
+):
+    """
+    Input:
+        - fs: sampling frequency of the signal
+        - signal: array of the signal, 1D or 2D (channels x samples)
+
+    Applying a notch filter to the signal, all channels are filtered at once along the last axis
+    
+    
+    """
+
+    # parameters
+    notch_freq = 50 # 50 Hz line noise in Europe
+    Q = 30 # Q factor for notch filter
+
+    # apply notch filter
+    sos = sos_filter_coefficients_externalized(fs=fs, btype='notch', frequency=notch_freq, Q=Q)
+    filtered_signal = scipy.signal.sosfiltfilt(sos, signal, axis=-1)
+
+    return filtered_signal
@@ -13,6 +13,7 @@ import json
 import os
 import mne
 import pickle
+import concurrent.futures
 
 import fooof
 from fooof.plts.spectra import plot_spectrum
@@ -21,6 +22,13 @@ from fooof.plts.spectra import plot_spectrum
 from .. utils import find_folders as find_folders
 from .. utils import loadResults as loadResults
 from .. utils import load_data_files as load_data
+from .. utils import fooof_fit_cache as fooof_fit_cache
+from .. monopolar.externalized_filters import (
+    sos_filter_coefficients_externalized,
+    band_pass_filter_externalized,
+    high_pass_filter_externalized,
+    notch_filter_externalized,
+)
 
 
 
@@ -73,85 +81,97 @@ channel_mapping_2 = {
     'LFP_7_L_S': 'LFP_L_08_STN_MT'
 }
 
-# get index of each channel and get the corresponding LFP data
-# plot filtered channels 1-8 [0]-[7] Right and 9-16 [8]-[15] 
-# butterworth filter: band pass -> filter order = 5, high pass 5 Hz, low-pass 95 Hz
-def band_pass_filter_externalized(
-        fs: int,
-        signal: np.array
+
+def chunked_psd_Poly5(
+        poly5_reader,
+        picks: list = None,
+        tmin: float = None,
+        tmax: float = None,
+        chunk_duration: float = 10,
+        notch_filter: bool = False
 ):
     """
     Input:
-        - fs: sampling frequency of the signal
-        - signal: array of the signal
+        - poly5_reader: tmsi_poly5reader.Poly5Reader, ideally opened with lazy=True
+        - picks: list of channel names or indices, None = all channels
+        - tmin, tmax: time window in seconds, None = whole recording
+        - chunk_duration: duration in seconds of the chunks read from the Poly5 file
+        - notch_filter: bool, if True a 50 Hz notch filter is applied chunk by chunk 
+            (causal, the filter state is carried over between chunks)
+
+    Calculate the power spectrum of recordings that do not fit into memory:
+        - the Poly5 file is streamed in chunks via poly5_reader.iterSamples()
+        - window length = sfreq # 1 second window length
+        - overlap = window_length // 4 # 25% overlap
+        - window = hann(window_length, sym=False)
+        - the same segments as scipy.signal.spectrogram on the complete signal are used,
+          samples of an incomplete segment are carried over to the next chunk
 
-    Applying a band pass filter to the signal
-        - 5 Hz high pass
-        - 95 Hz low pass
-        - filter order: 3
+    Returns a dictionary:
+        - frequencies
+        - power_average_over_time: (n_channels, n_frequencies)
+        - power_std
+        - power_sem
+        - n_segments: number of spectrogram segments averaged
 
     """
-    # parameters
-    filter_order = 3 # in MATLAB spm_eeg_filter default=5 Butterworth
-    frequency_cutoff_low = 5 # 5Hz high-pass filter 
-    frequency_cutoff_high = 95 # 95 Hz low-pass filter
 
-    # create and apply the filter
-    b, a = scipy.signal.butter(filter_order, (frequency_cutoff_low, frequency_cutoff_high), btype='bandpass', output='ba', fs=fs)
-    band_pass_filtered = scipy.signal.filtfilt(b, a, signal) 
+    sfreq = poly5_reader.sample_rate
 
-    return band_pass_filtered
+    window_length = int(sfreq) # 1 second window length
+    overlap = window_length // 4 # 25% overlap
+    step = window_length - overlap
+    window = hann(window_length, sym=False)
 
-def high_pass_filter_externalized(
-        fs: int,
-        signal: np.array
-):
-    """
-    Input:
-        - fs: sampling frequency of the signal
-        - signal: array of the signal
+    if notch_filter:
+        b, a = scipy.signal.iirnotch(w0=50, Q=30, fs=sfreq)
+        sos = scipy.signal.tf2sos(b, a)
+        zi = None
 
-    Applying a band pass filter to the signal
-        - 1 Hz high pass
-        - filter order: 3
-    """
-    # parameters
-    filter_order = 5 # in MATLAB spm_eeg_filter default=5 Butterworth
-    frequency_cutoff_low = 1 # 1Hz high-pass filter 
+    carry_over = None
+    power_sum = 0
+    power_squared_sum = 0
+    n_segments = 0
 
-    # create and apply the filter
-    b, a = scipy.signal.butter(filter_order, (frequency_cutoff_low), btype='highpass', output='ba', fs=fs)
-    band_pass_filtered = scipy.signal.filtfilt(b, a, signal) 
+    for chunk in poly5_reader.iterSamples(chunk_size=int(chunk_duration * sfreq), picks=picks, tmin=tmin, tmax=tmax):
 
-    return band_pass_filtered
+        chunk = chunk.astype(np.float64)
 
+        if notch_filter:
+            if zi is None:
+                zi = scipy.signal.sosfilt_zi(sos)[:, np.newaxis, :] * chunk[:, 0][np.newaxis, :, np.newaxis]
+            chunk, zi = scipy.signal.sosfilt(sos, chunk, axis=-1, zi=zi)
 
+        if carry_over is not None:
+            chunk = np.concatenate([carry_over, chunk], axis=-1)
 
+        if chunk.shape[-1] < window_length:
+            carry_over = chunk
+            continue
 
-# notch filter: 50 Hz
-def notch_filter_externalized(
-        fs: int,
-        signal: np.array
-):
-    """
-    Input:
-        - fs: sampling frequency of the signal
-        - signal: array of the signal
+        frequencies, times, Zxx = scipy.signal.spectrogram(chunk, fs=sfreq, window=window, noverlap=overlap, scaling="density", mode="psd", axis=-1)
 
-    Applying a notch filter to the signal
-    
-    
-    """
+        power_sum = power_sum + Zxx.sum(axis=-1)
+        power_squared_sum = power_squared_sum + (Zxx ** 2).sum(axis=-1)
+        n_segments += Zxx.shape[-1]
 
-    # parameters
-    notch_freq = 50 # 50 Hz line noise in Europe
-    Q = 30 # Q factor for notch filter
+        # keep samples that were not part of a complete segment
+        carry_over = chunk[:, Zxx.shape[-1] * step:]
 
-    # apply notch filter
-    b, a = scipy.signal.iirnotch(w0=notch_freq, Q=Q, fs=fs)
-    filtered_signal = scipy.signal.filtfilt(b, a, signal)
+    if n_segments == 0:
+        raise ValueError(f"The selected window is shorter than one segment of {window_length} samples.")
 
-    return filtered_signal
+    power_average = power_sum / n_segments
+    power_std = np.sqrt(np.maximum(power_squared_sum / n_segments - power_average ** 2, 0))
+    power_sem = power_std / np.sqrt(n_segments)
+
+    return {
+        "frequencies": frequencies,
+        "power_average_over_time": power_average,
+        "power_std": power_std,
+        "power_sem": power_sem,
+        "n_segments": n_segments
+    }
 
 
 # detect artefacts 
@@ -167,236 +187,302 @@ def notch_filter_externalized(
 
 # perform FOOOF to extract only periodic component
 
-def preprocess_externalized_lfp(
-        sub:list
+def preprocess_externalized_lfp_subject(
+        patient:str
 ):
     """
     Input:
-        - sub: str e.g. [
-            "25", "30", "32", "47", "52", "59", 
-            "61", "64", "67", "69", "71", 
-            "72", "75", "77", "79", "80"]
+        - patient: str e.g. "25"
 
-    Load the BIDS .vhdr files with mne_bids.read_raw_bids(bids_path=bids_path)
+    Preprocessing of a single subject, see preprocess_externalized_lfp()
+    Subjects are independent of each other, so this function can run in a separate process.
 
-    if subject doesn't have a BIDS file yet -> load via Poly5reader
+    Returns a tuple:
+        - preprocessed_dataframe: one row per LFP channel
+        - originial_rec_info: information about the original recording
+        - mne_objects: MNE objects of the 4000 Hz and 250 Hz data, unfiltered
 
-    - crop the data to only 2 minutes: 1min - 3min
-    - downsample the data to 
-        1) sfreq=4000 Hz (if it was 4096Hz originally)
-        2) sfreq=250 Hz 
-    
-    - Filter 2 versions:
-        1) notch filter 50 Hz
-        2) notch filter 50 Hz + band-pass filter 5-95 Hz (filterorder 2)
-        
-    - save the data of all contacts into Dataframe:
-        1) externalized_preprocessed_data -> all versions of the data filtered, unfiltered, 250 Hz, 4000 Hz
-        2) externalized_recording_info_original -> information about the original recording
-        3) mne_objects_cropped_2_min -> MNE objects of the 4000 Hz and 250 Hz data, unfiltered
+    """
 
+    # check if patient is in the list with no BIDS yet
+    if patient in subjects_no_bids:
+        # memory-map the Poly5 file and only decode the 2 minute window of the LFP channels
+        poly5_reader = load_data.load_externalized_Poly5_reader(sub=patient, lazy=True)
 
-    """
+        # rename channels, first check which channel_mapping is correct
+        found = False
+        for name in poly5_reader.ch_names:
+            if name in channel_mapping_1:
+                found=True
+                channel_mapping = channel_mapping_1
+                break
 
-    group_data = pd.DataFrame()
-    group_originial_rec_info = pd.DataFrame()
-    mne_objects = {}
-    
-    for patient in sub:
-
-        # check if patient is in the list with no BIDS yet
-        if patient in subjects_no_bids:
-            mne_data = load_data.load_externalized_Poly5_files(sub=patient)
-
-            # rename channels, first check which channel_mapping is correct
-            found = False
-            for name in mne_data.info["ch_names"]:
-                if name in channel_mapping_1:
-                    found=True
-                    channel_mapping = channel_mapping_1
-                    break
-
-                elif name in channel_mapping_2:
-                    found=True
-                    channel_mapping = channel_mapping_2
-                    break
-            
-            if found == False:
-                print(f"Channel names of sub-{patient} are not in channel_mapping_1 or channel_mapping_2.")
+            elif name in channel_mapping_2:
+                found=True
+                channel_mapping = channel_mapping_2
+                break
+
+        if found == False:
+            print(f"Channel names of sub-{patient} are not in channel_mapping_1 or channel_mapping_2.")
 
-            mne_data.rename_channels(channel_mapping)
+        # select a period of 2 minutes with no aratefacts, default start at 1 min until 3 min
+        mne_data = poly5_reader.read_data_MNE(
+            tmin=60, 
+            tmax=180, 
+            picks=[chan for chan in poly5_reader.ch_names if "LFP" in chan]
+        )
+        mne_data.rename_channels(channel_mapping)
 
-            subject_info = "no_bids"
+        # get info of the original recording
+        ch_names = [channel_mapping.get(chan, chan) for chan in poly5_reader.ch_names]
+        bads = mne_data.info["bads"]
+        sfreq = float(poly5_reader.sample_rate)
+        n_times = poly5_reader.num_samples # number of timestamps
 
-            # bids_ID
-            bids_ID = f"sub-noBIDS{patient}"
-            print(f"subject {patient} with bids ID {bids_ID} was loaded.")
-        
-        else:
-            mne_data = load_data.load_BIDS_externalized_vhdr_files(sub=patient)
+        subject_info = "no_bids"
 
-            subject_info = mne_data.info["subject_info"]
-            bids_ID = mne_data.info["subject_info"]["his_id"]
-            print(f"subject {patient} with bids ID {bids_ID} was loaded.")
+        # bids_ID
+        bids_ID = f"sub-noBIDS{patient}"
+        print(f"subject {patient} with bids ID {bids_ID} was loaded.")
 
+    else:
+        mne_data = load_data.load_BIDS_externalized_vhdr_files(sub=patient)
 
-        recording_info = {}
-        processed_recording = {}
+        subject_info = mne_data.info["subject_info"]
+        bids_ID = mne_data.info["subject_info"]["his_id"]
+        print(f"subject {patient} with bids ID {bids_ID} was loaded.")
 
         # get info
         ch_names = mne_data.info["ch_names"]
-        ch_names_LFP = [chan for chan in ch_names if "LFP" in chan]
         bads = mne_data.info["bads"] # channel L_01 is mostly used as reference, "bad" channel is the reference
-        chs = mne_data.info["chs"] # list, [0] is dict
         sfreq = mne_data.info["sfreq"]
         n_times = mne_data.n_times # number of timestamps
-        rec_duration = (n_times / sfreq) / 60 # duration in minutes
-
-        subject = f"0{patient}"
 
         # pick LFP channels of both hemispheres
-        mne_data.pick_channels(ch_names_LFP) 
-
-        recording_info["original_information"] = [subject, bids_ID, ch_names, bads, sfreq, subject_info, n_times, rec_duration]
-        originial_rec_info = pd.DataFrame(recording_info)
-        originial_rec_info.rename(index={
-            0: "subject",
-            1: "BIDS_id",
-            2: "ch_names",
-            3: "bads",
-            4: "sfreq",
-            5: "subject_info",
-            6: "number_time_stamps",
-            7: "recording_duration"
-        }, inplace=True)
-        originial_rec_info = originial_rec_info.transpose()
+        mne_data.pick_channels([chan for chan in ch_names if "LFP" in chan]) 
 
         # plot the filtered channels, to visually detect artefacts
         # mne_data.plot(highpass=5.0, lowpass=95.0, filtorder=5.0)
-        
+
         # select a period of 2 minutes with no aratefacts, default start at 1 min until 3 min
         mne_data.crop(60,180)
 
-        # downsample all to 4000 Hz
-        if int(sfreq) != 4000:
-            mne_data = mne_data.copy().resample(sfreq=4000)
-            sfreq = mne_data.info["sfreq"]
-        
-        # downsample from TMSi sampling frequency to 250 sfreq (like Percept)
-        resampled_250 = mne_data.copy().resample(sfreq=250)
-        sfreq_250 = resampled_250.info["sfreq"]
-        # cropped data should have 30000 samples (2 min of sfreq 250)
 
-        # save the mne object
-        mne_objects[f"{patient}_4000Hz_2min"] = mne_data
-        mne_objects[f"{patient}_resampled_250Hz"] = resampled_250
+    recording_info = {}
+    processed_recording = {}
+
+    ch_names_LFP = [chan for chan in ch_names if "LFP" in chan]
+    rec_duration = (n_times / sfreq) / 60 # duration in minutes
 
-        # from bids_id only keep the part after sub-
-        bids_ID = bids_ID.split('-')
-        bids_ID = bids_ID[1]
+    subject = f"0{patient}"
 
-        ########## save processed LFP data in dataframe ##########
-        for idx, chan in enumerate(ch_names_LFP):
+    recording_info["original_information"] = [subject, bids_ID, ch_names, bads, sfreq, subject_info, n_times, rec_duration]
+    originial_rec_info = pd.DataFrame(recording_info)
+    originial_rec_info.rename(index={
+        0: "subject",
+        1: "BIDS_id",
+        2: "ch_names",
+        3: "bads",
+        4: "sfreq",
+        5: "subject_info",
+        6: "number_time_stamps",
+        7: "recording_duration"
+    }, inplace=True)
+    originial_rec_info = originial_rec_info.transpose()
 
-            lfp_data = mne_data.get_data(picks = chan)[0]
-            time_stamps = mne_data[idx][1]
+    # downsample all to 4000 Hz
+    if int(sfreq) != 4000:
+        mne_data = mne_data.copy().resample(sfreq=4000)
+        sfreq = mne_data.info["sfreq"]
 
-            lfp_data_250 = resampled_250.get_data(picks = chan)[0]
-            time_stamps_250 = resampled_250[idx][1]
+    # downsample from TMSi sampling frequency to 250 sfreq (like Percept)
+    resampled_250 = mne_data.copy().resample(sfreq=250)
+    sfreq_250 = resampled_250.info["sfreq"]
+    # cropped data should have 30000 samples (2 min of sfreq 250)
 
-            # ch_name corresponding to Percept -> TODO: is the order always correct???? 02 = 1A? could it also be 1B?
-            if "_01_" in chan:
-                monopol_chan_name = "0"
-            
-            elif "_02_" in chan:
-                monopol_chan_name = "1A"
-            
-            elif "_03_" in chan:
-                monopol_chan_name = "1B"
+    # save the mne object
+    mne_objects = {
+        f"{patient}_4000Hz_2min": mne_data,
+        f"{patient}_resampled_250Hz": resampled_250
+    }
 
-            elif "_04_" in chan:
-                monopol_chan_name = "1C"
+    # from bids_id only keep the part after sub-
+    bids_ID = bids_ID.split('-')
+    bids_ID = bids_ID[1]
 
-            elif "_05_" in chan:
-                monopol_chan_name = "2A"
+    ########## filter all LFP channels at once (channels x samples) ##########
+    lfp_data_all = mne_data.get_data(picks = ch_names_LFP)
+    lfp_data_250_all = resampled_250.get_data(picks = ch_names_LFP)
 
-            elif "_06_" in chan:
-                monopol_chan_name = "2B"
+    # notch filter 50 Hz
+    notch_filtered_lfp_4000_all = notch_filter_externalized(fs=sfreq, signal=lfp_data_all)
+    notch_filtered_lfp_250_all = notch_filter_externalized(fs=sfreq_250, signal=lfp_data_250_all)
 
-            elif "_07_" in chan:
-                monopol_chan_name = "2C"
+    # band pass filter 5-95 Hz, Butter worth filter order 3
+    filtered_lfp_4000_all = band_pass_filter_externalized(fs=sfreq, signal=notch_filtered_lfp_4000_all)
+    filtered_lfp_250_all = band_pass_filter_externalized(fs=sfreq_250, signal=notch_filtered_lfp_250_all)
 
-            elif "_08_" in chan:
-                monopol_chan_name = "3"
+    # high-pass filter 1 Hz, Butter worth filter order 5
+    high_pass_notch_filtered_lfp_4000_all = high_pass_filter_externalized(fs=sfreq, signal=notch_filtered_lfp_4000_all)
+    high_pass_notch_filtered_lfp_250_all = high_pass_filter_externalized(fs=sfreq_250, signal=notch_filtered_lfp_250_all)
 
-            # hemisphere
-            if "_L_" in chan:
-                hemisphere = "Left"
-            
-            elif "_R_" in chan:
-                hemisphere = "Right"
-            
-            # subject_hemisphere
-            subject_hemisphere = f"{subject}_{hemisphere}"
-
-            # notch filter 50 Hz
-            notch_filtered_lfp_4000 = notch_filter_externalized(fs=sfreq, signal=lfp_data)
-            notch_filtered_lfp_250 = notch_filter_externalized(fs=sfreq_250, signal=lfp_data_250)
-
-            # band pass filter 5-95 Hz, Butter worth filter order 3
-            filtered_lfp_4000 = band_pass_filter_externalized(fs=sfreq, signal=notch_filtered_lfp_4000)
-            filtered_lfp_250 = band_pass_filter_externalized(fs=sfreq_250, signal=notch_filtered_lfp_250)
-
-            # high-pass filter 1 Hz, Butter worth filter order 5
-            high_pass_notch_filtered_lfp_4000 = high_pass_filter_externalized(fs=sfreq, signal=notch_filtered_lfp_4000)
-            high_pass_notch_filtered_lfp_250 = high_pass_filter_externalized(fs=sfreq, signal=notch_filtered_lfp_250)
-
-            # number of samples
-            n_samples_250 = len(filtered_lfp_250)
-
-            processed_recording[f"{chan}"] = [bids_ID, subject, hemisphere, subject_hemisphere, chan, monopol_chan_name, 
-                                              lfp_data, time_stamps, sfreq, sfreq_250, lfp_data_250, time_stamps_250,
-                                              filtered_lfp_4000, filtered_lfp_250, 
-                                              notch_filtered_lfp_4000, notch_filtered_lfp_250, 
-                                              high_pass_notch_filtered_lfp_4000, high_pass_notch_filtered_lfp_250,
-                                              n_samples_250]
-        
-        preprocessed_dataframe = pd.DataFrame(processed_recording)
-        preprocessed_dataframe.rename(index={
-            0: "BIDS_id",
-            1: "subject",
-            2: "hemisphere",
-            3: "subject_hemisphere",
-            4: "original_ch_name",
-            5: "contact",
-            6: "lfp_2_min",
-            7: "time_stamps",
-            8: "sfreq",
-            9: "sfreq_250Hz",
-            10: "lfp_resampled_250Hz",
-            11: "time_stamps_250Hz",
-            12: "filtered_lfp_4000Hz",
-            13: "filtered_lfp_250Hz", 
-            14: "notch_filtered_lfp_4000Hz",
-            15: "notch_filtered_lfp_250Hz",
-            16: "high_pass_notch_filtered_lfp_4000Hz",
-            17: "high_pass_notch_filtered_lfp_250Hz",
-            18: "n_samples_250Hz"
- 
-        }, inplace=True)
-        preprocessed_dataframe = preprocessed_dataframe.transpose()
+    time_stamps = mne_data.times
+    time_stamps_250 = resampled_250.times
+
+    ########## save processed LFP data in dataframe ##########
+    for idx, chan in enumerate(ch_names_LFP):
+
+        lfp_data = lfp_data_all[idx]
+        lfp_data_250 = lfp_data_250_all[idx]
+
+        # ch_name corresponding to Percept -> TODO: is the order always correct???? 02 = 1A? could it also be 1B?
+        if "_01_" in chan:
+            monopol_chan_name = "0"
+
+        elif "_02_" in chan:
+            monopol_chan_name = "1A"
+
+        elif "_03_" in chan:
+            monopol_chan_name = "1B"
+
+        elif "_04_" in chan:
+            monopol_chan_name = "1C"
+
+        elif "_05_" in chan:
+            monopol_chan_name = "2A"
+
+        elif "_06_" in chan:
+            monopol_chan_name = "2B"
+
+        elif "_07_" in chan:
+            monopol_chan_name = "2C"
+
+        elif "_08_" in chan:
+            monopol_chan_name = "3"
+
+        # hemisphere
+        if "_L_" in chan:
+            hemisphere = "Left"
+
+        elif "_R_" in chan:
+            hemisphere = "Right"
+
+        # subject_hemisphere
+        subject_hemisphere = f"{subject}_{hemisphere}"
+
+        # filtered versions of this channel
+        notch_filtered_lfp_4000 = notch_filtered_lfp_4000_all[idx]
+        notch_filtered_lfp_250 = notch_filtered_lfp_250_all[idx]
+        filtered_lfp_4000 = filtered_lfp_4000_all[idx]
+        filtered_lfp_250 = filtered_lfp_250_all[idx]
+        high_pass_notch_filtered_lfp_4000 = high_pass_notch_filtered_lfp_4000_all[idx]
+        high_pass_notch_filtered_lfp_250 = high_pass_notch_filtered_lfp_250_all[idx]
+
+        # number of samples
+        n_samples_250 = len(filtered_lfp_250)
+
+        processed_recording[f"{chan}"] = [bids_ID, subject, hemisphere, subject_hemisphere, chan, monopol_chan_name, 
+                                          lfp_data, time_stamps, sfreq, sfreq_250, lfp_data_250, time_stamps_250,
+                                          filtered_lfp_4000, filtered_lfp_250, 
+                                          notch_filtered_lfp_4000, notch_filtered_lfp_250, 
+                                          high_pass_notch_filtered_lfp_4000, high_pass_notch_filtered_lfp_250,
+                                          n_samples_250]
+
+    preprocessed_dataframe = pd.DataFrame(processed_recording)
+    preprocessed_dataframe.rename(index={
+        0: "BIDS_id",
+        1: "subject",
+        2: "hemisphere",
+        3: "subject_hemisphere",
+        4: "original_ch_name",
+        5: "contact",
+        6: "lfp_2_min",
+        7: "time_stamps",
+        8: "sfreq",
+        9: "sfreq_250Hz",
+        10: "lfp_resampled_250Hz",
+        11: "time_stamps_250Hz",
+        12: "filtered_lfp_4000Hz",
+        13: "filtered_lfp_250Hz", 
+        14: "notch_filtered_lfp_4000Hz",
+        15: "notch_filtered_lfp_250Hz",
+        16: "high_pass_notch_filtered_lfp_4000Hz",
+        17: "high_pass_notch_filtered_lfp_250Hz",
+        18: "n_samples_250Hz"
+
+    }, inplace=True)
+    preprocessed_dataframe = preprocessed_dataframe.transpose()
+
+    return preprocessed_dataframe, originial_rec_info, mne_objects
+
+
+def preprocess_externalized_lfp(
+        sub:list,
+        n_jobs:int = 1,
+        write_pickle:bool = False
+):
+    """
+    Input:
+        - sub: str e.g. [
+            "25", "30", "32", "47", "52", "59", 
+            "61", "64", "67", "69", "71", 
+            "72", "75", "77", "79", "80"]
+        - n_jobs: int, number of worker processes. 
+            1: subjects are processed one after the other
+            >1: subjects are processed in parallel in a process pool, results are merged in the order of sub
+            -1: one worker process per CPU core
+        - write_pickle: bool, default False. True: externalized_preprocessed_data is additionally written as .pickle, 
+            e.g. for notebooks still loading it with load_data.load_externalized_pickle()
+
+    Load the BIDS .vhdr files with mne_bids.read_raw_bids(bids_path=bids_path)
+
+    if subject doesn't have a BIDS file yet -> load via Poly5reader
+
+    - crop the data to only 2 minutes: 1min - 3min
+    - downsample the data to 
+        1) sfreq=4000 Hz (if it was 4096Hz originally)
+        2) sfreq=250 Hz 
     
-        group_data = pd.concat([group_data, preprocessed_dataframe])
-        group_originial_rec_info = pd.concat([group_originial_rec_info, originial_rec_info])
+    - Filter 2 versions:
+        1) notch filter 50 Hz
+        2) notch filter 50 Hz + band-pass filter 5-95 Hz (filterorder 2)
+        
+    - save the data of all contacts into Dataframe:
+        1) externalized_preprocessed_data.h5 -> all versions of the data filtered, unfiltered, 250 Hz, 4000 Hz
+        2) externalized_recording_info_original -> information about the original recording
+        3) mne_objects_cropped_2_min -> MNE objects of the 4000 Hz and 250 Hz data, unfiltered
+
+
+    """
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    if n_jobs > 1 and len(sub) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(n_jobs, len(sub))) as executor:
+            # executor.map returns the results in the order of sub
+            subject_results = list(executor.map(preprocess_externalized_lfp_subject, sub))
     
+    else:
+        subject_results = [preprocess_externalized_lfp_subject(patient) for patient in sub]
+
+    group_data = pd.concat([result[0] for result in subject_results])
+    group_originial_rec_info = pd.concat([result[1] for result in subject_results])
+    mne_objects = {}
+    for result in subject_results:
+        mne_objects.update(result[2])
 
     # save dataframes
-    group_data_path = os.path.join(group_results_path, f"externalized_preprocessed_data.pickle")
-    with open(group_data_path, "wb") as file:
-        pickle.dump(group_data, file)
+    if write_pickle:
+        group_data_path = os.path.join(group_results_path, f"externalized_preprocessed_data.pickle")
+        with open(group_data_path, "wb") as file:
+            pickle.dump(group_data, file)
 
-    print(f"externalized_preprocessed_data.pickle",
-            f"\nwritten in: {group_results_path}" )
+        print(f"externalized_preprocessed_data.pickle",
+                f"\nwritten in: {group_results_path}" )
+    
+    # one dataset per signal version and channel, so single columns can be loaded with load_data.load_externalized_h5()
+    load_data.save_externalized_h5(data=group_data, filename="externalized_preprocessed_data")
     
     group_rec_info_path = os.path.join(group_results_path, f"externalized_recording_info_original.pickle")
     with open(group_rec_info_path, "wb") as file:
@@ -426,7 +512,8 @@ def fourier_transform_time_frequency_plots(
     Input:
         - incl_bids_id: list of bids_id ["L001", "L013"] or ["all"]
 
-    Load the preprocessed data: externalized_preprocessed_data.pickle
+    Load the preprocessed data: externalized_preprocessed_data.h5 
+    (only the column filtered_lfp_250Hz of the selected subjects is read from the file)
 
     - For each subject, plot a Time Frequency figure of all channels for Left and Right hemisphere
         1) extract only the filtered data, sfreq=250 Hz
@@ -436,8 +523,10 @@ def fourier_transform_time_frequency_plots(
     """
 
     # load the dataframe with all filtered LFP data
-    preprocessed_data = load_data.load_externalized_pickle(
-        filename="externalized_preprocessed_data"
+    preprocessed_data = load_data.load_externalized_h5(
+        filename="externalized_preprocessed_data",
+        columns=["filtered_lfp_250Hz"],
+        bids_id=None if "all" in incl_bids_id else incl_bids_id
     )
 
     # get all subject_hemispheres
@@ -501,9 +590,11 @@ def fourier_transform_time_frequency_plots(
 
 
 def clean_artefacts(
-        
+        write_pickle:bool = False
 ):
     """
+    Input:
+        - write_pickle: bool, default False. True: externalized_preprocessed_data_artefact_free is additionally written as .pickle
     
     Clean artefacts:
 
@@ -519,14 +610,18 @@ def clean_artefacts(
     - Plot again the clean Time Frequency plots (sfreq=250 Hz, filtered, artefact-free) to check, if artefacts are gone
 
     - copy the old preprocessed dataframe, replace the original data by the clean artefact-free data:
-        externalized_preprocessed_data_artefact_free.pickle
+        externalized_preprocessed_data_artefact_free.h5
+        only the metadata and the 4 cleaned 250 Hz columns are loaded and saved, the 4000 Hz columns are not cleaned
 
     """
     sfreq = 250
 
     # load data
     artefacts_excel = load_data.load_excel_data(filename="movement_artefacts")
-    preprocessed_data = load_data.load_externalized_pickle(filename="externalized_preprocessed_data")
+    preprocessed_data = load_data.load_externalized_h5(
+        filename="externalized_preprocessed_data",
+        columns=["filtered_lfp_250Hz", "lfp_resampled_250Hz", "notch_filtered_lfp_250Hz", "high_pass_notch_filtered_lfp_250Hz"]
+    )
 
     # artefact_free_dataframe= pd.DataFrame()
     artefact_free_dataframe = preprocessed_data.copy()
@@ -720,12 +815,15 @@ def clean_artefacts(
                         bbox_inches="tight")
     
     # save dataframes
-    group_data_path = os.path.join(group_results_path, f"externalized_preprocessed_data_artefact_free.pickle")
-    with open(group_data_path, "wb") as file:
-        pickle.dump(artefact_free_dataframe, file)
+    if write_pickle:
+        group_data_path = os.path.join(group_results_path, f"externalized_preprocessed_data_artefact_free.pickle")
+        with open(group_data_path, "wb") as file:
+            pickle.dump(artefact_free_dataframe, file)
 
-    print(f"externalized_preprocessed_data_artefact_free.pickle",
-            f"\nwritten in: {group_results_path}" )
+        print(f"externalized_preprocessed_data_artefact_free.pickle",
+                f"\nwritten in: {group_results_path}" )
+
+    load_data.save_externalized_h5(data=artefact_free_dataframe, filename="externalized_preprocessed_data_artefact_free")
     
     return artefact_free_dataframe
                     
@@ -760,7 +858,10 @@ def fourier_transform_to_psd(
 
     power_spectra_dict = {}
 
-    artefact_free_lfp = load_data.load_externalized_pickle(filename="externalized_preprocessed_data_artefact_free")
+    artefact_free_lfp = load_data.load_externalized_h5(
+        filename="externalized_preprocessed_data_artefact_free",
+        columns=["filtered_lfp_250Hz", "lfp_resampled_250Hz", "notch_filtered_lfp_250Hz", "high_pass_notch_filtered_lfp_250Hz"]
+    )
 
     BIDS_id_unique = list(artefact_free_lfp.BIDS_id.unique())
 
@@ -882,11 +983,14 @@ def fourier_transform_to_psd(
 
 
 def externalized_fooof_fit(
-        filtered:str
+        filtered:str,
+        use_cache:bool = True
 ):
     """
     Input:
         - filtered: str, "unfiltered" or "notch-filtered" or "high_pass_and_notch"    
+        - use_cache: bool, if True power spectra that were fitted before with the same settings are loaded 
+            from the FOOOF fit cache in the GroupResults folder instead of fitted again (see utils.fooof_fit_cache)
 
     Load the Power Spectra data
         - externalized_power_spectra_250Hz_artefact_free.pickle
@@ -946,6 +1050,9 @@ def externalized_fooof_fit(
     common_reference_contacts = {}
 
 
+    if use_cache:
+        fit_cache = fooof_fit_cache.FooofFitCache(cache_path=os.path.join(group_results_path, "fooof_fit_cache"))
+
     power_spectra_data = load_data.load_externalized_pickle(filename="externalized_power_spectra_250Hz_artefact_free")
 
     # first select only the rows with UNFILTERED OR NOTCH-FILTERED DATA 
@@ -993,17 +1100,15 @@ def externalized_fooof_fit(
 
                 ############ SET FOOOF MODEL ############
                 
-                model = fooof.FOOOF(
-                        peak_width_limits=[2, 15.0],
-                        max_n_peaks=6,
-                        min_peak_height=0.2,
-                        peak_threshold=2.0,
-                        aperiodic_mode="fixed", # fitting without knee component
-                        verbose=True,
-                    )
+                if use_cache:
+                    # only fit, if this power spectrum was not fitted before with the same settings
+                    model = fit_cache.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=freq_range)
 
-                # always fit a large Frequency band, later you can select Peaks within specific freq bands
-                model.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=freq_range)
+                else:
+                    model = fooof.FOOOF(**fooof_fit_cache.fooof_settings, verbose=True) # fitting without knee component
+
+                    # always fit a large Frequency band, later you can select Peaks within specific freq bands
+                    model.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=freq_range)
 
                 # Plot an example power spectrum, with a model fit in second ax
                 # model.plot(plot_peaks='shade', peak_kwargs={'color' : 'green'}, ax=ax[1])
@@ -1136,6 +1241,9 @@ def externalized_fooof_fit(
     print(f"fooof_externalized_group{filtered}.pickle",
             f"\nwritten in: {group_results_path}" )
 
+    if use_cache:
+        fit_cache.print_statistics()
+
     
     # bids_id, sub, hem, contact, original_ch_name
     common_reference_contacts_df = pd.DataFrame(common_reference_contacts)
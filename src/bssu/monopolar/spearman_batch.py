@@ -0,0 +1,136 @@
+""" Spearman correlations between sessions of all STNs as matrix products """
+
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+def contact_value_tensor(
+        data,
+        value_column: str,
+        sessions: list,
+        stns: list = None,
+        contacts: list = None
+):
+    """
+    Restructure a long format Dataframe into one STN x session x contact array
+
+    Input:
+        - data: Dataframe with columns "subject_hemisphere", "session", "contact" and value_column, one row per contact
+        - value_column: str, e.g. "estimated_monopolar_beta_psd", "Rank8contacts"
+        - sessions: list of sessions, e.g. ["postop", "fu3m", "fu12m", "fu18m"]
+        - stns: None or list of subject_hemisphere, None: all STNs in order of appearance in data
+        - contacts: None or list of contacts, None: all contacts in order of appearance in data
+
+    Values of the same contact are aligned between sessions, each contact must be unique within one STN and session.
+
+    return {
+        "values": np.array (n_stns, n_sessions, n_contacts), NaN if a contact was not recorded,
+        "recorded": boolean np.array (n_stns, n_sessions), True if the STN has at least one value at the session,
+        "stns", "sessions", "contacts": lists of the labels of each axis
+    }
+    """
+
+    if stns is None:
+        stns = list(data.subject_hemisphere.unique())
+
+    if contacts is None:
+        contacts = list(data.contact.unique())
+
+    values = data.set_index(["subject_hemisphere", "session", "contact"])[value_column]
+
+    if values.index.duplicated().any():
+        raise ValueError(f"each contact must be unique within one STN and session, duplicated rows in column {value_column}")
+
+    values = values.reindex(pd.MultiIndex.from_product([stns, sessions, contacts]))
+    values = values.to_numpy(dtype=float).reshape(len(stns), len(sessions), len(contacts))
+
+    return {
+        "values": values,
+        "recorded": ~np.isnan(values).all(axis=-1),
+        "stns": stns,
+        "sessions": sessions,
+        "contacts": contacts
+    }
+
+
+def spearman_session_matrices(values):
+    """
+    Spearman correlation of the contact values between all sessions of each STN
+
+    Input:
+        - values: np.array (n_stns, n_sessions, n_contacts), e.g. contact_value_tensor()["values"]
+
+    1) rank the contacts of each STN and session once (average ranks of ties, as scipy.stats.spearmanr)
+    2) center the ranks and scale them to length 1:
+        the Spearman r of all session pairs of all STNs is one matrix product (n_sessions x n_contacts) @ (n_contacts x n_sessions) per STN
+    3) two-sided p-values from the t-distribution with n_contacts - 2 degrees of freedom, as scipy.stats.spearmanr
+
+    As scipy.stats.spearmanr: NaN if a contact value is missing or all values of one session are the same.
+
+    return spearman_r, pval: np.arrays (n_stns, n_sessions, n_sessions)
+    """
+
+    values = np.asarray(values, dtype=float)
+    dof = values.shape[-1] - 2
+
+    ranks = stats.rankdata(values, axis=-1, nan_policy="propagate")
+    ranks = ranks - ranks.mean(axis=-1, keepdims=True)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ranks = ranks / np.sqrt((ranks ** 2).sum(axis=-1, keepdims=True))
+
+        spearman_r = np.clip(ranks @ ranks.transpose(0, 2, 1), -1.0, 1.0)
+
+        t_values = spearman_r * np.sqrt((dof / ((spearman_r + 1.0) * (1.0 - spearman_r))).clip(0))
+
+    pval = 2 * stats.t.sf(np.abs(t_values), dof)
+
+    return spearman_r, pval
+
+
+def spearman_session_pairs(
+        tensor: dict,
+        session_pairs: list
+):
+    """
+    Spearman correlations of all STNs recorded at both sessions of each session pair
+
+    Input:
+        - tensor: dict from contact_value_tensor()
+        - session_pairs: list of tuples (session_1, session_2), e.g. list(itertools.product(sessions, sessions))
+
+    return results_DF with one row per session pair and STN (in the order of tensor["stns"]):
+        - index: f"{session_1}_{session_2}_{STN}"
+        - columns: session_1, session_2, session_comparison, subject_hemisphere, spearman_r, pval
+    """
+
+    spearman_r, pval = spearman_session_matrices(tensor["values"])
+
+    stns = np.array(tensor["stns"], dtype=object)
+    recorded = tensor["recorded"]
+
+    pair_results = []
+
+    for session_1, session_2 in session_pairs:
+
+        index_1 = tensor["sessions"].index(session_1)
+        index_2 = tensor["sessions"].index(session_2)
+
+        # STNs with both sessions
+        both_sessions = recorded[:, index_1] & recorded[:, index_2]
+
+        pair_results.append(pd.DataFrame({
+            "session_1": session_1,
+            "session_2": session_2,
+            "session_comparison": f"{session_1}_{session_2}",
+            "subject_hemisphere": stns[both_sessions],
+            "spearman_r": spearman_r[both_sessions, index_1, index_2],
+            "pval": pval[both_sessions, index_1, index_2],
+        }))
+
+    results_DF = pd.concat(pair_results, ignore_index=True)
+    results_DF.index = results_DF.session_comparison + "_" + results_DF.subject_hemisphere
+
+    return results_DF
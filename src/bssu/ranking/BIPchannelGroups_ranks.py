@@ -15,11 +15,75 @@ from .. utils import find_folders as find_folders
 from .. utils import loadResults as loadResults
 
 
+
+def rank_within_partitions(
+        long_df,
+        value_column: str,
+        partition_columns: list,
+        ranked_df=None
+        ):
+    
+    """
+    Rank the values of each partition of a long format Dataframe in one groupby pass
+
+    Input:
+        - long_df: Dataframe in long format, one row per channel
+        - value_column: str, e.g. "averagedPSD" or "PEAK_5HzAverage"
+        - partition_columns: list of columns defining one ranking, e.g. ["channel_group", "session", "subject_hemisphere"]
+        - ranked_df: None or Dataframe already ranked with this function
+            partitions in long_df replace the same partitions of ranked_df, 
+            all other partitions of ranked_df are kept and not ranked again (e.g. when adding a new subject or session)
+
+    Ranks as pd.Series.rank(ascending=False): highest value = 1.0, ties get the average rank
+
+    return long_df with new column "rank" (appended to ranked_df if given)
+    """
+
+    ranked = long_df.copy()
+    ranked["rank"] = ranked.groupby(partition_columns, sort=False)[value_column].rank(ascending=False)
+
+    if ranked_df is not None:
+        new_partitions = pd.MultiIndex.from_frame(ranked[partition_columns])
+        keep_rows = ~pd.MultiIndex.from_frame(ranked_df[partition_columns]).isin(new_partitions)
+
+        ranked = pd.concat([ranked_df.loc[keep_rows], ranked])
+
+    return ranked
+
+
+def relative_to_rank1(
+        ranked_df,
+        value_column: str,
+        partition_columns: list
+        ):
+    
+    """
+    Value of each channel relative to the value of the rank 1 channel of the same partition
+
+    Input:
+        - ranked_df: Dataframe with column "rank", e.g. from rank_within_partitions()
+        - value_column: str, e.g. "averagedPSD"
+        - partition_columns: list of columns defining one ranking, e.g. ["channel_group", "session", "subject_hemisphere"]
+
+    rank 1 channels are always 1.0, partitions without a rank 1.0 channel (tied highest values) get NaN
+        before (row-wise loop with values[0] of the rank 1.0 row) tied highest values raised an IndexError
+
+    return ranked_df with new column "relative_to_rank1"
+    """
+
+    # value of the rank 1 row, broadcast to all rows of the same partition
+    rank1_value = ranked_df[value_column].where(ranked_df["rank"] == 1.0)
+    rank1_value = rank1_value.groupby([ranked_df[column] for column in partition_columns], sort=False).transform("first")
+
+    return ranked_df.assign(relative_to_rank1=(ranked_df[value_column] / rank1_value).astype(float))
+
+
 def Rank_BIPRingSegmGroups(
         result: str,
         filterSignal: str,
         normalization: str,
-        freqBand: str
+        freqBand: str,
+        incl_sub: list = None
         ):
     
     """
@@ -33,6 +97,11 @@ def Rank_BIPRingSegmGroups(
         - filterSignal: str, "band-pass" or "unfiltered"
         - normalization: str, ""rawPsd", "normPsdToTotalSum", "normPsdToSum1_100Hz", "normPsdToSum40_90Hz"
         - freqBand: str, "alpha", "beta", "lowBeta", "highBeta"
+        - incl_sub: None or list of subjects, e.g. ["024"] after adding a new subject or session
+            None: all subjects are ranked
+            list: only the STNs of these subjects are ranked again, 
+                the ranks of all other subjects are taken from "BIPranks_long_{result}_{freqBand}_{normalization}_{filterSignal}.pickle"
+                if this file doesn't exist yet, all subjects are ranked
 
     1) Load the BIPpeak or BIPpsdAverage Pickle file written with functions from BIP_channelGroups.py
         - one pickle file contains either the psdAverage or peak Values from 4 freqency bands: alpha, beta, lowBeta, highBeta
@@ -46,6 +115,11 @@ def Rank_BIPRingSegmGroups(
         - e.g. Dataframe each for Ring_postop, Ring_fu3m, Ring_fu12m, Ring_18m 
         - columns: session, bipolarChannel, freqBand, absoluteOrRelativePSD, averagedPSD, rank, subject_hemisphere
 
+    All Dataframes are concatenated into one long Dataframe first, 
+    ranks of all sessions, STNs and channel groups are computed in one groupby pass (rank_within_partitions()).
+    The long Dataframe with ranks is saved as "BIPranks_long_{result}_{freqBand}_{normalization}_{filterSignal}.pickle",
+    so incl_sub only ranks the partitions of new subjects.
+
     
 
     TODO: does Permutation analysis work if I don't have same number of values within each group?
@@ -54,9 +128,6 @@ def Rank_BIPRingSegmGroups(
     """
     channelGroups = ["Ring", "SegmInter", "SegmIntra"]
     sessions = ["postop", "fu3m", "fu12m", "fu18m"]
-    Ring_rankDF = {} # same keys as in sub_hem_ses_freqBand_list
-    SegmIntra_rankDF = {}
-    SegmInter_rankDF = {}
 
 
     ##################### LOAD PICKLE FILES WITH PSD AVERAGES OR PEAK VALUES FROM RESULTS FOLDER #####################
@@ -77,148 +148,76 @@ def Rank_BIPRingSegmGroups(
     # filter only keys containing the correct frequency band
     freqBand_keys = [i for i in sub_hem_ses_freqBand_all if f"{freqBand}" in i]
 
+    # ranks of the previous run, only the partitions of subjects in incl_sub are ranked again
+    ranked_long_filepath = os.path.join(results_path, f"BIPranks_long_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
+    previous_ranked_df = None
 
+    if incl_sub is not None:
 
-    ##################### EDIT DATAFRAMES; ADD COLUMN WITH RANKS #####################
-    # Edit all Dataframes from 3 channelGroups: add column with ranks 
-    for group in channelGroups:
-        for sub_hem_ses_freq in freqBand_keys:
-    
-            #first from all Ring DF take only adjacent BIP channels 01,12,23
-            if group == "Ring":
-                Ring_DF_allChannels = data[group][sub_hem_ses_freq] # containing 6 BIP channels
-                
-                # drop the BIP channels which contacts are not adjacent 
-                Ring_DF_3Channels = Ring_DF_allChannels[Ring_DF_allChannels.bipolarChannel.str.contains("03|13|02") == False]
-
-                # add column rank to DF depending on result input
-                if result == "psdAverage":
-                    rank_column = Ring_DF_3Channels.averagedPSD.rank(ascending=False) # rank highest psdAverage = 1.0
-                    copyDF = Ring_DF_3Channels.copy() # has to be copied, otherwise can´t add a new column
-                    copyDF["rank"] = rank_column # add new column "rank" to the copied DF
-                    Ring_rankDF[sub_hem_ses_freq] = copyDF
-                
-                elif result == "peak":
-                    rank_column = Ring_DF_3Channels.PEAK_5HzAverage.rank(ascending=False) # rank highest PEAK_5HzAverage = 1.0
-                    copyDF = Ring_DF_3Channels.copy()
-                    copyDF["rank"] = rank_column # add new column "rank" to the copied DF
-                    Ring_rankDF[sub_hem_ses_freq] = copyDF
-            
-
-            elif group == "SegmIntra":
-                SegmIntra_DF = data[group][sub_hem_ses_freq] # containing 6 BIP channels
-
-                # add column rank to DF depending on result input
-                if result == "psdAverage":
-                    rank_column = SegmIntra_DF.averagedPSD.rank(ascending=False) # rank highest psdAverage = 1.0
-                    copyDF = SegmIntra_DF.copy()
-                    copyDF["rank"] = rank_column # add new column "rank" to the copied DF
-                    SegmIntra_rankDF[sub_hem_ses_freq] = copyDF
-                
-                elif result == "peak":
-                    rank_column = SegmIntra_DF.PEAK_5HzAverage.rank(ascending=False) # rank highest PEAK_5HzAverage = 1.0
-                    copyDF = SegmIntra_DF.copy()
-                    copyDF["rank"] = rank_column # add new column "rank" to the copied DF
-                    SegmIntra_rankDF[sub_hem_ses_freq] = copyDF
-
-            
-            elif group == "SegmInter":
-                SegmInter_DF = data[group][sub_hem_ses_freq] # containing 6 BIP channels
-
-                # add column rank to DF depending on result input
-                if result == "psdAverage":
-                    rank_column = SegmInter_DF.averagedPSD.rank(ascending=False) # rank highest psdAverage = 1.0
-                    copyDF = SegmInter_DF.copy()
-                    copyDF["rank"] = rank_column # add new column "rank" to the copied DF
-                    SegmInter_rankDF[sub_hem_ses_freq] = copyDF
-                
-                elif result == "peak":
-                    rank_column = SegmInter_DF.PEAK_5HzAverage.rank(ascending=False) # rank highest PEAK_5HzAverage = 1.0
-                    copyDF = SegmInter_DF.copy()
-                    copyDF["rank"] = rank_column # add new column "rank" to the copied DF
-                    SegmInter_rankDF[sub_hem_ses_freq] = copyDF
-    
-
-
-    ##################### RESTRUCTURE DATAFRAMES #####################
-
-    # Restructure Dataframes into different session_channelGroup Dataframes 
-
-    Rank_channelGroup_dict = {}
+        if os.path.isfile(ranked_long_filepath):
+            with open(ranked_long_filepath, "rb") as file:
+                previous_ranked_df = pickle.load(file)
 
-    postop_dict = {}
-    fu3m_dict = {}
-    fu12m_dict = {}
-    fu18m_dict = {}
-
-    for group in channelGroups:
-        
-        # define the dictionary from where to take the dataframes for each channel group 
-        if group == "Ring":
-            base_dictionary = Ring_rankDF # dictionary that already stores the Dataframes I want to edit
-        
-        elif group == "SegmIntra":
-            base_dictionary = SegmIntra_rankDF
-        
-        elif group == "SegmInter":
-            base_dictionary = SegmInter_rankDF
+            freqBand_keys = [key for key in freqBand_keys if key.split("_")[0] in incl_sub]
         
         else:
-            print("base_dictionary and dict_to_store not defined. Group must be in: ", channelGroups)
+            print(f"no file: BIPranks_long_{result}_{freqBand}_{normalization}_{filterSignal}.pickle, all subjects are ranked")
 
 
-        # seperate Dataframes for each session
-        for ses in sessions:
+    ##################### ONE LONG DATAFRAME OF ALL CHANNEL GROUPS, STNs AND SESSIONS #####################
+    # helper columns: channel_group and data_key (e.g. "024_Right_postop_beta"), one ranking per channel_group and data_key
+    long_df = pd.concat([data[group][key].assign(channel_group=group, data_key=key) for group in channelGroups for key in freqBand_keys])
 
-            session_keys = [i for i in freqBand_keys if f"{ses}" in i] # list of keys that contain the correct session
+    # from the Ring group only take adjacent BIP channels 01,12,23: drop the BIP channels which contacts are not adjacent 
+    non_adjacent = (long_df.channel_group == "Ring") & (long_df.bipolarChannel.str.contains("03|13|02"))
+    long_df = long_df.loc[~non_adjacent]
 
-            if ses == "postop":
-                session_dict = postop_dict
-            
-            elif ses == "fu3m":
-                session_dict = fu3m_dict
-            
-            elif ses == "fu12m":
-                session_dict = fu12m_dict
 
-            elif ses == "fu18m":
-                session_dict = fu18m_dict
-            
-            #print("session: ", ses)
+    ##################### ADD COLUMN WITH RANKS #####################
+    if result == "psdAverage":
+        value_column = "averagedPSD" # rank highest psdAverage = 1.0
+    
+    elif result == "peak":
+        value_column = "PEAK_5HzAverage" # rank highest PEAK_5HzAverage = 1.0
 
-            for key in session_keys:
+    ranked_df = rank_within_partitions(
+        long_df, 
+        value_column=value_column, 
+        partition_columns=["channel_group", "data_key"],
+        ranked_df=previous_ranked_df
+        )
 
-                single_dataframe = base_dictionary[key] # this is one dataframe from the channelGroup Dictionary 
-                
-                # add subject_hemisphere column to the dataframe
-                key_split = key.split('_')# list of sub, hem, ses, freq
-                sub_hem =  '_'.join([key_split[0], key_split[1]]) # sub_hem information
+    with open(ranked_long_filepath, "wb") as file:
+        pickle.dump(ranked_df, file)
 
-                session_dict[f"{group}_{key}"] = single_dataframe.assign(subject_hemisphere = sub_hem) # add the column with name subject_hemisphere and the correct value
+    key_split = ranked_df.data_key.str.split("_") # list of sub, hem, ses, freq
+    ranked_df = ranked_df.assign(subject_hemisphere=(key_split.str[0] + "_" + key_split.str[1]).astype(str), key_session=key_split.str[2])
 
-                # e.g. postop_dict["024_Right_postop_beta"] = DF
-                # add this in Ring_permutation_dict["postop"] = 
+    helper_columns = ["channel_group", "data_key", "subject_hemisphere", "key_session"]
 
+    # Dataframes with ranks per channel group and sub_hem_ses_freq key, e.g. Ring_rankDF["024_Right_postop_beta"]
+    rankDF = {group: {} for group in channelGroups}
 
-            # add the complete session dictionary into the channelGroup dictionary
-            Rank_channelGroup_dict[ses] = session_dict # storing all channel Group Dataframes as values from session keys
-    
+    for (group, key), key_df in ranked_df.groupby(["channel_group", "data_key"], sort=False):
+        rankDF[group][key] = key_df.drop(columns=helper_columns)
 
+    Ring_rankDF = rankDF["Ring"]
+    SegmIntra_rankDF = rankDF["SegmIntra"]
+    SegmInter_rankDF = rankDF["SegmInter"]
 
-    ###### FROM Rank_channelGroup_dict CREATE FINAL VERSION OF DATAFRAMES CHANNELGROUP_SESSION ######
-    
+
+    ###### FINAL VERSION OF DATAFRAMES CHANNELGROUP_SESSION, with column subject_hemisphere ######
     ranks_channelGroup_session_dictionary = {}
 
+    group_session_dfs = dict(list(ranked_df.groupby(["channel_group", "key_session"], sort=False)))
+
     for group in channelGroups:
         for ses in sessions:
 
-            # get a ses_dictionary e.g. postop dictionary containing all RankDF: Ring+SegmInter+SegmIntra
-            ses_dictionary = Rank_channelGroup_dict[ses]
+            group_session_df = group_session_dfs.get((group, ses), ranked_df.iloc[0:0])
+            group_session_df = group_session_df.drop(columns=["channel_group", "data_key", "key_session"])
 
-            # only get keys and values from the ses_dictionary if the correct group e.g. Ring is in keys
-            select_dictionary = {key:value for key, value in ses_dictionary.items() if group in key}
-
-            ranks_channelGroup_session_dictionary[f"{group}_{ses}"] = pd.concat(select_dictionary.values(), ignore_index=True)
+            ranks_channelGroup_session_dictionary[f"{group}_{ses}"] = group_session_df.reset_index(drop=True)
 
 
     ### save the Dataframes with pickle 
@@ -289,6 +288,10 @@ def Permutation_BIPranksRingSegmGroups(
         - fu3m - fu18m
         - fu12m - fu18m
 
+    All channel groups and sessions are in one long Dataframe: 
+    the relative PSD is computed with one groupby pass (relative_to_rank1()) and all session pairs with one self-merge
+    STNs with tied highest PSD values have no rank 1.0 channel: their relative PSD is NaN, before this raised an IndexError
+
     
 
     TODO: does Permutation analysis work if I don't have same number of values within each group?
@@ -329,88 +332,42 @@ def Permutation_BIPranksRingSegmGroups(
     data_keys = data.keys()
 
 
-    ##################### RESTRUCTURE DATAFRAMES AND STORE IN DICTIONARY DF_storage #####################
-    DF_storage = {} # this will store single Dataframes stored as values in a dictionary
-    DF_all_in_one = pd.DataFrame() # this will store all Dataframes concatenated together
+    ##################### RESTRUCTURE DATAFRAMES INTO ONE LONG DATAFRAME #####################
+    # helper column storage_key: e.g. "Ring_postop"
+    frames = []
 
-
-    # Permutation test for each channelGroup seperately
     for group in channelGroups:
 
         comb_keys = [i for i in data_keys if group in i] # e.g. ['Ring_postop', 'Ring_fu3m', 'Ring_fu12m', 'Ring_fu18m']
 
+        for group_ses in comb_keys:
+            frames.append(data[group_ses].assign(recording_type=group, storage_key=group_ses))
 
-        for group_ses in comb_keys: # e.g. ['Ring_postop', 'Ring_fu3m', 'Ring_fu12m', 'Ring_fu18m']
-            DF_storage[f"{group_ses}"] = data[group_ses]
-
-
-            #problem with merging!! not all channel names are the same: therefore exchange ch_name each by structure "BIP_03"
-            # rename channels to BIP_xx
-
-            if group == "Ring":
-                channelnames = Ring_channels
-
-            elif group == "SegmIntra":
-                channelnames = SegmIntra_channels
-            
-            elif group == "SegmInter":
-                channelnames = SegmInter_channels
+    long_df = pd.concat(frames, ignore_index=True)
 
-        
-            # rename each channel: make sure the original DF is changed globally!!??
-            for chan in channelnames:
+    # add new column: recording_type as first column
+    long_df.insert(0, "recording_type", long_df.pop("recording_type"))
 
-                # replace the str in column bipolarChannel, if it contains chan e.g. "12"
-                DF_storage[f"{group_ses}"].loc[DF_storage[f"{group_ses}"].bipolarChannel.str.contains(chan), "bipolarChannel"] = f"BIP_{chan}"
+    #problem with merging!! not all channel names are the same: therefore exchange ch_name each by structure "BIP_03"
+    # rename channels to BIP_xx
+    for group, channelnames in [("Ring", Ring_channels), ("SegmIntra", SegmIntra_channels), ("SegmInter", SegmInter_channels)]:
+        for chan in channelnames:
 
+            # replace the str in column bipolarChannel, if it contains chan e.g. "12"
+            rename_rows = (long_df.recording_type == group) & (long_df.bipolarChannel.str.contains(chan))
+            long_df.loc[rename_rows, "bipolarChannel"] = f"BIP_{chan}"
 
-            # add new column "sub_hem_BIPchannel" by aggregating columns
-            DF_storage[f"{group_ses}"]["sub_hem_BIPchannel"] = DF_storage[f"{group_ses}"][['subject_hemisphere', 'bipolarChannel']].agg('_'.join, axis=1)
+    # add new column "sub_hem_BIPchannel" by aggregating columns
+    long_df["sub_hem_BIPchannel"] = long_df["subject_hemisphere"] + "_" + long_df["bipolarChannel"]
 
-            # add new column: recording_type
-            DF_storage[f"{group_ses}"].insert(0, "recording_type", group)
-
-            # drop unnecessary columns
-            DF_storage[f"{group_ses}"].drop(columns=["frequencyBand", "absoluteOrRelativePSD", "subject_hemisphere", "bipolarChannel"], inplace=True)
-
-
-            ################### NORMALIZE PSD TO RANK 1 ###################
-            sub_hem_BIPchannel = [] # stores all values from this column
-            sub_hem_all = [] # stores all sub_hem combinations
-            sub_hem_unique = [] # stores only unique sub_hem combinations
- 
-            
-            # get all values in column "sub_hem_BIPchannel"
-            for idx, row in DF_storage[f"{group_ses}"].iterrows():
-                sub_hem_BIPchannel.append(row["sub_hem_BIPchannel"])
-            
-            # split each string into 4 parts, only extract 0, 1 = sub, hem
-            for c, comb in enumerate(sub_hem_BIPchannel):
-                four_parts_split = comb.split("_")
-
-                sub_hem = "_".join([four_parts_split[0], four_parts_split[1]]) # e.g. 017_Right
-                sub_hem_all.append(sub_hem)
-
-            # now only take unique sub_hem combinations
-            for s_h in sub_hem_all:
-                if s_h not in sub_hem_unique:
-                    sub_hem_unique.append(s_h)
-            
-            # for each unique sub_hem combination - calculate the PSD relative to the ranked 1 beta
-            for s_h_unique in sub_hem_unique:
-
-                df_to_edit = DF_storage[f"{group_ses}"][DF_storage[f"{group_ses}"].sub_hem_BIPchannel.str.contains(s_h_unique)]
-
-                # if rank = 1.0 define averagedPSD value of the same row as beta_rank_1
-                beta_rank_1 = df_to_edit[df_to_edit["rank"] == 1.0] # taking the row containing 1.0 in rank
-                beta_rank_1 = beta_rank_1["averagedPSD"].values[0] # just taking psdAverage of rank 1.0
-                
-                # create a new column and fill the rows by calculating averagedPSD / beta_rank_1
-                df_to_edit_copy = df_to_edit.copy() # somehow copying is needed, otherwise warning
-                df_to_edit_copy["relative_to_rank1"] = df_to_edit_copy.apply(lambda row: row.averagedPSD / beta_rank_1, axis=1) # in each row add to new column psd/beta_rank1
-
-                DF_all_in_one = pd.concat([DF_all_in_one, df_to_edit_copy], ignore_index=True) # all dataframes will be added up together to one big dataframe
+    # drop unnecessary columns, storage_key and subject_hemisphere are kept as helper columns for the relative PSD to rank 1
+    long_df.drop(columns=["frequencyBand", "absoluteOrRelativePSD", "bipolarChannel"], inplace=True)
+    helper_columns = ["storage_key", "subject_hemisphere"]
 
+    ################### NORMALIZE PSD TO RANK 1 ###################
+    # for each channel group, session and subject hemisphere - calculate the PSD relative to the ranked 1 beta: averagedPSD / averagedPSD of rank 1.0
+    DF_all_in_one = relative_to_rank1(long_df, value_column="averagedPSD", partition_columns=helper_columns)
+    DF_all_in_one = DF_all_in_one.drop(columns=helper_columns)
 
     # save DF_all_in_one as pickle
     DF_all_in_one_filepath = os.path.join(results_path, f"BIP_relativePsdToRank1_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
@@ -419,212 +376,61 @@ def Permutation_BIPranksRingSegmGroups(
 
     ##################### MERGE DATAFRAMES TO PAIRED DATAFRAMES AND GET DIFFERENCES OF RANKS/psdAverage/peaks #####################
 
-    # 4 comparisons for each channel group: store all channel groups in comparison dictionary
-    comparisons = ["comparePostop_Postop", "comparePostop_Fu3m", "comparePostop_Fu12m", "comparePostop_Fu18m", 
-                   "compareFu3m_Postop", "compareFu3m_Fu3m", "compareFu3m_Fu12m", "compareFu3m_Fu18m", 
-                   "compareFu12m_Postop", "compareFu12m_Fu3m", "compareFu12m_Fu12m", "compareFu12m_Fu18m",
-                   "compareFu18m_Postop", "compareFu18m_Fu3m", "compareFu18m_Fu12m", "compareFu18m_Fu18m"]
-
-    # dictionaries to store DF of each channel Group
-    comparePostop_Postop = {} # keys: Ring, SegmIntra, SegmInter
-    comparePostop_Fu3m = {}
-    comparePostop_Fu12m = {}
-    comparePostop_Fu18m = {}
-    compareFu3m_Postop = {}
-    compareFu3m_Fu3m = {}
-    compareFu3m_Fu12m = {}
-    compareFu3m_Fu18m = {}
-    compareFu12m_Postop = {}
-    compareFu12m_Fu3m = {}
-    compareFu12m_Fu12m = {}
-    compareFu12m_Fu18m = {}
-    compareFu18m_Postop = {}
-    compareFu18m_Fu3m = {}
-    compareFu18m_Fu12m = {}
-    compareFu18m_Fu18m = {}
-    mean_differenceOfComparison = {}
-
-
-    for group in channelGroups:
-
-        # merge DF postop and fu3m, only keep matching rows in column "sub_hem_BIPchannel"
-        comparePostop_Postop[group] = DF_storage[f"{group}_postop"].merge(DF_storage[f"{group}_postop"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        comparePostop_Fu3m[group] = DF_storage[f"{group}_postop"].merge(DF_storage[f"{group}_fu3m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        comparePostop_Fu12m[group] = DF_storage[f"{group}_postop"].merge(DF_storage[f"{group}_fu12m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        comparePostop_Fu18m[group] = DF_storage[f"{group}_postop"].merge(DF_storage[f"{group}_fu18m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu3m_Postop[group] = DF_storage[f"{group}_fu3m"].merge(DF_storage[f"{group}_postop"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu3m_Fu3m[group] = DF_storage[f"{group}_fu3m"].merge(DF_storage[f"{group}_fu3m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu3m_Fu12m[group] = DF_storage[f"{group}_fu3m"].merge(DF_storage[f"{group}_fu12m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu3m_Fu18m[group] = DF_storage[f"{group}_fu3m"].merge(DF_storage[f"{group}_fu18m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu12m_Postop[group] = DF_storage[f"{group}_fu12m"].merge(DF_storage[f"{group}_postop"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu12m_Fu3m[group] = DF_storage[f"{group}_fu12m"].merge(DF_storage[f"{group}_fu3m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu12m_Fu12m[group] = DF_storage[f"{group}_fu12m"].merge(DF_storage[f"{group}_fu12m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu12m_Fu18m[group] = DF_storage[f"{group}_fu12m"].merge(DF_storage[f"{group}_fu18m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu18m_Postop[group] = DF_storage[f"{group}_fu18m"].merge(DF_storage[f"{group}_postop"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu18m_Fu3m[group] = DF_storage[f"{group}_fu18m"].merge(DF_storage[f"{group}_fu3m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu18m_Fu12m[group] = DF_storage[f"{group}_fu18m"].merge(DF_storage[f"{group}_fu12m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-        compareFu18m_Fu18m[group] = DF_storage[f"{group}_fu18m"].merge(DF_storage[f"{group}_fu18m"], left_on='sub_hem_BIPchannel', right_on='sub_hem_BIPchannel')
-
-
-        # add new column to each DF: Difference_rank_x_y, 
-        # or depending on result: Difference_averagedPSD_x_y or Difference_peak_x_y
-        
-        for c in comparisons:
+    # all session pairs of all channel groups in one self-merge, only keep matching rows in column "sub_hem_BIPchannel" within one channel group
+    # helper columns: storage_session (session of the storage key, e.g. "postop") and channel_group
+    pair_df = long_df.drop(columns=helper_columns)
+    pair_df["storage_session"] = long_df["storage_key"].str.split("_").str[1]
+    pair_df["channel_group"] = pair_df["recording_type"]
 
-            if c == "comparePostop_Postop":
-                comparison_DF = comparePostop_Postop[group]
-            
-            elif c == "comparePostop_Fu3m":
-                comparison_DF = comparePostop_Fu3m[group] 
+    session_pairs_df = pair_df.merge(pair_df, on=["channel_group", "sub_hem_BIPchannel"])
 
-            elif c == "comparePostop_Fu12m":
-                comparison_DF = comparePostop_Fu12m[group] 
-            
-            elif c == "comparePostop_Fu18m":
-                comparison_DF = comparePostop_Fu18m[group] 
-            
-            elif c == "compareFu3m_Postop":
-                comparison_DF = compareFu3m_Postop[group]
-            
-            elif c == "compareFu3m_Fu3m":
-                comparison_DF = compareFu3m_Fu3m[group]
-            
-            elif c == "compareFu3m_Fu12m":
-                comparison_DF = compareFu3m_Fu12m[group]
-            
-            elif c == "compareFu3m_Fu18m":
-                comparison_DF = compareFu3m_Fu18m[group]
-            
-            elif c == "compareFu12m_Postop":
-                comparison_DF = compareFu12m_Postop[group]
-            
-            elif c == "compareFu12m_Fu3m":
-                comparison_DF = compareFu12m_Fu3m[group]
+    # new column calculating difference between ranks (abs only gives absolute values, so no negative values)
+    session_pairs_df['Difference_rank_x_y'] = (session_pairs_df["rank_x"] - session_pairs_df["rank_y"]).abs().astype(float)
 
-            elif c == "compareFu12m_Fu12m":
-                comparison_DF = compareFu12m_Fu12m[group]
-            
-            elif c == "compareFu12m_Fu18m":
-                comparison_DF = compareFu12m_Fu18m[group]
-            
-            elif c == "compareFu18m_Postop":
-                comparison_DF = compareFu18m_Postop[group]
-            
-            elif c == "compareFu18m_Fu3m":
-                comparison_DF = compareFu18m_Fu3m[group]
-            
-            elif c == "compareFu18m_Fu12m":
-                comparison_DF = compareFu18m_Fu12m[group]
-            
-            elif c == "compareFu18m_Fu18m":
-                comparison_DF = compareFu18m_Fu18m[group]
-            
-
-            
-            # new column calculating difference between ranks (abs only gives absolute values, so no negative values)
-            comparison_DF['Difference_rank_x_y']  = (comparison_DF["rank_x"] - comparison_DF["rank_y"]).apply(abs)
+    if result == "psdAverage":
+        session_pairs_df['Difference_psdAverage_x_y'] = (session_pairs_df["averagedPSD_x"] - session_pairs_df["averagedPSD_y"]).abs().astype(float)
+    
+    elif result == "peak":
+        session_pairs_df['Difference_peak5Hz_x_y'] = (session_pairs_df["PEAK_5HzAverage_x"] - session_pairs_df["PEAK_5HzAverage_y"]).abs().astype(float)
 
-            if result == "psdAverage":
-                comparison_DF['Difference_psdAverage_x_y'] = (comparison_DF["averagedPSD_x"] - comparison_DF["averagedPSD_y"]).apply(abs)
-            
-            elif result == "peak":
-                comparison_DF['Difference_peak5Hz_x_y'] = (comparison_DF["PEAK_5HzAverage_x"] - comparison_DF["PEAK_5HzAverage_y"]).apply(abs)
-            
+    pair_columns = ["channel_group", "storage_session_x", "storage_session_y"]
+    session_pair_dfs = dict(list(session_pairs_df.groupby(pair_columns, sort=False)))
+    empty_pair_df = session_pairs_df.iloc[0:0]
 
-            # calculate the mean of each Difference column and store into dictionary
-            mean_differenceOfComparison[f"meanDiff_rank_{group}_{c}"] = comparison_DF['Difference_rank_x_y'].mean()
+    # 16 comparisons for each channel group, e.g. comparisons_storage["comparePostop_Fu3m"] = {"Ring": DF, "SegmIntra": DF, "SegmInter": DF}
+    session_names = {"postop": "Postop", "fu3m": "Fu3m", "fu12m": "Fu12m", "fu18m": "Fu18m"}
+    comparisons_storage = {}
+    mean_differenceOfComparison = {}
 
-            if result == "psdAverage":
-                mean_differenceOfComparison[f"meanDiff_psdAverage_{group}_{c}"] = comparison_DF['Difference_psdAverage_x_y'].mean() 
-            
-            elif result == "peak":
-                mean_differenceOfComparison[f"meanDiff_peak_{group}_{c}"] = comparison_DF['Difference_peak5Hz_x_y'].mean()
-            
+    for group in channelGroups:
+        for session_x in sessions:
+            for session_y in sessions:
 
-    # perform different Permutation tests depending on what difference you choose
-    mean_difference_keys = mean_differenceOfComparison.keys()
-    
-    if difference == "rank":
-        mean_diff_list = [i for i in mean_difference_keys if "rank" in i] # list of 3 channel groups x 3 comparisons (postop-3, 3-12, 12-18)
+                c = f"compare{session_names[session_x]}_{session_names[session_y]}"
 
-    elif difference == "psdAverage":
-        mean_diff_list = [i for i in mean_difference_keys if "psdAverage" in i]
-    
-    elif difference == "peak":
-        mean_diff_list = [i for i in mean_difference_keys if "peak" in i]
-    
+                comparison_DF = session_pair_dfs.get((group, session_x, session_y), empty_pair_df)
+                comparison_DF = comparison_DF.drop(columns=pair_columns).reset_index(drop=True)
 
-    
-    
+                comparisons_storage.setdefault(c, {})[group] = comparison_DF
 
+                # calculate the mean of each Difference column and store into dictionary
+                mean_differenceOfComparison[f"meanDiff_rank_{group}_{c}"] = comparison_DF['Difference_rank_x_y'].mean()
 
+                if result == "psdAverage":
+                    mean_differenceOfComparison[f"meanDiff_psdAverage_{group}_{c}"] = comparison_DF['Difference_psdAverage_x_y'].mean() 
+                
+                elif result == "peak":
+                    mean_differenceOfComparison[f"meanDiff_peak_{group}_{c}"] = comparison_DF['Difference_peak5Hz_x_y'].mean()
 
 
     ## save the Permutation structured Dataframes with pickle 
+    for c, comparison_dict in comparisons_storage.items():
 
-    comparePostop_Postop_filepath = os.path.join(results_path, f"BIPpermutationDF_Postop_Postop_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(comparePostop_Postop_filepath, "wb") as file:
-        pickle.dump(comparePostop_Postop, file)
-    
-    comparePostop_Fu3m_filepath = os.path.join(results_path, f"BIPpermutationDF_Postop_Fu3m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(comparePostop_Fu3m_filepath, "wb") as file:
-        pickle.dump(comparePostop_Fu3m, file)
-    
-    comparePostop_Fu12m_filepath = os.path.join(results_path, f"BIPpermutationDF_Postop_Fu12m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(comparePostop_Fu12m_filepath, "wb") as file:
-        pickle.dump(comparePostop_Fu12m, file)
-    
-    comparePostop_Fu18m_filepath = os.path.join(results_path, f"BIPpermutationDF_Postop_Fu18m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(comparePostop_Fu18m_filepath, "wb") as file:
-        pickle.dump(comparePostop_Fu18m, file)
-    
-    compareFu3m_Postop_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu3m_Postop_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu3m_Postop_filepath, "wb") as file:
-        pickle.dump(compareFu3m_Postop, file)
-    
-    compareFu3m_Fu3m_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu3m_Fu3m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu3m_Fu3m_filepath, "wb") as file:
-        pickle.dump(compareFu3m_Fu3m, file)
-
-    compareFu3m_Fu12m_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu3m_Fu12m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu3m_Fu12m_filepath, "wb") as file:
-        pickle.dump(compareFu3m_Fu12m, file)
-    
-    compareFu3m_Fu18m_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu3m_Fu18m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu3m_Fu18m_filepath, "wb") as file:
-        pickle.dump(compareFu3m_Fu18m, file)
-    
-    compareFu12m_Postop_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu12m_Postop_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu12m_Postop_filepath, "wb") as file:
-        pickle.dump(compareFu12m_Postop, file)
-    
-    compareFu12m_Fu3m_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu12m_Fu3m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu12m_Fu3m_filepath, "wb") as file:
-        pickle.dump(compareFu12m_Fu3m, file)
-    
-    compareFu12m_Fu12m_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu12m_Fu12m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu12m_Fu12m_filepath, "wb") as file:
-        pickle.dump(compareFu12m_Fu12m, file)
+        comparison_name = c.replace("compare", "") # e.g. "Postop_Fu3m"
 
-    compareFu12m_Fu18m_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu12m_Fu18m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu12m_Fu18m_filepath, "wb") as file:
-        pickle.dump(compareFu12m_Fu18m, file)
-    
-    compareFu18m_Postop_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu18m_Postop_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu18m_Postop_filepath, "wb") as file:
-        pickle.dump(compareFu18m_Postop, file)
-    
-    compareFu18m_Fu3m_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu18m_Fu3m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu18m_Fu3m_filepath, "wb") as file:
-        pickle.dump(compareFu18m_Fu3m, file)
-    
-    compareFu18m_Fu12m_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu18m_Fu12m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu18m_Fu12m_filepath, "wb") as file:
-        pickle.dump(compareFu18m_Fu12m, file)
-    
-    compareFu18m_Fu18m_filepath = os.path.join(results_path, f"BIPpermutationDF_Fu18m_Fu18m_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
-    with open(compareFu18m_Fu18m_filepath, "wb") as file:
-        pickle.dump(compareFu18m_Fu18m, file)
+        comparison_filepath = os.path.join(results_path, f"BIPpermutationDF_{comparison_name}_{result}_{freqBand}_{normalization}_{filterSignal}.pickle")
+        with open(comparison_filepath, "wb") as file:
+            pickle.dump(comparison_dict, file)
     
     print("files: ", 
           f"BIP_relativePsdToRank1_{result}_{freqBand}_{normalization}_{filterSignal}.pickle",
@@ -641,12 +447,12 @@ def Permutation_BIPranksRingSegmGroups(
 
     return {
         "DF_all_in_one": DF_all_in_one,
-        "comparePostop_Fu3m": comparePostop_Fu3m,
-        "comparePostop_Fu12m": comparePostop_Fu12m,
-        "comparePostop_Fu18m": comparePostop_Fu18m,
-        "compareFu3m_Fu12m": compareFu3m_Fu12m,
-        "compareFu3m_Fu18m": compareFu3m_Fu18m,
-        "compareFu12m_Fu18m": compareFu12m_Fu18m, 
+        "comparePostop_Fu3m": comparisons_storage["comparePostop_Fu3m"],
+        "comparePostop_Fu12m": comparisons_storage["comparePostop_Fu12m"],
+        "comparePostop_Fu18m": comparisons_storage["comparePostop_Fu18m"],
+        "compareFu3m_Fu12m": comparisons_storage["compareFu3m_Fu12m"],
+        "compareFu3m_Fu18m": comparisons_storage["compareFu3m_Fu18m"],
+        "compareFu12m_Fu18m": comparisons_storage["compareFu12m_Fu18m"], 
         "mean_differenceOfComparison": mean_differenceOfComparison
     }
 
@@ -21,6 +21,8 @@ import seaborn as sns
 ######### PRIVATE PACKAGES #########
 from .. utils import find_folders as find_folders
 from .. utils import loadResults as loadResults
+from . import permutation_engine as permutation_engine
+from .. utils import bootstrap_engine as bootstrap_engine
 
 
 def PermutationTest_BIPchannelGroups(
@@ -28,6 +30,12 @@ def PermutationTest_BIPchannelGroups(
         filterSignal: str,
         normalization: str,
         freqBand: str,
+        n_permutations: int = 1000,
+        rng = None,
+        alternative: str = "less",
+        n_jobs: int = 1,
+        plot_figures: bool = True,
+        show_figures: bool = False,
         ):
     
     """
@@ -43,6 +51,13 @@ def PermutationTest_BIPchannelGroups(
         - filterSignal: str e.g. "band-pass"
         - normalization: str e.g. "rawPsd"
         - freqBand: str e.g. "beta"
+        - n_permutations: int, number of random shuffles e.g. 1000 or 100000
+        - rng: numpy.random.Generator or int seed for reproducible shuffles, None: unseeded
+        - alternative: str "less" (real mean difference smaller than random = stable ranks), "greater" or "two-sided"
+        - n_jobs: int, number of worker processes for the permutation tests of all comparisons and channel groups
+            1: one after the other, >1: in parallel in a process pool, -1: one worker process per CPU core
+        - plot_figures: bool, if True the permutation histograms are plotted and saved after all tests are done
+        - show_figures: bool, if True plt.show() for each figure, otherwise figures are only saved and closed (headless)
     
     1) Load the comparison dataframes: e.g. BIPpermutationDF_Fu12m_Fu18m_psdAverage_beta_rawPsd_band-pass.pickle
 
@@ -55,10 +70,11 @@ def PermutationTest_BIPchannelGroups(
         and for each group ("Ring", "SegmInter", "SegmIntra")
         calculate the MEAN difference of ranks over all STNs
     
-    3) loop over each STN and shuffle ranks from session x and session y
-        - number of shuffle = 1000
+    3) shuffle ranks from session x and session y within each STN (permutation_engine.permutation_test_mean_abs_differences())
+        - number of shuffle = n_permutations, all shuffles are computed at once on padded per-STN arrays
+        - the tests of all comparisons and channel groups are independent: run in parallel if n_jobs > 1 (permutation_engine.permutation_tests())
         - calculate the absolute difference between ranks for each BIP recording
-        - calculate the MEAN of abs differences for each shuffle and store in a list difference_random_MEANranks
+        - calculate the MEAN of abs differences for each shuffle: array difference_random_MEANranks
     
     4) Statistics:
         calculate the distance of the REAL mean from the mean of all randomized means divided by the standard deviation
@@ -67,16 +83,22 @@ def PermutationTest_BIPchannelGroups(
         calculate the p-value 
         - (pval = 2-2*norm.cdf(abs(distanceMeanReal_MeanRandom)) # zweiseitige Berechnung)
         - pval = 1-norm.cdf(abs(distanceMeanReal_MeanRandom)) # einseitige Berechnung: wieviele Standardabweichungen der Real Mean vom randomized Mean entfernt ist
+
+        calculate the empirical p-value
+        - Ring and SegmInter (3 channels per STN): exact, all possible shuffles within STNs
+        - SegmIntra: (b+1)/(m+1), b = number of shuffles at least as extreme as the real mean, m = n_permutations
     
         
     5) Plot the distribution of the permutated MEAN values (should be normally distributed)
         - mark a red line for the REAL MEAN
         - annotation with the p value
         - one figure for each comparison: 3 subplots for 3 channel groups
+        - only if plot_figures, after all permutation tests are done
     
     6) save a Dataframe with statistics results
         - "Permutation_BIP_{data2permute}_{freqBand}_{normalization}_{filterSignal}.pickle"
-        - columns: comparison, channelGroup, MEAN_differenceOfRanks, distanceMEANreal_MEANrandom, p-value
+        - columns: comparison, channelGroup, MEAN_differenceOfRanks, distanceMEANreal_MEANrandom, p-value, 
+            p-value_empirical, p-value_method, n_permutations
     
 
     """
@@ -84,6 +106,9 @@ def PermutationTest_BIPchannelGroups(
     results_path = find_folders.get_local_path(folder="GroupResults")
     figures_path = find_folders.get_local_path(folder="GroupFigures")
 
+    # one random generator for all shuffles, seeded for reproducible results
+    rng = np.random.default_rng(rng)
+
     # comparisons for each channel group
     # comparisons = ["Postop_Fu3m", "Fu3m_Fu12m", "Fu12m_Fu18m", "Postop_Fu12m", "Postop_Fu18m", "Fu3m_Fu18m"]
     
@@ -107,132 +132,127 @@ def PermutationTest_BIPchannelGroups(
         filterSignal=filterSignal
     )
 
-    fontdict = {"size": 25}
-
-    # store 
-    Permutation_BIP = {}
+    ################# INPUT OF ALL PERMUTATION TESTS #################
+    # one test per comparison and channel group, all tests are independent
+    permutation_inputs = {}
 
     for comp in comparisons:
-        
-        # Figure Layout per comparison: 3 rows (Ring, SegmIntra, SegmInter), 1 column
-        fig, axes = plt.subplots(3,1,figsize=(10,15)) 
-
-        for g, group in enumerate(channelGroups):
+        for group in channelGroups:
 
             comp_group_DF = BIPcomparison_data[comp][group]
 
-            # calculate the mean of a difference of ranks
-            mean_difference = comp_group_DF["Difference_rank_x_y"].mean()
-            
-            ################# CREATE RANDOMLY SHUFFLED ARRAYS OF RANK-X AND RANK-Y #################
+            # shuffle within STNs!! STN of each row e.g. "024_Right" from "024_Right_12"
+            STN_of_rows = ["_".join(STN_channel.split("_")[:2]) for STN_channel in comp_group_DF["sub_hem_BIPchannel"].values]
 
-            # list of mean differences between shuffled rank_x and rank_y
-            difference_random_MEANranks = []
+            permutation_inputs[(comp, group)] = {
+                "values_x": comp_group_DF.rank_x.values,
+                "values_y": comp_group_DF.rank_y.values,
+                "groups": STN_of_rows,
+                "observed": comp_group_DF["Difference_rank_x_y"].mean(), # mean of a difference of ranks
+                "n_permutations": n_permutations,
+                "average": "all_rows",
+                "alternative": alternative,
+            }
 
-            # shuffle within STNs!! first get unique list of all STNs within the dataframe
-            STN_channel_list = list(comp_group_DF["sub_hem_BIPchannel"].unique())
-            STN_list = [] # list of unique STNs
-            STN_data = {} # Dataframes of each unique STN
+    ################# SHUFFLE RANK-X AND RANK-Y WITHIN EACH STN #################
+    # mean of abs differences between shuffled rank_x and rank_y over all BIP recordings, for each shuffle
+    permutation_results = permutation_engine.permutation_tests(permutation_inputs, n_jobs=n_jobs, rng=rng)
 
-            for STN_channel in STN_channel_list:
-                split = STN_channel.split("_")
-                STN = "_".join([split[0], split[1]]) # e.g. "024_Right"
-                STN_list.append(STN)
-
-            STN_list = list(set(STN_list)) # set() gets the unique values from a list
-            STN_list.sort() # sorts the strings 
-
-            # shuffle repetitions: 1000 times
-            numberOfShuffle = np.arange(1, 1001, 1)
+    # store 
+    Permutation_BIP = {}
 
-            # repeat shuffle 1000 times
-            for s, shuffle in enumerate(numberOfShuffle):
-                difference_random_STN_ranks = [] # list with all differences, will contain lists, so later on need to merge lists to one list
+    for (comp, group), permutation_test in permutation_results.items():
 
-                for STN in STN_list:
-                    all_STNs = comp_group_DF.copy()
-                    STN_data = all_STNs.loc[(all_STNs["sub_hem_BIPchannel"].str.contains(STN))] # Dataframe only of one STN
+        # real mean of a difference of ranks
+        mean_difference = permutation_test["observed"]
 
-                    rank_x = list(STN_data.rank_x.values)
-                    rank_y = list(STN_data.rank_y.values)
+        # distance of the real mean from the mean of all randomized means divided by the standard deviation
+        distanceMeanReal_MeanRandom = permutation_test["z_score"]
 
-                    # shuffle within one STN
-                    np.random.shuffle(rank_x)
-                    np.random.shuffle(rank_y)
+        # p-value of the normal approximation: 1-norm.cdf(abs(distanceMeanReal_MeanRandom))
+        pval = permutation_test["p_value_z"]
 
-                    # calculate the difference between random rank_x and rank_y, store in list
-                    difference_random_STN_ranks.append(list(abs(np.array(rank_x) - np.array(rank_y))))
+        # empirical p-value: exact or (b+1)/(m+1)
+        pval_empirical = permutation_test["p_value"]
 
-                # one merged list with all differences of one shuffle
-                difference_random_STN_ranks = list(itertools.chain.from_iterable(difference_random_STN_ranks)) 
+        # store all values in dictionary
+        Permutation_BIP[f"{comp}_{group}"] = [comp, group, mean_difference, distanceMeanReal_MeanRandom, "{:.15f}".format(pval),
+                                              "{:.15f}".format(pval_empirical), permutation_test["method"], permutation_test["n_permutations"]]
 
-                # store the MEAN of differences of one shuffle in list
-                difference_random_MEANranks.append(np.mean(difference_random_STN_ranks))
+    ################# PLOT #################
+    fontdict = {"size": 25}
 
+    if plot_figures:
 
-            # calculate the distance of the real mean from the mean of all randomized means divided by the standard deviation
-            distanceMeanReal_MeanRandom = (mean_difference - np.mean(difference_random_MEANranks)) / np.std(difference_random_MEANranks)
+        for comp in comparisons:
+        
+            # Figure Layout per comparison: 3 rows (Ring, SegmIntra, SegmInter), 1 column
+            fig, axes = plt.subplots(3,1,figsize=(10,15)) 
 
-            # calculate the p-value 
-            # pval = 2-2*norm.cdf(abs(distanceMeanReal_MeanRandom)) # zweiseitige Berechnung
-            pval = 1-norm.cdf(abs(distanceMeanReal_MeanRandom)) # einseitige Berechnung: wieviele Standardabweichungen der Real Mean vom randomized Mean entfernt ist
-            
+            for g, group in enumerate(channelGroups):
 
-            # store all values in dictionary
-            Permutation_BIP[f"{comp}_{group}"] = [comp, group, mean_difference, distanceMeanReal_MeanRandom, "{:.15f}".format(pval)]
-        
+                permutation_test = permutation_results[(comp, group)]
 
+                mean_difference = permutation_test["observed"]
+                difference_random_MEANranks = permutation_test["null_distribution"]
+                pval = permutation_test["p_value_z"]
+                pval_empirical = permutation_test["p_value"]
 
-            # plot the distribution of randomized difference MEAN values
-            # axes[g].hist(difference_random_ranks,bins=100)
+                # plot the distribution of randomized difference MEAN values
+                # axes[g].hist(difference_random_ranks,bins=100)
 
-            # make the normal distribution fit of the data
-            # mu, std = norm.fit(difference_random_ranks)
-            # xmin, xmax = plt.xlim()
-            # x = np.linspace(xmin,xmax,100)
-            # p = norm.pdf(x, mu, std)
-            # axes[g].plot(x, p, 'b', linewidth= 2)
+                # make the normal distribution fit of the data
+                # mu, std = norm.fit(difference_random_ranks)
+                # xmin, xmax = plt.xlim()
+                # x = np.linspace(xmin,xmax,100)
+                # p = norm.pdf(x, mu, std)
+                # axes[g].plot(x, p, 'b', linewidth= 2)
 
-            sns.histplot(difference_random_MEANranks, color="tab:blue", ax=axes[g], stat="count", element="bars", label="1000 Permutation repetitions", kde=True, bins=30, fill=True)
+                sns.histplot(difference_random_MEANranks, color="tab:blue", ax=axes[g], stat="count", element="bars", label=f"{n_permutations} Permutation repetitions", kde=True, bins=30, fill=True)
 
-            # mark with red line: real mean of the rank differences of comp_group_DF
-            axes[g].axvline(mean_difference, c="r")
-            axes[g].text(mean_difference +0.02, 50, 
-             "Mean difference between \nranks of both sessions \n\n p-value: {:.2f}".format(pval),
-             c="r", fontsize=15)
+                # mark with red line: real mean of the rank differences of comp_group_DF
+                axes[g].axvline(mean_difference, c="r")
+                axes[g].text(mean_difference +0.02, 50, 
+                 "Mean difference between \nranks of both sessions \n\n p-value: {:.2f} \n empirical p-value: {:.3f}".format(pval, pval_empirical),
+                 c="r", fontsize=15)
 
-            axes[g].set_title(f"{group} channels", fontdict=fontdict)
+                axes[g].set_title(f"{group} channels", fontdict=fontdict)
 
-        for ax in axes:
+            for ax in axes:
 
-            ax.set_xlabel(f"MEAN Difference between {freqBand} ranks", fontsize=25)
-            ax.set_ylabel("Count", fontsize=25)
-            #ax.legend(loc="upper right", bbox_to_anchor=(1.5, 1.0), fontsize=15)
+                ax.set_xlabel(f"MEAN Difference between {freqBand} ranks", fontsize=25)
+                ax.set_ylabel("Count", fontsize=25)
+                #ax.legend(loc="upper right", bbox_to_anchor=(1.5, 1.0), fontsize=15)
             
-            # if group == "Ring":
-            #     ax.set_xlim(0,1.3)
+                # if group == "Ring":
+                #     ax.set_xlim(0,1.3)
             
-            # elif group == "SegmInter":
-            #     ax.set_xlim(0,1.3)
+                # elif group == "SegmInter":
+                #     ax.set_xlim(0,1.3)
             
-            # elif group =="SegmIntra":
-            #     ax.set_xlim(0, 2.6)
+                # elif group =="SegmIntra":
+                #     ax.set_xlim(0, 2.6)
 
 
-            ax.tick_params(axis="x", labelsize=25)
-            ax.tick_params(axis="y", labelsize=25)
+                ax.tick_params(axis="x", labelsize=25)
+                ax.tick_params(axis="y", labelsize=25)
         
-        fig.suptitle(f"Permutation analysis: {comp} comparisons", fontsize=30)
-        fig.subplots_adjust(wspace=0, hspace=0)
-        fig.tight_layout()
-        plt.show()
+            fig.suptitle(f"Permutation analysis: {comp} comparisons", fontsize=30)
+            fig.subplots_adjust(wspace=0, hspace=0)
+            fig.tight_layout()
+
+            fig.savefig(os.path.join(figures_path, f"PermutationAnalysis_BIP_{comp}_{data2permute}_{freqBand}_{normalization}_{filterSignal}.png"))
 
-        fig.savefig(os.path.join(figures_path, f"PermutationAnalysis_BIP_{comp}_{data2permute}_{freqBand}_{normalization}_{filterSignal}.png"))
+            if show_figures:
+                plt.show()
+
+            plt.close(fig)
 
 
     # Permutation_BIP transform from dictionary to Dataframe
     Permutation_BIP_DF = pd.DataFrame(Permutation_BIP)
-    Permutation_BIP_DF.rename(index={0: "comparison", 1: "channelGroup", 2: "MEAN_differenceOfRanks", 3: "distanceMEANreal_MEANrandom", 4: "p-value"}, inplace=True)
+    Permutation_BIP_DF.rename(index={0: "comparison", 1: "channelGroup", 2: "MEAN_differenceOfRanks", 3: "distanceMEANreal_MEANrandom", 4: "p-value", 
+                                     5: "p-value_empirical", 6: "p-value_method", 7: "n_permutations"}, inplace=True)
     Permutation_BIP_DF = Permutation_BIP_DF.transpose()
 
     ## save the Permutation Dataframes with pickle 
@@ -250,6 +270,60 @@ def PermutationTest_BIPchannelGroups(
     
 
 
+def PermutationTest_BIPchannelGroups_sweep(
+        data2permute: str,
+        filterSignals: list,
+        normalizations: list,
+        freqBands: list,
+        n_permutations: int = 1000,
+        rng = None,
+        alternative: str = "less",
+        n_jobs: int = 1,
+        plot_figures: bool = False,
+        ):
+    
+    """
+    Run PermutationTest_BIPchannelGroups() for all combinations of filters, normalizations and frequency bands,
+    headless by default e.g. on a compute node.
+
+    Input: 
+        - data2permute: str e.g. "psdAverage"
+        - filterSignals: list e.g. ["band-pass", "unfiltered"]
+        - normalizations: list e.g. ["rawPsd", "normPsdToTotalSum", "normPsdToSum1_100Hz", "normPsdToSum40_90Hz"]
+        - freqBands: list e.g. ["beta", "lowBeta", "highBeta"]
+        - n_permutations, alternative, n_jobs, plot_figures: see PermutationTest_BIPchannelGroups()
+        - rng: numpy.random.Generator or int seed, one generator for the whole sweep
+
+    Each combination writes its own "Permutation_BIP_{data2permute}_{freqBand}_{normalization}_{filterSignal}.pickle"
+
+    return {(filterSignal, normalization, freqBand): Permutation_BIP_DF}
+    """
+
+    rng = np.random.default_rng(rng)
+
+    sweep_results = {}
+
+    for filterSignal in filterSignals:
+        for normalization in normalizations:
+            for freqBand in freqBands:
+
+                sweep_results[(filterSignal, normalization, freqBand)] = PermutationTest_BIPchannelGroups(
+                    data2permute=data2permute,
+                    filterSignal=filterSignal,
+                    normalization=normalization,
+                    freqBand=freqBand,
+                    n_permutations=n_permutations,
+                    rng=rng,
+                    alternative=alternative,
+                    n_jobs=n_jobs,
+                    plot_figures=plot_figures,
+                    show_figures=False,
+                )
+
+    return sweep_results
+
+
+
 def heatmap_distances_to_permutated_mean(
         data2permute:str,
         filterSignal:str,
@@ -352,6 +426,12 @@ def heatmap_distances_to_permutated_mean(
 
 def permutation_fooof_beta_ranks(
         fooof_spectrum:str,
+        n_permutations:int = 1000,
+        rng = None,
+        alternative:str = "less",
+        n_jobs:int = 1,
+        plot_figures:bool = True,
+        show_figures:bool = False,
         ):
     
     """
@@ -366,6 +446,13 @@ def permutation_fooof_beta_ranks(
             "periodic_spectrum"         -> 10**(model._peak_fit + model._ap_fit) - (10**model._ap_fit)
             "periodic_plus_aperiodic"   -> model._peak_fit + model._ap_fit (log(Power))
             "periodic_flat"             -> model._peak_fit
+        - n_permutations: int, number of random shuffles e.g. 1000 or 100000
+        - rng: numpy.random.Generator or int seed for reproducible shuffles, None: unseeded
+        - alternative: str "less" (real mean difference smaller than random = stable ranks), "greater" or "two-sided"
+        - n_jobs: int, number of worker processes for the permutation tests of all comparisons and channel groups
+            1: one after the other, >1: in parallel in a process pool, -1: one worker process per CPU core
+        - plot_figures: bool, if True the permutation histograms are plotted and saved after all tests are done
+        - show_figures: bool, if True plt.show() for each figure, otherwise figures are only saved and closed (headless)
 
     
     1) Load the fooof beta rank dataframes: e.g. beta_ranks_all_channels_fooof_periodic_spectrum.pickle
@@ -381,10 +468,11 @@ def permutation_fooof_beta_ranks(
         - per STN:  calculate the MEAN difference of ranks 
         - get average of all STN MEAN differences of ranks
     
-    3) loop over each STN and shuffle ranks from session x and session y
-        - number of shuffle = 1000
+    3) shuffle ranks from session x and session y within each STN (permutation_engine.permutation_test_mean_abs_differences())
+        - number of shuffle = n_permutations
         - calculate the absolute difference between ranks for each BIP recording
-        - calculate the MEAN of abs differences for each shuffle and store in a list difference_random_MEANranks
+        - calculate the MEAN of abs differences per STN and the MEAN of all STNs for each shuffle
+        - the tests of all comparisons and channel groups are independent: run in parallel if n_jobs > 1 (permutation_engine.permutation_tests())
     
     4) Statistics:
         calculate the distance of the REAL mean from the mean of all randomized means divided by the standard deviation
@@ -393,16 +481,22 @@ def permutation_fooof_beta_ranks(
         calculate the p-value 
         - (pval = 2-2*norm.cdf(abs(distanceMeanReal_MeanRandom)) # zweiseitige Berechnung)
         - pval = 1-norm.cdf(abs(distanceMeanReal_MeanRandom)) # einseitige Berechnung: wieviele Standardabweichungen der Real Mean vom randomized Mean entfernt ist
+
+        calculate the empirical p-value
+        - ring and segm_inter (3 channels per STN): exact, all possible shuffles within STNs
+        - segm_intra: (b+1)/(m+1), b = number of shuffles at least as extreme as the real mean, m = n_permutations
     
         
     5) Plot the distribution of the permutated MEAN values (should be normally distributed)
         - mark a red line for the REAL MEAN
         - annotation with the p value
         - one figure for each comparison: 3 subplots for 3 channel groups
+        - only if plot_figures, after all permutation tests are done
     
     6) save a Dataframe with statistics results
         - "Permutation_BIP_{data2permute}_{freqBand}_{normalization}_{filterSignal}.pickle"
-        - columns: comparison, channelGroup, MEAN_differenceOfRanks, distanceMEANreal_MEANrandom, p-value
+        - columns: comparison, channel_group, sample_size_stn, standard_deviation_real_different_ranks, mean_real_different_ranks,
+            distance_real_vs_random_mean_different_ranks, p-value, sample_size_random_shuffles, p-value_empirical, p-value_method
     
 
     """
@@ -410,6 +504,9 @@ def permutation_fooof_beta_ranks(
     results_path = find_folders.get_local_path(folder="GroupResults")
     figures_path = find_folders.get_local_path(folder="GroupFigures")
 
+    # one random generator for all shuffles, seeded for reproducible results
+    rng = np.random.default_rng(rng)
+
     # load FOOOF beta rank DF
     beta_rank_DF = loadResults.load_fooof_beta_ranks(
         fooof_spectrum=fooof_spectrum,
@@ -489,109 +586,112 @@ def permutation_fooof_beta_ranks(
     # 1) get the mean first of all channels within one STN and then across STNs
     # 2) permute within STNs, get mean within STNs and then across permuted STNs
 
-    permutation_fooof_beta_ranks = {}
-
-    # shuffle repetitions: 1000 times
-    number_of_shuffle = np.arange(1, 1001, 1)
-    fontdict = {"size": 25}
+    permutation_inputs = {}
+    real_stn_statistics = {}
 
     for comp in compare_sessions:
-        
-        # Figure Layout per comparison: 3 rows (Ring, SegmIntra, SegmInter), 1 column
-        fig, axes = plt.subplots(3,1,figsize=(10,15)) 
-
-        for g, group in enumerate(channel_groups):
+        for group in channel_groups:
 
             # Dataframe of one comparison and one channel group
             comp_group_DF = comparisons_storage[f"{group}_{comp}"]
 
-            # list of available STNs
-            stn_list = list(comp_group_DF["subject_hemisphere_x"].unique())
+            # mean of differences per stn
+            stn_real_mean_differences = comp_group_DF.groupby("subject_hemisphere_x").abs_difference_ranks.mean().values
+            
+            # real mean of all stns, sample size = number of STNs in one session comparison 
+            real_stn_statistics[(comp, group)] = {
+                "mean": np.mean(stn_real_mean_differences),
+                "std": np.std(stn_real_mean_differences),
+                "sample_size": len(stn_real_mean_differences),
+            }
+
+            # n_permutations x mean differences between shuffled rank_x and rank_y: mean per STN first, then mean of all STNs
+            permutation_inputs[(comp, group)] = {
+                "values_x": comp_group_DF.beta_rank_x.values,
+                "values_y": comp_group_DF.beta_rank_y.values,
+                "groups": comp_group_DF.subject_hemisphere_x.values,
+                "observed": real_stn_statistics[(comp, group)]["mean"],
+                "n_permutations": n_permutations,
+                "average": "group_means",
+                "alternative": alternative,
+            }
+
+    ############ SHUFFLE ############
+    permutation_results = permutation_engine.permutation_tests(permutation_inputs, n_jobs=n_jobs, rng=rng)
 
-            # list with all mean differences per comparison and channel group
-            stn_real_mean_differences = []
+    permutation_fooof_beta_ranks = {}
 
-            for stn in stn_list:
+    for (comp, group), permutation_test in permutation_results.items():
 
-                # store the mean of differences per stn
-                stn_real_mean = np.mean(comp_group_DF.abs_difference_ranks.values)
-                stn_real_mean_differences.append(stn_real_mean)
-            
-            # real mean of all stns
-            mean_comp_group = np.mean(stn_real_mean_differences)
-            std_comp_group = np.std(stn_real_mean_differences)
-            sample_size = len(stn_real_mean_differences) # number of STNs in one session comparison 
-            
-
-            ############ SHUFFLE ############
-            # list of 1000x mean differences between shuffled rank_x and rank_y
-            all_shuffled_mean_differences = []
+        mean_comp_group = real_stn_statistics[(comp, group)]["mean"]
+        std_comp_group = real_stn_statistics[(comp, group)]["std"]
+        sample_size = real_stn_statistics[(comp, group)]["sample_size"]
+    
+        ############ CALCULATE DISTANCE AND P-VAL OF REAL MEAN FROM MEAN OF ALL RANDOMIZED MEANS  ############
+        distance_real_vs_random_mean = permutation_test["z_score"]
 
-            # repeat shuffle 1000 times
-            for s, shuffle in enumerate(number_of_shuffle):
-                # will contain mean differences per stn of one shuffles, so later on need to merge lists to one list
-                difference_random_stn_mean_ranks = [] 
+        # p-value of the normal approximation: 1-norm.cdf(abs(distance_real_vs_random_mean))
+        pval = permutation_test["p_value_z"]
 
-                for STN in stn_list:
+        # empirical p-value: exact or (b+1)/(m+1)
+        pval_empirical = permutation_test["p_value"]
+        
+        sample_size_shuffled = permutation_test["n_permutations"]
 
-                    stn_data = comp_group_DF.loc[comp_group_DF.subject_hemisphere_x == STN]
+        # store all values in dictionary
+        permutation_fooof_beta_ranks[f"{comp}_{group}"] = [comp, group, sample_size, std_comp_group, mean_comp_group, distance_real_vs_random_mean, "{:.15f}".format(pval), sample_size_shuffled,
+                                                           "{:.15f}".format(pval_empirical), permutation_test["method"]]
+        
 
-                    rank_x = list(stn_data.beta_rank_x.values)
-                    rank_y = list(stn_data.beta_rank_y.values)
+    ############ PLOT ############
+    fontdict = {"size": 25}
 
-                    # shuffle within one STN
-                    np.random.shuffle(rank_x)
-                    np.random.shuffle(rank_y)
+    if plot_figures:
 
-                    # calculate the difference between random rank_x and rank_y, store in list
-                    difference_random_STN_ranks = list(abs(np.array(rank_x) - np.array(rank_y)))
+        for comp in compare_sessions:
+            
+            # Figure Layout per comparison: 3 rows (Ring, SegmIntra, SegmInter), 1 column
+            fig, axes = plt.subplots(3,1,figsize=(10,15)) 
 
-                    # get mean of differences of one stn
-                    difference_random_stn_mean_ranks.append(np.mean(difference_random_STN_ranks))
+            for g, group in enumerate(channel_groups):
 
-                # store the MEANs of differences of one shuffle in list
-                all_shuffled_mean_differences.append(np.mean(difference_random_stn_mean_ranks))
+                permutation_test = permutation_results[(comp, group)]
 
-        
-            ############ CALCULATE DISTANCE AND P-VAL OF REAL MEAN FROM MEAN OF ALL RANDOMIZED MEANS  ############
-            distance_real_vs_random_mean = (mean_comp_group - np.mean(all_shuffled_mean_differences)) / np.std(all_shuffled_mean_differences)
+                mean_comp_group = permutation_test["observed"]
+                all_shuffled_mean_differences = permutation_test["null_distribution"]
+                pval = permutation_test["p_value_z"]
+                pval_empirical = permutation_test["p_value"]
 
-            # calculate the p-value 
-            # pval = 2-2*norm.cdf(abs(distanceMeanReal_MeanRandom)) # zweiseitige Berechnung
-            pval = 1-norm.cdf(abs(distance_real_vs_random_mean)) # einseitige Berechnung: wieviele Standardabweichungen der Real Mean vom randomized Mean entfernt ist
-            
-            sample_size_shuffled = len(all_shuffled_mean_differences)
+                sns.histplot(all_shuffled_mean_differences, color="tab:blue", ax=axes[g], stat="count", element="bars", label=f"{n_permutations} Permutation repetitions", kde=True, bins=30, fill=True)
 
-            # store all values in dictionary
-            permutation_fooof_beta_ranks[f"{comp}_{group}"] = [comp, group, sample_size, std_comp_group, mean_comp_group, distance_real_vs_random_mean, "{:.15f}".format(pval), sample_size_shuffled]
-            
+                # mark with red line: real mean of the rank differences of comp_group_DF
+                axes[g].axvline(mean_comp_group, c="r", linewidth=3)
+                axes[g].text(mean_comp_group +0.02, 50, 
+                    "real mean \nof beta rank difference \n\n p-value: {:.3f} \n empirical p-value: {:.3f}".format(pval, pval_empirical),
+                    c="k", fontsize=20)
 
-            ############ PLOT ############
-            sns.histplot(all_shuffled_mean_differences, color="tab:blue", ax=axes[g], stat="count", element="bars", label="1000 Permutation repetitions", kde=True, bins=30, fill=True)
+                axes[g].set_title(f"{group} channel group", fontdict=fontdict)
 
-            # mark with red line: real mean of the rank differences of comp_group_DF
-            axes[g].axvline(mean_comp_group, c="r", linewidth=3)
-            axes[g].text(mean_comp_group +0.02, 50, 
-                "real mean \nof beta rank difference \n\n p-value: {:.3f}".format(pval),
-                c="k", fontsize=20)
+            for ax in axes:
 
-            axes[g].set_title(f"{group} channel group", fontdict=fontdict)
+                ax.set_xlabel(f"Mean difference between beta ranks", fontsize=25)
+                ax.set_ylabel("Count", fontsize=25)
 
-        for ax in axes:
+                ax.tick_params(axis="x", labelsize=25)
+                ax.tick_params(axis="y", labelsize=25)
+                ax.grid(False)
 
-            ax.set_xlabel(f"Mean difference between beta ranks", fontsize=25)
-            ax.set_ylabel("Count", fontsize=25)
+            fig.suptitle(f"Permutation analysis of beta ranks: {comp} session comparison", fontsize=30)
+            fig.subplots_adjust(wspace=0, hspace=0)
+            fig.tight_layout()
 
-            ax.tick_params(axis="x", labelsize=25)
-            ax.tick_params(axis="y", labelsize=25)
-            ax.grid(False)
+            fig.savefig(os.path.join(figures_path, f"permutation_beta_ranks_fooof_spectra_{comp}.png"), bbox_inches="tight")
+            fig.savefig(os.path.join(figures_path, f"permutation_beta_ranks_fooof_spectra_{comp}.svg"), bbox_inches="tight", format="svg")
 
-        fig.suptitle(f"Permutation analysis of beta ranks: {comp} session comparison", fontsize=30)
-        fig.subplots_adjust(wspace=0, hspace=0)
-        fig.tight_layout()
+            if show_figures:
+                plt.show()
 
-        fig.savefig(os.path.join(figures_path, f"permutation_beta_ranks_fooof_spectra_{comp}.png"), bbox_inches="tight")
-        fig.savefig(os.path.join(figures_path, f"permutation_beta_ranks_fooof_spectra_{comp}.svg"), bbox_inches="tight", format="svg")
+            plt.close(fig)
 
         
     # Permutation_BIP transform from dictionary to Dataframe
@@ -604,7 +704,9 @@ def permutation_fooof_beta_ranks(
         4: "mean_real_different_ranks",
         5: "distance_real_vs_random_mean_different_ranks",
         6: "p-value",
-        7: "sample_size_random_shuffles"
+        7: "sample_size_random_shuffles",
+        8: "p-value_empirical",
+        9: "p-value_method"
         }, 
         inplace=True)
     permutation_result_df = permutation_result_df.transpose()
@@ -1054,7 +1156,11 @@ def fooof_beta_write_session_comparison_df(
 def fooof_bip_channel_groups_beta_spearman(
         fooof_spectrum:str,
         spearman_mean_or_median:str,
-        all_groups_together:str
+        all_groups_together:str,
+        n_resamples:int = 10000,
+        confidence:float = 0.95,
+        rng = None,
+        n_jobs:int = 1
         ):
     
     """
@@ -1065,14 +1171,18 @@ def fooof_bip_channel_groups_beta_spearman(
         - spearman_mean_or_median: "mean", "median",
         - all_groups_together: "yes" or "no"    -> "yes" will calculate the beta correlation of all LFPs of each subject 
                                                 -> "no" will calculate the beta correlation of each LFP group seperately of each subject
+        - n_resamples: int, number of bootstrap resamples of the STNs, e.g. 10000
+        - confidence: float, e.g. 0.95
+        - rng: None or int seed of the bootstrap
+        - n_jobs: int, number of worker processes for the bootstrap, -1: one per CPU core
 
     From the above function load the comparison_storage dictionary
     fooof_beta_write_session_comparison_df()
 
         - keys of the dictionary: "ring_fu3m_fu12m" for each channel group and session comparison
-    
-    
-    
+
+    Bootstrap confidence intervals (resampling STNs) of the mean and median spearman r and pval
+    are added as columns f"{column}_ci_low", f"{column}_ci_high" of the spearman_result_df
     
     """
 
@@ -1097,6 +1207,7 @@ def fooof_bip_channel_groups_beta_spearman(
 
     fooof_beta_spearman = {}
     single_hemisphere_fooof_beta_spearman = {}
+    bootstrap_inputs = {}
 
     fontdict = {"size": 25}
 
@@ -1158,6 +1269,11 @@ def fooof_bip_channel_groups_beta_spearman(
             
 
             # store all values in dictionary
+            # spearman r and pval of each STN for the bootstrap of the mean and median
+            stn_spearman_values = np.column_stack([spearman_r_list, spearman_pval_list])
+            bootstrap_inputs[(f"{comp}_{group_name}", "mean")] = {"stn_values": stn_spearman_values, "statistic": "mean"}
+            bootstrap_inputs[(f"{comp}_{group_name}", "median")] = {"stn_values": stn_spearman_values, "statistic": "median"}
+
             fooof_beta_spearman[f"{comp}_{group_name}"] = [comp, group_name, sample_size_spearman, 
                                                     std_spearman_comp_group, mean_spearman_comp_group, median_spearman_comp_group,
                                                     std_pval_comp_group, mean_pval_comp_group, median_pval_comp_group]
@@ -1210,6 +1326,11 @@ def fooof_bip_channel_groups_beta_spearman(
                 
 
                 # store all values in dictionary
+                # spearman r and pval of each STN for the bootstrap of the mean and median
+                stn_spearman_values = np.column_stack([spearman_r_list, spearman_pval_list])
+                bootstrap_inputs[(f"{comp}_{group}", "mean")] = {"stn_values": stn_spearman_values, "statistic": "mean"}
+                bootstrap_inputs[(f"{comp}_{group}", "median")] = {"stn_values": stn_spearman_values, "statistic": "median"}
+
                 fooof_beta_spearman[f"{comp}_{group}"] = [comp, group, sample_size_spearman, 
                                                         std_spearman_comp_group, mean_spearman_comp_group, median_spearman_comp_group,
                                                         std_pval_comp_group, mean_pval_comp_group, median_pval_comp_group]
@@ -1262,6 +1383,20 @@ def fooof_bip_channel_groups_beta_spearman(
         inplace=True)
     spearman_result_df = spearman_result_df.transpose()
 
+    # bootstrap confidence intervals of the mean and median across STNs
+    bootstrap_results = bootstrap_engine.bootstrap_cis(
+        bootstrap_inputs=bootstrap_inputs,
+        n_resamples=n_resamples,
+        confidence=confidence,
+        rng=rng,
+        n_jobs=n_jobs
+    )
+
+    for statistic in ["mean", "median"]:
+        for v, value_column in enumerate([f"{statistic}_spearman_values", f"{statistic}_pval"]):
+            spearman_result_df[f"{value_column}_ci_low"] = [bootstrap_results[(key, statistic)]["ci_low"][v] for key in spearman_result_df.index]
+            spearman_result_df[f"{value_column}_ci_high"] = [bootstrap_results[(key, statistic)]["ci_high"][v] for key in spearman_result_df.index]
+
     spearman_result_df[["session_1", "session_2"]] = spearman_result_df["comparison"].str.split("_", expand=True)
 
     ################## PLOT A HEAT MAP OF SPEARMAN CORRELATION MEAN OR MEDIAN VALUES PER SESSION COMBINATION ##################
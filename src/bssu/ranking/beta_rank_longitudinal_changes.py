@@ -21,11 +21,118 @@ import seaborn as sns
 ######### PRIVATE PACKAGES #########
 from .. utils import find_folders as find_folders
 from .. utils import loadResults as loadResults
+from . import permutation_engine as permutation_engine
 
 
 results_path = find_folders.get_local_path(folder="GroupResults")
 figures_path = find_folders.get_local_path(folder="GroupFigures")
 
+segmental_contacts = ["1A", "1B", "1C", "2A", "2B", "2C"]
+
+# x_direction (A=1, B=2, C=3) and y_level (1, 2) of each segmental contact, rows in the order of segmental_contacts
+contact_coordinates = np.array([
+    [1, 1], [2, 1], [3, 1],
+    [1, 2], [2, 2], [3, 2],
+])
+
+
+def direction_difference(abs_difference):
+    """
+    Input:
+        - abs_difference: np.array of absolute differences between directions A=1, B=2, C=3
+
+    there can only be a difference of direction of 0 or 1: A and C are neighbours, so a difference of 2 is replaced by 1
+
+    return np.array of direction differences
+    """
+
+    return np.where(abs_difference == 2, 1, abs_difference)
+
+
+def contact_coordinate_index(contacts):
+    """
+    Input:
+        - contacts: array of segmental contacts, e.g. ["1A", "2C"]
+
+    return integer np.array with the row of each contact in contact_coordinates
+    """
+
+    contact_index = pd.Categorical(np.asarray(contacts), categories=segmental_contacts).codes.astype(int)
+
+    if (contact_index == -1).any():
+        unknown_contacts = sorted(set(np.asarray(contacts)[contact_index == -1].astype(str)))
+        raise ValueError(f"only segmental contacts {segmental_contacts} have a direction and level, got: {unknown_contacts}")
+
+    return contact_index
+
+
+def rank_location_differences(
+        beta_rank_df,
+        comparisons:list,
+        ranks_included:list
+):
+    """
+    Direction and level differences of beta rank contacts for all STNs and session comparisons in one pass
+
+    Input:
+        - beta_rank_df: Dataframe with columns subject_hemisphere, session (0, 3, 12, 18), rank_beta, contact
+            one row per beta rank of each STN and session
+        - comparisons: list of session comparisons, e.g. ["0_3", "3_12"]
+        - ranks_included: list of beta ranks, e.g. [1, 2]
+
+    1) one integer array of contact indices (STN x session x rank), -1 if not recorded
+    2) index the session axis with session 1 and session 2 of all comparisons at once
+    3) look up direction and level of all contacts in contact_coordinates and subtract session 2 from session 1
+        x_difference: A and C are neighbours, so a difference of 2 is replaced by -1 and -2 by 1
+
+    return coord_difference_dataframe with one row per comparison, STN (order of appearance) and rank recorded at both sessions
+        - index: f"{comp}_{stn}_{rank}"
+        - columns: session_comparison, session_1, session_2, subject_hemisphere, beta_rank, contact_session_1, contact_session_2, x_difference, y_difference
+    """
+
+    stns = list(beta_rank_df.subject_hemisphere.unique())
+    comparison_sessions = np.array([[int(session) for session in comp.split("_")] for comp in comparisons]).reshape(-1, 2)
+    sessions = sorted(set(comparison_sessions.ravel()))
+
+    # the first row of each STN, session and rank
+    contact_codes = beta_rank_df.assign(contact_index=contact_coordinate_index(beta_rank_df.contact))
+    contact_codes = contact_codes.drop_duplicates(subset=["subject_hemisphere", "session", "rank_beta"])
+    contact_codes = contact_codes.set_index(["subject_hemisphere", "session", "rank_beta"])["contact_index"]
+    contact_codes = contact_codes.reindex(pd.MultiIndex.from_product([stns, sessions, ranks_included]), fill_value=-1)
+    contact_codes = contact_codes.to_numpy(dtype=int).reshape(len(stns), len(sessions), len(ranks_included))
+
+    # contacts of session 1 and session 2: comparison x STN x rank
+    contacts_session_1 = contact_codes[:, np.searchsorted(sessions, comparison_sessions[:, 0]), :].transpose(1, 0, 2)
+    contacts_session_2 = contact_codes[:, np.searchsorted(sessions, comparison_sessions[:, 1]), :].transpose(1, 0, 2)
+
+    both_sessions = (contacts_session_1 >= 0) & (contacts_session_2 >= 0)
+    comp_index, stn_index, rank_index = np.nonzero(both_sessions)
+
+    contacts_session_1 = contacts_session_1[both_sessions]
+    contacts_session_2 = contacts_session_2[both_sessions]
+
+    coord_differences = contact_coordinates[contacts_session_1] - contact_coordinates[contacts_session_2]
+    x_difference = np.select([coord_differences[:, 0] == 2, coord_differences[:, 0] == -2], [-1, 1], coord_differences[:, 0])
+
+    coord_difference_dataframe = pd.DataFrame({
+        "session_comparison": np.array(comparisons, dtype=object)[comp_index],
+        "session_1": comparison_sessions[comp_index, 0],
+        "session_2": comparison_sessions[comp_index, 1],
+        "subject_hemisphere": np.array(stns, dtype=object)[stn_index],
+        "beta_rank": np.array(ranks_included)[rank_index],
+        "contact_session_1": np.array(segmental_contacts, dtype=object)[contacts_session_1],
+        "contact_session_2": np.array(segmental_contacts, dtype=object)[contacts_session_2],
+        "x_difference": x_difference,
+        "y_difference": coord_differences[:, 1],
+    })
+
+    coord_difference_dataframe.index = (coord_difference_dataframe.session_comparison + "_"
+                                        + coord_difference_dataframe.subject_hemisphere + "_"
+                                        + coord_difference_dataframe.beta_rank.astype(str))
+
+    return coord_difference_dataframe
+
+
 def write_df_xy_changes_of_beta_ranks(
         similarity_calculation:str,
         ranks_included:list
@@ -40,7 +147,7 @@ def write_df_xy_changes_of_beta_ranks(
     
     Load the monopolar FOOOF dataframe of estimated beta power at segmental contacts and beta rank 1-6
 
-
+    Direction and level differences of all STNs and session comparisons are calculated at once (rank_location_differences())
 
     """
 
@@ -50,9 +157,6 @@ def write_df_xy_changes_of_beta_ranks(
                     "12_0", "12_3", "12_12", "12_18",
                     "18_0", "18_3", "18_12", "18_18"]
     
-    coord_difference_data = {}
-    sample_size = {}
-
     loaded_fooof_monopolar_data = loadResults.load_fooof_monopolar_weighted_psd(
         fooof_spectrum="periodic_spectrum",
         segmental="yes",
@@ -70,110 +174,35 @@ def write_df_xy_changes_of_beta_ranks(
     # replace session names by integers
     fooof_monopolar_df_copy = fooof_monopolar_df_copy.replace(to_replace=["postop", "fu3m", "fu12m", "fu18or24m"], value=[0, 3, 12, 18])
 
-    # add 2 new columns "x_coordinate", "y_coordinate"
-    fooof_monopolar_df_copy = fooof_monopolar_df_copy.assign(x_direction=fooof_monopolar_df_copy["contact"]).rename(columns={"x_direction":"x_direction"})
-    fooof_monopolar_df_copy["x_direction"] = fooof_monopolar_df_copy["x_direction"].replace(to_replace=["1A", "2A"], value=[1, 1]) # direction A
-    fooof_monopolar_df_copy["x_direction"] = fooof_monopolar_df_copy["x_direction"].replace(to_replace=["1B", "2B"], value=[2, 2]) # direction B
-    fooof_monopolar_df_copy["x_direction"] = fooof_monopolar_df_copy["x_direction"].replace(to_replace=["1C", "2C"], value=[3, 3]) # direction C
-
-    fooof_monopolar_df_copy = fooof_monopolar_df_copy.assign(y_level=fooof_monopolar_df_copy["contact"]).rename(columns={"y_level":"y_level"})
-    fooof_monopolar_df_copy["y_level"] = fooof_monopolar_df_copy["y_level"].replace(to_replace=["1A", "1B", "1C"], value=[1, 1, 1]) # level 1
-    fooof_monopolar_df_copy["y_level"] = fooof_monopolar_df_copy["y_level"].replace(to_replace=["2A", "2B", "2C"], value=[2, 2, 2]) # level 2
-
+    # add 2 new columns "x_direction" (A=1, B=2, C=3) and "y_level" (1, 2) from the contact coordinate lookup
+    contact_index = contact_coordinate_index(fooof_monopolar_df_copy["contact"])
+    fooof_monopolar_df_copy["x_direction"] = contact_coordinates[contact_index, 0]
+    fooof_monopolar_df_copy["y_level"] = contact_coordinates[contact_index, 1]
 
     # select only the included ranks 
     fooof_monopolar_df_copy = fooof_monopolar_df_copy.loc[fooof_monopolar_df_copy.rank_beta.isin(ranks_included)]
 
-    # check which STNs ad sessions exist in data
-    sub_hem_keys = list(fooof_monopolar_df_copy.subject_hemisphere.unique())
-
     #################   CALCULATE THE DIFFERENCE OF COORDINATES OF DIRECTION AND LEVEL FOR EACH RANK PER SESSION COMPARISON  #################
-    for comp in comparisons:
-
-        comp_split = comp.split("_")
-        session_1 = int(comp_split[0]) # first session as integer
-        session_2 = int(comp_split[1])
-
-        for stn in sub_hem_keys:
-
-            # check for each STN, which ones have both sessions
-            stn_dataframe = fooof_monopolar_df_copy.loc[fooof_monopolar_df_copy.subject_hemisphere == stn]
-
-            if session_1 not in stn_dataframe.session.values:
-                continue
-
-            elif session_2 not in stn_dataframe.session.values:
-                continue
-
-            stn_session_1 = stn_dataframe.loc[stn_dataframe.session == session_1]
-            stn_session_2 = stn_dataframe.loc[stn_dataframe.session == session_2]
-
-            # calculate coordinate difference for each included rank
-            for rank in ranks_included:
-
-                rank_session_1 = stn_session_1.loc[stn_session_1.rank_beta == rank] # row of only one rank of one stn of session 1
-                rank_session_2 = stn_session_2.loc[stn_session_2.rank_beta == rank]
-
-                # contacts at both sessions with specific rank
-                contact_session_1 = rank_session_1.contact.values[0]
-                contact_session_2 = rank_session_2.contact.values[0]
-
-                # extract x and y coordinates of a rank contact at two sessions
-                x_coord_ses_1 = rank_session_1.x_direction.values[0]
-                y_level_ses_1 = rank_session_1.y_level.values[0]
-                x_coord_ses_2 = rank_session_2.x_direction.values[0]
-                y_level_ses_2 = rank_session_2.y_level.values[0]
-
-                # calculate xy difference between coordinates at both sessions
-                x_difference = x_coord_ses_1 - x_coord_ses_2
-                y_difference = y_level_ses_1 - y_level_ses_2
-
-                coord_difference_data[f"{comp}_{stn}_{rank}"] = [comp, session_1, session_2, stn, 
-                                                                 rank, contact_session_1, contact_session_2,
-                                                                 x_difference, y_difference]
-                
-    
-    # save as dataframe
-    coord_difference_dataframe = pd.DataFrame(coord_difference_data)
-    coord_difference_dataframe.rename(
-        index={0: "session_comparison",
-               1: "session_1",
-               2: "session_2",
-               3: "subject_hemisphere",
-               4: "beta_rank",
-               5: "contact_session_1",
-               6: "contact_session_2",
-               7: "x_difference",
-               8: "y_difference"},
-               inplace=True)
-    coord_difference_dataframe = coord_difference_dataframe.transpose()
-
-    # considering x_difference: replace all values 2 by value -1, because there can only be a difference of direction of -1, 0 or 1
-    coord_difference_dataframe["x_difference"] = coord_difference_dataframe["x_difference"].replace(to_replace=[2, -2], value=[-1, +1])
-
-    for comp in comparisons:
-
-        comp_data = coord_difference_dataframe.loc[coord_difference_dataframe.session_comparison == comp]
-
-        comp_data_rank_1 = comp_data.loc[comp_data.beta_rank == 1]
-
-        size = comp_data_rank_1.count()
-        size = size["subject_hemisphere"]
+    coord_difference_dataframe = rank_location_differences(
+        beta_rank_df=fooof_monopolar_df_copy,
+        comparisons=comparisons,
+        ranks_included=ranks_included
+    )
 
-        percentage_stable_level = (comp_data_rank_1.y_difference.value_counts()[0])/size
-        percentage_stable_direction = (comp_data_rank_1.x_difference.value_counts()[0])/size
+    # sample size and relative amount of stable beta rank 1 locations per comparison
+    comp_data_rank_1 = coord_difference_dataframe.loc[coord_difference_dataframe.beta_rank == 1]
+    comp_data_rank_1 = comp_data_rank_1.assign(stable_level=comp_data_rank_1.y_difference == 0,
+                                               stable_direction=comp_data_rank_1.x_difference == 0)
 
-        sample_size[f"{comp}_beta_rank_1"] = [comp, size, percentage_stable_level, percentage_stable_direction]
+    sample_size_dataframe = comp_data_rank_1.groupby("session_comparison").agg(
+        sample_size=("subject_hemisphere", "count"),
+        percentage_stable_level=("stable_level", "mean"),
+        percentage_stable_direction=("stable_direction", "mean"),
+    ).reindex(comparisons)
 
-    # save as dataframe
-    sample_size_dataframe = pd.DataFrame(sample_size)
-    sample_size_dataframe.rename(
-        index={0: "session_comparison",
-               1: "sample_size",
-               2: "percentage_stable_level",
-               3: "percentage_stable_direction"},
-               inplace=True)
-    sample_size_dataframe = sample_size_dataframe.transpose()
+    sample_size_dataframe["sample_size"] = sample_size_dataframe["sample_size"].fillna(0).astype(int)
+    sample_size_dataframe.insert(0, "session_comparison", comparisons)
+    sample_size_dataframe.index = [f"{comp}_beta_rank_1" for comp in comparisons]
 
     return {
         "fooof_monopolar_df_copy": fooof_monopolar_df_copy,
@@ -254,8 +283,117 @@ def fooof_beta_rank_coord_difference_scatterplot(
 
 
 
+def permutation_contact_location_differences(
+        contact_index_session_1,
+        contact_index_session_2,
+        n_permutations:int = 1000,
+        rng = None,
+        batch_size:int = 10000
+):
+    """
+    Input:
+        - contact_index_session_1, contact_index_session_2: integer arrays from contact_coordinate_index(), one contact per STN
+        - n_permutations: int, e.g. 1000 or 100000
+        - rng: numpy.random.Generator, SeedSequence or int seed, None: new unseeded Generator
+        - batch_size: int, number of permutations computed at once, limits the memory usage
+
+    For each permutation: shuffle the contact labels of session 1 and session 2 independently,
+    look up direction and level of the shuffled contacts and calculate the mean absolute differences
+    (direction differences of 2 are replaced by 1)
+
+    return np.array (n_permutations, 2) with the mean absolute direction difference (column 0) and level difference (column 1)
+    """
+
+    rng = np.random.default_rng(rng)
+
+    contact_index_session_1 = np.asarray(contact_index_session_1, dtype=int)
+    contact_index_session_2 = np.asarray(contact_index_session_2, dtype=int)
+
+    permutation_means = np.empty((n_permutations, 2))
+
+    for batch_start in range(0, n_permutations, batch_size):
+
+        batch_stop = min(batch_start + batch_size, n_permutations)
+        n_batch = batch_stop - batch_start
+
+        shuffled_session_1 = rng.permuted(np.tile(contact_index_session_1, (n_batch, 1)), axis=1)
+        shuffled_session_2 = rng.permuted(np.tile(contact_index_session_2, (n_batch, 1)), axis=1)
+
+        # permutation x STN x (direction, level)
+        abs_differences = np.abs(contact_coordinates[shuffled_session_1] - contact_coordinates[shuffled_session_2])
+        abs_differences[..., 0] = direction_difference(abs_differences[..., 0])
+
+        permutation_means[batch_start:batch_stop] = abs_differences.mean(axis=1)
+
+    return permutation_means
+
+
+def contact_permutation_tests(
+        contact_inputs:dict,
+        observed:dict,
+        n_permutations:int = 1000,
+        alternative:str = "less",
+        rng = None
+):
+    """
+    Permutation tests of direction and level differences with one shuffle of the contact labels for both
+
+    Input:
+        - contact_inputs: dict {(rank, comp): {"contact_index_session_1", "contact_index_session_2"}}
+        - observed: dict {(rank, comp, diff): real mean absolute difference}, diff = "x_difference" or "y_difference"
+        - n_permutations: int, e.g. 1000 or 100000
+        - alternative: str "less", "greater" or "two-sided"
+        - rng: numpy.random.Generator or int seed, None: new unseeded Generator
+
+    Each (rank, comp) gets its own random seed spawned from rng, as in permutation_engine.permutation_tests()
+
+    return {(rank, comp, diff): dict with the keys of permutation_engine.permutation_test_mean_abs_differences()}
+        in the order of observed
+    """
+
+    seed_sequences = np.random.SeedSequence(np.random.default_rng(rng).integers(2**63)).spawn(len(contact_inputs))
+
+    null_distributions = {}
+
+    for (rank, comp), seed_sequence in zip(contact_inputs.keys(), seed_sequences):
+
+        permutation_means = permutation_contact_location_differences(
+            n_permutations=n_permutations,
+            rng=seed_sequence,
+            **contact_inputs[(rank, comp)]
+        )
+
+        null_distributions[(rank, comp, "x_difference")] = permutation_means[:, 0]
+        null_distributions[(rank, comp, "y_difference")] = permutation_means[:, 1]
+
+    permutation_results = {}
+
+    for key, observed_mean in observed.items():
+
+        permutation_results[key] = {
+            "observed": observed_mean,
+            "null_distribution": null_distributions[key],
+            **permutation_engine.permutation_statistics(
+                observed=observed_mean,
+                null_values=null_distributions[key],
+                alternative=alternative
+            ),
+            "method": "monte_carlo",
+            "n_permutations": n_permutations,
+        }
+
+    return permutation_results
+
+
 def permutation_fooof_beta_rank_location_differences(
         ranks_included:list,
+        n_permutations:int = 1000,
+        rng = None,
+        alternative:str = "less",
+        n_jobs:int = 1,
+        plot_figures:bool = True,
+        show_figures:bool = False,
+        permutation_mode:str = "coordinates",
         ):
     
     """
@@ -272,6 +410,17 @@ def permutation_fooof_beta_rank_location_differences(
             "periodic_flat"             -> model._peak_fit
         
         - ranks_included: list e.g. [1], [1,2] -> these beta ranks will be included into the dataframe with data input for analysis
+        - n_permutations: int, number of random shuffles e.g. 1000 or 100000
+        - rng: numpy.random.Generator or int seed for reproducible shuffles, None: unseeded
+        - alternative: str "less" (real mean difference smaller than random = stable locations), "greater" or "two-sided"
+        - n_jobs: int, number of worker processes for the permutation tests of all ranks, comparisons, directions and levels
+            1: one after the other, >1: in parallel in a process pool, -1: one worker process per CPU core
+        - plot_figures: bool, if True the permutation histograms are plotted and saved after all tests are done
+        - show_figures: bool, if True plt.show() for each figure, otherwise figures are only saved and closed (headless)
+        - permutation_mode: str
+            "coordinates": directions and levels are shuffled in seperate permutation tests (permutation_engine.permutation_tests())
+            "contacts": the integer contact labels are shuffled, direction and level differences of each shuffle
+                are looked up in contact_coordinates (contact_permutation_tests()), n_jobs is not used
 
     
     1) Load the dataframes from write_df_xy_changes_of_beta_ranks()
@@ -287,10 +436,12 @@ def permutation_fooof_beta_rank_location_differences(
         - per STN:  calculate the MEAN difference of ranks 
         - get average of all STN MEAN differences of ranks
     
-    3) loop over each STN and shuffle ranks from session x and session y
-        - number of shuffle = 1000
-        - calculate the absolute difference between ranks for each BIP recording
-        - calculate the MEAN of abs differences for each shuffle and store in a list difference_random_MEANranks
+    3) shuffle the contact locations of session 1 and session 2 of all STNs 
+        (permutation_mode "coordinates": permutation_engine.permutation_test_mean_abs_differences(), "contacts": contact_permutation_tests())
+        - number of shuffle = n_permutations
+        - calculate the absolute location difference for each STN, direction differences of 2 are replaced by 1
+        - calculate the MEAN of abs differences for each shuffle
+        - all tests are independent: run in parallel if n_jobs > 1 (permutation_engine.permutation_tests())
     
     4) Statistics:
         calculate the distance of the REAL mean from the mean of all randomized means divided by the standard deviation
@@ -299,12 +450,16 @@ def permutation_fooof_beta_rank_location_differences(
         calculate the p-value 
         - (pval = 2-2*norm.cdf(abs(distanceMeanReal_MeanRandom)) # zweiseitige Berechnung)
         - pval = 1-norm.cdf(abs(distanceMeanReal_MeanRandom)) # einseitige Berechnung: wieviele Standardabweichungen der Real Mean vom randomized Mean entfernt ist
+
+        calculate the empirical p-value
+        - (b+1)/(m+1), b = number of shuffles at least as extreme as the real mean, m = n_permutations
     
         
     5) Plot the distribution of the permutated MEAN values (should be normally distributed)
         - mark a red line for the REAL MEAN
         - annotation with the p value
         - one figure for each comparison: 3 subplots for 3 channel groups
+        - only if plot_figures, after all permutation tests are done
     
     6) save a Dataframe with statistics results
         - "Permutation_BIP_{data2permute}_{freqBand}_{normalization}_{filterSignal}.pickle"
@@ -324,24 +479,14 @@ def permutation_fooof_beta_rank_location_differences(
     # new column with stn and channel info combined
     beta_rank_DF_copy = beta_rank_DF.copy()
     
-    # add 2 new columns "x_coordinate", "y_coordinate"
-    beta_rank_DF_copy = beta_rank_DF_copy.assign(x_direction_session_1=beta_rank_DF_copy[f"contact_session_1"]).rename(columns={"x_direction_session_1":"x_direction_session_1"})
-    beta_rank_DF_copy["x_direction_session_1"] = beta_rank_DF_copy["x_direction_session_1"].replace(to_replace=["1A", "2A"], value=[1, 1]) # direction A
-    beta_rank_DF_copy["x_direction_session_1"] = beta_rank_DF_copy["x_direction_session_1"].replace(to_replace=["1B", "2B"], value=[2, 2]) # direction B
-    beta_rank_DF_copy["x_direction_session_1"] = beta_rank_DF_copy["x_direction_session_1"].replace(to_replace=["1C", "2C"], value=[3, 3]) # direction C
-
-    beta_rank_DF_copy = beta_rank_DF_copy.assign(x_direction_session_2=beta_rank_DF_copy[f"contact_session_2"]).rename(columns={"x_direction_session_2":"x_direction_session_2"})
-    beta_rank_DF_copy["x_direction_session_2"] = beta_rank_DF_copy["x_direction_session_2"].replace(to_replace=["1A", "2A"], value=[1, 1]) # direction A
-    beta_rank_DF_copy["x_direction_session_2"] = beta_rank_DF_copy["x_direction_session_2"].replace(to_replace=["1B", "2B"], value=[2, 2]) # direction B
-    beta_rank_DF_copy["x_direction_session_2"] = beta_rank_DF_copy["x_direction_session_2"].replace(to_replace=["1C", "2C"], value=[3, 3]) # direction C
-
-    beta_rank_DF_copy = beta_rank_DF_copy.assign(y_level_session_1=beta_rank_DF_copy[f"contact_session_1"]).rename(columns={"y_level_session_1":"y_level_session_1"})
-    beta_rank_DF_copy["y_level_session_1"] = beta_rank_DF_copy["y_level_session_1"].replace(to_replace=["1A", "1B", "1C"], value=[1, 1, 1]) # level 1
-    beta_rank_DF_copy["y_level_session_1"] = beta_rank_DF_copy["y_level_session_1"].replace(to_replace=["2A", "2B", "2C"], value=[2, 2, 2]) # level 2
+    # add 4 new columns direction and level of session 1 and 2 from the contact coordinate lookup
+    contact_index_session_1 = contact_coordinate_index(beta_rank_DF_copy["contact_session_1"])
+    contact_index_session_2 = contact_coordinate_index(beta_rank_DF_copy["contact_session_2"])
 
-    beta_rank_DF_copy = beta_rank_DF_copy.assign(y_level_session_2=beta_rank_DF_copy[f"contact_session_2"]).rename(columns={"y_level_session_2":"y_level_session_2"})
-    beta_rank_DF_copy["y_level_session_2"] = beta_rank_DF_copy["y_level_session_2"].replace(to_replace=["1A", "1B", "1C"], value=[1, 1, 1]) # level 1
-    beta_rank_DF_copy["y_level_session_2"] = beta_rank_DF_copy["y_level_session_2"].replace(to_replace=["2A", "2B", "2C"], value=[2, 2, 2]) # level 2
+    beta_rank_DF_copy["x_direction_session_1"] = contact_coordinates[contact_index_session_1, 0]
+    beta_rank_DF_copy["x_direction_session_2"] = contact_coordinates[contact_index_session_2, 0]
+    beta_rank_DF_copy["y_level_session_1"] = contact_coordinates[contact_index_session_1, 1]
+    beta_rank_DF_copy["y_level_session_2"] = contact_coordinates[contact_index_session_2, 1]
 
     # defined variables
     comparisons = ["0_0", "0_3", "0_12", "0_18", 
@@ -357,11 +502,9 @@ def permutation_fooof_beta_rank_location_differences(
     # 1) get the real mean first of all channels within one session comparison across STNs
     # 2) permute within session comparison, get the permuted mean across STNs
 
-    permutation_fooof_beta_ranks_coord = {}
-
-    # shuffle repetitions: 1000 times
-    number_of_shuffle = np.arange(1, 1001, 1)
-    fontdict = {"size": 25}
+    permutation_inputs = {}
+    contact_inputs = {}
+    real_location_statistics = {}
 
     for rank in ranks_included:
 
@@ -370,105 +513,136 @@ def permutation_fooof_beta_rank_location_differences(
 
         for comp in comparisons:
 
-            # Figure Layout per comparison: 2 rows (direction, level), 1 column
-            fig, axes = plt.subplots(2,1,figsize=(10,15)) 
-
             # Dataframe per session comparison
             comp_df = rank_df.loc[(rank_df["session_comparison"] == comp)]
 
-            # list of STNs per session
-            comp_stns = list(comp_df.subject_hemisphere.unique())
-
-            for d, diff in enumerate(difference_level_or_direction):
+            for diff in difference_level_or_direction:
 
                 if diff == "x_difference":
                     coord = "x_direction"
+                    # there can only be a difference of direction of 0 or 1
+                    difference_transform = direction_difference
                 
                 elif diff == "y_difference":
                     coord = "y_level"
-                
+                    difference_transform = None
 
                 # Array of real differences: 1 horizontal direction, 2 vertical level
-                location_diff_mean = np.mean(comp_df[f"{diff}"].abs()) # absolute values! because otherwise you take the mean of -1, 0 and 1 and it will be close to 0
-                location_diff_std = np.std(comp_df[f"{diff}"].abs())
+                real_location_statistics[(rank, comp, diff)] = {
+                    "stn_list": list(comp_df.subject_hemisphere.unique()), # list of STNs per session
+                    "mean": np.mean(comp_df[f"{diff}"].abs()), # absolute values! because otherwise you take the mean of -1, 0 and 1 and it will be close to 0
+                    "std": np.std(comp_df[f"{diff}"].abs()),
+                    "sample_size": len(comp_df[f"{diff}"].values),
+                }
+
+                # randomly shuffle the rank contacts at session 1 and session 2 (1 out of 6 potential segmental contacts) 
+                # direction: A=1, B=2, C=3
+                # level: 1=1, 2=2
+                permutation_inputs[(rank, comp, diff)] = {
+                    "values_x": comp_df[f"{coord}_session_1"].values,
+                    "values_y": comp_df[f"{coord}_session_2"].values,
+                    "observed": real_location_statistics[(rank, comp, diff)]["mean"],
+                    "n_permutations": n_permutations,
+                    "alternative": alternative,
+                    "difference_transform": difference_transform,
+                }
+
+            # integer contact labels for the permutation_mode "contacts"
+            contact_inputs[(rank, comp)] = {
+                "contact_index_session_1": contact_coordinate_index(comp_df["contact_session_1"]),
+                "contact_index_session_2": contact_coordinate_index(comp_df["contact_session_2"]),
+            }
+
+    ############ SHUFFLE ############
+    # n_permutations x mean differences between shuffled session 1 and session 2 locations
+    if permutation_mode == "coordinates":
+        permutation_results = permutation_engine.permutation_tests(permutation_inputs, n_jobs=n_jobs, rng=rng)
+
+    elif permutation_mode == "contacts":
+        permutation_results = contact_permutation_tests(
+            contact_inputs=contact_inputs,
+            observed={key: real_statistics["mean"] for key, real_statistics in real_location_statistics.items()},
+            n_permutations=n_permutations,
+            alternative=alternative,
+            rng=rng
+        )
+
+    else:
+        raise ValueError(f"permutation_mode must be 'coordinates' or 'contacts', got: {permutation_mode}")
+
+    permutation_fooof_beta_ranks_coord = {}
 
-                sample_size = len(comp_df[f"{diff}"].values)
+    for (rank, comp, diff), permutation_test in permutation_results.items():
 
+        real_statistics = real_location_statistics[(rank, comp, diff)]
+                
+        ############ CALCULATE DISTANCE AND P-VAL OF REAL MEAN FROM MEAN OF ALL RANDOMIZED MEANS  ############
+        distance_real_vs_random_mean = permutation_test["z_score"]
 
-                ############ SHUFFLE ############
-                # list of 1000x mean differences between shuffled rank_x and rank_y
-                shuffled_mean_differences = []
+        # p-value of the normal approximation: 1-norm.cdf(abs(distance_real_vs_random_mean))
+        pval = permutation_test["p_value_z"]
 
-                # repeat shuffle 1000 times
-                for s, shuffle in enumerate(number_of_shuffle):
+        # empirical p-value: (b+1)/(m+1)
+        pval_empirical = permutation_test["p_value"]
+        
+        sample_size_shuffled = permutation_test["n_permutations"]
+
+        # store all values in dictionary
+        permutation_fooof_beta_ranks_coord[f"{rank}_{comp}_{diff}"] = [rank, comp, diff, real_statistics["stn_list"],
+                                                                       real_statistics["mean"], real_statistics["std"], real_statistics["sample_size"],
+                                                                       permutation_test["null_distribution"], distance_real_vs_random_mean,
+                                                                       "{:.15f}".format(pval), sample_size_shuffled,
+                                                                       "{:.15f}".format(pval_empirical), permutation_test["method"]]
+                
+    ############ PLOT ############
+    fontdict = {"size": 25}
 
-                    # randomly shuffle the rank contacts at session 1 and session 2 (1 out of 6 potential segmental contacts) 
-                    # direction: A=1, B=2, C=3
-                    # level: 1=1, 2=2
-                    random_coordinate_session_1 = list(comp_df[f"{coord}_session_1"].values) # list of contact coordinates in direction or level 
-                    random_coordinate_session_2 = list(comp_df[f"{coord}_session_2"].values)
+    if plot_figures:
 
-                    # shuffle
-                    np.random.shuffle(random_coordinate_session_1)
-                    np.random.shuffle(random_coordinate_session_2)
+        for rank in ranks_included:
+            for comp in comparisons:
 
-                    # calculate the difference between random random_coordinate_session_1 and random_coordinate_session_2, store in list
-                    difference_random_coord = list(abs(np.array(random_coordinate_session_1) - np.array(random_coordinate_session_2)))
+                # Figure Layout per comparison: 2 rows (direction, level), 1 column
+                fig, axes = plt.subplots(2,1,figsize=(10,15)) 
 
-                    # only for x_direction: replace all values 2 by -1 and -2 by +1, because there can only be a difference of direction of -1, 0 or 1
-                    if diff == "x_difference":
+                for d, diff in enumerate(difference_level_or_direction):
 
-                        difference_random_coord = [-1 if x == 2 else (1 if x == -2 else x) for x in difference_random_coord]
-                        difference_random_coord = [abs(x) for x in difference_random_coord] # take absolute differences
-                    
-                    elif diff == "y_difference":
+                    permutation_test = permutation_results[(rank, comp, diff)]
 
-                        difference_random_coord = [abs(x) for x in difference_random_coord] # take absolute differences
+                    location_diff_mean = permutation_test["observed"]
+                    pval = permutation_test["p_value_z"]
+                    pval_empirical = permutation_test["p_value"]
 
-                    # get mean of differences 
-                    shuffled_mean_differences.append(np.mean(difference_random_coord))
-                
-                ############ CALCULATE DISTANCE AND P-VAL OF REAL MEAN FROM MEAN OF ALL RANDOMIZED MEANS  ############
-                distance_real_vs_random_mean = (location_diff_mean - np.mean(shuffled_mean_differences)) / np.std(shuffled_mean_differences)
+                    sns.histplot(permutation_test["null_distribution"], color="tab:blue", ax=axes[d], stat="count", element="bars", label=f"{n_permutations} Permutation repetitions", kde=True, bins=30, fill=True)
 
-                # calculate the p-value 
-                # pval = 2-2*norm.cdf(abs(distanceMeanReal_MeanRandom)) # zweiseitige Berechnung
-                pval = 1-norm.cdf(abs(distance_real_vs_random_mean)) # einseitige Berechnung: wieviele Standardabweichungen der Real Mean vom randomized Mean entfernt ist
-                
-                sample_size_shuffled = len(shuffled_mean_differences)
+                    # mark with red line: real mean of the rank differences of comp_group_DF
+                    axes[d].axvline(location_diff_mean, c="r", linewidth=3)
+                    axes[d].text(location_diff_mean +0.02, 50, 
+                        "real mean \nof location difference \n\n p-value: {:.3f} \n empirical p-value: {:.3f}".format(pval, pval_empirical),
+                        c="k", fontsize=20)
 
-                # store all values in dictionary
-                permutation_fooof_beta_ranks_coord[f"{rank}_{comp}_{diff}"] = [rank, comp, diff, comp_stns,
-                                                                               location_diff_mean, location_diff_std, sample_size,
-                                                                               shuffled_mean_differences, distance_real_vs_random_mean,
-                                                                               "{:.15f}".format(pval), sample_size_shuffled]
-                
-                ############ PLOT ############
-                sns.histplot(shuffled_mean_differences, color="tab:blue", ax=axes[d], stat="count", element="bars", label="1000 Permutation repetitions", kde=True, bins=30, fill=True)
+                    axes[d].set_title(f"{diff}", fontdict=fontdict)
 
-                # mark with red line: real mean of the rank differences of comp_group_DF
-                axes[d].axvline(location_diff_mean, c="r", linewidth=3)
-                axes[d].text(location_diff_mean +0.02, 50, 
-                    "real mean \nof location difference \n\n p-value: {:.3f}".format(pval),
-                    c="k", fontsize=20)
+                for ax in axes:
 
-                axes[d].set_title(f"{diff}", fontdict=fontdict)
+                    ax.set_xlabel(f"Mean location difference between session 1 and session 2", fontsize=25)
+                    ax.set_ylabel("Count", fontsize=25)
 
-            for ax in axes:
+                    ax.tick_params(axis="x", labelsize=25)
+                    ax.tick_params(axis="y", labelsize=25)
+                    ax.grid(False)
 
-                ax.set_xlabel(f"Mean location difference between session 1 and session 2", fontsize=25)
-                ax.set_ylabel("Count", fontsize=25)
+                fig.suptitle(f"Permutation analysis of contact location: beta rank {rank}, {comp} session comparison", fontsize=30)
+                fig.subplots_adjust(wspace=0, hspace=0)
+                fig.tight_layout()
 
-                ax.tick_params(axis="x", labelsize=25)
-                ax.tick_params(axis="y", labelsize=25)
-                ax.grid(False)
+                fig.savefig(os.path.join(figures_path, f"permutation_location_beta_rank_{rank}_fooof_spectra_{comp}.png"), bbox_inches="tight")
+                fig.savefig(os.path.join(figures_path, f"permutation_location_beta_rank_{rank}_fooof_spectra_{comp}.svg"), bbox_inches="tight", format="svg")
 
-            fig.suptitle(f"Permutation analysis of contact location: beta rank {rank}, {comp} session comparison", fontsize=30)
-            fig.subplots_adjust(wspace=0, hspace=0)
-            fig.tight_layout()
+                if show_figures:
+                    plt.show()
 
-            fig.savefig(os.path.join(figures_path, f"permutation_location_beta_rank_{rank}_fooof_spectra_{comp}.png"), bbox_inches="tight")
-            fig.savefig(os.path.join(figures_path, f"permutation_location_beta_rank_{rank}_fooof_spectra_{comp}.svg"), bbox_inches="tight", format="svg")
+                plt.close(fig)
 
         
     # Permutation_BIP transform from dictionary to Dataframe
@@ -484,7 +658,9 @@ def permutation_fooof_beta_rank_location_differences(
         7: "shuffled_difference_mean",
         8: "distance_real_vs_random_mean_differences",
         9: "p-value",
-        10: "sample_size_random_shuffles"
+        10: "sample_size_random_shuffles",
+        11: "p-value_empirical",
+        12: "p-value_method"
         }, 
         inplace=True)
     permutation_result_df = permutation_result_df.transpose()
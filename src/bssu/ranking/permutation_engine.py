@@ -0,0 +1,440 @@
+""" Vectorized within-STN permutations of ranks """
+
+
+import concurrent.futures
+import itertools
+import os
+
+import numpy as np
+from scipy.stats import norm
+
+
+def within_group_arrays(values, groups):
+    """
+    Input:
+        - values: array of values e.g. ranks, one value per row
+        - groups: array of group labels e.g. STN "024_Right", one label per row
+
+    Sort the values into one row per group, groups with less values are padded with NaN at the end.
+
+    return {
+        "padded_values": np.array (n_groups, max_group_size),
+        "group_labels": sorted unique group labels
+    }
+    """
+
+    values = np.asarray(values, dtype=float)
+    groups = np.asarray(groups)
+
+    group_labels, group_index = np.unique(groups, return_inverse=True)
+    group_sizes = np.bincount(group_index, minlength=len(group_labels))
+
+    # position of each value within its group, keeping the original row order
+    order = np.argsort(group_index, kind="stable")
+    position = np.empty(len(values), dtype=int)
+    position[order] = np.arange(len(values)) - np.repeat(np.cumsum(group_sizes) - group_sizes, group_sizes)
+
+    padded_values = np.full((len(group_labels), group_sizes.max(initial=0)), np.nan)
+    padded_values[group_index, position] = values
+
+    return {
+        "padded_values": padded_values,
+        "group_labels": group_labels,
+    }
+
+
+def permute_within_groups(padded_values, n_permutations: int, rng):
+    """
+    Input:
+        - padded_values: np.array (n_groups, max_group_size), output of within_group_arrays()
+        - n_permutations: int, number of permutations
+        - rng: numpy.random.Generator
+
+    Shuffle the values of each group independently for each permutation:
+    argsort of random keys along the group axis, NaN padding gets the key inf and stays at the end of each group.
+
+    return np.array (n_permutations, n_groups, max_group_size)
+    """
+
+    keys = rng.random((n_permutations,) + padded_values.shape)
+    keys[:, np.isnan(padded_values)] = np.inf
+
+    permutation_order = np.argsort(keys, axis=-1)
+
+    return np.take_along_axis(np.broadcast_to(padded_values, keys.shape), permutation_order, axis=-1)
+
+
+def mean_abs_difference(abs_differences, average: str):
+    """
+    Input:
+        - abs_differences: np.array (..., n_groups, max_group_size), NaN padded
+        - average: str "all_rows" or "group_means", see permutation_mean_abs_differences()
+
+    return the mean absolute difference (...)
+    """
+
+    if average == "all_rows":
+        return np.nanmean(abs_differences.reshape(abs_differences.shape[:-2] + (-1,)), axis=-1)
+
+    elif average == "group_means":
+        return np.mean(np.nanmean(abs_differences, axis=-1), axis=-1)
+
+    raise ValueError(f"average must be 'all_rows' or 'group_means', got: {average}")
+
+
+def permutation_mean_abs_differences(
+        values_x,
+        values_y,
+        groups=None,
+        n_permutations: int = 1000,
+        average: str = "all_rows",
+        rng=None,
+        difference_transform=None,
+        batch_size: int = 10000,
+):
+    """
+    Input:
+        - values_x: array of values of session x e.g. rank_x, one value per row
+        - values_y: array of values of session y e.g. rank_y, same rows as values_x
+        - groups: array of group labels e.g. STN "024_Right", one label per row. None: all rows are shuffled together
+        - n_permutations: int, number of permutations e.g. 1000 or 100000
+        - average: str
+            "all_rows": mean of absolute differences over all rows
+            "group_means": mean of absolute differences within each group first, then mean over all groups
+        - rng: numpy.random.Generator or int seed, None: new unseeded Generator
+        - difference_transform: None or function applied to the array of absolute differences before averaging
+        - batch_size: int, number of permutations computed at once, limits the memory usage
+
+    For each permutation: values_x and values_y are shuffled independently within each group,
+    then the absolute difference of each row and the mean of these differences is calculated.
+
+    return np.array (n_permutations,) with the mean absolute difference of each permutation
+    """
+
+    rng = np.random.default_rng(rng)
+
+    if groups is None:
+        groups = np.zeros(len(values_x))
+
+    padded_x = within_group_arrays(values_x, groups)["padded_values"]
+    padded_y = within_group_arrays(values_y, groups)["padded_values"]
+
+    permutation_means = np.empty(n_permutations)
+
+    for batch_start in range(0, n_permutations, batch_size):
+
+        batch_stop = min(batch_start + batch_size, n_permutations)
+        n_batch = batch_stop - batch_start
+
+        # NaN padding is at the end of each group in both arrays, so padding is only subtracted from padding
+        abs_differences = np.abs(
+            permute_within_groups(padded_x, n_batch, rng) - permute_within_groups(padded_y, n_batch, rng)
+            )
+
+        if difference_transform is not None:
+            abs_differences = difference_transform(abs_differences)
+
+        permutation_means[batch_start:batch_stop] = mean_abs_difference(abs_differences, average)
+
+    return permutation_means
+
+
+def exact_mean_abs_difference_distribution(
+        values_x,
+        values_y,
+        groups=None,
+        average: str = "all_rows",
+        difference_transform=None,
+):
+    """
+    Input: see permutation_mean_abs_differences()
+
+    Exact permutation distribution of the mean absolute difference, only feasible for small groups.
+
+    Shuffling values_x and values_y independently within a group is the same as keeping values_x 
+    and shuffling values_y, so every group has k! equally likely outcomes (k = group size). 
+    The groups are shuffled independently: the distribution of the sum over all groups 
+    is the convolution of the distributions of all groups.
+
+    return {
+        "values": np.array of all possible mean absolute differences,
+        "probabilities": np.array of the probability of each value,
+        "n_permutations": int, number of all possible permutations
+    }
+    """
+
+    if groups is None:
+        groups = np.zeros(len(values_x))
+
+    padded_x = within_group_arrays(values_x, groups)["padded_values"]
+    padded_y = within_group_arrays(values_y, groups)["padded_values"]
+
+    n_groups = padded_x.shape[0]
+    n_rows = np.count_nonzero(~np.isnan(padded_x))
+
+    # distribution of the sum: start with the value 0 with probability 1
+    values = np.zeros(1)
+    probabilities = np.ones(1)
+    n_permutations = 1
+
+    for group_x, group_y in zip(padded_x, padded_y):
+
+        group_x = group_x[~np.isnan(group_x)]
+        group_y = group_y[~np.isnan(group_y)]
+        group_size = len(group_x)
+
+        # sum of absolute differences for all orders of group_y
+        group_y_orders = group_y[np.array(list(itertools.permutations(range(group_size))))]
+        abs_differences = np.abs(group_x - group_y_orders)
+
+        if difference_transform is not None:
+            abs_differences = difference_transform(abs_differences)
+
+        group_sums = abs_differences.sum(axis=-1)
+
+        if average == "group_means":
+            group_sums = group_sums / group_size
+
+        # convolution of the distribution so far with the distribution of this group, rounded to merge equal values
+        values = np.round(np.add.outer(values, group_sums).ravel(), 10)
+        probabilities = np.outer(probabilities, np.full(len(group_sums), 1 / len(group_sums))).ravel()
+
+        values, value_index = np.unique(values, return_inverse=True)
+        probabilities = np.bincount(value_index, weights=probabilities)
+
+        n_permutations *= len(group_sums)
+
+    if average == "all_rows":
+        values = values / n_rows
+
+    elif average == "group_means":
+        values = values / n_groups
+
+    return {
+        "values": values,
+        "probabilities": probabilities,
+        "n_permutations": n_permutations,
+    }
+
+
+def permutation_test_mean_abs_differences(
+        values_x,
+        values_y,
+        groups=None,
+        observed=None,
+        n_permutations: int = 1000,
+        rng=None,
+        average: str = "all_rows",
+        alternative: str = "less",
+        exact="auto",
+        max_exact_group_size: int = 3,
+        difference_transform=None,
+):
+    """
+    Permutation test of the mean absolute difference between values_x and values_y, 
+    shared by the permutation tests of beta ranks and beta rank locations.
+
+    Input:
+        - values_x, values_y, groups, average, difference_transform: see permutation_mean_abs_differences()
+        - observed: float, real mean absolute difference. None: calculated from values_x and values_y with average
+        - n_permutations: int, number of Monte-Carlo permutations e.g. 1000 or 100000
+        - rng: numpy.random.Generator or int seed, None: new unseeded Generator
+        - alternative: str
+            "less": real mean difference is smaller than random (stable ranks)
+            "greater": real mean difference is larger than random
+            "two-sided"
+        - exact: "auto", True or False
+            "auto": exact permutation distribution if no group has more than max_exact_group_size values 
+            (e.g. 3 ring or 3 inter-level channels per STN), otherwise Monte-Carlo
+        - max_exact_group_size: int, see exact
+
+    Statistics:
+        - z_score: distance of the real mean from the mean of all randomized means divided by the standard deviation
+        - p_value_z: 1-norm.cdf(abs(z_score)), normal approximation
+        - p_value: empirical p-value
+            Monte-Carlo: (b+1)/(m+1) with b = number of permutations at least as extreme as the real mean, m = n_permutations
+            exact: probability of all permutations at least as extreme as the real mean
+
+    return {
+        "observed", "null_distribution" (n_permutations Monte-Carlo samples, also used for plotting), 
+        "null_mean", "null_std", "z_score", "p_value_z", "p_value", "method" ("exact" or "monte_carlo"), "n_permutations"
+    }
+    """
+
+    rng = np.random.default_rng(rng)
+
+    if groups is None:
+        groups = np.zeros(len(values_x))
+
+    if observed is None:
+        padded_x = within_group_arrays(values_x, groups)["padded_values"]
+        padded_y = within_group_arrays(values_y, groups)["padded_values"]
+        abs_differences = np.abs(padded_x - padded_y)
+
+        if difference_transform is not None:
+            abs_differences = difference_transform(abs_differences)
+
+        observed = mean_abs_difference(abs_differences, average)
+
+    null_distribution = permutation_mean_abs_differences(
+        values_x=values_x,
+        values_y=values_y,
+        groups=groups,
+        n_permutations=n_permutations,
+        average=average,
+        rng=rng,
+        difference_transform=difference_transform,
+    )
+
+    if exact == "auto":
+        exact = np.unique(groups, return_counts=True)[1].max(initial=0) <= max_exact_group_size
+
+    if exact:
+        exact_distribution = exact_mean_abs_difference_distribution(
+            values_x=values_x,
+            values_y=values_y,
+            groups=groups,
+            average=average,
+            difference_transform=difference_transform,
+        )
+
+        statistics = permutation_statistics(
+            observed=observed,
+            null_values=exact_distribution["values"],
+            null_probabilities=exact_distribution["probabilities"],
+            alternative=alternative,
+        )
+
+        method = "exact"
+        n_null = exact_distribution["n_permutations"]
+
+    else:
+        statistics = permutation_statistics(
+            observed=observed,
+            null_values=null_distribution,
+            alternative=alternative,
+        )
+
+        method = "monte_carlo"
+        n_null = n_permutations
+
+    return {
+        "observed": observed,
+        "null_distribution": null_distribution,
+        **statistics,
+        "method": method,
+        "n_permutations": n_null,
+    }
+
+
+def permutation_statistics(
+        observed,
+        null_values,
+        null_probabilities=None,
+        alternative: str = "less",
+):
+    """
+    Statistics of a real value compared to its permutation distribution
+
+    Input:
+        - observed: float, real value e.g. mean absolute difference
+        - null_values: np.array of permuted values
+        - null_probabilities: None or np.array of the probability of each null value
+            None: null_values are Monte-Carlo samples with equal probabilities
+            array: exact permutation distribution
+        - alternative: str "less", "greater" or "two-sided", see permutation_test_mean_abs_differences()
+
+    return {"null_mean", "null_std", "z_score", "p_value_z", "p_value"}
+    """
+
+    monte_carlo = null_probabilities is None
+
+    if monte_carlo:
+        null_probabilities = np.full(len(null_values), 1 / len(null_values))
+
+    null_mean = np.sum(null_values * null_probabilities)
+    null_std = np.sqrt(np.sum((null_values - null_mean) ** 2 * null_probabilities))
+
+    # calculate the distance of the real mean from the mean of all randomized means divided by the standard deviation
+    z_score = (observed - null_mean) / null_std
+    p_value_z = 1-norm.cdf(abs(z_score)) # einseitige Berechnung: wieviele Standardabweichungen der Real Mean vom randomized Mean entfernt ist
+
+    # permutations at least as extreme as the real mean, with a tolerance for rounding errors
+    tolerance = 1e-9 * max(1, abs(observed))
+
+    if alternative == "less":
+        extreme = null_values <= observed + tolerance
+
+    elif alternative == "greater":
+        extreme = null_values >= observed - tolerance
+
+    elif alternative == "two-sided":
+        extreme = np.abs(null_values - null_mean) >= np.abs(observed - null_mean) - tolerance
+
+    else:
+        raise ValueError(f"alternative must be 'less', 'greater' or 'two-sided', got: {alternative}")
+
+    if monte_carlo:
+        p_value = (np.count_nonzero(extreme) + 1) / (len(null_values) + 1)
+
+    else:
+        p_value = np.sum(null_probabilities[extreme])
+
+    return {
+        "null_mean": null_mean,
+        "null_std": null_std,
+        "z_score": z_score,
+        "p_value_z": p_value_z,
+        "p_value": p_value,
+    }
+
+
+def permutation_test_from_input(test_input: dict):
+    """
+    Input:
+        - test_input: dict of keyword arguments of permutation_test_mean_abs_differences()
+
+    module level function, so it can be sent to worker processes
+
+    return the result of permutation_test_mean_abs_differences()
+    """
+
+    return permutation_test_mean_abs_differences(**test_input)
+
+
+def permutation_tests(test_inputs: dict, n_jobs: int = 1, rng=None):
+    """
+    Run independent permutation tests e.g. of all session comparisons and channel groups.
+
+    Input:
+        - test_inputs: dict {key: dict of keyword arguments of permutation_test_mean_abs_differences()}, without rng
+            e.g. key = (comparison, channel_group)
+        - n_jobs: int, number of worker processes
+            1: tests are run one after the other
+            >1: tests are run in parallel in a process pool
+            -1: one worker process per CPU core
+        - rng: numpy.random.Generator or int seed, None: new unseeded Generator
+
+    Each test gets its own random seed, spawned from rng in the order of test_inputs,
+    so results with the same seed are identical for any n_jobs.
+
+    return {key: result of permutation_test_mean_abs_differences()} in the order of test_inputs
+    """
+
+    keys = list(test_inputs.keys())
+
+    seed_sequences = np.random.SeedSequence(np.random.default_rng(rng).integers(2**63)).spawn(len(keys))
+    inputs = [dict(test_inputs[key], rng=seed_sequence) for key, seed_sequence in zip(keys, seed_sequences)]
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    if n_jobs > 1 and len(inputs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(n_jobs, len(inputs))) as executor:
+            # executor.map returns the results in the order of inputs
+            results = list(executor.map(permutation_test_from_input, inputs))
+
+    else:
+        results = [permutation_test_from_input(test_input) for test_input in inputs]
+
+    return dict(zip(keys, results))
@@ -254,160 +254,95 @@ def welch_Psd(incl_sub: str, incl_session: list, incl_condition: list, incl_cont
 
                 # ch_names = [ch_names_renamed[idx] for idx in ch_names_indices] # new list of picked channel names based on the indeces 
 
+                # picked channel indices in the order of the recording, every channel only once
+                ch_names_indices = np.unique(ch_names_indices)
+                ch_names_picked = [ch_names_renamed[idx] for idx in ch_names_indices]
 
-                # create signal per channel with Welch´s method and plot
-                for i, ch in enumerate(ch_names_renamed):
-                    
-                    # only get picked channels
-                    if i not in ch_names_indices:
-                        continue
-
-                    #################### FILTER ####################
-
-                    # filter the signal by using the above defined butterworth filter
-                    filtered = scipy.signal.filtfilt(b, a, temp_data.get_data()[i, :]) # .get_data()
 
+                #################### FILTER ALL PICKED CHANNELS AT ONCE ####################
 
-                    #################### GET ABSOLUTE PSD VALUES BY USING WELCH'S METHOD ####################
+                # filter the channels x samples array along the time axis by using the above defined butterworth filter
+                filtered_channels = scipy.signal.filtfilt(b, a, temp_data.get_data()[ch_names_indices, :], axis=-1)
 
-                    window = 250 # with sfreq 250 frequencies will be from 0 to 125 Hz
-                    noverlap = 0.5
 
-                    # transform the filtered time series data into power spectral density using Welch's method
-                    f, px = scipy.signal.welch(filtered, fs, nperseg = window, noverlap = noverlap)  # Returns: f=array of sample frequencies, px= psd or power spectrum of x (amplitude)
-                    # density unit: mV**2/Hz
+                #################### GET ABSOLUTE PSD VALUES BY USING WELCH'S METHOD ####################
 
-                    # calculate the SEM of psd values and store sem of each channel in dictionary
-                    semRawPsd = np.std(px)/np.sqrt(len(px))
+                window = 250 # with sfreq 250 frequencies will be from 0 to 125 Hz
+                noverlap = 0.5
 
-                    # store frequency, raw psd and sem values in a dictionary, together with session timepoint and channel
-                    f_rawPsd_dict[f'{tp}_{ch}'] = [tp, ch, f, px, semRawPsd]
+                # transform the filtered time series data of all channels into power spectral density using Welch's method
+                f, px_channels = scipy.signal.welch(filtered_channels, fs, nperseg = window, noverlap = noverlap, axis=-1)  # Returns: f=array of sample frequencies, px_channels= psd of each channel (channels x frequencies)
+                # density unit: mV**2/Hz
 
-                
 
-                    #################### NORMALIZE PSD IN MULTIPLE WAYS ####################
-                    
-                    #################### NORMALIZE PSD TO TOTAL SUM OF THE POWER SPECTRUM (ALL FREQUENCIES) ####################
-
-                    # reshape the array to a single-row 2D array, so it can be used in sklearn.preprocessing.normalize()
-                    # normalize() does not work with px as input, eventhough it is a numpy array, reshaping px to a 2D array .reshape(1,-1) is necessary
-                    px_2Darray = px.reshape(1, -1) # reshape into a single-row 2D Array: -1 is a placeholder, so as many features as in px
-
-                    # sklearn.preprocessing.normalize() norm="l1" will normalize so that sum of absolute values is 1
-                    px_rel_2Darray = normalize(px_2Darray, norm='l1') 
-                    
-                    # reshape back to 1D Array, because of other functions that input 1D arrays: like scipy.signal.find_peaks
-                    rel_psd_1Darray = px_rel_2Darray.reshape(-1,) 
+                #################### NORMALIZE PSD IN MULTIPLE WAYS ####################
 
-                    # *100 to get the values in percentage
-                    normToTotalSum_psd = rel_psd_1Darray * 100                  
+                # sklearn.preprocessing.normalize() norm="l1" normalizes each row (channel) so that sum of absolute values is 1, *100 to get the values in percentage
+                normToTotalSum_channels = normalize(px_channels, norm='l1') * 100
 
-                    # calculate the SEM of psd values 
-                    semNormToTotalSum_psd = np.std(normToTotalSum_psd)/np.sqrt(len(normToTotalSum_psd))
+                # raw psd divided by sum of psd between 1 and 100 Hz (indexing the frequencies)
+                percentageNormPsdToSum1to100Hz_channels = (px_channels / px_channels[:, 1:104].sum(axis=-1, keepdims=True)) * 100
 
-                    # store frequencies and normalized psd values and sem of normalized psd in a dictionary
-                    f_normPsdToTotalSum_dict[f'{tp}_{ch}'] = [tp, ch, f, normToTotalSum_psd, semNormToTotalSum_psd]
+                # raw psd divided by sum of psd between 40 and 90 Hz (gerundet)
+                percentageNormPsdToSum40to90Hz_channels = (px_channels / px_channels[:, 41:93].sum(axis=-1, keepdims=True)) * 100
 
+                # psd and sem of each channel for every normalization: SEM = standard deviation of psd values / square root of number of frequencies
+                psd_channels = {
+                    "rawPsd": px_channels,
+                    "normPsdToTotalSum": normToTotalSum_channels,
+                    "normPsdToSum1_100Hz": percentageNormPsdToSum1to100Hz_channels,
+                    "normPsdToSum40_90Hz": percentageNormPsdToSum40to90Hz_channels,
+                }
+                sem_channels = {norm: np.std(psd, axis=-1) / np.sqrt(psd.shape[-1]) for norm, psd in psd_channels.items()}
 
-                    #################### NORMALIZE PSD TO SUM OF PSD BETWEEN 1-100 Hz  ####################
-                   
-                    # get raw psd values from 1 to 100 Hz by indexing the numpy arrays f and px
-                    rawPsd_1to100Hz = px[1:104]
-
-                    # sum of rawPSD between 1 and 100 Hz
-                    psdSum1to100Hz = rawPsd_1to100Hz.sum()
-
-                    # raw psd divided by sum of psd between 1 and 100 Hz
-                    normPsdToSum1to100Hz = px/psdSum1to100Hz
-                    percentageNormPsdToSum1to100Hz = normPsdToSum1to100Hz * 100 
-
-                    # calculate the SEM of psd values 
-                    semNormPsdToSum1to100Hz = np.std(percentageNormPsdToSum1to100Hz)/np.sqrt(len(percentageNormPsdToSum1to100Hz))
-
-                    # store frequencies and normalized psd values and sem of normalized psd in a dictionary
-                    f_normPsdToSum1to100Hz_dict[f'{tp}_{ch}'] = [tp, ch, f, percentageNormPsdToSum1to100Hz, semNormPsdToSum1to100Hz]
-
-
-                    #################### NORMALIZE PSD TO SUM OF PSD BETWEEN 40-90 Hz  ####################
-                   
-                    # get raw psd values from 40 to 90 Hz (gerundet) by indexing the numpy arrays f and px
-                    rawPsd_40to90Hz = px[41:93] 
-
-                    # sum of rawPSD between 40 and 90 Hz
-                    psdSum40to90Hz = rawPsd_40to90Hz.sum()
-
-                    # raw psd divided by sum of psd between 40 and 90 Hz
-                    normPsdToSum40to90Hz = px/psdSum40to90Hz
-                    percentageNormPsdToSum40to90Hz = normPsdToSum40to90Hz * 100 
-
-                    # calculate the SEM of psd values 
-                    semNormPsdToSum40to90Hz = np.std(percentageNormPsdToSum40to90Hz)/np.sqrt(len(percentageNormPsdToSum40to90Hz))
-
-                    # store frequencies and normalized psd values and sem of normalized psd in a dictionary
-                    f_normPsdToSum40to90Hz_dict[f'{tp}_{ch}'] = [tp, ch, f, percentageNormPsdToSum40to90Hz, semNormPsdToSum40to90Hz]
-
-
-                    #################### PEAK DETECTION ####################
-
-                    # depending on what normalization or raw was chosen: define variables for psd, sem and ylabel accordingly
-                    if normalization == "rawPsd":
-                        chosenPsd = px
-                        chosenSem = semRawPsd
-                        chosen_ylabel = "uV^2/Hz +- SEM"
-                    
-                    elif normalization == "normPsdToTotalSum":
-                        chosenPsd = normToTotalSum_psd
-                        chosenSem = semNormToTotalSum_psd
-                        chosen_ylabel = "rel. PSD to total sum (%) +- SEM"
-
-                    elif normalization == "normPsdToSum1_100Hz":
-                        chosenPsd = percentageNormPsdToSum1to100Hz
-                        chosenSem = semNormPsdToSum1to100Hz
-                        chosen_ylabel = "rel. PSD to sum 1-100 Hz (%) +- SEM"
-
-                    elif normalization == "normPsdToSum40_90Hz":
-                        chosenPsd = percentageNormPsdToSum40to90Hz
-                        chosenSem = semNormPsdToSum40to90Hz
-                        chosen_ylabel = "rel. PSD to sum 40-90 Hz (%) +- SEM"
-
-
-
-                    #################### PSD AVERAGE OF EACH FREQUENCY BAND DEPENDING ON CHOSEN PSD NORMALIZATION ####################
-                    
-                    # create booleans for each frequency-range for alpha, low beta, high beta, beta and gamma
-                    alpha_frequency = (f >= 8) & (f <= 12) # alpha_range will output a boolean of True values within the alpha range
-                    lowBeta_frequency = (f >= 13) & (f <= 20)
-                    highBeta_frequency = (f >= 21) & (f <= 35)
-                    beta_frequency = (f >= 13) & (f <= 35)
-                    narrowGamma_frequency = (f >= 40) & (f <= 90)
-
-                    # make a list with all boolean masks of each frequency, so I can loop through
-                    range_allFrequencies = [alpha_frequency, lowBeta_frequency, highBeta_frequency, beta_frequency, narrowGamma_frequency]
-
-                    # loop through frequency ranges and get all psd values of each frequency band
-                    for count, boolean in enumerate(range_allFrequencies):
-
-                        frequency = []
-                        if count == 0:
-                            frequency = "alpha"
-                        elif count == 1:
-                            frequency = "lowBeta"
-                        elif count == 2:
-                            frequency = "highBeta"
-                        elif count == 3:
-                            frequency = "beta"
-                        elif count == 4:
-                            frequency = "narrowGamma"
+                # depending on what normalization or raw was chosen: define variables for psd, sem and ylabel accordingly
+                if normalization == "rawPsd":
+                    chosen_ylabel = "uV^2/Hz +- SEM"
+                
+                elif normalization == "normPsdToTotalSum":
+                    chosen_ylabel = "rel. PSD to total sum (%) +- SEM"
 
+                elif normalization == "normPsdToSum1_100Hz":
+                    chosen_ylabel = "rel. PSD to sum 1-100 Hz (%) +- SEM"
 
-                        # get all frequencies and chosen psd values within each frequency range
-                        frequencyInFreqBand = f[range_allFrequencies[count]] # all frequencies within a frequency band
-                        psdInFreqBand = chosenPsd[range_allFrequencies[count]] # all psd values within a frequency band
+                elif normalization == "normPsdToSum40_90Hz":
+                    chosen_ylabel = "rel. PSD to sum 40-90 Hz (%) +- SEM"
+                
+                chosenPsd_channels = psd_channels[normalization]
+                chosenSem_channels = sem_channels[normalization]
 
-                        psdAverage = np.mean(psdInFreqBand)
 
-                        # store averaged psd values of each frequency band in a dictionary
-                        psdAverage_dict[f'{tp}_{ch}_psdAverage_{frequency}'] = [tp, ch, frequency, psdAverage]
+                #################### PSD AVERAGE OF EACH FREQUENCY BAND DEPENDING ON CHOSEN PSD NORMALIZATION ####################
+                
+                # boolean masks for each frequency-range: alpha, low beta, high beta, beta and gamma
+                range_allFrequencies = {
+                    "alpha": (f >= 8) & (f <= 12), # alpha_range will output a boolean of True values within the alpha range
+                    "lowBeta": (f >= 13) & (f <= 20),
+                    "highBeta": (f >= 21) & (f <= 35),
+                    "beta": (f >= 13) & (f <= 35),
+                    "narrowGamma": (f >= 40) & (f <= 90),
+                }
+
+                # average of the chosen psd values within each frequency band, for all channels at once
+                psdAverage_channels = {frequency: np.mean(chosenPsd_channels[:, boolean], axis=-1) for frequency, boolean in range_allFrequencies.items()}
+
+
+                # store values and detect peaks per channel
+                for i, ch in enumerate(ch_names_picked):
+
+                    px = px_channels[i]
+                    chosenPsd = chosenPsd_channels[i]
+                    chosenSem = chosenSem_channels[i]
+
+                    # store frequency, psd and sem values in a dictionary, together with session timepoint and channel
+                    f_rawPsd_dict[f'{tp}_{ch}'] = [tp, ch, f, px, sem_channels["rawPsd"][i]]
+                    f_normPsdToTotalSum_dict[f'{tp}_{ch}'] = [tp, ch, f, normToTotalSum_channels[i], sem_channels["normPsdToTotalSum"][i]]
+                    f_normPsdToSum1to100Hz_dict[f'{tp}_{ch}'] = [tp, ch, f, percentageNormPsdToSum1to100Hz_channels[i], sem_channels["normPsdToSum1_100Hz"][i]]
+                    f_normPsdToSum40to90Hz_dict[f'{tp}_{ch}'] = [tp, ch, f, percentageNormPsdToSum40to90Hz_channels[i], sem_channels["normPsdToSum40_90Hz"][i]]
+
+                    # store averaged psd values of each frequency band in a dictionary
+                    for frequency, psdAverage in psdAverage_channels.items():
+                        psdAverage_dict[f'{tp}_{ch}_psdAverage_{frequency}'] = [tp, ch, frequency, psdAverage[i]]
 
 
 
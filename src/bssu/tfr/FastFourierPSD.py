@@ -16,6 +16,214 @@ from scipy.signal import hann
 # import py_perceive
 from PerceiveImport.classes import main_class
 from .. utils import find_folders as findfolders
+from .. utils import binary_results as binary_results
+
+
+# normalization variants of the PSD, in the order they are written to the results
+normalization_list = ["rawPsd", "normPsdToTotalSum", "normPsdToSum1_100Hz", "normPsdToSum40_90Hz"]
+
+
+def normalize_spectrogram_psd(Sxx):
+    """
+
+    Input:
+        - Sxx: output of scipy.signal.spectrogram, array (..., frequencies, time_sectors)
+
+    Average the spectrogram over all time sectors and derive all normalization variants from the same array:
+        - rawPsd: average PSD of all time sectors
+        - normPsdToTotalSum: normalized to total sum of PSD from each power spectrum (in %)
+        - normPsdToSum1_100Hz: normalized to sum of PSD from 1-100 Hz (in %)
+        - normPsdToSum40_90Hz: normalized to sum of PSD from 40-90 Hz (in %)
+    
+    The SEM of the raw PSD (standard deviation over time sectors / sqrt(number of time sectors)) is normalized in the same way.
+
+    Leading dimensions (e.g. channels) are kept, so all channels of a recording can be normalized at once.
+
+    return {norm: [psd, sem]} for each normalization in normalization_list
+
+    """
+
+    # average all Power spectra of all time sectors 
+    average_Sxx = np.mean(Sxx, axis=-1)
+
+    # SEM = standard deviation / square root of sample size (number of time sectors)
+    semRawPsd = np.std(Sxx, axis=-1) / np.sqrt(Sxx.shape[-1])
+
+    # sum of PSD used for each normalization, keepdims so it broadcasts over the frequencies
+    normalization_sums = {
+        "normPsdToTotalSum": np.sum(average_Sxx, axis=-1, keepdims=True),
+        "normPsdToSum1_100Hz": np.sum(average_Sxx[..., 1:100], axis=-1, keepdims=True),
+        "normPsdToSum40_90Hz": np.sum(average_Sxx[..., 40:90], axis=-1, keepdims=True),
+    }
+
+    normalized_psd = {"rawPsd": [average_Sxx, semRawPsd]}
+
+    for norm, psd_sum in normalization_sums.items():
+        normalized_psd[norm] = [(average_Sxx / psd_sum) * 100, (semRawPsd / psd_sum) * 100] # in percentage
+
+    return normalized_psd
+
+
+# frequency bands used for band averages and peak detection: [lower, upper] frequency in Hz
+frequency_bands = {
+    "alpha": [8, 12],
+    "lowBeta": [13, 20],
+    "highBeta": [21, 35],
+    "beta": [13, 35],
+    "narrowGamma": [40, 90],
+}
+
+
+def frequency_band_averages(f, psd):
+    """
+
+    Input:
+        - f: frequencies of the power spectrum
+        - psd: array (..., frequencies), e.g. PSD of all channels of one recording (channels, frequencies)
+
+    Average the PSD within each frequency band of frequency_bands (including the lower and upper frequency).
+
+    return {frequency_band: average psd (...)}
+
+    """
+
+    return {
+        frequency: np.mean(psd[..., (f >= low) & (f <= high)], axis=-1) for frequency, (low, high) in frequency_bands.items()
+    }
+
+
+def spectrogram_Psd_allChannels(mainclass_sub, incl_session: list, incl_condition: list, incl_contact: list, pickChannels: list, filter: str):
+    """
+
+    Input: 
+        - mainclass_sub: main_class.PerceiveData of one subject
+        - incl_session: list ["postop", "fu3m", "fu12m", "fu18m", "fu24m"]
+        - incl_condition: list e.g. ["m0s0", "m1s0"]
+        - incl_contact: list of contact groups e.g. ["RingR", "SegmIntraR", "SegmInterR"]
+        - pickChannels: list of bipolar channels
+        - filter: str "unfiltered", "band-pass"
+
+    Single pass over all sessions, conditions and contact groups:
+        - if filter == "band-pass": band-pass filter by a Butterworth Filter of fifth order (5-95 Hz)
+        - calculate the spectrogram of all picked channels of a recording at once (channels, frequencies, time_sectors)
+        - derive the raw PSD and all normalization variants with normalize_spectrogram_psd()
+        - average the PSD of each frequency band with frequency_band_averages()
+
+    return a list with one dictionary per channel:
+        {"session_index", "session", "condition", "bipolarChannel", "frequency", "time_sectors", 
+        "psd": {norm: [psd, sem]}, "psdAverage": {norm: {frequency_band: psd average}}}
+
+    """
+
+    psd_channels = []
+
+    for t, tp in enumerate(incl_session):
+        # t is indexing time_points, tp are the time_points
+
+        for c, cond in enumerate(incl_condition):
+
+            for cont, contact in enumerate(incl_contact): 
+
+                # avoid Attribute Error, continue if attribute doesn´t exist
+                if getattr(mainclass_sub.survey, tp) is None:
+                    continue
+
+                temp_data = getattr(mainclass_sub.survey, tp) # gets attribute e.g. of tp "postop" from modality_class with modality set to survey
+                
+                # avoid Attribute Error, continue if attribute doesn´t exist
+                if getattr(temp_data, cond) is None:
+                    continue
+
+                temp_data = getattr(temp_data, cond) # gets attribute e.g. "m0s0"
+                temp_data = getattr(temp_data.rest, contact)
+                temp_data = temp_data.run1.data # gets the mne loaded data from the perceive .mat BSSu, m0s0 file with task "RestBSSuRingR"
+    
+
+                #################### CREATE A BUTTERWORTH FILTER ####################
+                # sampling frequency: 250 Hz
+                fs = temp_data.info['sfreq']
+
+                # only if filter == "band-pass"
+                if filter == "band-pass":
+
+                    # set filter parameters for band-pass filter
+                    filter_order = 5 # in MATLAB spm_eeg_filter default=5 Butterworth
+                    frequency_cutoff_low = 5 # 5Hz high-pass filter
+                    frequency_cutoff_high = 95 # 95 Hz low-pass filter
+
+                    # create the filter
+                    b, a = scipy.signal.butter(filter_order, (frequency_cutoff_low, frequency_cutoff_high), btype='bandpass', output='ba', fs=fs)
+    
+                else:
+                    print("no filter applied")
+                
+                # get new channel names
+                ch_names = temp_data.info.ch_names
+
+
+                #################### PICK CHANNELS ####################
+                include_channelList = [] # this will be a list with all channel names selected
+
+                for names in ch_names:
+                    
+                    # add all channel names that contain the picked channels: e.g. 02, 13, etc given in the input pickChannels
+                    for picked in pickChannels:
+                        if picked in names:
+                            include_channelList.append(names)
+                    
+                # Error Checking: 
+                if len(include_channelList) == 0:
+                    continue
+
+                # pick channels of interest: mne.pick_channels() will output the indices of included channels in an array
+                ch_names_indices = mne.pick_channels(ch_names, include=include_channelList)
+
+                # picked channel indices in the order of the recording, every channel only once
+                ch_names_indices = np.unique(ch_names_indices)
+
+                #################### FILTER ALL PICKED CHANNELS AT ONCE ####################
+                # channels x samples array of all picked channels
+                signal = {}
+                if filter == "band-pass":
+                    # filter the signal along the time axis by using the above defined butterworth filter
+                    signal["band-pass"] = scipy.signal.filtfilt(b, a, temp_data.get_data()[ch_names_indices, :], axis=-1)
+                
+                elif filter == "unfiltered": 
+                    signal["unfiltered"] = temp_data.get_data()[ch_names_indices, :]
+
+                #################### PERFORM FOURIER TRANSFORMATION AND CALCULATE POWER SPECTRAL DENSITY ####################
+
+                window = 250 # with sfreq 250 frequencies will be from 0 to 125 Hz, 125Hz = Nyquist = fs/2
+                noverlap = 0.5 # 50% overlap of windows 250/2=125 would be an overlap of 50%...
+
+                window = hann(window, sym=False) # 250 points in the output window, sym=False for use in spectral analysis
+
+                # compute the spectrogram of all channels at once along the time axis
+                f,time_sectors,Sxx = scipy.signal.spectrogram(x=signal[f"{filter}"], fs=fs, window=window, noverlap=noverlap,  scaling='density', mode='psd', axis=-1)
+                # f = frequencies 0-125 Hz (Maximum = Nyquist frequency = sfreq/2)
+                # time_sectors = sectors 0.5 - 20.5 s in 1.0 steps (in total 21 time sectors)
+                # Sxx = channels x 126 frequency rows x 21 time sector columns
+
+                # raw psd, all normalizations and band averages of all channels at once
+                psd = normalize_spectrogram_psd(Sxx)
+                psdAverage = {norm: frequency_band_averages(f, psd[norm][0]) for norm in normalization_list}
+
+                for i, ch_index in enumerate(ch_names_indices):
+
+                    psd_channels.append({
+                        "session_index": t,
+                        "session": tp,
+                        "condition": cond,
+                        "bipolarChannel": ch_names[ch_index],
+                        "frequency": f,
+                        "time_sectors": time_sectors,
+                        "psd": {norm: [psd[norm][0][i], psd[norm][1][i]] for norm in normalization_list},
+                        "psdAverage": {norm: {frequency: psdAverage[norm][frequency][i] for frequency in frequency_bands} for norm in normalization_list},
+                    })
+
+    return psd_channels
+
+
 
 def spectrogram_Psd(incl_sub: str, incl_session: list, incl_condition: list, pickChannels: list, hemisphere: str, filter: str):
     """
@@ -116,10 +324,34 @@ def spectrogram_Psd(incl_sub: str, incl_session: list, incl_condition: list, pic
     psdAverage_dict = {}
     highest_peak_dict = {}
 
-    # loop through all normalizations to get all values
-    normalization_list = ["rawPsd", "normPsdToTotalSum", "normPsdToSum1_100Hz", "normPsdToSum40_90Hz"]
+    #################### FILTER, SPECTROGRAM AND ALL NORMALIZATIONS: ONLY ONCE PER CHANNEL ####################
+    psd_channels = spectrogram_Psd_allChannels(
+        mainclass_sub=mainclass_sub,
+        incl_session=incl_session,
+        incl_condition=incl_condition,
+        incl_contact=incl_contact[f"{hemisphere}"],
+        pickChannels=pickChannels,
+        filter=filter
+    )
+
+    for psd_channel in psd_channels:
+
+        cond = psd_channel["condition"]
+        tp = psd_channel["session"]
+        ch = psd_channel["bipolarChannel"]
+        f = psd_channel["frequency"]
+        time_sectors = psd_channel["time_sectors"]
+        psd = psd_channel["psd"]
+
+        # store frequency, time vectors and psd values in a dictionary, together with session timepoint and channel
+        f_rawPsd_dict[f'{tp}_{ch}_{cond}'] = [cond, tp, ch, f, time_sectors] + psd["rawPsd"]
+        f_normPsdToTotalSum_dict[f'{tp}_{ch}_{cond}'] = [cond, tp, ch, f, time_sectors] + psd["normPsdToTotalSum"]
+        f_normPsdToSum1to100Hz_dict[f'{tp}_{ch}_{cond}'] = [cond, tp, ch, f, time_sectors] + psd["normPsdToSum1_100Hz"]
+        f_normPsdToSum40to90Hz_dict[f'{tp}_{ch}_{cond}'] = [cond, tp, ch, f, time_sectors] + psd["normPsdToSum40_90Hz"]
+
 
-    for n, norm in enumerate(normalization_list):
+    # loop through all normalizations: only band averages, peak detection and plotting depend on the normalization
+    for norm in normalization_list:
 
         # set layout for figures: using the object-oriented interface
         fig, axes = plt.subplots(len(incl_session), 1, figsize=(10, 15)) # subplot(rows, columns, panel number), figsize(width,height)
@@ -129,342 +361,138 @@ def spectrogram_Psd(incl_sub: str, incl_session: list, incl_condition: list, pic
         cycler_colors = cycler("color", ["blue", "navy", "deepskyblue", "purple", "green", "darkolivegreen", "magenta", "orange", "red", "darkred", "chocolate", "gold", "cyan",  "yellow", "lime"])
         plt.rc('axes', prop_cycle=cycler_colors)
 
-
-        for t, tp in enumerate(incl_session):
-            # t is indexing time_points, tp are the time_points
-
-            for c, cond in enumerate(incl_condition):
-
-                for cont, contact in enumerate(incl_contact[f"{hemisphere}"]): 
-                    # tk is indexing task, task is the input task
-
-                    # avoid Attribute Error, continue if attribute doesn´t exist
-                    if getattr(mainclass_sub.survey, tp) is None:
-                        continue
-
-                
-                    # apply loop over channels
-                    temp_data = getattr(mainclass_sub.survey, tp) # gets attribute e.g. of tp "postop" from modality_class with modality set to survey
-                    
-                    # avoid Attribute Error, continue if attribute doesn´t exist
-                    if getattr(temp_data, cond) is None:
-                        continue
-                
-                    # try:
-                    #     temp_data = getattr(temp_data, cond)
-                    #     temp_data = temp_data.rest.data[tasks[tk]]
-                    
-                    # except AttributeError:
-                    #     continue
-
-                    temp_data = getattr(temp_data, cond) # gets attribute e.g. "m0s0"
-                    temp_data = getattr(temp_data.rest, contact)
-                    temp_data = temp_data.run1.data # gets the mne loaded data from the perceive .mat BSSu, m0s0 file with task "RestBSSuRingR"
-        
-
-                    #################### CREATE A BUTTERWORTH FILTER ####################
-                    # sampling frequency: 250 Hz
-                    fs = temp_data.info['sfreq']
-
-                    # only if filter == "band-pass"
-                    if filter == "band-pass":
-
-                        # set filter parameters for band-pass filter
-                        filter_order = 5 # in MATLAB spm_eeg_filter default=5 Butterworth
-                        frequency_cutoff_low = 5 # 5Hz high-pass filter
-                        frequency_cutoff_high = 95 # 95 Hz low-pass filter
-
-                        # create the filter
-                        b, a = scipy.signal.butter(filter_order, (frequency_cutoff_low, frequency_cutoff_high), btype='bandpass', output='ba', fs=fs)
+        # define ylabel and limits depending on the normalization
+        if norm == "rawPsd":
+            chosen_ylabel = "uV^2/Hz+-SEM"
+            chosen_ylim = [0, 3]
         
-                    else:
-                        print("no filter applied")
-                    
-                    
-                    # get new channel names
-                    ch_names = temp_data.info.ch_names
-
-
-                    #################### PICK CHANNELS ####################
-                    include_channelList = [] # this will be a list with all channel names selected
-
-                    for n, names in enumerate(ch_names):
-                        
-                        # add all channel names that contain the picked channels: e.g. 02, 13, etc given in the input pickChannels
-                        for picked in pickChannels:
-                            if picked in names:
-                                include_channelList.append(names)
-
+        elif norm == "normPsdToTotalSum":
+            chosen_ylabel = "PSD to total sum[%]+-SEM"
+            chosen_ylim = [0, 14]
 
-                        # exclude all bipolar 0-3 channels, because they do not give much information
-                        # if "03" in names:
-                        #     exclude_channelList.append(names)
-                        
-                    # Error Checking: 
-                    if len(include_channelList) == 0:
-                        continue
+        elif norm == "normPsdToSum1_100Hz":
+            chosen_ylabel = "PSD to sum 1-100 Hz[%]+-SEM"
+            chosen_ylim = [0, 14]
 
-                    # pick channels of interest: mne.pick_channels() will output the indices of included channels in an array
-                    ch_names_indices = mne.pick_channels(ch_names, include=include_channelList)
+        elif norm == "normPsdToSum40_90Hz":
+            chosen_ylabel = "PSD to sum 40-90 Hz[%]+-SEM"
+            chosen_ylim = [0, 150]
 
-                    
-                    for i, ch in enumerate(ch_names):
-                        
-                        # only get picked channels
-                        if i not in ch_names_indices:
-                            continue
 
-                        #################### FILTER ####################
-                        signal = {}
-                        if filter == "band-pass":
-                            # filter the signal by using the above defined butterworth filter
-                            signal["band-pass"] = scipy.signal.filtfilt(b, a, temp_data.get_data()[i, :]) 
-                        
-                        elif filter == "unfiltered": 
-                            signal["unfiltered"] = temp_data.get_data()[i, :]
-
-                        #################### PERFORM FOURIER TRANSFORMATION AND CALCULATE POWER SPECTRAL DENSITY ####################
+        for psd_channel in psd_channels:
 
-                        window = 250 # with sfreq 250 frequencies will be from 0 to 125 Hz, 125Hz = Nyquist = fs/2
-                        noverlap = 0.5 # 50% overlap of windows 250/2=125 would be an overlap of 50%...
+            t = psd_channel["session_index"]
+            cond = psd_channel["condition"]
+            tp = psd_channel["session"]
+            ch = psd_channel["bipolarChannel"]
+            f = psd_channel["frequency"]
 
-                        window = hann(window, sym=False) # 250 points in the output window, sym=False for use in spectral analysis
-
-                        # compute spectrogram with Fourier Transforms
-                        
-                        f,time_sectors,Sxx = scipy.signal.spectrogram(x=signal[f"{filter}"], fs=fs, window=window, noverlap=noverlap,  scaling='density', mode='psd', axis=0)
-                        # f = frequencies 0-125 Hz (Maximum = Nyquist frequency = sfreq/2)
-                        # time_sectors = sectors 0.5 - 20.5 s in 1.0 steps (in total 21 time sectors)
-                        # Sxx = 126 arrays with 21 values each of PSD [µV^2/Hz], for each frequency bin PSD values of each time sector
-                        # Sxx = 126 frequency rows, 21 time sector columns
-
-                        # average all 21 Power spectra of all time sectors 
-                        average_Sxx = np.mean(Sxx, axis=1) # axis = 1 -> mean of each column: in total 21x126 mean values for each frequency
-                                    
-
-                        #################### CALCULATE THE STANDARD ERROR OF MEAN ####################
-                        # SEM = standard deviation / square root of sample size
-                        Sxx_std = np.std(Sxx, axis=1) # standard deviation of each frequency row
-                        semRawPsd = Sxx_std / np.sqrt(Sxx.shape[1]) # sample size = 21 time vectors -> sem with 126 values
-
-                        # store frequency, time vectors and psd values in a dictionary, together with session timepoint and channel
-                        f_rawPsd_dict[f'{tp}_{ch}_{cond}'] = [cond, tp, ch, f, time_sectors, average_Sxx, semRawPsd] 
+            # raw or normalized PSD and SEM of this channel, computed once in spectrogram_Psd_allChannels()
+            chosenPsd, chosenSem = psd_channel["psd"][norm]
                     
+            #################### PSD AVERAGE OF EACH FREQUENCY BAND DEPENDING ON CHOSEN PSD NORMALIZATION ####################
+            
+            # band averages of all channels were computed at once in spectrogram_Psd_allChannels()
+            for frequency, psdAverage in psd_channel["psdAverage"][norm].items():
 
-                        #################### NORMALIZE PSD IN MULTIPLE WAYS ####################
-                        
-                        #################### NORMALIZE PSD TO TOTAL SUM OF THE POWER SPECTRUM (ALL FREQUENCIES) ####################
-
-                        normToTotalSum_psd = (average_Sxx/np.sum(average_Sxx))*100 # in percentage               
-                        # calculate the SEM of psd values 
-                        semNormToTotalSum_psd = (semRawPsd/np.sum(average_Sxx))*100
-
-                        # store frequencies and normalized psd values and sem of normalized psd in a dictionary
-                        f_normPsdToTotalSum_dict[f'{tp}_{ch}_{cond}'] = [cond, tp, ch, f, time_sectors, normToTotalSum_psd, semNormToTotalSum_psd]
-
-
-                        #################### NORMALIZE PSD TO SUM OF PSD BETWEEN 1-100 Hz  ####################
-                    
-                        # get raw psd values from 1 to 100 Hz by indexing the numpy arrays f and px
-                        rawPsd_1to100Hz = average_Sxx[1:100]
-
-                        # sum of rawPSD between 1 and 100 Hz
-                        psdSum1to100Hz = rawPsd_1to100Hz.sum()
-
-                        # raw psd divided by sum of psd between 1 and 100 Hz
-                        normPsdToSum1to100Hz = (average_Sxx/psdSum1to100Hz)*100
-
-                        # calculate the SEM of psd values 
-                        semNormPsdToSum1to100Hz = (semRawPsd/psdSum1to100Hz)*100
-
-                        # store frequencies and normalized psd values and sem of normalized psd in a dictionary
-                        f_normPsdToSum1to100Hz_dict[f'{tp}_{ch}_{cond}'] = [cond, tp, ch, f, time_sectors, normPsdToSum1to100Hz, semNormPsdToSum1to100Hz]
-
-
-                        #################### NORMALIZE PSD TO SUM OF PSD BETWEEN 40-90 Hz  ####################
-                    
-                        # get raw psd values from 40 to 90 Hz (gerundet) by indexing the numpy arrays f and px
-                        rawPsd_40to90Hz = average_Sxx[40:90] 
-
-                        # sum of rawPSD between 40 and 90 Hz
-                        psdSum40to90Hz = rawPsd_40to90Hz.sum()
-
-                        # raw psd divided by sum of psd between 40 and 90 Hz
-                        normPsdToSum40to90Hz = (average_Sxx/psdSum40to90Hz)*100
-                    
-                        # calculate the SEM of psd values 
-                        semNormPsdToSum40to90Hz = (semRawPsd/psdSum40to90Hz)*100
-
-                        # store frequencies and normalized psd values and sem of normalized psd in a dictionary
-                        f_normPsdToSum40to90Hz_dict[f'{tp}_{ch}_{cond}'] = [cond, tp, ch, f, time_sectors, normPsdToSum40to90Hz, semNormPsdToSum40to90Hz]
-
-
-                        #################### PSD average and PEAK DETECTION ####################
-                        # depending on what normalization or raw was chosen: define variables for psd, sem and ylabel accordingly
-                        if norm == "rawPsd":
-                            chosenPsd = average_Sxx
-                            chosenSem = semRawPsd
-                            chosen_ylabel = "uV^2/Hz+-SEM"
-                            chosen_ylim = [0, 3]
-                        
-                        elif norm == "normPsdToTotalSum":
-                            chosenPsd = normToTotalSum_psd
-                            chosenSem = semNormToTotalSum_psd
-                            chosen_ylabel = "PSD to total sum[%]+-SEM"
-                            chosen_ylim = [0, 14]
-
-                        elif norm == "normPsdToSum1_100Hz":
-                            chosenPsd = normPsdToSum1to100Hz
-                            chosenSem = semNormPsdToSum1to100Hz
-                            chosen_ylabel = "PSD to sum 1-100 Hz[%]+-SEM"
-                            chosen_ylim = [0, 14]
-
-                        elif norm == "normPsdToSum40_90Hz":
-                            chosenPsd = normPsdToSum40to90Hz
-                            chosenSem = semNormPsdToSum40to90Hz
-                            chosen_ylabel = "PSD to sum 40-90 Hz[%]+-SEM"
-                            chosen_ylim = [0, 150]
-                        
-                        else:
-                            chosenPsd = average_Sxx
-                            chosenSem = semRawPsd
-                            chosen_ylabel = "uV^2/Hz+-SEM"
-                        # else statement is necessary to ensure the definition variable is not only locally 
-                            
-
-                        #################### PSD AVERAGE OF EACH FREQUENCY BAND DEPENDING ON CHOSEN PSD NORMALIZATION ####################
-                        
-                        # create booleans for each frequency-range for alpha, low beta, high beta, beta and gamma
-                        alpha_frequency = (f >= 8) & (f <= 12) # alpha_range will output a boolean of True values within the alpha range
-                        lowBeta_frequency = (f >= 13) & (f <= 20)
-                        highBeta_frequency = (f >= 21) & (f <= 35)
-                        beta_frequency = (f >= 13) & (f <= 35)
-                        narrowGamma_frequency = (f >= 40) & (f <= 90)
-
-                        # make a list with all boolean masks of each frequency, so I can loop through
-                        range_allFrequencies = [alpha_frequency, lowBeta_frequency, highBeta_frequency, beta_frequency, narrowGamma_frequency]
-
-                        # loop through frequency ranges and get all psd values of each frequency band
-                        for count, boolean in enumerate(range_allFrequencies):
-
-                            frequency = []
-                            if count == 0:
-                                frequency = "alpha"
-                            elif count == 1:
-                                frequency = "lowBeta"
-                            elif count == 2:
-                                frequency = "highBeta"
-                            elif count == 3:
-                                frequency = "beta"
-                            elif count == 4:
-                                frequency = "narrowGamma"
-                            
+                # store averaged psd values of each frequency band in a dictionary
+                psdAverage_dict[f'{cond}_{tp}_{ch}_psdAverage_{norm}_{frequency}'] = [cond, tp, ch, frequency, norm, psdAverage]
 
 
-                            # get all frequencies and chosen psd values within each frequency range
-                            # frequencyInFreqBand = f[range_allFrequencies[count]] # all frequencies within a frequency band
-                            psdInFreqBand = chosenPsd[range_allFrequencies[count]] # all psd values within a frequency band
 
-                            psdAverage = np.mean(psdInFreqBand)
+            #################### PEAK DETECTION PSD DEPENDING ON CHOSEN PSD NORMALIZATION ####################
+            # find all peaks: peaks is a tuple -> peaks[0] = index of frequency?, peaks[1] = dictionary with keys("peaks_height") 
+            peaks = scipy.signal.find_peaks(chosenPsd, height=0.1) # height: peaks only above 0.1 will be recognized
 
-                            # store averaged psd values of each frequency band in a dictionary
-                            psdAverage_dict[f'{cond}_{tp}_{ch}_psdAverage_{norm}_{frequency}'] = [cond, tp, ch, frequency, norm, psdAverage]
+            # Error checking: if no peaks found, continue
+            if len(peaks) == 0:
+                continue
 
+            peaks_height = peaks[1]["peak_heights"] # np.array of y-value of peaks = power
+            peaks_pos = f[peaks[0]] # np.array of indeces on x-axis of peaks = frequency
 
+            # set the x-range for each frequency band
+            alpha_range = (peaks_pos >= 8) & (peaks_pos <= 12) # alpha_range will output a boolean of True values within the alpha range
+            lowBeta_range = (peaks_pos >= 13) & (peaks_pos <= 20)
+            highBeta_range = (peaks_pos >= 21) & (peaks_pos <= 35)
+            beta_range = (peaks_pos >= 13) & (peaks_pos <= 35)
+            narrowGamma_range = (peaks_pos >= 40) & (peaks_pos <= 90)
 
-                        #################### PEAK DETECTION PSD DEPENDING ON CHOSEN PSD NORMALIZATION ####################
-                        # find all peaks: peaks is a tuple -> peaks[0] = index of frequency?, peaks[1] = dictionary with keys("peaks_height") 
-                        peaks = scipy.signal.find_peaks(chosenPsd, height=0.1) # height: peaks only above 0.1 will be recognized
+            # make a list with all boolean masks of each frequency, so I can loop through
+            frequency_ranges = [alpha_range, lowBeta_range, highBeta_range, beta_range, narrowGamma_range]
 
-                        # Error checking: if no peaks found, continue
-                        if len(peaks) == 0:
-                            continue
+            # loop through frequency ranges and get the highest peak of each frequency band
+            for count, boolean in enumerate(frequency_ranges):
 
-                        peaks_height = peaks[1]["peak_heights"] # np.array of y-value of peaks = power
-                        peaks_pos = f[peaks[0]] # np.array of indeces on x-axis of peaks = frequency
-
-                        # set the x-range for each frequency band
-                        alpha_range = (peaks_pos >= 8) & (peaks_pos <= 12) # alpha_range will output a boolean of True values within the alpha range
-                        lowBeta_range = (peaks_pos >= 13) & (peaks_pos <= 20)
-                        highBeta_range = (peaks_pos >= 21) & (peaks_pos <= 35)
-                        beta_range = (peaks_pos >= 13) & (peaks_pos <= 35)
-                        narrowGamma_range = (peaks_pos >= 40) & (peaks_pos <= 90)
-
-                        # make a list with all boolean masks of each frequency, so I can loop through
-                        frequency_ranges = [alpha_range, lowBeta_range, highBeta_range, beta_range, narrowGamma_range]
-
-                        # loop through frequency ranges and get the highest peak of each frequency band
-                        for count, boolean in enumerate(frequency_ranges):
-
-                            frequency = []
-                            if count == 0:
-                                frequency = "alpha"
-                            elif count == 1:
-                                frequency = "lowBeta"
-                            elif count == 2:
-                                frequency = "highBeta"
-                            elif count == 3:
-                                frequency = "beta"
-                            elif count == 4:
-                                frequency = "narrowGamma"
-                            
-                            # get all peak positions and heights within each frequency range
-                            peaksinfreq_pos = peaks_pos[frequency_ranges[count]]
-                            peaksinfreq_height = peaks_height[frequency_ranges[count]]
+                frequency = []
+                if count == 0:
+                    frequency = "alpha"
+                elif count == 1:
+                    frequency = "lowBeta"
+                elif count == 2:
+                    frequency = "highBeta"
+                elif count == 3:
+                    frequency = "beta"
+                elif count == 4:
+                    frequency = "narrowGamma"
+                
+                # get all peak positions and heights within each frequency range
+                peaksinfreq_pos = peaks_pos[frequency_ranges[count]]
+                peaksinfreq_height = peaks_height[frequency_ranges[count]]
 
-                            # Error checking: check first, if there is a peak in the frequency range
-                            if len(peaksinfreq_height) == 0:
-                                continue
+                # Error checking: check first, if there is a peak in the frequency range
+                if len(peaksinfreq_height) == 0:
+                    continue
 
-                            # select only the highest peak within the alpha range
-                            highest_peak_height = peaksinfreq_height.max()
+                # select only the highest peak within the alpha range
+                highest_peak_height = peaksinfreq_height.max()
 
-                            ######## calculate psd average of +- 2 Hz from highest Peak ########
-                            # 1) find psd values from -2Hz until + 2Hz from highest Peak by slicing and indexing the numpy array of all chosen psd values
-                            peakIndex = np.where(chosenPsd == highest_peak_height) # np.where output is a tuple: index, dtype
-                            peakIndexValue = peakIndex[0].item() # only take the index value of the highest Peak psd value in all chosen psd
+                ######## calculate psd average of +- 2 Hz from highest Peak ########
+                # 1) find psd values from -2Hz until + 2Hz from highest Peak by slicing and indexing the numpy array of all chosen psd values
+                peakIndex = np.where(chosenPsd == highest_peak_height) # np.where output is a tuple: index, dtype
+                peakIndexValue = peakIndex[0].item() # only take the index value of the highest Peak psd value in all chosen psd
 
-                            # 2) go -2 and +3 indeces 
-                            indexlowCutt = peakIndexValue-2
-                            indexhighCutt = peakIndexValue+3   # +3 because the ending index is left out when slicing a numpy array
+                # 2) go -2 and +3 indeces 
+                indexlowCutt = peakIndexValue-2
+                indexhighCutt = peakIndexValue+3   # +3 because the ending index is left out when slicing a numpy array
 
-                            # 3) slice the numpy array of all chosen psd values, only get values from -2 until +2 Hz from highest Peak
-                            psdArray5HzRangeAroundPeak = chosenPsd[indexlowCutt:indexhighCutt] # array only of psd values -2 until +2Hz around Peak = 5 values
+                # 3) slice the numpy array of all chosen psd values, only get values from -2 until +2 Hz from highest Peak
+                psdArray5HzRangeAroundPeak = chosenPsd[indexlowCutt:indexhighCutt] # array only of psd values -2 until +2Hz around Peak = 5 values
 
-                            # 4) Average of 5Hz Array
-                            highest_peak_height_5Hzaverage = np.mean(psdArray5HzRangeAroundPeak)                       
+                # 4) Average of 5Hz Array
+                highest_peak_height_5Hzaverage = np.mean(psdArray5HzRangeAroundPeak)                       
 
 
 
-                            # get the index of the highest peak y value to get the corresponding peak position x
-                            ix = np.where(peaksinfreq_height == highest_peak_height)
-                            highest_peak_pos = peaksinfreq_pos[ix].item()
+                # get the index of the highest peak y value to get the corresponding peak position x
+                ix = np.where(peaksinfreq_height == highest_peak_height)
+                highest_peak_pos = peaksinfreq_pos[ix].item()
 
-                            # plot only the highest peak within each frequency band
-                            axes[t].scatter(highest_peak_pos, highest_peak_height, color="k", s=15, marker='D')
+                # plot only the highest peak within each frequency band
+                axes[t].scatter(highest_peak_pos, highest_peak_height, color="k", s=15, marker='D')
 
-                            # store highest peak values of each frequency band in a dictionary
-                            highest_peak_dict[f'{cond}_{tp}_{ch}_highestPEAK_{norm}_{frequency}'] = [cond, tp, ch, frequency, norm, highest_peak_pos, highest_peak_height, highest_peak_height_5Hzaverage]
+                # store highest peak values of each frequency band in a dictionary
+                highest_peak_dict[f'{cond}_{tp}_{ch}_highestPEAK_{norm}_{frequency}'] = [cond, tp, ch, frequency, norm, highest_peak_pos, highest_peak_height, highest_peak_height_5Hzaverage]
 
 
 
 
-                        #################### PLOT THE CHOSEN PSD DEPENDING ON NORMALIZATION INPUT ####################
+            #################### PLOT THE CHOSEN PSD DEPENDING ON NORMALIZATION INPUT ####################
 
-                        # the title of each plot is set to the timepoint e.g. "postop"
-                        axes[t].set_title(tp, fontsize=15) 
+            # the title of each plot is set to the timepoint e.g. "postop"
+            axes[t].set_title(tp, fontsize=15) 
 
-                        # get y-axis label and limits
-                        # axes[t].get_ylabel()
-                        # axes[t].get_ylim()
+            # get y-axis label and limits
+            # axes[t].get_ylabel()
+            # axes[t].get_ylim()
 
-                        # .plot() method for creating the plot, axes[0] refers to the first plot, the plot is set on the appropriate object axes[t]
-                        axes[t].plot(f, chosenPsd, label=f"{ch}_{cond}")  # or np.log10(px) 
-                        # colors of each line in different color, defined at the beginning
-                        # axes[t].plot(f, chosenPsd, label=f"{ch}_{cond}", color=colors[i])
+            # .plot() method for creating the plot, axes[0] refers to the first plot, the plot is set on the appropriate object axes[t]
+            axes[t].plot(f, chosenPsd, label=f"{ch}_{cond}")  # or np.log10(px) 
+            # colors of each line in different color, defined at the beginning
+            # axes[t].plot(f, chosenPsd, label=f"{ch}_{cond}", color=colors[i])
 
-                        # make a shadowed line of the sem
-                        axes[t].fill_between(f, chosenPsd-chosenSem, chosenPsd+chosenSem, color='lightgray', alpha=0.5)
+            # make a shadowed line of the sem
+            axes[t].fill_between(f, chosenPsd-chosenSem, chosenPsd+chosenSem, color='lightgray', alpha=0.5)
 
 
 
@@ -554,11 +582,15 @@ def spectrogram_Psd(incl_sub: str, incl_session: list, incl_condition: list, pic
     # normPsdToSum40to90DataFrame.to_json(os.path.join(results_path,f"SPECTROGRAMnormPsdToSum_40to90Hz_{hemisphere}_{filter}"), sep=",")
     psdAverageDF.to_json(os.path.join(results_path,f"SPECTROGRAMpsdAverageFrequencyBands_{hemisphere}_{filter}.json"))
     highestPEAKDF.to_json(os.path.join(results_path,f"SPECTROGRAM_highestPEAK_FrequencyBands_{hemisphere}_{filter}.json"))
+    binary_results.write_npz_result(psdAverageDF, os.path.join(results_path,f"SPECTROGRAMpsdAverageFrequencyBands_{hemisphere}_{filter}.json"))
+    binary_results.write_npz_result(highestPEAKDF, os.path.join(results_path,f"SPECTROGRAM_highestPEAK_FrequencyBands_{hemisphere}_{filter}.json"))
 
     # concatenate the PSD Dataframes to one and take out the Duplicated columns
     PSD_Dataframe = pd.concat([rawPSDDataFrame, normPsdToTotalSumDataFrame, normPsdToSum1to100HzDataFrame, normPsdToSum40to90DataFrame], axis=1)
     PSD_Dataframe = PSD_Dataframe.loc[:,~PSD_Dataframe.columns.duplicated()]
     PSD_Dataframe.to_json(os.path.join(results_path,f"SPECTROGRAMPSD_{hemisphere}_{filter}.json"))  
+    # binary copy of the power spectra, preferred by loadResults.load_PSDjson
+    binary_results.write_npz_result(PSD_Dataframe, os.path.join(results_path,f"SPECTROGRAMPSD_{hemisphere}_{filter}.json"))
 
 
     return {
@@ -705,10 +737,34 @@ def spectrogram_Psd_onlyONEsession(incl_sub: str, incl_session: list, incl_condi
     psdAverage_dict = {}
     highest_peak_dict = {}
 
-    # loop through all normalizations to get all values
-    normalization_list = ["rawPsd", "normPsdToTotalSum", "normPsdToSum1_100Hz", "normPsdToSum40_90Hz"]
+    #################### FILTER, SPECTROGRAM AND ALL NORMALIZATIONS: ONLY ONCE PER CHANNEL ####################
+    psd_channels = spectrogram_Psd_allChannels(
+        mainclass_sub=mainclass_sub,
+        incl_session=incl_session,
+        incl_condition=incl_condition,
+        incl_contact=incl_contact[f"{hemisphere}"],
+        pickChannels=pickChannels,
+        filter=filter
+    )
+
+    for psd_channel in psd_channels:
+
+        cond = psd_channel["condition"]
+        tp = psd_channel["session"]
+        ch = psd_channel["bipolarChannel"]
+        f = psd_channel["frequency"]
+        time_sectors = psd_channel["time_sectors"]
+        psd = psd_channel["psd"]
+
+        # store frequency, time vectors and psd values in a dictionary, together with session timepoint and channel
+        f_rawPsd_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors] + psd["rawPsd"]
+        f_normPsdToTotalSum_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors] + psd["normPsdToTotalSum"]
+        f_normPsdToSum1to100Hz_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors] + psd["normPsdToSum1_100Hz"]
+        f_normPsdToSum40to90Hz_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors] + psd["normPsdToSum40_90Hz"]
 
-    for n, norm in enumerate(normalization_list):
+
+    # loop through all normalizations: only band averages, peak detection and plotting depend on the normalization
+    for norm in normalization_list:
 
         # set layout for figures: using the object-oriented interface
         fig = plt.figure() # subplot(rows, columns, panel number), figsize(width,height)
@@ -719,343 +775,137 @@ def spectrogram_Psd_onlyONEsession(incl_sub: str, incl_session: list, incl_condi
         cycler_colors = cycler("color", ["blue", "navy", "deepskyblue", "purple", "green", "darkolivegreen", "magenta", "orange", "red", "darkred", "chocolate", "gold", "cyan",  "yellow", "lime"])
         plt.rc('axes', prop_cycle=cycler_colors)
 
-
-        for t, tp in enumerate(incl_session):
-            # t is indexing time_points, tp are the time_points
-
-            for c, cond in enumerate(incl_condition):
-
-                for cont, contact in enumerate(incl_contact[f"{hemisphere}"]): 
-                    # tk is indexing task, task is the input task
-
-                    # avoid Attribute Error, continue if attribute doesn´t exist
-                    if getattr(mainclass_sub.survey, tp) is None:
-                        continue
-
-                
-                    # apply loop over channels
-                    temp_data = getattr(mainclass_sub.survey, tp) # gets attribute e.g. of tp "postop" from modality_class with modality set to survey
-                    
-                    # avoid Attribute Error, continue if attribute doesn´t exist
-                    if getattr(temp_data, cond) is None:
-                        continue
-                
-                    # try:
-                    #     temp_data = getattr(temp_data, cond)
-                    #     temp_data = temp_data.rest.data[tasks[tk]]
-                    
-                    # except AttributeError:
-                    #     continue
-
-                    temp_data = getattr(temp_data, cond) # gets attribute e.g. "m0s0"
-                    temp_data = getattr(temp_data.rest, contact)
-                    temp_data = temp_data.run1.data # gets the mne loaded data from the perceive .mat BSSu, m0s0 file with task "RestBSSuRingR"
-        
-
-                    #################### CREATE A BUTTERWORTH FILTER ####################
-                    # sampling frequency: 250 Hz
-                    fs = temp_data.info['sfreq']
-
-                    # only if filter == "band-pass"
-                    if filter == "band-pass":
-
-                        # set filter parameters for band-pass filter
-                        filter_order = 5 # in MATLAB spm_eeg_filter default=5 Butterworth
-                        frequency_cutoff_low = 5 # 5Hz high-pass filter
-                        frequency_cutoff_high = 95 # 95 Hz low-pass filter
-
-                        # create the filter
-                        b, a = scipy.signal.butter(filter_order, (frequency_cutoff_low, frequency_cutoff_high), btype='bandpass', output='ba', fs=fs)
+        # define ylabel and limits depending on the normalization
+        if norm == "rawPsd":
+            chosen_ylabel = "uV^2/Hz+-SEM"
+            chosen_ylim = [0, 9]
         
-                    else:
-                        print("no filter applied")
-                    
-                    
-                    # get new channel names
-                    ch_names = temp_data.info.ch_names
+        elif norm == "normPsdToTotalSum":
+            chosen_ylabel = "PSD to total sum[%]+-SEM"
+            chosen_ylim = [0, 14]
 
+        elif norm == "normPsdToSum1_100Hz":
+            chosen_ylabel = "PSD to sum 1-100 Hz[%]+-SEM"
+            chosen_ylim = [0, 14]
 
-                    #################### PICK CHANNELS ####################
-                    include_channelList = [] # this will be a list with all channel names selected
-                    exclude_channelList = []
-
-                    for n, names in enumerate(ch_names):
-                        
-                        # add all channel names that contain the picked channels: e.g. 02, 13, etc given in the input pickChannels
-                        for picked in pickChannels:
-                            if picked in names:
-                                include_channelList.append(names)
+        elif norm == "normPsdToSum40_90Hz":
+            chosen_ylabel = "PSD to sum 40-90 Hz[%]+-SEM"
+            chosen_ylim = [0, 200]
 
 
-                        # exclude all bipolar 0-3 channels, because they do not give much information
-                        # if "03" in names:
-                        #     exclude_channelList.append(names)
-                        
-                    # Error Checking: 
-                    if len(include_channelList) == 0:
-                        continue
+        for psd_channel in psd_channels:
 
-                    # pick channels of interest: mne.pick_channels() will output the indices of included channels in an array
-                    ch_names_indices = mne.pick_channels(ch_names, include=include_channelList)
+            cond = psd_channel["condition"]
+            tp = psd_channel["session"]
+            ch = psd_channel["bipolarChannel"]
+            f = psd_channel["frequency"]
 
+            # raw or normalized PSD and SEM of this channel, computed once in spectrogram_Psd_allChannels()
+            chosenPsd, chosenSem = psd_channel["psd"][norm]
                     
-                    for i, ch in enumerate(ch_names):
-                        
-                        # only get picked channels
-                        if i not in ch_names_indices:
-                            continue
-
-                        #################### FILTER ####################
-                        signal = {}
-                        if filter == "band-pass":
-                            # filter the signal by using the above defined butterworth filter
-                            signal["band-pass"] = scipy.signal.filtfilt(b, a, temp_data.get_data()[i, :]) 
-                        
-                        elif filter == "unfiltered": 
-                            signal["unfiltered"] = temp_data.get_data()[i, :]
-
-                        #################### PERFORM FOURIER TRANSFORMATION AND CALCULATE POWER SPECTRAL DENSITY ####################
-
-                        window = 250 # with sfreq 250 frequencies will be from 0 to 125 Hz, 125Hz = Nyquist = fs/2
-                        noverlap = 0.5 # 50% overlap of windows
-
-                        window = hann(window, sym=False)
-
-                        # compute spectrogram with Fourier Transforms
-                        
-                        f,time_sectors,Sxx = scipy.signal.spectrogram(x=signal[f"{filter}"], fs=fs, window=window, noverlap=noverlap,  scaling='density', mode='psd', axis=0)
-                        # f = frequencies 0-125 Hz (Maximum = Nyquist frequency = sfreq/2)
-                        # time_sectors = sectors 0.5 - 20.5 s in 0.5 steps (in total 21 time sectors)
-                        # Sxx = 126 arrays with 21 values each of PSD [µV^2/Hz], for each frequency bin PSD values of each time sector
-                        # Sxx = 126 frequency rows, 21 time sector columns
-
-                        # average all 21 Power spectra of all time sectors 
-                        average_Sxx = np.mean(Sxx, axis=1) # axis = 1 -> mean of each column: in total 21x126 mean values for each frequency
-                                    
-
-                        #################### CALCULATE THE STANDARD ERROR OF MEAN ####################
-                        # SEM = standard deviation / square root of sample size
-                        Sxx_std = np.std(Sxx, axis=1) # standard deviation of each frequency row
-                        semRawPsd = Sxx_std / np.sqrt(Sxx.shape[1]) # sample size = 21 time vectors -> sem with 126 values
-
-                        # store frequency, time vectors and psd values in a dictionary, together with session timepoint and channel
-                        f_rawPsd_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors, average_Sxx, semRawPsd] 
-                    
-
-                        #################### NORMALIZE PSD IN MULTIPLE WAYS ####################
-                        
-                        #################### NORMALIZE PSD TO TOTAL SUM OF THE POWER SPECTRUM (ALL FREQUENCIES) ####################
-
-                        normToTotalSum_psd = (average_Sxx/np.sum(average_Sxx))*100 # in percentage               
-                        # calculate the SEM of psd values 
-                        semNormToTotalSum_psd = (semRawPsd/np.sum(average_Sxx))*100
-
-                        # store frequencies and normalized psd values and sem of normalized psd in a dictionary
-                        f_normPsdToTotalSum_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors, normToTotalSum_psd, semNormToTotalSum_psd]
-
-
-                        #################### NORMALIZE PSD TO SUM OF PSD BETWEEN 1-100 Hz  ####################
-                    
-                        # get raw psd values from 1 to 100 Hz by indexing the numpy arrays f and px
-                        rawPsd_1to100Hz = average_Sxx[1:100]
-
-                        # sum of rawPSD between 1 and 100 Hz
-                        psdSum1to100Hz = rawPsd_1to100Hz.sum()
-
-                        # raw psd divided by sum of psd between 1 and 100 Hz
-                        normPsdToSum1to100Hz = (average_Sxx/psdSum1to100Hz)*100
-
-                        # calculate the SEM of psd values 
-                        semNormPsdToSum1to100Hz = (semRawPsd/psdSum1to100Hz)*100
-
-                        # store frequencies and normalized psd values and sem of normalized psd in a dictionary
-                        f_normPsdToSum1to100Hz_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors, normPsdToSum1to100Hz, semNormPsdToSum1to100Hz]
-
-
-                        #################### NORMALIZE PSD TO SUM OF PSD BETWEEN 40-90 Hz  ####################
-                    
-                        # get raw psd values from 40 to 90 Hz (gerundet) by indexing the numpy arrays f and px
-                        rawPsd_40to90Hz = average_Sxx[40:90] 
-
-                        # sum of rawPSD between 40 and 90 Hz
-                        psdSum40to90Hz = rawPsd_40to90Hz.sum()
-
-                        # raw psd divided by sum of psd between 40 and 90 Hz
-                        normPsdToSum40to90Hz = (average_Sxx/psdSum40to90Hz)*100
-                    
-                        # calculate the SEM of psd values 
-                        semNormPsdToSum40to90Hz = (semRawPsd/psdSum40to90Hz)*100
-
-                        # store frequencies and normalized psd values and sem of normalized psd in a dictionary
-                        f_normPsdToSum40to90Hz_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors, normPsdToSum40to90Hz, semNormPsdToSum40to90Hz]
-
-
-                        #################### PSD average and PEAK DETECTION ####################
-                        # depending on what normalization or raw was chosen: define variables for psd, sem and ylabel accordingly
-                        if norm == "rawPsd":
-                            chosenPsd = average_Sxx
-                            chosenSem = semRawPsd
-                            chosen_ylabel = "uV^2/Hz+-SEM"
-                            chosen_ylim = [0, 9]
-                        
-                        elif norm == "normPsdToTotalSum":
-                            chosenPsd = normToTotalSum_psd
-                            chosenSem = semNormToTotalSum_psd
-                            chosen_ylabel = "PSD to total sum[%]+-SEM"
-                            chosen_ylim = [0, 14]
-
-                        elif norm == "normPsdToSum1_100Hz":
-                            chosenPsd = normPsdToSum1to100Hz
-                            chosenSem = semNormPsdToSum1to100Hz
-                            chosen_ylabel = "PSD to sum 1-100 Hz[%]+-SEM"
-                            chosen_ylim = [0, 14]
-
-                        elif norm == "normPsdToSum40_90Hz":
-                            chosenPsd = normPsdToSum40to90Hz
-                            chosenSem = semNormPsdToSum40to90Hz
-                            chosen_ylabel = "PSD to sum 40-90 Hz[%]+-SEM"
-                            chosen_ylim = [0, 200]
-                        
-                        else:
-                            chosenPsd = average_Sxx
-                            chosenSem = semRawPsd
-                            chosen_ylabel = "uV^2/Hz+-SEM"
-                        # else statement is necessary to ensure the definition variable is not only locally 
-                            
+            #################### PSD AVERAGE OF EACH FREQUENCY BAND DEPENDING ON CHOSEN PSD NORMALIZATION ####################
+            
+            # band averages of all channels were computed at once in spectrogram_Psd_allChannels()
+            for frequency, psdAverage in psd_channel["psdAverage"][norm].items():
 
-                        #################### PSD AVERAGE OF EACH FREQUENCY BAND DEPENDING ON CHOSEN PSD NORMALIZATION ####################
-                        
-                        # create booleans for each frequency-range for alpha, low beta, high beta, beta and gamma
-                        alpha_frequency = (f >= 8) & (f <= 12) # alpha_range will output a boolean of True values within the alpha range
-                        lowBeta_frequency = (f >= 13) & (f <= 20)
-                        highBeta_frequency = (f >= 21) & (f <= 35)
-                        beta_frequency = (f >= 13) & (f <= 35)
-                        narrowGamma_frequency = (f >= 40) & (f <= 90)
-
-                        # make a list with all boolean masks of each frequency, so I can loop through
-                        range_allFrequencies = [alpha_frequency, lowBeta_frequency, highBeta_frequency, beta_frequency, narrowGamma_frequency]
-
-                        # loop through frequency ranges and get all psd values of each frequency band
-                        for count, boolean in enumerate(range_allFrequencies):
-
-                            frequency = []
-                            if count == 0:
-                                frequency = "alpha"
-                            elif count == 1:
-                                frequency = "lowBeta"
-                            elif count == 2:
-                                frequency = "highBeta"
-                            elif count == 3:
-                                frequency = "beta"
-                            elif count == 4:
-                                frequency = "narrowGamma"
-                            
+                # store averaged psd values of each frequency band in a dictionary
+                psdAverage_dict[f'{tp}_{ch}_psdAverage_{norm}_{frequency}'] = [tp, ch, frequency, norm, psdAverage]
 
 
-                            # get all frequencies and chosen psd values within each frequency range
-                            # frequencyInFreqBand = f[range_allFrequencies[count]] # all frequencies within a frequency band
-                            psdInFreqBand = chosenPsd[range_allFrequencies[count]] # all psd values within a frequency band
 
-                            psdAverage = np.mean(psdInFreqBand)
+            #################### PEAK DETECTION PSD DEPENDING ON CHOSEN PSD NORMALIZATION ####################
+            # find all peaks: peaks is a tuple -> peaks[0] = index of frequency?, peaks[1] = dictionary with keys("peaks_height") 
+            peaks = scipy.signal.find_peaks(chosenPsd, height=0.1) # height: peaks only above 0.1 will be recognized
 
-                            # store averaged psd values of each frequency band in a dictionary
-                            psdAverage_dict[f'{tp}_{ch}_psdAverage_{norm}_{frequency}'] = [tp, ch, frequency, norm, psdAverage]
+            # Error checking: if no peaks found, continue
+            if len(peaks) == 0:
+                continue
 
+            peaks_height = peaks[1]["peak_heights"] # np.array of y-value of peaks = power
+            peaks_pos = f[peaks[0]] # np.array of indeces on x-axis of peaks = frequency
 
+            # set the x-range for each frequency band
+            alpha_range = (peaks_pos >= 8) & (peaks_pos <= 12) # alpha_range will output a boolean of True values within the alpha range
+            lowBeta_range = (peaks_pos >= 13) & (peaks_pos <= 20)
+            highBeta_range = (peaks_pos >= 21) & (peaks_pos <= 35)
+            beta_range = (peaks_pos >= 13) & (peaks_pos <= 35)
+            narrowGamma_range = (peaks_pos >= 40) & (peaks_pos <= 90)
 
-                        #################### PEAK DETECTION PSD DEPENDING ON CHOSEN PSD NORMALIZATION ####################
-                        # find all peaks: peaks is a tuple -> peaks[0] = index of frequency?, peaks[1] = dictionary with keys("peaks_height") 
-                        peaks = scipy.signal.find_peaks(chosenPsd, height=0.1) # height: peaks only above 0.1 will be recognized
+            # make a list with all boolean masks of each frequency, so I can loop through
+            frequency_ranges = [alpha_range, lowBeta_range, highBeta_range, beta_range, narrowGamma_range]
 
-                        # Error checking: if no peaks found, continue
-                        if len(peaks) == 0:
-                            continue
+            # loop through frequency ranges and get the highest peak of each frequency band
+            for count, boolean in enumerate(frequency_ranges):
 
-                        peaks_height = peaks[1]["peak_heights"] # np.array of y-value of peaks = power
-                        peaks_pos = f[peaks[0]] # np.array of indeces on x-axis of peaks = frequency
-
-                        # set the x-range for each frequency band
-                        alpha_range = (peaks_pos >= 8) & (peaks_pos <= 12) # alpha_range will output a boolean of True values within the alpha range
-                        lowBeta_range = (peaks_pos >= 13) & (peaks_pos <= 20)
-                        highBeta_range = (peaks_pos >= 21) & (peaks_pos <= 35)
-                        beta_range = (peaks_pos >= 13) & (peaks_pos <= 35)
-                        narrowGamma_range = (peaks_pos >= 40) & (peaks_pos <= 90)
-
-                        # make a list with all boolean masks of each frequency, so I can loop through
-                        frequency_ranges = [alpha_range, lowBeta_range, highBeta_range, beta_range, narrowGamma_range]
-
-                        # loop through frequency ranges and get the highest peak of each frequency band
-                        for count, boolean in enumerate(frequency_ranges):
-
-                            frequency = []
-                            if count == 0:
-                                frequency = "alpha"
-                            elif count == 1:
-                                frequency = "lowBeta"
-                            elif count == 2:
-                                frequency = "highBeta"
-                            elif count == 3:
-                                frequency = "beta"
-                            elif count == 4:
-                                frequency = "narrowGamma"
-                            
-                            # get all peak positions and heights within each frequency range
-                            peaksinfreq_pos = peaks_pos[frequency_ranges[count]]
-                            peaksinfreq_height = peaks_height[frequency_ranges[count]]
+                frequency = []
+                if count == 0:
+                    frequency = "alpha"
+                elif count == 1:
+                    frequency = "lowBeta"
+                elif count == 2:
+                    frequency = "highBeta"
+                elif count == 3:
+                    frequency = "beta"
+                elif count == 4:
+                    frequency = "narrowGamma"
+                
+                # get all peak positions and heights within each frequency range
+                peaksinfreq_pos = peaks_pos[frequency_ranges[count]]
+                peaksinfreq_height = peaks_height[frequency_ranges[count]]
 
-                            # Error checking: check first, if there is a peak in the frequency range
-                            if len(peaksinfreq_height) == 0:
-                                continue
+                # Error checking: check first, if there is a peak in the frequency range
+                if len(peaksinfreq_height) == 0:
+                    continue
 
-                            # select only the highest peak within the alpha range
-                            highest_peak_height = peaksinfreq_height.max()
+                # select only the highest peak within the alpha range
+                highest_peak_height = peaksinfreq_height.max()
 
-                            ######## calculate psd average of +- 2 Hz from highest Peak ########
-                            # 1) find psd values from -2Hz until + 2Hz from highest Peak by slicing and indexing the numpy array of all chosen psd values
-                            peakIndex = np.where(chosenPsd == highest_peak_height) # np.where output is a tuple: index, dtype
-                            peakIndexValue = peakIndex[0].item() # only take the index value of the highest Peak psd value in all chosen psd
+                ######## calculate psd average of +- 2 Hz from highest Peak ########
+                # 1) find psd values from -2Hz until + 2Hz from highest Peak by slicing and indexing the numpy array of all chosen psd values
+                peakIndex = np.where(chosenPsd == highest_peak_height) # np.where output is a tuple: index, dtype
+                peakIndexValue = peakIndex[0].item() # only take the index value of the highest Peak psd value in all chosen psd
 
-                            # 2) go -2 and +3 indeces 
-                            indexlowCutt = peakIndexValue-2
-                            indexhighCutt = peakIndexValue+3   # +3 because the ending index is left out when slicing a numpy array
+                # 2) go -2 and +3 indeces 
+                indexlowCutt = peakIndexValue-2
+                indexhighCutt = peakIndexValue+3   # +3 because the ending index is left out when slicing a numpy array
 
-                            # 3) slice the numpy array of all chosen psd values, only get values from -2 until +2 Hz from highest Peak
-                            psdArray5HzRangeAroundPeak = chosenPsd[indexlowCutt:indexhighCutt] # array only of psd values -2 until +2Hz around Peak = 5 values
+                # 3) slice the numpy array of all chosen psd values, only get values from -2 until +2 Hz from highest Peak
+                psdArray5HzRangeAroundPeak = chosenPsd[indexlowCutt:indexhighCutt] # array only of psd values -2 until +2Hz around Peak = 5 values
 
-                            # 4) Average of 5Hz Array
-                            highest_peak_height_5Hzaverage = np.mean(psdArray5HzRangeAroundPeak)                       
+                # 4) Average of 5Hz Array
+                highest_peak_height_5Hzaverage = np.mean(psdArray5HzRangeAroundPeak)                       
 
 
 
-                            # get the index of the highest peak y value to get the corresponding peak position x
-                            ix = np.where(peaksinfreq_height == highest_peak_height)
-                            highest_peak_pos = peaksinfreq_pos[ix].item()
+                # get the index of the highest peak y value to get the corresponding peak position x
+                ix = np.where(peaksinfreq_height == highest_peak_height)
+                highest_peak_pos = peaksinfreq_pos[ix].item()
 
-                            # plot only the highest peak within each frequency band
-                            plt.scatter(highest_peak_pos, highest_peak_height, color="k", s=15, marker='D')
+                # plot only the highest peak within each frequency band
+                plt.scatter(highest_peak_pos, highest_peak_height, color="k", s=15, marker='D')
 
-                            # store highest peak values of each frequency band in a dictionary
-                            highest_peak_dict[f'{tp}_{ch}_highestPEAK_{norm}_{frequency}'] = [tp, ch, frequency, norm, highest_peak_pos, highest_peak_height, highest_peak_height_5Hzaverage]
+                # store highest peak values of each frequency band in a dictionary
+                highest_peak_dict[f'{tp}_{ch}_highestPEAK_{norm}_{frequency}'] = [tp, ch, frequency, norm, highest_peak_pos, highest_peak_height, highest_peak_height_5Hzaverage]
 
 
 
 
-                        #################### PLOT THE CHOSEN PSD DEPENDING ON NORMALIZATION INPUT ####################
+            #################### PLOT THE CHOSEN PSD DEPENDING ON NORMALIZATION INPUT ####################
 
-                        # the title of each plot is set to the timepoint e.g. "postop"
-                        plt.title(tp, fontsize=15) 
+            # the title of each plot is set to the timepoint e.g. "postop"
+            plt.title(tp, fontsize=15) 
 
-                        # get y-axis label and limits
-                        # axes[t].get_ylabel()
-                        # axes[t].get_ylim()
+            # get y-axis label and limits
+            # axes[t].get_ylabel()
+            # axes[t].get_ylim()
 
-                        # .plot() method for creating the plot, axes[0] refers to the first plot, the plot is set on the appropriate object axes[t]
-                        plt.plot(f, chosenPsd, label=f"{ch}_{cond}")  # or np.log10(px) 
-                        # colors of each line in different color, defined at the beginning
-                        # axes[t].plot(f, chosenPsd, label=f"{ch}_{cond}", color=colors[i])
+            # .plot() method for creating the plot, axes[0] refers to the first plot, the plot is set on the appropriate object axes[t]
+            plt.plot(f, chosenPsd, label=f"{ch}_{cond}")  # or np.log10(px) 
+            # colors of each line in different color, defined at the beginning
+            # axes[t].plot(f, chosenPsd, label=f"{ch}_{cond}", color=colors[i])
 
-                        # make a shadowed line of the sem
-                        plt.fill_between(f, chosenPsd-chosenSem, chosenPsd+chosenSem, color='lightgray', alpha=0.5)
+            # make a shadowed line of the sem
+            plt.fill_between(f, chosenPsd-chosenSem, chosenPsd+chosenSem, color='lightgray', alpha=0.5)
 
 
 
@@ -1141,11 +991,15 @@ def spectrogram_Psd_onlyONEsession(incl_sub: str, incl_session: list, incl_condi
     # normPsdToSum40to90DataFrame.to_json(os.path.join(results_path,f"SPECTROGRAMnormPsdToSum_40to90Hz_{hemisphere}_{filter}"), sep=",")
     psdAverageDF.to_json(os.path.join(results_path,f"SPECTROGRAMpsdAverageFrequencyBands_{hemisphere}_{filter}.json"))
     highestPEAKDF.to_json(os.path.join(results_path,f"SPECTROGRAM_highestPEAK_FrequencyBands_{hemisphere}_{filter}.json"))
+    binary_results.write_npz_result(psdAverageDF, os.path.join(results_path,f"SPECTROGRAMpsdAverageFrequencyBands_{hemisphere}_{filter}.json"))
+    binary_results.write_npz_result(highestPEAKDF, os.path.join(results_path,f"SPECTROGRAM_highestPEAK_FrequencyBands_{hemisphere}_{filter}.json"))
 
     # concatenate the PSD Dataframes to one and take out the Duplicated columns
     PSD_Dataframe = pd.concat([rawPSDDataFrame, normPsdToTotalSumDataFrame, normPsdToSum1to100HzDataFrame, normPsdToSum40to90DataFrame], axis=1)
     PSD_Dataframe = PSD_Dataframe.loc[:,~PSD_Dataframe.columns.duplicated()]
     PSD_Dataframe.to_json(os.path.join(results_path,f"SPECTROGRAMPSD_{hemisphere}_{filter}.json"))
+    # binary copy of the power spectra, preferred by loadResults.load_PSDjson
+    binary_results.write_npz_result(PSD_Dataframe, os.path.join(results_path,f"SPECTROGRAMPSD_{hemisphere}_{filter}.json"))
 
 
     return {
@@ -1307,95 +1161,48 @@ def absoluteSpectrogram_Psd_noFilter(incl_sub: str, incl_session: list, incl_con
                 # pick channels of interest: mne.pick_channels() will output the indices of included channels in an array
                 ch_names_indices = mne.pick_channels(ch_names, include=include_channelList)
 
-                
-                for i, ch in enumerate(ch_names):
-                    
-                    # only get picked channels
-                    if i not in ch_names_indices:
-                        continue
-
-                    #################### GET DATA and sampling frequency OF EACH CHANNEL ####################
+                # picked channel indices in the order of the recording, every channel only once
+                ch_names_indices = np.unique(ch_names_indices)
 
-                    data = temp_data.get_data()[i, :]
-                    fs = temp_data.info["sfreq"]
 
+                #################### GET DATA and sampling frequency OF ALL PICKED CHANNELS ####################
 
-                    #################### PERFORM FOURIER TRANSFORMATION AND CALCULATE POWER SPECTRAL DENSITY ####################
+                data = temp_data.get_data()[ch_names_indices, :] # channels x samples
+                fs = temp_data.info["sfreq"]
 
-                    window = 250 # with sfreq 250 frequencies will be from 0 to 125 Hz, 125Hz = Nyquist = fs/2
-                    noverlap = 0.5 # 50% overlap of windows
 
-                    window = hann(window, sym=False)
+                #################### PERFORM FOURIER TRANSFORMATION AND CALCULATE POWER SPECTRAL DENSITY ####################
 
-                    # compute spectrogram with Fourier Transforms
-                    
-                    f,time_sectors,Sxx = scipy.signal.spectrogram(x=data, fs=fs, window=window, noverlap=noverlap,  scaling='density', mode='psd', axis=0)
-                    # f = frequencies 0-125 Hz (Maximum = Nyquist frequency = sfreq/2)
-                    # time_sectors = sectors 0.5 - 20.5 s in 0.5 steps (in total 21 time sectors)
-                    # Sxx = 126 arrays with 21 values each of PSD [µV^2/Hz], for each frequency bin PSD values of each time sector
-                    # Sxx = 126 frequency rows, 21 time sector columns
-
-                    # average all 21 Power spectra of all time sectors 
-                    average_Sxx = np.mean(Sxx, axis=1) # axis = 1 -> mean of each column: in total 21x126 mean values for each frequency
-                                   
-
-                    #################### CALCULATE THE STANDARD ERROR OF MEAN ####################
-                    # SEM = standard deviation / square root of sample size
-                    Sxx_std = np.std(Sxx, axis=1) # standard deviation of each frequency row
-                    semRawPsd = Sxx_std / np.sqrt(Sxx.shape[1]) # sample size = 21 time vectors -> sem with 126 values
-
-                    # # store only the integers of the channel name (later on in the column Channel_ID)
-                    # split_ch_name = ch.split("_") # split channel names in parts seperated by underscores
-                    # channel_ID = [] # list with only one value: str with integers of the channelname e.g. "03" in channel LFP_R_03_STN_MT
-                       
-                    # for substr in split_ch_name:
-                    #        if substr.isdigit():
-                    #          channel_ID.append(substr)
-
-                    # print("CHANNEL ID", channel_ID)
+                window = 250 # with sfreq 250 frequencies will be from 0 to 125 Hz, 125Hz = Nyquist = fs/2
+                noverlap = 0.5 # 50% overlap of windows
 
-                    # store frequency, time vectors and psd values in a dictionary, together with session timepoint and channel
-                    f_rawPsd_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors, average_Sxx, semRawPsd] 
-        
-                        
+                window = hann(window, sym=False)
 
-                    #################### PSD AVERAGE OF EACH FREQUENCY BAND DEPENDING ON CHOSEN PSD NORMALIZATION ####################
-                    
-                    # create booleans for each frequency-range for alpha, low beta, high beta, beta and gamma
-                    alpha_frequency = (f >= 8) & (f <= 12) # alpha_range will output a boolean of True values within the alpha range
-                    lowBeta_frequency = (f >= 13) & (f <= 20)
-                    highBeta_frequency = (f >= 21) & (f <= 35)
-                    beta_frequency = (f >= 13) & (f <= 35)
-                    narrowGamma_frequency = (f >= 40) & (f <= 90)
+                # compute the spectrogram of all channels at once along the time axis
+                f,time_sectors,Sxx = scipy.signal.spectrogram(x=data, fs=fs, window=window, noverlap=noverlap,  scaling='density', mode='psd', axis=-1)
+                # f = frequencies 0-125 Hz (Maximum = Nyquist frequency = sfreq/2)
+                # time_sectors = sectors 0.5 - 20.5 s in 0.5 steps (in total 21 time sectors)
+                # Sxx = channels x 126 frequency rows x 21 time sector columns of PSD [µV^2/Hz]
 
-                    # make a list with all boolean masks of each frequency, so I can loop through
-                    range_allFrequencies = [alpha_frequency, lowBeta_frequency, highBeta_frequency, beta_frequency, narrowGamma_frequency]
+                # average PSD of all time sectors and SEM (standard deviation / square root of number of time sectors) of all channels
+                average_Sxx_channels, semRawPsd_channels = normalize_spectrogram_psd(Sxx)["rawPsd"]
 
-                    # loop through frequency ranges and get all psd values of each frequency band
-                    for count, boolean in enumerate(range_allFrequencies):
+                #################### PSD AVERAGE OF EACH FREQUENCY BAND ####################
+                psdAverage_channels = frequency_band_averages(f, average_Sxx_channels)
 
-                        frequency = []
-                        if count == 0:
-                            frequency = "alpha"
-                        elif count == 1:
-                            frequency = "lowBeta"
-                        elif count == 2:
-                            frequency = "highBeta"
-                        elif count == 3:
-                            frequency = "beta"
-                        elif count == 4:
-                            frequency = "narrowGamma"
-                        
 
+                for i, ch_index in enumerate(ch_names_indices):
 
-                        # get all frequencies and chosen psd values within each frequency range
-                        # frequencyInFreqBand = f[range_allFrequencies[count]] # all frequencies within a frequency band
-                        psdInFreqBand = average_Sxx[range_allFrequencies[count]] # all psd values within a frequency band
+                    ch = ch_names[ch_index]
+                    average_Sxx = average_Sxx_channels[i]
+                    semRawPsd = semRawPsd_channels[i]
 
-                        psdAverage = np.mean(psdInFreqBand)
+                    # store frequency, time vectors and psd values in a dictionary, together with session timepoint and channel
+                    f_rawPsd_dict[f'{tp}_{ch}'] = [tp, ch, f, time_sectors, average_Sxx, semRawPsd] 
 
-                        # store averaged psd values of each frequency band in a dictionary
-                        psdAverage_dict[f'{tp}_{ch}_psdAverage_{frequency}'] = [tp, ch, frequency, psdAverage]
+                    # store averaged psd values of each frequency band in a dictionary
+                    for frequency, psdAverage in psdAverage_channels.items():
+                        psdAverage_dict[f'{tp}_{ch}_psdAverage_{frequency}'] = [tp, ch, frequency, psdAverage[i]]
 
 
 
@@ -26,6 +26,8 @@ from fooof.plts.spectra import plot_spectrum
 # PyPerceive Imports
 from .. utils import find_folders as find_folders
 from ..utils import loadResults as loadResults  
+from ..utils import fooof_fit_cache as fooof_fit_cache
+from ..utils import binary_results as binary_results
 
 
 # channel_map = {'ZERO_AND_THREE_LEFT_RING':"LFP_L_03_STN_MT",
@@ -208,7 +210,8 @@ def write_missing_FOOOF_data_add_to_old_FOOOF(
         sub: str,
         session: str,
         condition: str,
-        json_filename: str
+        json_filename: str,
+        use_cache: bool = True
 ):
     
     """"
@@ -222,6 +225,8 @@ def write_missing_FOOOF_data_add_to_old_FOOOF(
         - session: str "fu18m" -> don't use fu18or24m here! allowed: "postop", "fu3m", "fu12m", "fu18m", "fu24m"
         - condition: str "m0s0"
         - json_filename
+        - use_cache: bool, if True power spectra that were fitted before with the same settings are loaded 
+            from the FOOOF fit cache instead of fitted again (see utils.fooof_fit_cache)
 
     1) extract from JSON: BSSU raw data and channel names
     2) rename channel names, and get hemisphere
@@ -266,6 +271,9 @@ def write_missing_FOOOF_data_add_to_old_FOOOF(
     freq_range = [1, 95] # frequency range to fit FOOOF model
 
 
+    if use_cache:
+        fit_cache = fooof_fit_cache.FooofFitCache()
+
     # loop over dataframe and run FOOOF for each row (so each channel), add new columns with FOOOF results
     fooof_results = {}
 
@@ -288,18 +296,16 @@ def write_missing_FOOOF_data_add_to_old_FOOOF(
 
         ############ SET FOOOF MODEL ############
 
-        model = fooof.FOOOF(
-                peak_width_limits=[2, 15.0],
-                max_n_peaks=6,
-                min_peak_height=0.2,
-                peak_threshold=2.0,
-                aperiodic_mode="fixed", # fitting without knee component
-                verbose=True,
-            )
+        if use_cache:
+            # only run FOOOF, if this power spectrum was not fitted before with the same settings
+            model = fit_cache.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=freq_range)
 
-        # run FOOOF
-        # always fit a large Frequency band, later you can select Peaks within specific freq bands
-        model.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=freq_range)
+        else:
+            model = fooof.FOOOF(**fooof_fit_cache.fooof_settings, verbose=True) # fitting without knee component
+
+            # run FOOOF
+            # always fit a large Frequency band, later you can select Peaks within specific freq bands
+            model.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=freq_range)
 
         # Plot an example power spectrum, with a model fit in second ax
         # model.plot(plot_peaks='shade', peak_kwargs={'color' : 'green'}, ax=ax[1])
@@ -424,6 +430,10 @@ def write_missing_FOOOF_data_add_to_old_FOOOF(
     
     # save DF in subject results folder
     new_concatenated_fooof.to_json(os.path.join(local_results_path, f"fooof_model_sub{sub}.json"))
+    binary_results.write_npz_result(new_concatenated_fooof, os.path.join(local_results_path, f"fooof_model_sub{sub}.json"))
+
+    if use_cache:
+        fit_cache.print_statistics()
     	
 
 
@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 import pickle
+import concurrent.futures
 
 import seaborn as sns
 from statannotations.Annotator import Annotator
@@ -22,6 +23,8 @@ from fooof.plts.spectra import plot_spectrum
 from ..classes import mainAnalysis_class
 from ..utils import find_folders as findfolders
 from ..utils import loadResults as loadResults  
+from ..utils import fooof_fit_cache as fooof_fit_cache
+from ..utils import binary_results as binary_results
 
 
 def get_input_y_n(message: str) -> str:
@@ -359,12 +362,42 @@ def get_input_w_wo_knee(message: str) -> str:
 
 
 
-def fooof_fit_power_spectra(incl_sub: list):
+def fooof_fit_model(freqs, power_spectrum, freq_range: list):
+    """
+    Input: 
+        - freqs: np.array of frequencies of the power spectrum
+        - power_spectrum: np.array of the unfiltered, raw power spectrum
+        - freq_range: list e.g. [1, 95], frequency range to fit the FOOOF model
+
+    Set and fit a FOOOF model without a knee (settings: fooof_fit_cache.fooof_settings, see fooof_fit_power_spectra()).
+
+    Defined on module level, so it can be sent to worker processes.
+
+    return the fitted fooof.FOOOF model
+    """
+
+    model = fooof.FOOOF(**fooof_fit_cache.fooof_settings, verbose=True) # fitting without knee component
+    
+    # always fit a large Frequency band, later you can select Peaks within specific freq bands
+    model.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=freq_range)
+
+    return model
+
+
+def fooof_fit_power_spectra(incl_sub: list, n_jobs: int = 1, plot_figures: bool = True, use_cache: bool = True):
     """
     NEW VERSION ONLY MODELING WITHOUT KNEE BECAUSE NOT NEEDED IN THE STN    
     
     Input: 
         - incl_sub: list e.g. ["017", "019", "021", "024", "025", "026", "028", "029", "030", "031", "032", "033", "038", "041", "060"]
+        - n_jobs: int, number of worker processes for fitting the FOOOF models
+            1: power spectra are fitted one after the other
+            >1: power spectra of all subjects are fitted in parallel in a process pool
+            -1: one worker process per CPU core
+        - plot_figures: bool, if True the figures of all fitted models are plotted after fitting with fooof_plot_power_spectra()
+            if False, no figures are plotted. Run fooof_plot_power_spectra() separately later, e.g. only for selected channels.
+        - use_cache: bool, if True only power spectra that were not fitted before with the same settings are fitted,
+            all other models are loaded from the FOOOF fit cache (see utils.fooof_fit_cache)
       
     1) Load the Power Spectrum from main Class:
         - unfiltered
@@ -386,12 +419,11 @@ def fooof_fit_power_spectra(incl_sub: list):
 
         frequency range for parameterization: 1-95 Hz
 
-        plot a figure with the raw Power spectrum and the fitted model 
-
-    3) save figure into figure folder of each subject:
-        figure filename: fooof_model_sub{subject}_{hemisphere}_{ses}_{chan}_wo_knee.png
-    
+        all power spectra are fitted first (in parallel if n_jobs > 1), figures are plotted afterwards 
+        if use_cache: unchanged power spectra are loaded from the FOOOF fit cache, cache hits and misses are printed
 
+    3) save the fitted models into results folder of each subject:
+        - filename: "fooof_models_sub{subject}.pickle"
     
     4) Extract following parameters and save as columns into DF 
         - 0: "subject_hemisphere", 
@@ -415,6 +447,8 @@ def fooof_fit_power_spectra(incl_sub: list):
     5) save Dataframe into results folder of each subject
         - filename: "fooof_model_sub{subject}.json"
 
+    6) if plot_figures: plot a figure with the raw Power spectrum and the fitted model, see fooof_plot_power_spectra()
+
     """
 
     # define variables 
@@ -426,17 +460,15 @@ def fooof_fit_power_spectra(incl_sub: list):
     
     freq_range = [1, 95] # frequency range to fit FOOOF model
 
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
 
-    ################### Load an unfiltered Power Spectrum with their frequencies for each STN ###################
 
-    for subject in incl_sub:
+    ################### Load an unfiltered Power Spectrum with their frequencies for each STN ###################
 
-        fooof_results = {}
-
-        # get path to results folder of each subject
-        local_figures_path = findfolders.get_local_path(folder="figures", sub=subject)
-        local_results_path = findfolders.get_local_path(folder="results", sub=subject)
+    power_spectra = [] # one dictionary per subject, hemisphere, session, channel
 
+    for subject in incl_sub:
 
         for hemisphere in hemispheres:
 
@@ -465,136 +497,156 @@ def fooof_fit_power_spectra(incl_sub: list):
                     # get the power spectra and frequencies from each channel
                     chan_data = getattr(data_power_spectrum, ses)
                     chan_data = getattr(chan_data, f"BIP_{chan}")
-                    
-                    power_spectrum = np.array(chan_data.rawPsd.data)
-                    freqs = np.array(chan_data.frequency.data)
 
-                    ############ SET PLOT LAYOUT ############
-                    fig, ax = plt.subplots(4,1, figsize=(7,20))
+                    power_spectra.append({
+                        "subject": subject,
+                        "hemisphere": hemisphere,
+                        "session": ses,
+                        "bipolar_channel": chan,
+                        "freqs": np.array(chan_data.frequency.data),
+                        "power_spectrum": np.array(chan_data.rawPsd.data),
+                    })
 
-                    # Plot the unfiltered Power spectrum in first ax
-                    plot_spectrum(freqs, power_spectrum, log_freqs=False, log_powers=False,
-                                    ax=ax[0])
-                    ax[0].grid(False)
-                    
 
-                    ############ SET FOOOF MODEL ############
+    ############ LOAD UNCHANGED FOOOF MODELS FROM THE CACHE ############
+    if use_cache:
+        fit_cache = fooof_fit_cache.FooofFitCache()
 
-                    model = fooof.FOOOF(
-                            peak_width_limits=[2, 15.0],
-                            max_n_peaks=6,
-                            min_peak_height=0.2,
-                            peak_threshold=2.0,
-                            aperiodic_mode="fixed", # fitting without knee component
-                            verbose=True,
-                        )
-                    
-                    # always fit a large Frequency band, later you can select Peaks within specific freq bands
-                    model.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=freq_range)
-
-                    # Plot an example power spectrum, with a model fit in second ax
-                    # model.plot(plot_peaks='shade', peak_kwargs={'color' : 'green'}, ax=ax[1])
-                    model.plot(ax=ax[1], plt_log=True) # to evaluate the aperiodic component
-                    model.plot(ax=ax[2], plt_log=False) # To see the periodic component better without log in frequency axis
-                    ax[1].grid(False)
-                    ax[2].grid(False)
-
-                    # check if fooof attributes are None:
-                    if model._peak_fit is None:
-                        print(f"subject {subject}, session {ses}, {chan}: model peak fit is None.")
-                        continue
-
-                    if model._ap_fit is None:
-                        print(f"subject {subject}, session {ses}, {chan}: model aperiodic fit is None.")
-                        continue
-                
+        for spectrum in power_spectra:
+            spectrum["model"] = fit_cache.load(spectrum["freqs"], spectrum["power_spectrum"], freq_range)
+    
+    else:
+        for spectrum in power_spectra:
+            spectrum["model"] = None
+    
+    # only fit power spectra without a cached model
+    spectra_to_fit = [spectrum for spectrum in power_spectra if spectrum["model"] is None]
 
-                    # plot only the fooof spectrum of the periodic component
-                    fooof_power_spectrum = 10**(model._peak_fit + model._ap_fit) - (10**model._ap_fit)
-                    plot_spectrum(np.arange(1, (len(fooof_power_spectrum)+1)), fooof_power_spectrum, log_freqs=False, log_powers=False, ax=ax[3])
-                    # frequencies: 1-95 Hz with 1 Hz resolution
 
-                    # titles
-                    fig.suptitle(f"sub {subject}, {hemisphere} hemisphere, {ses}, bipolar channel: {chan}",
-                                         fontsize=25)
-                    
-                    ax[0].set_title("unfiltered, raw power spectrum", fontsize=20, y=0.97, pad=-20)
-                    ax[3].set_title("power spectrum of periodic component", fontsize=20)
-
-                    # mark beta band
-                    x1 = 13
-                    x2 = 35
-                    ax[3].axvspan(x1, x2, color="whitesmoke")
-                    ax[3].grid(False)
-                    
-                    fig.tight_layout()
-                    fig.savefig(os.path.join(local_figures_path, f"fooof_model_sub{subject}_{hemisphere}_{ses}_{chan}.svg"), bbox_inches="tight", format="svg")
-                    fig.savefig(os.path.join(local_figures_path, f"fooof_model_sub{subject}_{hemisphere}_{ses}_{chan}.png"), bbox_inches="tight")
+    ############ FIT ALL NEW FOOOF MODELS ############
+    fit_input = ([spectrum["freqs"] for spectrum in spectra_to_fit], 
+                 [spectrum["power_spectrum"] for spectrum in spectra_to_fit], 
+                 [freq_range] * len(spectra_to_fit))
 
-                    
-                    # extract parameters from the chosen model
-                    # model.print_results()
+    if n_jobs > 1 and len(spectra_to_fit) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(n_jobs, len(spectra_to_fit))) as executor:
+            # executor.map returns the models in the order of spectra_to_fit
+            models = list(executor.map(fooof_fit_model, *fit_input, chunksize=8))
 
-                    ############ SAVE APERIODIC PARAMETERS ############
-                    # goodness of fit
-                    err = model.get_params('error')
-                    r_sq = model.r_squared_
+    else:
+        models = [fooof_fit_model(*spectrum_input) for spectrum_input in zip(*fit_input)]
+    
+    for spectrum, model in zip(spectra_to_fit, models):
+        spectrum["model"] = model
 
-                    # aperiodic components
-                    exp = model.get_params('aperiodic_params', 'exponent')
-                    offset = model.get_params('aperiodic_params', 'offset')
+        if use_cache:
+            fit_cache.save(spectrum["freqs"], spectrum["power_spectrum"], freq_range, model)
+    
+    if use_cache:
+        fit_cache.print_statistics()
 
-                    # periodic component
-                    log_power_fooof_periodic_plus_aperiodic = model._peak_fit + model._ap_fit # periodic+aperiodic component in log Power axis
-                    fooof_periodic_component = model._peak_fit # just periodic component, flattened spectrum
-                    
-                    ############ SAVE ALL PEAKS IN ALPHA; HIGH AND LOW BETA ############
-
-                    number_peaks = model.n_peaks_
-
-                    # get the highest Peak of each frequency band as an array: CF center frequency, Power, BandWidth
-                    alpha_peak = fooof.analysis.get_band_peak_fm(
-                        model,
-                        band=(8.0, 12.0),
-                        select_highest=True,
-                        attribute="peak_params"
-                        )
-
-                    low_beta_peak = fooof.analysis.get_band_peak_fm(
-                        model,
-                        band=(13.0, 20.0),
-                        select_highest=True,
-                        attribute="peak_params",
-                        )
-
-                    high_beta_peak = fooof.analysis.get_band_peak_fm(
-                        model,
-                        band=(21.0, 35.0),
-                        select_highest=True,
-                        attribute="peak_params",
-                        )
-
-                    beta_peak = fooof.analysis.get_band_peak_fm(
-                        model,
-                        band=(13.0, 35.0),
-                        select_highest=True,
-                        attribute="peak_params",
-                        )
-
-                    gamma_peak = fooof.analysis.get_band_peak_fm(
-                        model,
-                        band=(60.0, 90.0),
-                        select_highest=True,
-                        attribute="peak_params",
-                        )
-                    
-                    # save all results in dictionary
-                    STN = "_".join([subject, hemisphere])
 
-                    fooof_results[f"{subject}_{hemisphere}_{ses}_{chan}"] = [STN, ses, chan, 
-                                                        err, r_sq, exp, offset, 
-                                                        fooof_power_spectrum, log_power_fooof_periodic_plus_aperiodic, fooof_periodic_component,
-                                                        number_peaks, alpha_peak, low_beta_peak, high_beta_peak, beta_peak, gamma_peak]
+    ################### Extract the parameters of each subject ###################
+    fooof_results_subjects = {}
+
+    for subject in incl_sub:
+
+        fooof_results = {}
+        fooof_models = {}
+
+        # get path to results folder of each subject
+        local_results_path = findfolders.get_local_path(folder="results", sub=subject)
+
+        for spectrum in power_spectra:
+
+            if spectrum["subject"] != subject:
+                continue
+
+            hemisphere = spectrum["hemisphere"]
+            ses = spectrum["session"]
+            chan = spectrum["bipolar_channel"]
+            model = spectrum["model"]
+
+            fooof_models[f"{subject}_{hemisphere}_{ses}_{chan}"] = spectrum
+
+            # check if fooof attributes are None:
+            if model._peak_fit is None:
+                print(f"subject {subject}, session {ses}, {chan}: model peak fit is None.")
+                continue
+
+            if model._ap_fit is None:
+                print(f"subject {subject}, session {ses}, {chan}: model aperiodic fit is None.")
+                continue
+        
+
+            # only the fooof spectrum of the periodic component
+            fooof_power_spectrum = 10**(model._peak_fit + model._ap_fit) - (10**model._ap_fit)
+            # frequencies: 1-95 Hz with 1 Hz resolution
+
+            
+            # extract parameters from the chosen model
+            # model.print_results()
+
+            ############ SAVE APERIODIC PARAMETERS ############
+            # goodness of fit
+            err = model.get_params('error')
+            r_sq = model.r_squared_
+
+            # aperiodic components
+            exp = model.get_params('aperiodic_params', 'exponent')
+            offset = model.get_params('aperiodic_params', 'offset')
+
+            # periodic component
+            log_power_fooof_periodic_plus_aperiodic = model._peak_fit + model._ap_fit # periodic+aperiodic component in log Power axis
+            fooof_periodic_component = model._peak_fit # just periodic component, flattened spectrum
+            
+            ############ SAVE ALL PEAKS IN ALPHA; HIGH AND LOW BETA ############
+
+            number_peaks = model.n_peaks_
+
+            # get the highest Peak of each frequency band as an array: CF center frequency, Power, BandWidth
+            alpha_peak = fooof.analysis.get_band_peak_fm(
+                model,
+                band=(8.0, 12.0),
+                select_highest=True,
+                attribute="peak_params"
+                )
+
+            low_beta_peak = fooof.analysis.get_band_peak_fm(
+                model,
+                band=(13.0, 20.0),
+                select_highest=True,
+                attribute="peak_params",
+                )
+
+            high_beta_peak = fooof.analysis.get_band_peak_fm(
+                model,
+                band=(21.0, 35.0),
+                select_highest=True,
+                attribute="peak_params",
+                )
+
+            beta_peak = fooof.analysis.get_band_peak_fm(
+                model,
+                band=(13.0, 35.0),
+                select_highest=True,
+                attribute="peak_params",
+                )
+
+            gamma_peak = fooof.analysis.get_band_peak_fm(
+                model,
+                band=(60.0, 90.0),
+                select_highest=True,
+                attribute="peak_params",
+                )
+            
+            # save all results in dictionary
+            STN = "_".join([subject, hemisphere])
+
+            fooof_results[f"{subject}_{hemisphere}_{ses}_{chan}"] = [STN, ses, chan, 
+                                                err, r_sq, exp, offset, 
+                                                fooof_power_spectrum, log_power_fooof_periodic_plus_aperiodic, fooof_periodic_component,
+                                                number_peaks, alpha_peak, low_beta_peak, high_beta_peak, beta_peak, gamma_peak]
         # store results in a DataFrame
         fooof_results_df = pd.DataFrame(fooof_results)  
         fooof_results_df.rename(index={0: "subject_hemisphere", 
@@ -620,13 +672,120 @@ def fooof_fit_power_spectra(incl_sub: list):
 
         # save DF in subject results folder
         fooof_results_df.to_json(os.path.join(local_results_path, f"fooof_model_sub{subject}.json"))
-    	
-   
+        binary_results.write_npz_result(fooof_results_df, os.path.join(local_results_path, f"fooof_model_sub{subject}.json"))
+
+        # save the fitted models with their power spectra, so figures can be plotted later
+        with open(os.path.join(local_results_path, f"fooof_models_sub{subject}.pickle"), "wb") as file:
+            pickle.dump(fooof_models, file)
+        
+        fooof_results_subjects[subject] = fooof_results_df
+    
+
+    ############ PLOT FIGURES OF ALL FITTED MODELS ############
+    if plot_figures:
+        fooof_plot_power_spectra(incl_sub=incl_sub)
+    
+    
     return {
         "fooof_results_df": fooof_results_df, 
+        "fooof_results_subjects": fooof_results_subjects,
         }
 
 
+def fooof_plot_power_spectra(incl_sub: list, hemispheres: list = None, sessions: list = None, channels: list = None):
+    """
+    Figure stage of fooof_fit_power_spectra(), can be run separately after fitting.
+
+    Input: 
+        - incl_sub: list e.g. ["017", "019"]
+        - hemispheres: list e.g. ["Right"], None: all hemispheres
+        - sessions: list e.g. ["postop", "fu3m"], None: all sessions
+        - channels: list e.g. ["13", "1A1B"], None: all channels
+    
+    1) Load the fitted models from the results folder of each subject:
+        - filename: "fooof_models_sub{subject}.pickle" (written by fooof_fit_power_spectra())
+
+    2) plot a figure with the raw Power spectrum and the fitted model of each selected model:
+        - ax[0]: unfiltered, raw power spectrum
+        - ax[1]: model fit with log power
+        - ax[2]: model fit without log in frequency axis
+        - ax[3]: power spectrum of periodic component, beta band marked
+
+        models with an aperiodic or peak fit None are skipped
+
+    3) save figure into figure folder of each subject:
+        figure filename: fooof_model_sub{subject}_{hemisphere}_{ses}_{chan}.svg and .png
+
+    """
+
+    for subject in incl_sub:
+
+        local_figures_path = findfolders.get_local_path(folder="figures", sub=subject)
+        local_results_path = findfolders.get_local_path(folder="results", sub=subject)
+
+        with open(os.path.join(local_results_path, f"fooof_models_sub{subject}.pickle"), "rb") as file:
+            fooof_models = pickle.load(file)
+
+        for spectrum in fooof_models.values():
+
+            hemisphere = spectrum["hemisphere"]
+            ses = spectrum["session"]
+            chan = spectrum["bipolar_channel"]
+            model = spectrum["model"]
+
+            # only plot the selected models
+            if hemispheres is not None and hemisphere not in hemispheres:
+                continue
+
+            if sessions is not None and ses not in sessions:
+                continue
+
+            if channels is not None and chan not in channels:
+                continue
+
+            # check if fooof attributes are None:
+            if model._peak_fit is None or model._ap_fit is None:
+                continue
+
+            ############ SET PLOT LAYOUT ############
+            fig, ax = plt.subplots(4,1, figsize=(7,20))
+
+            # Plot the unfiltered Power spectrum in first ax
+            plot_spectrum(spectrum["freqs"], spectrum["power_spectrum"], log_freqs=False, log_powers=False,
+                            ax=ax[0])
+            ax[0].grid(False)
+
+            # Plot an example power spectrum, with a model fit in second ax
+            # model.plot(plot_peaks='shade', peak_kwargs={'color' : 'green'}, ax=ax[1])
+            model.plot(ax=ax[1], plt_log=True) # to evaluate the aperiodic component
+            model.plot(ax=ax[2], plt_log=False) # To see the periodic component better without log in frequency axis
+            ax[1].grid(False)
+            ax[2].grid(False)
+
+            # plot only the fooof spectrum of the periodic component
+            fooof_power_spectrum = 10**(model._peak_fit + model._ap_fit) - (10**model._ap_fit)
+            plot_spectrum(np.arange(1, (len(fooof_power_spectrum)+1)), fooof_power_spectrum, log_freqs=False, log_powers=False, ax=ax[3])
+            # frequencies: 1-95 Hz with 1 Hz resolution
+
+            # titles
+            fig.suptitle(f"sub {subject}, {hemisphere} hemisphere, {ses}, bipolar channel: {chan}",
+                                    fontsize=25)
+            
+            ax[0].set_title("unfiltered, raw power spectrum", fontsize=20, y=0.97, pad=-20)
+            ax[3].set_title("power spectrum of periodic component", fontsize=20)
+
+            # mark beta band
+            x1 = 13
+            x2 = 35
+            ax[3].axvspan(x1, x2, color="whitesmoke")
+            ax[3].grid(False)
+            
+            fig.tight_layout()
+            fig.savefig(os.path.join(local_figures_path, f"fooof_model_sub{subject}_{hemisphere}_{ses}_{chan}.svg"), bbox_inches="tight", format="svg")
+            fig.savefig(os.path.join(local_figures_path, f"fooof_model_sub{subject}_{hemisphere}_{ses}_{chan}.png"), bbox_inches="tight")
+            plt.close(fig)
+
+
 
 
     
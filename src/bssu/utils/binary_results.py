@@ -0,0 +1,168 @@
+""" Binary NPZ result files of power spectra, written alongside the JSON result files """
+
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def npz_filepath(json_filepath: str):
+    """ path of the NPZ file next to a JSON result file, e.g. SPECTROGRAMPSD_Right_band-pass.npz """
+
+    return os.path.splitext(json_filepath)[0] + ".npz"
+
+
+def column_kind(values):
+    """
+    Input:
+        - values: np.array of the values of one Dataframe column
+
+    return str
+        "number": int, float or bool values, missing values as NaN
+        "string": only str values
+        "array": only 1-dimensional lists or arrays of numbers, e.g. power spectra, can have different lengths
+        None: any other column, can not be stored in the NPZ file
+    """
+
+    if values.dtype != object:
+        return "number" if np.issubdtype(values.dtype, np.number) or values.dtype == bool else None
+
+    if all(isinstance(value, str) for value in values):
+        return "string"
+
+    if all(isinstance(value, (int, float, np.number, bool)) or value is None for value in values):
+        return "number"
+
+    if all(isinstance(value, (list, tuple, np.ndarray)) for value in values):
+        try:
+            row_arrays = [np.asarray(value, dtype=float) for value in values]
+        except (TypeError, ValueError):
+            return None
+
+        # only 1-dimensional arrays, the shape of nested lists is not stored
+        return "array" if all(row.ndim == 1 for row in row_arrays) else None
+
+    return None
+
+
+def write_npz_result(result_df, json_filepath: str):
+    """
+    Write a result Dataframe as binary NPZ file next to its JSON file, without pickled objects
+
+    Input:
+        - result_df: Dataframe, e.g. PSD_Dataframe or fooof_results_df, one row per power spectrum
+        - json_filepath: str, path of the JSON file of the same Dataframe
+
+    The values are stored as they are read from the JSON file: pd.DataFrame(json.loads(result_df.to_json())),
+    so floats have the same 10 decimals as in the JSON file.
+
+    Stored arrays:
+        - "index", "columns", "kinds": index labels as str (as in the JSON file), column names, column_kind() of each column
+        - f"values_{c}": values of column c
+            array columns: all arrays of the column concatenated as one float array
+        - f"offsets_{c}": only array columns, start of each row in f"values_{c}" and the total length at the end
+
+    Write the JSON file first: loadResults only prefers the NPZ file, if it is not older than the JSON file.
+
+    return bool, False if a column can not be stored (the JSON file stays the only result file)
+    """
+
+    # same values and dtypes as loading the JSON file
+    result_df = pd.DataFrame(json.loads(result_df.to_json()))
+
+    arrays = {
+        "index": np.array([str(label) for label in result_df.index]),
+        "columns": np.array([str(column) for column in result_df.columns]),
+    }
+
+    kinds = []
+
+    for c, column in enumerate(result_df.columns):
+
+        values = result_df.iloc[:, c].to_numpy()
+        kind = column_kind(values)
+
+        if kind is None:
+            print(f"column {column} can not be stored as NPZ, only JSON written: {json_filepath}")
+            return False
+
+        if kind == "number":
+            if values.dtype == object:
+                integer = all(isinstance(value, (int, np.integer)) and not isinstance(value, bool) for value in values)
+                values = np.array([np.nan if value is None else value for value in values], dtype=np.int64 if integer else float)
+
+            arrays[f"values_{c}"] = values
+
+        elif kind == "string":
+            arrays[f"values_{c}"] = values.astype(str)
+
+        elif kind == "array":
+            row_arrays = [np.asarray(value, dtype=float) for value in values]
+            arrays[f"values_{c}"] = np.concatenate(row_arrays) if row_arrays else np.zeros(0)
+            arrays[f"offsets_{c}"] = np.concatenate([[0], np.cumsum([len(row) for row in row_arrays])]).astype(np.int64)
+
+        kinds.append(kind)
+
+    arrays["kinds"] = np.array(kinds)
+
+    np.savez(npz_filepath(json_filepath), **arrays)
+
+    return True
+
+
+def read_npz_result(filepath: str):
+    """
+    Input:
+        - filepath: str, path of the NPZ file written by write_npz_result()
+
+    return Dataframe equal to pd.DataFrame() of the JSON file: same index (str), columns and values,
+        each value of an array column is a list of floats
+    """
+
+    with np.load(filepath, allow_pickle=False) as npz:
+
+        columns = {}
+
+        for c, (column, kind) in enumerate(zip(npz["columns"], npz["kinds"])):
+
+            values = npz[f"values_{c}"]
+
+            if kind == "array":
+                offsets = npz[f"offsets_{c}"]
+                # Series of lists as in the JSON file, np.array() of equal length lists would be 2-dimensional
+                values = pd.Series([values[start:stop].tolist() for start, stop in zip(offsets[:-1], offsets[1:])], dtype=object).to_numpy()
+
+            elif kind == "string":
+                values = values.astype(object)
+
+            columns[str(column)] = values
+
+        index = npz["index"].astype(object)
+
+    result_df = pd.DataFrame(index=index)
+
+    for column, values in columns.items():
+        result_df[column] = values
+
+    return result_df
+
+
+def preferred_result_file(json_filepath: str):
+    """
+    Input:
+        - json_filepath: str, path of a JSON result file
+
+    return the path of the NPZ file, if it exists and is not older than the JSON file, otherwise json_filepath
+    """
+
+    binary_filepath = npz_filepath(json_filepath)
+
+    if not os.path.isfile(binary_filepath):
+        return json_filepath
+
+    if os.path.isfile(json_filepath) and os.path.getmtime(binary_filepath) < os.path.getmtime(json_filepath):
+        return json_filepath
+
+    return binary_filepath
@@ -0,0 +1,266 @@
+""" Vectorized bootstrap confidence intervals with STNs as resampling unit """
+
+
+import concurrent.futures
+import os
+
+import numpy as np
+
+
+def group_sums(values, groups):
+    """
+    Input:
+        - values: np.array (n_observations,) or (n_observations, n_statistics), e.g. one row per rank of an STN
+        - groups: array of group labels e.g. STN "024_Right", one label per observation
+
+    NaN observations are left out of the sums and counts of their statistic
+
+    return {
+        "sums": np.array (n_groups, n_statistics), sum of the values of each group,
+        "counts": np.array (n_groups, n_statistics), number of observations of each group and statistic,
+        "group_labels": unique group labels in order of appearance
+    }
+    """
+
+    values = np.asarray(values, dtype=float)
+    values = values.reshape(len(values), -1)
+
+    group_labels, first_index, group_index = np.unique(np.asarray(groups), return_index=True, return_inverse=True)
+
+    # order of appearance instead of sorted labels
+    appearance = np.argsort(first_index)
+    group_index = np.argsort(appearance)[group_index]
+
+    observed = ~np.isnan(values)
+
+    sums = np.zeros((len(group_labels), values.shape[1]))
+    np.add.at(sums, group_index, np.where(observed, values, 0.0))
+
+    counts = np.zeros((len(group_labels), values.shape[1]))
+    np.add.at(counts, group_index, observed)
+
+    return {
+        "sums": sums,
+        "counts": counts,
+        "group_labels": group_labels[appearance]
+    }
+
+
+def resample_weights(n_stns: int, n_resamples: int, rng):
+    """
+    Draw n_stns STNs with replacement for each resample.
+
+    Input:
+        - n_stns: int, number of STNs
+        - n_resamples: int, e.g. 1000
+        - rng: numpy.random.Generator
+
+    return np.array (n_resamples, n_stns), how often each STN was drawn in each resample
+    """
+
+    drawn = rng.integers(n_stns, size=(n_resamples, n_stns))
+
+    # count the draws of all resamples at once: each resample gets its own range of bins
+    offsets = np.arange(n_resamples)[:, None] * n_stns
+
+    return np.bincount((drawn + offsets).ravel(), minlength=n_resamples * n_stns).reshape(n_resamples, n_stns)
+
+
+def bootstrap_statistics(stn_values, weights, statistic: str = "mean", stn_counts=None):
+    """
+    Statistic of each resample, all resamples at once
+
+    Input:
+        - stn_values: np.array (n_stns, n_statistics), one value per STN and statistic
+        - weights: np.array (n_resamples, n_stns), from resample_weights()
+        - statistic: str, "mean" or "median" across STNs
+        - stn_counts: None or np.array (n_stns,) or (n_stns, n_statistics), only for "mean":
+            stn_values are the sums of stn_counts observations per STN,
+            the mean is the mean of all observations of the drawn STNs (e.g. all ranks of all STNs)
+
+    mean: one matrix product weights @ stn_values
+    median: the values are sorted once, the median of each resample is found in the cumulative weights of the sorted values
+
+    return np.array (n_resamples, n_statistics), NaN if a value of a drawn STN is NaN
+        (bootstrap_ci() drops STNs without a value before drawing)
+    """
+
+    n_stns = stn_values.shape[0]
+
+    if statistic == "mean":
+
+        if stn_counts is None:
+            return (weights @ stn_values) / weights.sum(axis=1, keepdims=True)
+
+        drawn_counts = weights @ stn_counts
+
+        return (weights @ stn_values) / drawn_counts.reshape(len(weights), -1)
+
+    if statistic != "median":
+        raise ValueError(f"statistic must be 'mean' or 'median', got: {statistic}")
+
+    if stn_counts is not None:
+        raise ValueError("stn_counts can only be used with statistic 'mean'")
+
+    # positions of the two middle values of n_stns drawn values (the same position if n_stns is odd)
+    lower_position = (n_stns - 1) // 2
+    upper_position = n_stns // 2
+
+    medians = np.empty((len(weights), stn_values.shape[1]))
+
+    for column in range(stn_values.shape[1]):
+
+        order = np.argsort(stn_values[:, column])
+        sorted_values = stn_values[order, column]
+
+        # the value at position p is the first sorted value with more than p draws up to and including it
+        cumulative_weights = np.cumsum(weights[:, order], axis=1)
+        lower_values = sorted_values[(cumulative_weights > lower_position).argmax(axis=1)]
+        upper_values = sorted_values[(cumulative_weights > upper_position).argmax(axis=1)]
+
+        medians[:, column] = (lower_values + upper_values) / 2
+
+        if np.isnan(sorted_values).any():
+            medians[:, column] = np.where((weights[:, np.isnan(stn_values[:, column])] > 0).any(axis=1), np.nan, medians[:, column])
+
+    return medians
+
+
+def bootstrap_ci(
+        stn_values,
+        statistic: str = "mean",
+        stn_counts=None,
+        n_resamples: int = 10000,
+        confidence: float = 0.95,
+        rng=None,
+        batch_size: int = 1000
+):
+    """
+    Percentile bootstrap confidence interval of a mean or median across STNs
+
+    Input:
+        - stn_values: np.array (n_stns,) or (n_stns, n_statistics), one value per STN, e.g. spearman r of each STN
+            several statistics are resampled with the same STNs
+        - statistic: str, "mean" or "median"
+        - stn_counts: None or np.array (n_stns,) or (n_stns, n_statistics), see bootstrap_statistics()
+        - n_resamples: int, e.g. 10000
+        - confidence: float, e.g. 0.95 for the 2.5 and 97.5 percentiles
+        - rng: numpy.random.Generator, SeedSequence or int seed, None: new unseeded Generator
+        - batch_size: int, number of resamples computed at once
+
+    STNs without a value of a statistic (NaN, or stn_counts 0) are dropped before drawing,
+    so a single NaN STN does not make the whole bootstrap NaN. 
+    Statistics with the same remaining STNs are resampled together.
+
+    return {
+        "estimate": np.array (n_statistics,), statistic of all STNs with a value,
+        "ci_low", "ci_high": np.arrays (n_statistics,), NaN if there are no STNs with a value,
+        "n_stns": np.array (n_statistics,), number of STNs with a value of each statistic
+    }
+    """
+
+    rng = np.random.default_rng(rng)
+
+    stn_values = np.asarray(stn_values, dtype=float)
+
+    # reshape(len, -1) fails without STNs
+    if stn_values.ndim == 1:
+        stn_values = stn_values[:, None]
+
+    n_stns, n_statistics = stn_values.shape
+
+    valid = ~np.isnan(stn_values)
+
+    if stn_counts is not None:
+        stn_counts = np.broadcast_to(np.asarray(stn_counts, dtype=float).reshape(n_stns, -1), (n_stns, n_statistics))
+        valid &= stn_counts > 0
+
+    estimate = np.full(n_statistics, np.nan)
+    ci_low = np.full(n_statistics, np.nan)
+    ci_high = np.full(n_statistics, np.nan)
+
+    tail = 100 * (1 - confidence) / 2
+
+    # one resampling per pattern of STNs with a value, e.g. only one if no value is missing
+    valid_patterns, pattern_index = np.unique(valid.T, axis=0, return_inverse=True)
+    pattern_index = pattern_index.ravel()
+
+    for pattern, valid_stns in enumerate(valid_patterns):
+
+        n_valid = int(valid_stns.sum())
+
+        if n_valid == 0:
+            continue
+
+        columns = np.flatnonzero(pattern_index == pattern)
+        values = stn_values[np.ix_(valid_stns, columns)]
+        counts = None if stn_counts is None else stn_counts[np.ix_(valid_stns, columns)]
+
+        estimate[columns] = bootstrap_statistics(values, np.ones((1, n_valid)), statistic, counts)[0]
+
+        distribution = np.concatenate([
+            bootstrap_statistics(values, resample_weights(n_valid, min(batch_size, n_resamples - start), rng), statistic, counts)
+            for start in range(0, n_resamples, batch_size)
+        ])
+
+        ci_low[columns], ci_high[columns] = np.percentile(distribution, [tail, 100 - tail], axis=0)
+
+    return {
+        "estimate": estimate,
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "n_stns": valid.sum(axis=0)
+    }
+
+
+def bootstrap_ci_from_input(bootstrap_input: dict):
+    """ bootstrap_ci() with keyword arguments from one dict, used by the worker processes of bootstrap_cis() """
+
+    return bootstrap_ci(**bootstrap_input)
+
+
+def bootstrap_cis(
+        bootstrap_inputs: dict,
+        n_resamples: int = 10000,
+        confidence: float = 0.95,
+        rng=None,
+        n_jobs: int = 1
+):
+    """
+    Bootstrap confidence intervals of independent groups, e.g. of all session comparisons
+
+    Input:
+        - bootstrap_inputs: dict {key: {"stn_values", "statistic", optional "stn_counts"}}, see bootstrap_ci()
+            e.g. key = session comparison
+        - n_resamples: int, e.g. 10000
+        - confidence: float, e.g. 0.95
+        - rng: numpy.random.Generator or int seed, None: new unseeded Generator
+        - n_jobs: int, number of worker processes
+            1: one after the other
+            >1: in parallel in a process pool
+            -1: one worker process per CPU core
+
+    Each key gets its own random seed, spawned from rng in the order of bootstrap_inputs,
+    so results with the same seed are identical for any n_jobs.
+
+    return {key: result of bootstrap_ci()} in the order of bootstrap_inputs
+    """
+
+    keys = list(bootstrap_inputs.keys())
+
+    seed_sequences = np.random.SeedSequence(np.random.default_rng(rng).integers(2**63)).spawn(len(keys))
+    inputs = [dict(bootstrap_inputs[key], n_resamples=n_resamples, confidence=confidence, rng=seed_sequence)
+              for key, seed_sequence in zip(keys, seed_sequences)]
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    if n_jobs > 1 and len(inputs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(n_jobs, len(inputs))) as executor:
+            # executor.map returns the results in the order of inputs
+            results = list(executor.map(bootstrap_ci_from_input, inputs))
+
+    else:
+        results = [bootstrap_ci_from_input(bootstrap_input) for bootstrap_input in inputs]
+
+    return dict(zip(keys, results))
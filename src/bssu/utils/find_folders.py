@@ -5,6 +5,181 @@ import pandas as pd
 
 from .. utils import loadResults as loadResults
 
+
+# environment variable overriding the folder containing 'BetaSenSightLongterm' and 'Monopolar_power_estimation',
+# e.g. export BSSU_PROJECT_ROOT=/Users/username/work/Code
+project_root_variable = "BSSU_PROJECT_ROOT"
+
+# folder keys of get_local_path and get_monopolar_project_path, relative to the project folder
+project_folders = {
+    "Project": [],
+    "GroupResults": ["results"],
+    "GroupFigures": ["figures"],
+    "data": ["data"],
+}
+
+subject_folders = {
+    "results": ["results"],
+    "figures": ["figures"],
+}
+
+
+class ProjectPathResolver:
+    """
+    Resolves the project folders once and caches everything needed for path lookups inside per-subject loops.
+
+    The project root (folder containing 'BetaSenSightLongterm' and 'Monopolar_power_estimation') is:
+        - project_root, if given
+        - the environment variable BSSU_PROJECT_ROOT, if set
+        - otherwise found once from the cwd: the folder inside the folder 'work', as before in get_local_path
+
+    Cached on first use:
+        - patient_metadata.xlsx of the monopolar project, sheet "patient_metadata", patient_ID as str
+        - folder names in data/externalized_lfp and the folder of each subject
+
+    Parameters:
+        - project_root: str, default None
+
+    Usage:
+        project_paths = ProjectPathResolver()
+        project_paths.get_local_path(folder="results", sub="029")
+        project_paths.get_monopolar_project_path(folder="data_sub", sub="EL001")
+        project_paths.clear_cache()     # after patient_metadata.xlsx or data/externalized_lfp changed
+    """
+
+    def __init__(self, project_root: str = None):
+
+        self.project_root = project_root
+
+        self.patient_metadata_df = None
+        self.externalized_lfp_folders = None
+        self.subject_folder_index = {}
+
+
+    def get_project_root(self):
+        """ return the project root, resolved on the first call """
+
+        if self.project_root is not None:
+            return self.project_root
+
+        if os.environ.get(project_root_variable):
+            self.project_root = os.environ[project_root_variable]
+            return self.project_root
+
+        # from the cwd go up until the parent folder is 'work'
+        path = os.getcwd()
+
+        while os.path.dirname(path)[-4:] != 'work':
+
+            if os.path.dirname(path) == path:
+                raise ValueError(f"no folder 'work' above {os.getcwd()}, set the environment variable {project_root_variable}")
+
+            path = os.path.dirname(path)
+
+        self.project_root = path
+
+        return self.project_root
+
+
+    def project_path(self, project: str, folder: str, sub: str = None):
+        """
+        Input:
+            - project: str "BetaSenSightLongterm" or "Monopolar_power_estimation"
+            - folder: str, key of project_folders or subject_folders
+            - sub: str, only for subject_folders
+
+        return the path, None for other folders (as before)
+        """
+
+        path = os.path.join(self.get_project_root(), project)
+
+        if folder in project_folders:
+            return os.path.join(path, *project_folders[folder])
+
+        if folder in subject_folders:
+            return os.path.join(path, *subject_folders[folder], f"sub-{sub}")
+
+        return None
+
+
+    def patient_metadata(self):
+        """ return a copy of the sheet "patient_metadata" of patient_metadata.xlsx, the file is read only once """
+
+        if self.patient_metadata_df is None:
+
+            patient_metadata = pd.read_excel(os.path.join(self.project_path("Monopolar_power_estimation", "data"), "patient_metadata.xlsx"),
+                                             keep_default_na=True, sheet_name="patient_metadata")
+
+            # change column "patient_ID" to strings
+            patient_metadata["patient_ID"] = patient_metadata.patient_ID.astype(str)
+
+            self.patient_metadata_df = patient_metadata
+
+        return self.patient_metadata_df.copy()
+
+
+    def externalized_subject_folder(self, sub: str):
+        """
+        Input:
+            - sub: str, e.g. "EL001" or "L010"
+
+        return the path of the subject folder in data/externalized_lfp, which contains the externalized_ID of the subject
+        """
+
+        if sub in self.subject_folder_index:
+            return self.subject_folder_index[sub]
+
+        data_path = self.project_path("Monopolar_power_estimation", "data")
+
+        if self.patient_metadata_df is None:
+            self.patient_metadata()
+
+        if self.externalized_lfp_folders is None:
+            self.externalized_lfp_folders = os.listdir(os.path.join(data_path, "externalized_lfp"))
+
+        sub_externalized_ID = self.patient_metadata_df.loc[self.patient_metadata_df.patient_ID == sub] # row of subject
+
+        if len(sub_externalized_ID) == 0:
+            raise ValueError(f"subject {sub} is not in patient_metadata.xlsx")
+
+        sub_externalized_ID = sub_externalized_ID.externalized_ID.values[0] # externalized ID
+
+        # check if externalized ID is in the directory, as before the last matching folder is used
+        folder_names = [folder for folder in self.externalized_lfp_folders if sub_externalized_ID in folder]
+
+        if len(folder_names) == 0:
+            raise ValueError(f"subject {sub} has no folder in {os.path.join(data_path, 'externalized_lfp')}")
+
+        self.subject_folder_index[sub] = os.path.join(data_path, "externalized_lfp", folder_names[-1])
+
+        return self.subject_folder_index[sub]
+
+
+    def get_local_path(self, folder: str, sub: str = None):
+
+        return self.project_path("BetaSenSightLongterm", folder=folder, sub=sub)
+
+
+    def get_monopolar_project_path(self, folder: str, sub: str = None):
+
+        if folder == "data_sub":
+            return self.externalized_subject_folder(sub)
+
+        return self.project_path("Monopolar_power_estimation", folder=folder, sub=sub)
+
+
+    def clear_cache(self):
+        """ read patient_metadata.xlsx and list data/externalized_lfp again on the next lookup, the project root is kept """
+
+        self.patient_metadata_df = None
+        self.externalized_lfp_folders = None
+        self.subject_folder_index = {}
+
+
+# resolver of this process, used by get_local_path and get_monopolar_project_path
+project_paths = ProjectPathResolver()
+
+
 def find_project_folder():
     """
     find_project_folder is a function to find the folder "PyPerceive_Project" on your local computer
@@ -226,12 +401,8 @@ def get_onedrive_path_externalized_bids(
         return os.path.join(datapath, 'sourcedata', f"sub-{sub}")
 
     elif folder == 'rawdata_sub':
-        local_path = get_monopolar_project_path(folder="data")
-        patient_metadata = pd.read_excel(os.path.join(local_path, "patient_metadata.xlsx"),
-                                         keep_default_na=True, sheet_name="patient_metadata")
-
-        # change column "patient_ID" to strings
-        patient_metadata["patient_ID"] = patient_metadata.patient_ID.astype(str)
+        # read only once, patient_ID as strings
+        patient_metadata = project_paths.patient_metadata()
 
         sub_BIDS_ID = patient_metadata.loc[patient_metadata.patient_ID == sub] # row of subject
         
@@ -279,47 +450,11 @@ def get_local_path(folder: str, sub: str = None):
         - sub: str, e.g. "029"
 
 
-    """
+    The project root is only resolved once, see ProjectPathResolver
 
-    folder_options = [
-        'Project', 'GroupResults', 'results', 'GroupFigures', 'figures', 'data'
-        ]
-
-    # Error checking, if folder input is in folder options
-    #if folder.lower() not in folder_options:
-        # raise ValueError(
-        #     f'given folder: {folder} is incorrect, '
-        #     f'should be {folder_options}')
-
-    # from your cwd get the path and stop at 'Users'
-    path = os.getcwd()
-
-    while os.path.dirname(path)[-4:] != 'work':
-        path = os.path.dirname(path) # path is now leading to Users/username
-
-    # get the Research folder and add it to the path
-
-    path = os.path.join(path, 'BetaSenSightLongterm') # path is now leading to Research folder
-
-
-    # add the folder to the path and from there open the folders depending on input folder
-    if folder == 'Project':
-        return path
-
-    elif folder == "GroupResults":
-        return os.path.join(path, "results")
-
-    elif folder == 'results':
-        return os.path.join(path, "results", f"sub-{sub}")
-
-    elif folder == 'GroupFigures':
-        return os.path.join(path, "figures")
-
-    elif folder == 'figures':
-        return os.path.join(path, "figures", f"sub-{sub}")
+    """
 
-    elif folder == 'data':
-        return os.path.join(path, "data")
+    return project_paths.get_local_path(folder=folder, sub=sub)
 
 
 def get_monopolar_project_path(folder: str, sub: str = None):
@@ -338,69 +473,8 @@ def get_monopolar_project_path(folder: str, sub: str = None):
         - sub: str, e.g. "EL001" or "L010"
 
 
-    """
-
-    folder_options = [
-        'Project', 'GroupResults', 'results', 'GroupFigures', 'figures', 'data',
-        'data_sub'
-        ]
-
-    # Error checking, if folder input is in folder options
-    #if folder.lower() not in folder_options:
-        # raise ValueError(
-        #     f'given folder: {folder} is incorrect, '
-        #     f'should be {folder_options}')
-
-    # from your cwd get the path and stop at 'Users'
-    path = os.getcwd()
-
-    while os.path.dirname(path)[-4:] != 'work':
-        path = os.path.dirname(path) # path is now leading to Users/username
-
-    # get the Research folder and add it to the path
-
-    path = os.path.join(path, 'Monopolar_power_estimation') # path is now leading to Research folder
-
+    The project root, patient_metadata.xlsx and the folders in data/externalized_lfp are only read once, see ProjectPathResolver
 
-    # add the folder to the path and from there open the folders depending on input folder
-    if folder == 'Project':
-        return path
-
-    elif folder == "GroupResults":
-        return os.path.join(path, "results")
-
-    elif folder == 'results':
-        return os.path.join(path, "results", f"sub-{sub}")
-
-    elif folder == 'GroupFigures':
-        return os.path.join(path, "figures")
-
-    elif folder == 'figures':
-        return os.path.join(path, "figures", f"sub-{sub}")
-
-    elif folder == 'data':
-        return os.path.join(path, "data")
-
-    elif folder == 'data_sub':
-        patient_metadata = pd.read_excel(os.path.join(path, "data", "patient_metadata.xlsx"),
-                                         keep_default_na=True, sheet_name="patient_metadata")
-
-        # change column "patient_ID" to strings
-        patient_metadata["patient_ID"] = patient_metadata.patient_ID.astype(str)
-
-        sub_externalized_ID = patient_metadata.loc[patient_metadata.patient_ID == sub] # row of subject
-        sub_externalized_ID = sub_externalized_ID.externalized_ID.values[0] # externalized ID
-
-        sub_folders = os.listdir(os.path.join(path, "data", "externalized_lfp"))
-        # check if externalized ID is in the directory
-        for folder in sub_folders:
-            if sub_externalized_ID in folder:
-                folder_name = folder
-
-        # if folder_name not in locals():
-        #     print(f"subject {sub} not in data. Check, if this subject has a folder in data")
-
-        sub_path = os.path.join(path, "data", "externalized_lfp", folder_name)
-        return sub_path
+    """
 
-            
+    return project_paths.get_monopolar_project_path(folder=folder, sub=sub)
@@ -0,0 +1,196 @@
+""" Content-addressed cache of FOOOF model fits """
+
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import fooof
+from fooof.data import FOOOFResults
+
+# Local Imports
+from . import find_folders as find_folders
+
+
+# FOOOF settings of all STN power spectrum fits
+fooof_settings = {
+    "peak_width_limits": [2, 15.0],  # must be a list, low limit should be more than twice as frequency resolution, usually not more than 15Hz bw
+    "max_n_peaks": 6,                # 4, 5 sometimes misses important peaks, 6 better even though there might be more false positives in high frequencies
+    "min_peak_height": 0.2,          # 0.2 detects false positives in gamma but better than 0.35 missing relevant peaks in low frequencies
+    "peak_threshold": 2.0,           # default 2.0, lower if necessary to detect peaks more sensitively
+    "aperiodic_mode": "fixed",       # fitting without knee component, because there are no knees found so far in the STN
+}
+
+
+def fooof_cache_key(freqs, power_spectrum, settings: dict, freq_range: list):
+    """
+    Input:
+        - freqs: np.array of frequencies of the power spectrum
+        - power_spectrum: np.array of the power spectrum
+        - settings: dict of FOOOF settings, e.g. fooof_settings
+        - freq_range: list e.g. [1, 95]
+
+    The key is the sha256 hash of the power spectrum and frequency bytes, the FOOOF settings,
+    the frequency range and the fooof version.
+    The same spectrum fitted with the same settings always gets the same key.
+
+    return the key as hex string
+    """
+
+    key_hash = hashlib.sha256()
+
+    for array in [freqs, power_spectrum]:
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        key_hash.update(str(array.shape).encode())
+        key_hash.update(array.tobytes())
+
+    key_hash.update(json.dumps(
+        {"settings": settings, "freq_range": list(freq_range), "fooof_version": fooof.__version__},
+        sort_keys=True,
+        default=float
+        ).encode())
+
+    return key_hash.hexdigest()
+
+
+class FooofFitCache:
+    """
+    Persistent cache of FOOOF model fits, one .npz file per fit in cache_path.
+
+    Stored for each fit: aperiodic_params, gaussian_params, peak_params, error, r_squared, _ap_fit and _peak_fit.
+    Failed fits are stored as well, so they are not fitted again.
+
+    Parameters:
+        - cache_path: str, folder of the cache files, default: "fooof_fit_cache" in the GroupResults folder
+        - settings: dict of FOOOF settings, default: fooof_settings
+
+    Usage:
+        fit_cache = FooofFitCache()
+        model = fit_cache.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=[1, 95])
+        fit_cache.print_statistics()
+    """
+
+    def __init__(self, cache_path: str = None, settings: dict = None):
+
+        if cache_path is None:
+            cache_path = os.path.join(find_folders.get_local_path(folder="GroupResults"), "fooof_fit_cache")
+
+        if settings is None:
+            settings = fooof_settings
+
+        self.cache_path = cache_path
+        self.settings = settings
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_path, exist_ok=True)
+
+
+    def new_model(self):
+        """ FOOOF model with the settings of this cache """
+
+        return fooof.FOOOF(**self.settings, verbose=True)
+
+
+    def cache_file(self, freqs, power_spectrum, freq_range: list):
+        """ path of the cache file of one power spectrum """
+
+        key = fooof_cache_key(freqs, power_spectrum, self.settings, freq_range)
+
+        return os.path.join(self.cache_path, f"{key}.npz")
+
+
+    def load(self, freqs, power_spectrum, freq_range: list):
+        """
+        return the cached FOOOF model of the power spectrum, None if it was not fitted before
+        """
+
+        cache_file = self.cache_file(freqs, power_spectrum, freq_range)
+
+        if not os.path.isfile(cache_file):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        with np.load(cache_file) as cached:
+            cached = dict(cached)
+
+        # add the data, so the model can be plotted
+        model = self.new_model()
+        model.add_data(freqs, power_spectrum, freq_range)
+
+        # failed fits have no results
+        if not cached["has_model"]:
+            return model
+
+        model.add_results(FOOOFResults(
+            aperiodic_params=cached["aperiodic_params"],
+            peak_params=cached["peak_params"],
+            r_squared=cached["r_squared"].item(),
+            error=cached["error"].item(),
+            gaussian_params=cached["gaussian_params"],
+        ))
+
+        # fitted components exactly as they were fitted
+        model._ap_fit = cached["ap_fit"]
+        model._peak_fit = cached["peak_fit"]
+        model.fooofed_spectrum_ = model._peak_fit + model._ap_fit
+        model._spectrum_flat = model.power_spectrum - model._ap_fit
+        model._spectrum_peak_rm = model.power_spectrum - model._peak_fit
+
+        return model
+
+
+    def save(self, freqs, power_spectrum, freq_range: list, model):
+        """
+        store the parameters of a fitted FOOOF model
+        """
+
+        cache_file = self.cache_file(freqs, power_spectrum, freq_range)
+
+        if model._ap_fit is None or model._peak_fit is None:
+            cached = {"has_model": False}
+
+        else:
+            cached = {
+                "has_model": True,
+                "aperiodic_params": model.aperiodic_params_,
+                "gaussian_params": model.gaussian_params_,
+                "peak_params": model.peak_params_,
+                "r_squared": model.r_squared_,
+                "error": model.error_,
+                "ap_fit": model._ap_fit,
+                "peak_fit": model._peak_fit,
+            }
+
+        # write to a temporary file first, so an interrupted run never leaves a broken cache file
+        temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temporary_file, "wb") as file:
+            np.savez(file, **cached)
+
+        os.replace(temporary_file, cache_file)
+
+
+    def fit(self, freqs, power_spectrum, freq_range: list):
+        """
+        return the cached FOOOF model of the power spectrum, or fit and cache a new FOOOF model
+        """
+
+        model = self.load(freqs, power_spectrum, freq_range)
+
+        if model is None:
+            model = self.new_model()
+            model.fit(freqs=freqs, power_spectrum=power_spectrum, freq_range=freq_range)
+            self.save(freqs, power_spectrum, freq_range, model)
+
+        return model
+
+
+    def print_statistics(self):
+        """ print cache hits and misses of this run """
+
+        print(f"FOOOF fit cache: {self.hits} hits, {self.misses} misses (fitted),",
+              f"\ncache folder: {self.cache_path}")
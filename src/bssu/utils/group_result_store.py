@@ -0,0 +1,270 @@
+""" Group result Dataframes: collected once, stored partitioned by subject hemisphere """
+
+
+import json
+import os
+import pickle
+
+import pandas as pd
+
+# Local Imports
+from . import result_cache as result_file_cache
+
+
+class GroupResultBuilder:
+    """
+    Collects the Dataframes of all subject hemispheres and sessions in a list
+    and concatenates them once at the end, instead of pd.concat in every iteration of the loop.
+
+    Parameters:
+        - ignore_index: bool, default True: new index 0 to n-1, False: the index of each added Dataframe is kept
+
+    Usage:
+        group_builder = GroupResultBuilder()
+
+        for sub in incl_sub:
+            group_builder.add(session_DF_copy)
+
+        group_dataframe = group_builder.dataframe()
+    """
+
+    def __init__(self, ignore_index: bool = True):
+
+        self.ignore_index = ignore_index
+        self.frames = []
+
+
+    def add(self, frame):
+        """ add one Dataframe, e.g. all rows of one session of one subject hemisphere """
+
+        self.frames.append(frame)
+
+
+    def dataframe(self):
+        """
+        return one Dataframe with all added rows in the order they were added
+            empty Dataframe if nothing was added
+        """
+
+        if len(self.frames) == 0:
+            return pd.DataFrame()
+
+        return pd.concat(self.frames, ignore_index=self.ignore_index)
+
+
+
+class GroupResultStore:
+    """
+    Group result Dataframe stored as one pickle file per subject hemisphere in the folder {name}_store,
+    e.g. GroupResults/fooof_model_group_data_store/017_Right.pickle
+
+    The file "partitions.json" lists all partitions in the order of the group Dataframe
+    and the version (modification time in ns and size) of the group file {name}.{group_file_format} the store was written with.
+    A single new or recomputed subject is appended by writing only its partitions,
+    the files of all other subject hemispheres stay unchanged.
+
+    Parameters:
+        - results_path: str, folder of the group results, e.g. find_folders.get_local_path(folder="GroupResults")
+        - name: str, filename of the group result without extension, e.g. "fooof_model_group_data"
+        - partition_column: str, column with one value per partition, default "subject_hemisphere"
+        - group_file_format: str, "pickle" or "json", format of the group file written next to the store.
+            "json": read() returns the same dtypes as pd.DataFrame(json.load()) of the group file (str index, lists instead of arrays)
+
+    Usage:
+        group_store = GroupResultStore(results_path=results_path, name="fooof_model_group_data", group_file_format="json")
+        group_fooof_dataframe.to_json(group_store.group_filepath)
+        group_store.write(group_fooof_dataframe)            # all subject hemispheres, after the group file was written
+        group_store.append(fooof_dataframe_of_one_subject)  # replaces or adds only these subject hemispheres
+        group_fooof_dataframe = group_store.read()
+    """
+
+    def __init__(self, results_path: str, name: str, partition_column: str = "subject_hemisphere", group_file_format: str = "pickle"):
+
+        if group_file_format not in ["pickle", "json"]:
+            raise ValueError(f"group_file_format must be 'pickle' or 'json', not {group_file_format}")
+
+        self.results_path = results_path
+        self.name = name
+        self.partition_column = partition_column
+        self.group_file_format = group_file_format
+
+        self.group_filepath = os.path.join(results_path, f"{name}.{group_file_format}")
+        self.store_path = os.path.join(results_path, f"{name}_store")
+        self.manifest_filepath = os.path.join(self.store_path, "partitions.json")
+
+
+    def exists(self):
+
+        return os.path.isfile(self.manifest_filepath)
+
+
+    def manifest(self):
+        """ return dict of partitions.json, empty dict if the store does not exist """
+
+        if not self.exists():
+            return {}
+
+        with open(self.manifest_filepath) as file:
+            return json.load(file)
+
+
+    def partitions(self):
+        """ return list of all partitions in the store, e.g. ["017_Right", "017_Left"] """
+
+        return self.manifest().get("partitions", [])
+
+
+    def group_file_version(self):
+        """ return [modification time in ns, size] of the group file, None if it does not exist """
+
+        if not os.path.isfile(self.group_filepath):
+            return None
+
+        file_stat = os.stat(self.group_filepath)
+
+        return [file_stat.st_mtime_ns, file_stat.st_size]
+
+
+    def partition_filepath(self, partition: str):
+
+        return os.path.join(self.store_path, f"{partition}.pickle")
+
+
+    def split(self, group_dataframe):
+        """
+        return dict {partition: Dataframe} in the order of the first row of each partition
+        """
+
+        if self.partition_column not in group_dataframe.columns:
+            raise ValueError(f"column {self.partition_column} is missing, the group Dataframe can not be partitioned")
+
+        return {str(partition): partition_df for partition, partition_df in group_dataframe.groupby(self.partition_column, sort=False, dropna=False)}
+
+
+    def write_partitions(self, partition_frames: dict, partitions: list, group_file_version: list, appended: bool):
+        """ 
+        write the Dataframe of each given partition and then the manifest:
+            - partitions: list of all partitions
+            - group_file_version: version of the group file containing all partitions that were not appended
+            - appended: bool, True if partitions were added or replaced after the group file was written
+        """
+
+        os.makedirs(self.store_path, exist_ok=True)
+
+        for partition, partition_df in partition_frames.items():
+
+            # converted once when written, so read() only concatenates the partitions
+            if self.group_file_format == "json":
+                partition_df = pd.DataFrame(json.loads(partition_df.to_json()))
+
+            with open(self.partition_filepath(partition), "wb") as file:
+                pickle.dump(partition_df, file)
+
+        # the manifest is written last, so a store is only complete if all its partitions were written
+        with open(self.manifest_filepath, "w") as file:
+            json.dump({
+                "partitions": partitions, 
+                "partition_column": self.partition_column, 
+                "group_file_version": group_file_version,
+                "appended": appended
+                }, file)
+
+
+    def write(self, group_dataframe):
+        """
+        Write the whole group Dataframe, partitions that are not in the Dataframe anymore are removed.
+        Call after the same Dataframe was written into the group file, its version is stored in the manifest.
+        An empty Dataframe (no subject results) writes an empty store.
+        """
+
+        if len(group_dataframe) == 0:
+            partition_frames = {}
+        else:
+            partition_frames = self.split(group_dataframe)
+
+        for partition in self.partitions():
+            if partition not in partition_frames and os.path.isfile(self.partition_filepath(partition)):
+                os.remove(self.partition_filepath(partition))
+
+        self.write_partitions(partition_frames, partitions=list(partition_frames.keys()), group_file_version=self.group_file_version(), appended=False)
+
+        print(f"group store written: {len(partition_frames)} partitions in {self.store_path}")
+
+
+    def append(self, new_dataframe):
+        """
+        Write only the partitions of new_dataframe, e.g. all rows of one new subject.
+        Existing partitions with the same name are replaced in place, new partitions are added at the end.
+        """
+
+        # appending to a missing store would hide all other subject hemispheres of the group file
+        if not self.exists():
+            raise ValueError(f"no group store of {self.name} in {self.results_path}, write the whole group result first")
+
+        if len(new_dataframe) == 0:
+            print(f"group store of {self.name} not changed: no rows to append")
+            return
+
+        partition_frames = self.split(new_dataframe)
+
+        manifest = self.manifest()
+        partitions = manifest["partitions"]
+        partitions = partitions + [partition for partition in partition_frames if partition not in partitions]
+
+        self.write_partitions(partition_frames, partitions=partitions, group_file_version=manifest.get("group_file_version"), appended=True)
+
+        print(f"group store appended: {list(partition_frames.keys())} in {self.store_path}")
+
+
+    def read(self, partitions: list = None, reader=result_file_cache.read_pickle_file):
+        """
+        Input:
+            - partitions: list of partitions to read, default None: all partitions
+            - reader: function reading one partition file, default read_pickle_file
+
+        return the group Dataframe with all rows of the partitions, index 0 to n-1
+            group_file_format "json": the partitions were stored converted like the group file, pd.DataFrame(json.loads(to_json())):
+            index "0" to "n-1", arrays as lists, floats with 10 decimals
+        """
+
+        if not self.exists():
+            raise ValueError(f"no group store of {self.name} in {self.results_path}")
+
+        if partitions is None:
+            partitions = self.partitions()
+
+        group_builder = GroupResultBuilder()
+
+        for partition in partitions:
+            group_builder.add(reader(self.partition_filepath(partition)))
+
+        group_dataframe = group_builder.dataframe()
+
+        if self.group_file_format == "json":
+            # index labels as str as in the group file, columns with None only in some partitions back to float with NaN
+            group_dataframe.index = group_dataframe.index.astype(str)
+            group_dataframe = group_dataframe.infer_objects()
+
+        return group_dataframe
+
+
+    def is_newer_than_group_file(self):
+        """ 
+        True if partitions were appended to the store after the group file was written 
+        or if there is only the store and no group file.
+
+        False if the group file was written again without the store (its version differs from the manifest),
+        or if the store holds the same rows as the group file.
+        """
+
+        if not self.exists():
+            return False
+
+        group_file_version = self.group_file_version()
+
+        if group_file_version is None:
+            return True
+
+        manifest = self.manifest()
+
+        return manifest.get("appended", False) and manifest.get("group_file_version") == group_file_version
@@ -3,10 +3,64 @@
 
 import os
 import pandas as pd
-import pickle
-import json
 
 from .. utils import find_folders as find_folders
+from .. utils import result_cache as result_file_cache
+from .. utils import binary_results as binary_results
+from .. utils import group_result_store as group_result_store
+
+
+# parsed JSON, NPZ, CSV and Excel result files of this process, files are only read again if they changed: result_cache.print_statistics()
+# pickle files are read directly: the cache stores pickled bytes, so a hit would cost as much as reading the file
+result_cache = result_file_cache.ResultFileCache(max_bytes=512 * 1024**2)
+
+
+
+def load_json_or_npz_result(json_filepath: str):
+
+    """
+    Reads a JSON result file of the PSD or FOOOF stages,
+    or the binary NPZ file written next to it (binary_results.write_npz_result), if it exists and is not older than the JSON file
+
+    Input:
+        - json_filepath: str, path of the JSON result file
+
+    Returns:
+        - data: Dataframe read from the NPZ file, or pd.DataFrame of the dictionary read from the JSON file
+            the same Dataframe in both cases
+
+    """
+
+    filepath = binary_results.preferred_result_file(json_filepath)
+
+    if filepath != json_filepath:
+        return result_cache.read(filepath, binary_results.read_npz_result)
+
+    return pd.DataFrame(result_cache.read(json_filepath, result_file_cache.read_json_file))
+
+
+
+def load_group_result_store(results_path: str, name: str, group_file_format: str = "pickle"):
+
+    """
+    Reads the group store "{name}_store" (one pickle file per subject hemisphere) written by writeGroupDataframes
+
+    Input:
+        - results_path: str, GroupResults folder
+        - name: str, filename of the group result without extension, e.g. "fooof_model_group_data"
+        - group_file_format: str, "pickle" or "json", the Dataframe has the same dtypes as the loaded group file
+
+    Returns:
+        - data: group Dataframe of all partitions, None if the store does not exist
+    
+    """
+
+    group_store = group_result_store.GroupResultStore(results_path=results_path, name=name, group_file_format=group_file_format)
+
+    if not group_store.exists():
+        return None
+
+    return group_store.read()
 
 
 
@@ -23,7 +77,7 @@ def load_PSDjson(sub: str, result: str, hemisphere: str, filter: str):
 
 
     Returns: 
-        - data: loaded CSV file as a Dataframe 
+        - data: Dataframe of the JSON file, or of the NPZ file next to it (see load_json_or_npz_result())
 
     """
 
@@ -66,8 +120,7 @@ def load_PSDjson(sub: str, result: str, hemisphere: str, filter: str):
     #     f'filename no .csv INCORRECT extension: {filename}'
     # )
 
-    with open(os.path.join(local_results_path, filename)) as file:
-        data = json.load(file)
+    data = load_json_or_npz_result(os.path.join(local_results_path, filename))
 
     return data
 
@@ -78,6 +131,9 @@ def load_BIPChannelGroups_ALL(freqBand:str, normalization:str, signalFilter:str)
     Loads pickle file from Group Results folder
     filename example: "BIPChannelGroups_ALL_{freqBand}_{normalization}_{signalFilter}.pickle"
 
+    If subjects were appended to the group store "BIPChannelGroups_ALL_{freqBand}_{normalization}_{signalFilter}_store"
+    after the pickle file was written, the store is loaded instead
+
     """
     # Error check: 
     # Error if sub str is not exactly 3 letters e.g. 024
@@ -99,8 +155,12 @@ def load_BIPChannelGroups_ALL(freqBand:str, normalization:str, signalFilter:str)
 
     filepath = os.path.join(local_results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    group_store = group_result_store.GroupResultStore(results_path=local_results_path, name=filename[:-len(".pickle")])
+
+    if group_store.is_newer_than_group_file():
+        return load_group_result_store(results_path=local_results_path, name=group_store.name)
+
+    data = result_file_cache.read_pickle_file(filepath)
 
     return data
 
@@ -138,8 +198,7 @@ def load_BIPChannelGroups_psdRanks_relToRank1(freqBand:str, normalization:str, s
 
     filepath = os.path.join(local_results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     return data
 
@@ -199,7 +258,7 @@ def load_PSDresultCSV(sub: str, psdMethod: str, normalization: str, hemisphere:
     # )
 
 
-    df = pd.read_csv(os.path.join(local_results_path, filename), sep= ",")
+    df = result_cache.read(os.path.join(local_results_path, filename), pd.read_csv, sep=",")
 
     return df
 
@@ -260,7 +319,7 @@ def load_freqBandsCSV(sub: str, parameters: str, normalization: str, hemisphere:
     # )
 
 
-    df = pd.read_csv(os.path.join(local_results_path, filename))
+    df = result_cache.read(os.path.join(local_results_path, filename), pd.read_csv)
 
     return df
 
@@ -313,8 +372,7 @@ def load_BIPchannelGroupsPickle(result: str,  channelGroup: list, normalization:
         # )
 
     
-        with open(filepath, "rb") as file:
-            data[g] = pickle.load(file)
+        data[g] = result_file_cache.read_pickle_file(filepath)
 
     return data
 
@@ -361,8 +419,7 @@ def load_BIPchannelGroup_sessionPickle(result: str,  freqBand: str, normalizatio
 
     filepath = os.path.join(local_results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     return data
 
@@ -414,8 +471,7 @@ def load_BIPpermutationComparisonsPickle(result: str,  freqBand: str, normalizat
 
         filepath = os.path.join(local_results_path, filename)
 
-        with open(filepath, "rb") as file:
-            data[c] = pickle.load(file)
+        data[c] = result_file_cache.read_pickle_file(filepath)
 
         print("pickle file loaded: ",filename, "\nloaded from: ", local_results_path)
 
@@ -457,8 +513,7 @@ def load_BIPpermutation_ranks_result(
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -486,7 +541,7 @@ def load_BestClinicalStimulation_excel():
     filename = "BestClinicalStimulation.xlsx"
     filepath = os.path.join(data_path, filename)
 
-    data = pd.read_excel(filepath, keep_default_na=True, sheet_name=None) # all sheets are loaded
+    data = result_cache.read(filepath, pd.read_excel, keep_default_na=True, sheet_name=None) # all sheets are loaded
     print("Excel file loaded: ",filename, "\nloaded from: ", data_path)
 
 
@@ -536,8 +591,7 @@ def load_monoRef_weightedPsdCoordinateDistance_pickle(
 
     filepath = os.path.join(sub_results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     print("pickle file loaded: ",filename, "\nloaded from: ", sub_results_path)
 
@@ -574,8 +628,7 @@ def load_monoRef_only_segmental_weight_psd_by_distance(
 
     filepath = os.path.join(sub_results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     print("pickle file loaded: ",filename, "\nloaded from: ", sub_results_path)
 
@@ -612,8 +665,7 @@ def load_Group_monoRef_only_segmental_weight_psd_by_distance(
 
     filepath = os.path.join(results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     print("pickle file loaded: ",filename, "\nloaded from: ", results_path)
 
@@ -654,8 +706,7 @@ def load_monopol_rel_psd_from0To8_pickle(
 
     filepath = os.path.join(results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     print("pickle file loaded: ",filename, "\nloaded from: ", results_path)
 
@@ -696,8 +747,7 @@ def load_GroupMonoRef_weightedPsdCoordinateDistance_pickle(
 
     filepath = os.path.join(results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     print("pickle file loaded: ",filename, "\nloaded from: ", results_path)
 
@@ -747,8 +797,7 @@ def load_monoRef_JLB_pickle(
 
     filepath = os.path.join(sub_results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     print("pickle file loaded: ",filename, "\nloaded from: ", sub_results_path)
 
@@ -789,8 +838,7 @@ def load_ClinicalActiveVsInactive(
 
     filepath = os.path.join(results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     print("pickle file loaded: ",filename, "\nloaded from: ", results_path)
 
@@ -842,8 +890,7 @@ def load_SSD_results_pickle(
 
     filepath = os.path.join(results_path, filename)
 
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     print("pickle file loaded: ",filename, "\nloaded from: ", results_path)
 
@@ -865,10 +912,7 @@ def load_fooof_json(subject: str):
     filename = f"fooof_model_sub{subject}.json"
 
     # load the json file
-    with open(os.path.join(results_path_sub, filename)) as file:
-        json_data = json.load(file)
-
-    fooof_result_df = pd.DataFrame(json_data)
+    fooof_result_df = load_json_or_npz_result(os.path.join(results_path_sub, filename))
     
     return fooof_result_df
 
@@ -879,6 +923,8 @@ def load_group_fooof_result():
     Load the file: "fooof_model_group_data.json"
     from the group result folder
 
+    If subjects were appended to the group store "fooof_model_group_data_store" after the JSON file was written, the store is loaded instead
+
     """
    
     # find the path to the results folder
@@ -887,11 +933,13 @@ def load_group_fooof_result():
     # create filename
     filename = f"fooof_model_group_data.json"
 
-    # load the json file
-    with open(os.path.join(results_path, filename)) as file:
-        json_data = json.load(file)
+    group_store = group_result_store.GroupResultStore(results_path=results_path, name="fooof_model_group_data", group_file_format="json")
 
-    fooof_result_df = pd.DataFrame(json_data)
+    if group_store.is_newer_than_group_file():
+        return load_group_result_store(results_path=results_path, name=group_store.name, group_file_format="json")
+
+    # load the json file
+    fooof_result_df = load_json_or_npz_result(os.path.join(results_path, filename))
     
     return fooof_result_df
 
@@ -914,8 +962,7 @@ def load_fooof_peaks_per_session():
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -935,8 +982,7 @@ def load_fooof_rank_beta_peak_power():
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -979,8 +1025,7 @@ def load_fooof_beta_ranks(
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
 
     ############## only keep one longterm session ##############
     if all_or_one_longterm_ses == "one_longterm_session":
@@ -1045,8 +1090,7 @@ def load_power_spectra_session_comparison(
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -1093,8 +1137,7 @@ def load_fooof_monopolar_weighted_psd(
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -1120,8 +1163,7 @@ def load_fooof_monopolar_JLB(
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -1156,8 +1198,7 @@ def load_fooof_permutation_bip_beta_ranks():
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -1196,8 +1237,7 @@ def load_fooof_lme_model_result(
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -1223,8 +1263,7 @@ def load_fooof_monoRef_all_contacts_weight_beta(
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -1253,13 +1292,11 @@ def load_preprocessing_files(table:str):
 
     # load the file
     if table == "movement_artifact_coord":
-        with open(filepath, "rb") as file:
-            data = pickle.load(file)
+        data = result_file_cache.read_pickle_file(filepath)
 
     elif table == "cleaned_power_spectra":
-        with open(filepath) as file:
-            data = json.load(file)
-            data = pd.DataFrame(data)
+        data = result_cache.read(filepath, result_file_cache.read_json_file)
+        data = pd.DataFrame(data)
 
     
     return data
@@ -1294,8 +1331,7 @@ def load_pickle_group_result(
     filepath = os.path.join(results_path, filename)
 
     # load the pickle file
-    with open(filepath, "rb") as file:
-        data = pickle.load(file)
+    data = result_file_cache.read_pickle_file(filepath)
     
     return data
 
@@ -82,23 +82,25 @@ def load_excel_data(
 
 
 
-def load_externalized_Poly5_files(
-        sub: str
+def load_externalized_Poly5_reader(
+        sub: str,
+        lazy: bool = False
 ):
     """
     Input:
         - sub: str e.g. "24"
+        - lazy: bool, if True the Poly5 file is memory-mapped and only the samples 
+                requested via get_data() or read_data_MNE(tmin, tmax, picks) are decoded
 
     filepath: '/Users/jenniferbehnke/Dropbox/work/ResearchProjects/Monopolar_power_estimation/data/externalized_lfp/
     -> subject path depending on the externalized patient ID
 
-    load the correct Poly5 file of the input subject
+    return the Poly5Reader of the correct Poly5 file of the input subject
     - externalized LFP
     - Med Off
     - Stim Off
     - Rest 
 
-    
     """
 
     subject_folder_path = find_folders.get_monopolar_project_path(
@@ -115,7 +117,29 @@ def load_externalized_Poly5_files(
     filepath = os.path.join(subject_folder_path, filename)
 
     # load the Poly5 file
-    raw_file = tmsi_poly5reader.Poly5Reader(filepath)
+    return tmsi_poly5reader.Poly5Reader(filepath, lazy=lazy)
+
+
+def load_externalized_Poly5_files(
+        sub: str
+):
+    """
+    Input:
+        - sub: str e.g. "24"
+
+    filepath: '/Users/jenniferbehnke/Dropbox/work/ResearchProjects/Monopolar_power_estimation/data/externalized_lfp/
+    -> subject path depending on the externalized patient ID
+
+    load the correct Poly5 file of the input subject
+    - externalized LFP
+    - Med Off
+    - Stim Off
+    - Rest 
+
+    
+    """
+
+    raw_file = load_externalized_Poly5_reader(sub=sub)
     raw_file = raw_file.read_data_MNE()
     raw_file.load_data()
 
@@ -149,13 +173,8 @@ def load_BIDS_externalized_vhdr_files(
     
     """
 
-    # get the BIDS key from the subject
-    local_path = find_folders.get_monopolar_project_path(folder="data")
-    patient_metadata = pd.read_excel(os.path.join(local_path, "patient_metadata.xlsx"),
-                                        keep_default_na=True, sheet_name="patient_metadata")
-
-    # change column "patient_ID" to strings
-    patient_metadata["patient_ID"] = patient_metadata.patient_ID.astype(str)
+    # get the BIDS key from the subject, patient_metadata.xlsx is read only once, patient_ID as strings
+    patient_metadata = find_folders.project_paths.patient_metadata()
     sub_BIDS_ID = patient_metadata.loc[patient_metadata.patient_ID == sub] # row of subject
 
     # check if the subject has a BIDS key
@@ -269,3 +288,151 @@ def load_externalized_pickle(
     
 
 
+
+
+
+def externalized_signal_columns(
+        data: pd.DataFrame
+):
+    """
+    Input:
+        - data: Dataframe with one row per channel, e.g. externalized_preprocessed_data
+
+    A column is a signal column, if any of its rows holds an array (np.ndarray, list or tuple).
+    All rows are checked, so a signal column is also found if its first row is missing (None or NaN).
+
+    return list of the signal columns in the order of data.columns
+    """
+
+    signal_columns = []
+
+    for col in data.columns:
+        values = data[col].tolist()
+        is_signal = [isinstance(v, (np.ndarray, list, tuple)) for v in values]
+
+        if not any(is_signal):
+            continue
+
+        # rows without a signal may only be missing values
+        scalar_values = [v for v, signal_row in zip(values, is_signal) if not signal_row and not pd.isna(v)]
+        if len(scalar_values) > 0:
+            raise ValueError(f"column {col} holds arrays and scalar values, e.g. {scalar_values[0]}")
+
+        signal_columns.append(col)
+
+    return signal_columns
+
+
+def save_externalized_h5(
+        data: pd.DataFrame,
+        filename: str,
+        signal_columns: list = None
+):
+    """
+    Input:
+        - data: Dataframe with one row per channel, e.g. externalized_preprocessed_data
+        - filename: str, e.g. "externalized_preprocessed_data"
+        - signal_columns: list of columns holding signals, e.g. ["lfp_2_min", "filtered_lfp_250Hz"]
+            None = detected from all rows with externalized_signal_columns()
+
+    Write the Dataframe into {filename}.h5 in the group results folder of the monopolar estimation project.
+    Each column holding signals is stored separately, so single signal versions of single subjects
+    can be loaded without reading the whole file:
+
+        - metadata/{column}: one value per row for all columns with scalar values (BIDS_id, contact, sfreq, ...)
+        - signals/{column}/{BIDS_id}/{original_ch_name}: one dataset per signal version and channel, 
+          e.g. signals/filtered_lfp_250Hz/L001/LFP_R_01_STN_MT
+
+    Rows without a signal (None or NaN) get no dataset and are loaded as NaN.
+
+    """
+
+    group_results_path = find_folders.get_monopolar_project_path(folder="GroupResults")
+    filepath = os.path.join(group_results_path, f"{filename}.h5")
+
+    data = data.reset_index(drop=True)
+    if signal_columns is None:
+        signal_columns = externalized_signal_columns(data)
+
+    metadata_columns = [col for col in data.columns if col not in signal_columns]
+
+    with h5py.File(filepath, "w") as file:
+
+        # keep the original column order
+        file.attrs["columns"] = list(data.columns)
+        
+        metadata = file.create_group("metadata")
+        for col in metadata_columns:
+            values = data[col].tolist()
+            if all(isinstance(v, str) for v in values):
+                metadata.create_dataset(col, data=values, dtype=h5py.string_dtype())
+            else:
+                metadata.create_dataset(col, data=np.asarray(values))
+
+        signals = file.create_group("signals")
+        for col in signal_columns:
+            for bids_id, ch_name, values in zip(data.BIDS_id, data.original_ch_name, data[col]):
+                if not isinstance(values, (np.ndarray, list, tuple)):
+                    continue
+                signals.create_dataset(f"{col}/{bids_id}/{ch_name}", data=values)
+
+    print(f"{filename}.h5",
+            f"\nwritten in: {group_results_path}" )
+
+
+def load_externalized_h5(
+        filename: str,
+        columns: list = None,
+        bids_id: list = None
+):
+    """
+    Input:
+        - filename: str, e.g. "externalized_preprocessed_data", "externalized_preprocessed_data_artefact_free"
+        - columns: list of signal columns to load, e.g. ["filtered_lfp_250Hz"], None = all signal columns
+        - bids_id: list of BIDS ids to load, e.g. ["L001", "L013"], None = all subjects
+
+    Load a file written by save_externalized_h5() from the group results folder.
+    Only the requested signal versions of the requested subjects are read from the file.
+
+    If there is no .h5 file yet, the .pickle file is loaded instead and the same selection is returned.
+
+    Returns a Dataframe with one row per channel: all metadata columns and the requested signal columns
+
+    """
+
+    group_results_path = find_folders.get_monopolar_project_path(folder="GroupResults")
+    filepath = os.path.join(group_results_path, f"{filename}.h5")
+
+    if not os.path.exists(filepath):
+        data = load_externalized_pickle(filename=filename)
+        if bids_id is not None:
+            data = data.loc[data.BIDS_id.isin(bids_id)]
+        if columns is not None:
+            signal_columns = externalized_signal_columns(data)
+            data = data[[col for col in data.columns if col in columns or col not in signal_columns]]
+        return data
+
+    with h5py.File(filepath, "r") as file:
+
+        metadata = {}
+        for col, dataset in file["metadata"].items():
+            if h5py.check_string_dtype(dataset.dtype) is not None:
+                metadata[col] = dataset.asstr()[()]
+            else:
+                metadata[col] = dataset[()]
+        data = pd.DataFrame(metadata)
+
+        if bids_id is not None:
+            data = data.loc[data.BIDS_id.isin(bids_id)].copy()
+
+        if columns is None:
+            columns = list(file["signals"].keys())
+
+        for col in columns:
+            col_signals = file["signals"].get(col, {})
+            data[col] = [col_signals[f"{b_id}/{ch_name}"][()] if f"{b_id}/{ch_name}" in col_signals else np.nan 
+                         for b_id, ch_name in zip(data.BIDS_id, data.original_ch_name)]
+
+        column_order = [col for col in file.attrs["columns"] if col in data.columns]
+
+    return data[column_order]
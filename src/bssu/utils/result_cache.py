@@ -0,0 +1,156 @@
+""" In-memory LRU cache of parsed result files """
+
+
+import collections
+import json
+import os
+import pickle
+import threading
+
+
+def read_json_file(filepath: str):
+    """ json.load of one file """
+
+    with open(filepath) as file:
+        return json.load(file)
+
+
+def read_pickle_file(filepath: str):
+    """ pickle.load of one file """
+
+    with open(filepath, "rb") as file:
+        return pickle.load(file)
+
+
+class ResultFileCache:
+    """
+    Bounded in-memory cache of parsed result files, shared by all loadResults.load_* functions of one process.
+
+    Each entry is stored as the pickled bytes of the parsed file:
+        - the memory of each entry is known exactly, entries are evicted least recently used first when max_bytes is exceeded
+        - every hit returns a new object, so changing a loaded Dataframe does not change the cache
+        - unpickling is much faster than parsing JSON, CSV or Excel again
+
+    Pickle result files should be read directly with read_pickle_file() and not through the cache: 
+    a hit unpickles the stored bytes, which costs as much as reading the file, and every miss adds a pickle.dumps.
+
+    An entry is only used, if modification time and size of the file did not change since it was read,
+    so results written again in the same session are read again.
+
+    Parameters:
+        - max_bytes: int, maximal memory of all entries, e.g. 1024**3, 0: nothing is cached
+
+    Usage:
+        result_cache = ResultFileCache(max_bytes=512 * 1024**2)
+        data = result_cache.read(filepath, read_json_file)
+        result_cache.print_statistics()
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024**2):
+
+        self.max_bytes = max_bytes
+
+        self.entries = collections.OrderedDict()
+        self.current_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.lock = threading.Lock()
+
+
+    def read(self, filepath: str, reader, **reader_kwargs):
+        """
+        Input:
+            - filepath: str, path of the result file
+            - reader: function reading the file, e.g. read_json_file, pd.read_csv
+            - reader_kwargs: keyword arguments of the reader, e.g. sep=","
+
+        return the parsed file, from the cache if the file did not change since it was read
+        """
+
+        filepath = os.path.abspath(filepath)
+        file_stat = os.stat(filepath)
+        file_version = (file_stat.st_mtime_ns, file_stat.st_size)
+
+        key = (filepath, f"{reader.__module__}.{reader.__qualname__}", repr(sorted(reader_kwargs.items())))
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and entry[0] == file_version:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return pickle.loads(entry[1])
+
+            self.misses += 1
+
+        data = reader(filepath, **reader_kwargs)
+
+        if self.max_bytes > 0:
+            self.store(key, file_version, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+
+        return data
+
+
+    def store(self, key: tuple, file_version: tuple, data_bytes: bytes):
+        """ store one entry and evict the least recently used entries until all entries fit into max_bytes """
+
+        with self.lock:
+
+            if key in self.entries:
+                self.current_bytes -= len(self.entries.pop(key)[1])
+
+            # entries larger than the whole cache are not stored
+            if len(data_bytes) > self.max_bytes:
+                return
+
+            self.entries[key] = (file_version, data_bytes)
+            self.current_bytes += len(data_bytes)
+
+            while self.current_bytes > self.max_bytes:
+                evicted_key, (evicted_version, evicted_bytes) = self.entries.popitem(last=False)
+                self.current_bytes -= len(evicted_bytes)
+                self.evictions += 1
+
+
+    def set_max_bytes(self, max_bytes: int):
+        """ change the maximal memory, entries are evicted if they do not fit anymore """
+
+        with self.lock:
+            self.max_bytes = max_bytes
+
+            while self.current_bytes > self.max_bytes:
+                evicted_key, (evicted_version, evicted_bytes) = self.entries.popitem(last=False)
+                self.current_bytes -= len(evicted_bytes)
+                self.evictions += 1
+
+
+    def clear(self):
+        """ remove all entries, the statistics are kept """
+
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+
+    def statistics(self):
+        """
+        return {"hits", "misses", "evictions", "entries", "current_bytes", "max_bytes"}
+        """
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "current_bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+    def print_statistics(self):
+
+        print(f"result file cache: {self.hits} hits, {self.misses} misses, {self.evictions} evictions, "
+              f"{len(self.entries)} files, {self.current_bytes / 1024**2:.1f} of {self.max_bytes / 1024**2:.1f} MB")
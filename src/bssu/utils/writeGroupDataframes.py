@@ -4,7 +4,6 @@ import os
 import pickle
 
 import pandas as pd
-import json
 import numpy as np
 
 from ..  tfr import feats_ssd as feats_ssd
@@ -12,6 +11,8 @@ from ..  tfr import feats_ssd as feats_ssd
 from .. classes import mainAnalysis_class as mainAnalysis_class
 from .. utils import find_folders as find_folders
 from .. utils import loadResults as loadResults
+from .. utils import binary_results as binary_results
+from .. utils import group_result_store as group_result_store
 # PyPerceive Imports
 # import py_perceive
 from PerceiveImport.classes import main_class
@@ -21,7 +22,8 @@ def write_BIPChannelGroups_ALLpsd(
         incl_sub: list, 
         signalFilter: str,
         normalization: str,
-        freqBand: str
+        freqBand: str,
+        append: bool = False
 ):
 
     """
@@ -40,10 +42,14 @@ def write_BIPChannelGroups_ALLpsd(
         - signalFilter: str "unfiltered", "band-pass"
         - normalization: str "rawPsd", "normPsdToTotalSum", "normPsdToSum1_100Hz", "normPsdToSum40_90Hz"
         - freqBand: list e.g. ["beta", "highBeta", "lowBeta"]
+        - append: bool, default False
+            True: only the subjects in incl_sub are written (added or replaced) in the group store, the pickle file is not rewritten
     
     Output: 
         - saving Dataframe as .pickle file
         filename: "BIPChannelGroups_ALL_{freqBand}_{normalization}_{signalFilter}.pickle"
+        - group store with one pickle file per subject hemisphere: "BIPChannelGroups_ALL_{freqBand}_{normalization}_{signalFilter}_store"
+            loadResults.load_BIPChannelGroups_ALL() loads the store, if subjects were appended after the pickle file was written
     
     """
 
@@ -67,7 +73,7 @@ def write_BIPChannelGroups_ALLpsd(
 
 
 
-    psdAverage_dataframe = pd.DataFrame()
+    group_builder = group_result_store.GroupResultBuilder()
 
     ##################### LOAD DATA for all subject hemispheres #####################
     for sub in incl_sub:
@@ -197,14 +203,32 @@ def write_BIPChannelGroups_ALLpsd(
                     
 
 
-                # concatenate all dataframes together
-                psdAverage_dataframe = pd.concat([psdAverage_dataframe, session_DF_copy], ignore_index=True)
+                # collect all dataframes, concatenated once after the loop
+                group_builder.add(session_DF_copy)
+
+    psdAverage_dataframe = group_builder.dataframe()
+
+    # one pickle file per subject hemisphere, so single subjects can be added later without rewriting the group file
+    group_store = group_result_store.GroupResultStore(
+        results_path=results_path, 
+        name=f"BIPChannelGroups_ALL_{freqBand}_{normalization}_{signalFilter}"
+        )
+    
+    if append:
+        group_store.append(psdAverage_dataframe)
+
+        return {
+            "psdAverage_dataframe": group_store.read()
+        }
 
     ### save the Dataframes with pickle 
     BIPChannelGroups_ALLpsd_filepath = os.path.join(results_path, f"BIPChannelGroups_ALL_{freqBand}_{normalization}_{signalFilter}.pickle")
     with open(BIPChannelGroups_ALLpsd_filepath, "wb") as file:
         pickle.dump(psdAverage_dataframe, file)
 
+    # the store is written after the group file and keeps its version
+    group_store.write(psdAverage_dataframe)
+
     return {
         "psdAverage_dataframe": psdAverage_dataframe
 
@@ -262,7 +286,7 @@ def write_BIPChannelGroups_psdRanks_relToRank1(
 
     recording_montage_group = ["circular", "segm_intralevel", "segm_interlevel"]
 
-    psdRank_and_relative_dataframe = pd.DataFrame()
+    group_builder = group_result_store.GroupResultBuilder()
 
     ##################### LOAD DATA for all subject hemispheres #####################
 
@@ -328,9 +352,10 @@ def write_BIPChannelGroups_psdRanks_relToRank1(
                 copyDF[f"relativePSD_to_{freqBand}_Rank1"] = copyDF.apply(lambda row: row[f"{freqBand}_psd"] / beta_rank_1, axis=1) # in each row add to new value psd/beta_rank1
 
                 
-                # concatenate all dataframes together
-                psdRank_and_relative_dataframe = pd.concat([psdRank_and_relative_dataframe, copyDF], ignore_index=True)
+                # collect all dataframes, concatenated once after the loop
+                group_builder.add(copyDF)
                 
+    psdRank_and_relative_dataframe = group_builder.dataframe()
 
     ### save the Dataframes with pickle 
     BIPChannelGroups_psdRanks_relToRank1_filepath = os.path.join(results_path, f"BIPChannelGroups_psdRanks_relToRank1_{freqBand}_{normalization}_{signalFilter}.pickle")
@@ -397,7 +422,7 @@ def write_GroupMonopolar_weightedPsdCoordinateDistance_relToRank1(
     sessions = ["postop", "fu3m", "fu12m", "fu18m"]
 
 
-    relToRank1_dataframe = pd.DataFrame()
+    group_builder = group_result_store.GroupResultBuilder()
 
     for sub in incl_sub:
 
@@ -438,8 +463,10 @@ def write_GroupMonopolar_weightedPsdCoordinateDistance_relToRank1(
                 session_DF_copy[f"relativePSD_to_{freqBand}_Rank1"] = session_DF_copy.apply(lambda row: row[f"averaged_monopolar_PSD_{freqBand}"] / beta_rank_1, axis=1) # in each row add to new value psd/beta_rank1
 
                 
-                # concatenate all dataframes together
-                relToRank1_dataframe = pd.concat([relToRank1_dataframe, session_DF_copy], ignore_index=True)
+                # collect all dataframes, concatenated once after the loop
+                group_builder.add(session_DF_copy)
+
+    relToRank1_dataframe = group_builder.dataframe()
     
     ### save the Dataframes with pickle 
     relToRank1_dataframe_filepath = os.path.join(results_path, f"GroupMonopolar_weightedPsdCoordinateDistance_relToRank1_{freqBand}_{normalization}_{signalFilter}.pickle")
@@ -503,7 +530,7 @@ def write_Group_monoRef_only_segmental_weight_psd_by_distance(
     sessions = ["postop", "fu3m", "fu12m", "fu18m"]
 
 
-    relToRank1_dataframe = pd.DataFrame()
+    group_builder = group_result_store.GroupResultBuilder()
 
     for sub in incl_sub:
 
@@ -544,8 +571,10 @@ def write_Group_monoRef_only_segmental_weight_psd_by_distance(
                 session_DF_copy[f"relativePSD_to_{freqBand}_Rank1"] = session_DF_copy.apply(lambda row: row[f"estimated_monopolar_psd_{freqBand}"] / beta_rank_1, axis=1) # in each row add to new value psd/beta_rank1
 
                 
-                # concatenate all dataframes together
-                relToRank1_dataframe = pd.concat([relToRank1_dataframe, session_DF_copy], ignore_index=True)
+                # collect all dataframes, concatenated once after the loop
+                group_builder.add(session_DF_copy)
+
+    relToRank1_dataframe = group_builder.dataframe()
     
     ### save the Dataframes with pickle 
     relToRank1_dataframe_filepath = os.path.join(results_path, f"group_monoRef_only_segmental_weight_psd_by_distance_{freqBand}_{normalization}_{signalFilter}.pickle")
@@ -624,7 +653,7 @@ def write_monopol_rel_psd_from0To8(
     contacts_8 = ["0", "1A", "1B", "1C", "2A", "2B", "2C", "3"]
 
 
-    relToRank1_dataframe = pd.DataFrame()
+    group_builder = group_result_store.GroupResultBuilder()
 
     for sub in incl_sub:
 
@@ -683,8 +712,10 @@ def write_monopol_rel_psd_from0To8(
                 session_DF_copy[f"relativePSD_{freqBand}_to_mean_std"] = session_DF_copy.apply(lambda row: (row[f"averaged_monopolar_PSD_{freqBand}"] - mean) / std, axis=1) 
 
                 
-                # concatenate all dataframes together
-                relToRank1_dataframe = pd.concat([relToRank1_dataframe, session_DF_copy], ignore_index=True)
+                # collect all dataframes, concatenated once after the loop
+                group_builder.add(session_DF_copy)
+
+    relToRank1_dataframe = group_builder.dataframe()
 
 
     #################### LOAD CLINICAL STIMULATION PARAMETERS #####################
@@ -697,7 +728,7 @@ def write_monopol_rel_psd_from0To8(
 
 
     ##################### FILTER THE MONOBETA8RANKS_DF: clinically ACTIVE contacts #####################
-    activeMonoBeta8Ranks = pd.DataFrame()
+    active_builder = group_result_store.GroupResultBuilder()
 
     for idx, row in BestClinicalContacts.iterrows():
 
@@ -715,15 +746,17 @@ def write_monopol_rel_psd_from0To8(
         sub_hem_ses_rows_copy = sub_hem_ses_rows.copy()
         sub_hem_ses_rows_copy["currentPolarity"] = currentPolarity
         
-        # concatenate single rows to new Dataframe
-        activeMonoBeta8Ranks = pd.concat([activeMonoBeta8Ranks, sub_hem_ses_rows_copy], ignore_index=True)
+        # collect single rows, concatenated once after the loop
+        active_builder.add(sub_hem_ses_rows_copy)
+
+    activeMonoBeta8Ranks = active_builder.dataframe()
 
     # add a column "clinicalUse" to the Dataframe and fill with "active"
     activeMonoBeta8Ranks["clinicalUse"] = "active"
 
 
     ##################### FILTER THE MONOBETA8RANKS_DF: clinically INACTIVE contacts #####################
-    inactiveMonoBeta8Ranks = pd.DataFrame()
+    inactive_builder = group_result_store.GroupResultBuilder()
 
     for idx, row in BestClinicalContacts.iterrows():
 
@@ -740,8 +773,10 @@ def write_monopol_rel_psd_from0To8(
         sub_hem_ses_rows_copy = sub_hem_ses_rows.copy()
         sub_hem_ses_rows_copy["currentPolarity"] = "0"
 
-        # concatenate single rows to new Dataframe
-        inactiveMonoBeta8Ranks = pd.concat([inactiveMonoBeta8Ranks, sub_hem_ses_rows_copy], ignore_index=True)
+        # collect single rows, concatenated once after the loop
+        inactive_builder.add(sub_hem_ses_rows_copy)
+
+    inactiveMonoBeta8Ranks = inactive_builder.dataframe()
 
     # add a column "clinicalUse" to the Dataframe and fill with "non_active"
     inactiveMonoBeta8Ranks["clinicalUse"] = "inactive"
@@ -924,7 +959,7 @@ def write_SSD_filtered_groupChannels(
     return SSD_results_Dataframe
 
 
-def write_fooof_group_json(incl_sub: list):
+def write_fooof_group_json(incl_sub: list, append: bool = False):
 
     """
     Load the file: "fooof_model_sub{subject}.json"
@@ -932,12 +967,17 @@ def write_fooof_group_json(incl_sub: list):
 
     Input
         - incl_sub: list e.g. ["017", "019", "021", "024", "025", "026", "028", "029", "030", "031", "032", "033", "038", "041", "060"]]
+        - append: bool, default False
+            False: write "fooof_model_group_data.json" and the group store "fooof_model_group_data_store" with all subjects in incl_sub
+            True: only the subjects in incl_sub are written (added or replaced) in the group store, e.g. incl_sub=["060"],
+                the group JSON file is not rewritten, loadResults.load_group_fooof_result() loads the store, if subjects were appended after the JSON file was written
 
+    return the group Dataframe of all subjects in the group file or store
     """
     # results folder for group results
     results_path_group = find_folders.get_local_path(folder="GroupResults")
 
-    group_fooof_dataframe = pd.DataFrame()
+    group_builder = group_result_store.GroupResultBuilder()
 
     for sub in incl_sub:
 
@@ -948,23 +988,32 @@ def write_fooof_group_json(incl_sub: list):
         filename = f"fooof_model_sub{sub}.json"
 
         # check if file exists
-        files_in_folder = os.listdir(results_path_sub) # list of all files in the sub results folder
-
-        if filename not in files_in_folder:
+        if not os.path.isfile(os.path.join(results_path_sub, filename)):
             print(f"no file: fooof_model_sub{sub}.json in sub-{sub} results folder")
             continue
 
-        elif filename in files_in_folder:
-            # load the json file
-            with open(os.path.join(results_path_sub, filename)) as file:
-                data = json.load(file)
-                data = pd.DataFrame(data)
-            
-            # concatenate all Dataframes together
-            group_fooof_dataframe = pd.concat([group_fooof_dataframe, data], ignore_index=True)
+        # load the json file (or the NPZ file written next to it)
+        data = loadResults.load_fooof_json(subject=sub)
+        
+        # collect all Dataframes, concatenated once after the loop
+        group_builder.add(data)
+    
+    group_fooof_dataframe = group_builder.dataframe()
+
+    # one pickle file per subject hemisphere, so single subjects can be added later without rewriting the group file
+    group_store = group_result_store.GroupResultStore(results_path=results_path_group, name="fooof_model_group_data", group_file_format="json")
+
+    if append:
+        group_store.append(group_fooof_dataframe)
+
+        return group_store.read()
     
     # save the group Dataframe into group results folder
     group_fooof_dataframe.to_json(os.path.join(results_path_group, f"fooof_model_group_data.json"))
+    binary_results.write_npz_result(group_fooof_dataframe, os.path.join(results_path_group, f"fooof_model_group_data.json"))
+
+    # the store is written after the group file and keeps its version
+    group_store.write(group_fooof_dataframe)
 
     return group_fooof_dataframe
 
@@ -1021,9 +1070,9 @@ def highest_beta_channels_fooof(
 
     stn_unique = fooof_group_result_copy.subject_hemisphere.unique().tolist()
 
-    highest_beta_df = pd.DataFrame()
-    beta_ranks_all_channels = pd.DataFrame()
-    beta_ranks_all_and_all_channels = pd.DataFrame()
+    highest_beta_builder = group_result_store.GroupResultBuilder(ignore_index=False)
+    beta_ranks_all_builder = group_result_store.GroupResultBuilder(ignore_index=False)
+    beta_ranks_all_and_all_builder = group_result_store.GroupResultBuilder(ignore_index=False)
 
     for stn in stn_unique:
 
@@ -1039,7 +1088,7 @@ def highest_beta_channels_fooof(
                 stn_ses_df = stn_df.loc[stn_df.session == ses] # df of only 1 stn and 1 session
             
             # save data for all channels, no ranks
-            beta_ranks_all_and_all_channels = pd.concat([beta_ranks_all_and_all_channels, stn_ses_df])
+            beta_ranks_all_and_all_builder.add(stn_ses_df)
                 
 
             for group in channel_group:
@@ -1065,9 +1114,13 @@ def highest_beta_channels_fooof(
                 group_comp_df_copy = group_comp_df_copy.loc[group_comp_df_copy.beta_rank == 1.0]
 
                 # save to ranked_beta_df
-                beta_ranks_all_channels = pd.concat([beta_ranks_all_channels, beta_ranks])
-                highest_beta_df = pd.concat([highest_beta_df, group_comp_df_copy])
+                beta_ranks_all_builder.add(beta_ranks)
+                highest_beta_builder.add(group_comp_df_copy)
     
+    highest_beta_df = highest_beta_builder.dataframe()
+    beta_ranks_all_channels = beta_ranks_all_builder.dataframe()
+    beta_ranks_all_and_all_channels = beta_ranks_all_and_all_builder.dataframe()
+
     # this dataframe contains only the highest beta channel per session and lfp group
     highest_beta_df_filepath = os.path.join(results_path, f"highest_beta_channels_fooof_{fooof_spectrum}.pickle")
     with open(highest_beta_df_filepath, "wb") as file:
@@ -1299,15 +1352,17 @@ def write_ses_comparison_power_spectra(
         STN_list = list(set(session_1_stns) & set(session_2_stns))
         STN_list.sort()
 
-        comparison_df = pd.DataFrame()
+        comparison_builder = group_result_store.GroupResultBuilder(ignore_index=False)
 
         for stn in STN_list:
 
             session_1_compared_to_2 = session_1_df.loc[session_1_df["stn"]==stn]
             session_2_compared_to_1 = session_2_df.loc[session_2_df["stn"]==stn]
             
-            comparison_df = pd.concat([comparison_df, session_1_compared_to_2, session_2_compared_to_1])
+            comparison_builder.add(session_1_compared_to_2)
+            comparison_builder.add(session_2_compared_to_1)
             
+        comparison_df = comparison_builder.dataframe()
 
         comparisons_storage[f"{comparison}_df"] = comparison_df
 
@@ -0,0 +1,100 @@
+""" Batched SOS filters of externalized LFPs compared with the previous per-channel filtfilt(b, a) """
+
+import numpy as np
+import pytest
+import scipy.signal
+
+from bssu.monopolar import externalized_filters
+
+
+n_channels = 16
+duration = 60 # seconds
+
+
+def reference_filtfilt(b, a, signal):
+    """ previous implementation: transfer function coefficients, one filtfilt call per channel """
+
+    return np.array([scipy.signal.filtfilt(b, a, channel) for channel in signal])
+
+
+def random_lfp(fs: int):
+
+    return np.random.default_rng(0).standard_normal((n_channels, int(fs * duration)))
+
+
+def relative_max_difference(filtered, reference):
+
+    return np.max(np.abs(filtered - reference)) / np.max(np.abs(reference))
+
+
+@pytest.mark.parametrize("fs", [250, 4000])
+def test_notch_filter_matches_per_channel_filtfilt(fs):
+
+    signal = random_lfp(fs)
+    b, a = scipy.signal.iirnotch(w0=50, Q=30, fs=fs)
+
+    filtered = externalized_filters.notch_filter_externalized(fs=fs, signal=signal)
+
+    assert relative_max_difference(filtered, reference_filtfilt(b, a, signal)) < 1e-10
+
+
+@pytest.mark.parametrize("fs", [250, 4000])
+def test_band_pass_filter_matches_per_channel_filtfilt(fs):
+
+    signal = random_lfp(fs)
+    b, a = scipy.signal.butter(3, (5, 95), btype='bandpass', output='ba', fs=fs)
+
+    filtered = externalized_filters.band_pass_filter_externalized(fs=fs, signal=signal)
+
+    assert relative_max_difference(filtered, reference_filtfilt(b, a, signal)) < 1e-6
+
+
+@pytest.mark.parametrize("fs, tolerance", [
+    (250, 1e-6),
+    # 1 Hz order 5 at 4000 Hz: the b, a coefficients of the previous implementation are ill-conditioned,
+    # the SOS output differs by about 1.5e-2 of the signal maximum (see test_high_pass_filter_4000Hz_gain)
+    (4000, 3e-2),
+])
+def test_high_pass_filter_matches_per_channel_filtfilt(fs, tolerance):
+
+    signal = random_lfp(fs)
+    b, a = scipy.signal.butter(5, 1, btype='highpass', output='ba', fs=fs)
+
+    filtered = externalized_filters.high_pass_filter_externalized(fs=fs, signal=signal)
+
+    assert relative_max_difference(filtered, reference_filtfilt(b, a, signal)) < tolerance
+
+
+def test_high_pass_filter_4000Hz_gain():
+    """ at 4000 Hz the SOS filter has the gain of the ideal Butterworth filter, the previous b, a filter does not """
+
+    fs = 4000
+    frequency = 0.2
+
+    sos = externalized_filters.sos_filter_coefficients_externalized(fs=fs, btype='highpass', frequency=1, order=5)
+    b, a = scipy.signal.butter(5, 1, btype='highpass', output='ba', fs=fs)
+
+    ideal_gain = (frequency / 1) ** 5 / np.sqrt(1 + (frequency / 1) ** 10)
+    sos_gain = np.abs(scipy.signal.sosfreqz(sos, worN=[frequency], fs=fs)[1][0])
+    ba_gain = np.abs(scipy.signal.freqz(b, a, worN=[frequency], fs=fs)[1][0])
+
+    assert sos_gain == pytest.approx(ideal_gain, rel=1e-2)
+    assert abs(ba_gain - ideal_gain) > 100 * abs(sos_gain - ideal_gain)
+
+
+def test_one_channel_equals_all_channels():
+
+    signal = random_lfp(250)
+
+    all_channels = externalized_filters.band_pass_filter_externalized(fs=250, signal=signal)
+    one_channel = externalized_filters.band_pass_filter_externalized(fs=250, signal=signal[3])
+
+    np.testing.assert_allclose(one_channel, all_channels[3], rtol=0, atol=1e-12)
+
+
+def test_filter_coefficients_are_cached():
+
+    first = externalized_filters.sos_filter_coefficients_externalized(fs=250, btype='notch', frequency=50, Q=30)
+    second = externalized_filters.sos_filter_coefficients_externalized(fs=250, btype='notch', frequency=50, Q=30)
+
+    assert first is second